@@ -0,0 +1,39 @@
+"""
+Comando reindexar_busqueda_clientes - FELICITAFAC
+Reconstruye los términos de búsqueda de clientes
+Uso: python manage.py reindexar_busqueda_clientes [--lote 500]
+Necesario tras cargas masivas con bulk_create o update(), que no pasan por Cliente.save
+"""
+
+from django.core.management.base import BaseCommand
+from aplicaciones.clientes.models import Cliente, TerminoBusquedaCliente
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de todos los clientes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Cantidad de clientes reindexados por transacción'
+        )
+    
+    def handle(self, *args, **options):
+        clientes = Cliente.objects.only(*TerminoBusquedaCliente.PESOS_CAMPOS).order_by('pk')
+        
+        lote = []
+        indexados = 0
+        for cliente in clientes.iterator(chunk_size=options['lote']):
+            lote.append(cliente)
+            if len(lote) >= options['lote']:
+                TerminoBusquedaCliente.indexar(lote)
+                indexados += len(lote)
+                lote = []
+        
+        if lote:
+            TerminoBusquedaCliente.indexar(lote)
+            indexados += len(lote)
+        
+        self.stdout.write(self.style.SUCCESS(f'Clientes reindexados: {indexados}'))
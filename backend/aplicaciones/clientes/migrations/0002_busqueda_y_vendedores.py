@@ -0,0 +1,117 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+import unicodedata
+
+
+# Copia de TerminoBusquedaCliente al crear el índice: la migración no depende del modelo actual
+PESOS_CAMPOS = {
+    'numero_documento': 10,
+    'razon_social': 5,
+    'nombre_comercial': 5,
+    'email': 1,
+}
+CAMPOS_CODIGO = ['numero_documento']
+LONGITUD_TERMINO = 50
+
+
+def tokenizar(texto):
+    """Palabras sin tildes y en mayúsculas, en orden y sin repetir"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    return list(dict.fromkeys(re.findall(r'[A-Z0-9]+', texto.upper())))
+
+
+def terminos_cliente(cliente):
+    """Términos del cliente con el mayor peso de los campos donde aparecen"""
+    terminos = {}
+    for campo, peso in PESOS_CAMPOS.items():
+        tokens = tokenizar(getattr(cliente, campo))
+        if campo in CAMPOS_CODIGO and len(tokens) > 1:
+            tokens.append(''.join(tokens))
+        
+        for token in tokens:
+            token = token[:LONGITUD_TERMINO]
+            terminos[token] = max(peso, terminos.get(token, 0))
+    
+    return terminos
+
+
+def indexar_clientes(apps, schema_editor):
+    """Términos de búsqueda de los clientes existentes, en lotes"""
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Termino = apps.get_model('clientes', 'TerminoBusquedaCliente')
+    
+    terminos = []
+    for cliente in Cliente.objects.only(*PESOS_CAMPOS).iterator(chunk_size=500):
+        terminos.extend(
+            Termino(cliente_id=cliente.pk, termino=termino, peso=peso)
+            for termino, peso in terminos_cliente(cliente).items()
+        )
+        if len(terminos) >= 5000:
+            Termino.objects.bulk_create(terminos)
+            terminos = []
+    
+    Termino.objects.bulk_create(terminos)
+
+
+def vincular_vendedores(apps, schema_editor):
+    """Pares vendedor-cliente distintos de los documentos ya emitidos"""
+    DocumentoElectronico = apps.get_model('facturacion', 'DocumentoElectronico')
+    ClienteVendedor = apps.get_model('clientes', 'ClienteVendedor')
+    
+    pares = DocumentoElectronico.objects.filter(
+        vendedor__isnull=False
+    ).values_list('cliente_id', 'vendedor_id').distinct().order_by()
+    
+    ClienteVendedor.objects.bulk_create(
+        [ClienteVendedor(cliente_id=cliente_id, vendedor_id=vendedor_id) for cliente_id, vendedor_id in pares],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('clientes', '0001_initial'),
+        ('facturacion', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusquedaCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(help_text='Palabra normalizada sin tildes y en mayúsculas', max_length=50, verbose_name='Término')),
+                ('peso', models.PositiveSmallIntegerField(help_text='Peso del campo de mayor relevancia que contiene el término', verbose_name='Peso')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos_busqueda', to='clientes.cliente', verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda',
+                'verbose_name_plural': 'Términos de Búsqueda',
+                'db_table': 'clientes_termino_busqueda',
+                'indexes': [models.Index(fields=['termino', 'cliente', 'peso'], name='idx_termino_busqueda_cli')],
+                'unique_together': {('cliente', 'termino')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ClienteVendedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos_vendedor', to='clientes.cliente', verbose_name='Cliente')),
+                ('vendedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos_cliente', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Cliente de Vendedor',
+                'verbose_name_plural': 'Clientes de Vendedores',
+                'db_table': 'clientes_cliente_vendedor',
+                'unique_together': {('vendedor', 'cliente')},
+            },
+        ),
+        migrations.RunPython(indexar_clientes, migrations.RunPython.noop),
+        migrations.RunPython(vincular_vendedores, migrations.RunPython.noop),
+    ]
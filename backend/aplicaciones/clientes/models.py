@@ -4,10 +4,10 @@ Sistema de Facturación Electrónica para Perú
 Optimizado para MySQL y hosting compartido
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import RegexValidator, EmailValidator
 from django.core.exceptions import ValidationError
-from aplicaciones.core.models import ModeloBase
+from aplicaciones.core.models import ModeloBase, TerminoBusqueda
 
 
 class TipoDocumento(ModeloBase):
@@ -373,7 +373,15 @@ class Cliente(ModeloBase):
         if self.nombre_comercial:
             self.nombre_comercial = self.nombre_comercial.strip().upper()
         
-        super().save(*args, **kwargs)
+        # Solo se reindexa si cambian campos de búsqueda (no en estadísticas de compra)
+        campos = kwargs.get('update_fields')
+        if campos is not None and not set(campos) & set(TerminoBusquedaCliente.PESOS_CAMPOS):
+            super().save(*args, **kwargs)
+            return
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            TerminoBusquedaCliente.indexar([self])
     
     def obtener_nombre_completo(self):
         """Retorna el nombre completo del cliente"""
@@ -503,4 +511,89 @@ class ContactoCliente(ModeloBase):
     
     def obtener_nombre_completo(self):
         """Retorna el nombre completo del contacto"""
-        return f"{self.nombres} {self.apellidos}".strip()
\ No newline at end of file
+        return f"{self.nombres} {self.apellidos}".strip()
+
+
+class TerminoBusquedaCliente(TerminoBusqueda):
+    """
+    Índice de búsqueda de clientes
+    Se mantiene en Cliente.save; reindexar_busqueda_clientes lo reconstruye tras cargas masivas
+    """
+    
+    # Peso de cada campo en la relevancia
+    PESOS_CAMPOS = {
+        'numero_documento': 10,
+        'razon_social': 5,
+        'nombre_comercial': 5,
+        'email': 1,
+    }
+    
+    CAMPOS_CODIGO = ['numero_documento']
+    CAMPO_OBJETO = 'cliente'
+    
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name='terminos_busqueda',
+        verbose_name='Cliente'
+    )
+    
+    class Meta:
+        db_table = 'clientes_termino_busqueda'
+        verbose_name = 'Término de Búsqueda'
+        verbose_name_plural = 'Términos de Búsqueda'
+        unique_together = [['cliente', 'termino']]
+        indexes = [
+            models.Index(fields=['termino', 'cliente', 'peso'], name='idx_termino_busqueda_cli'),
+        ]
+    
+    @classmethod
+    def buscar(cls, queryset, texto):
+        """Clientes ordenados por relevancia y razón social"""
+        resultado = super().buscar(queryset, texto)
+        if resultado is queryset:
+            return queryset
+        return resultado.order_by('-relevancia', 'razon_social')
+
+
+class ClienteVendedor(models.Model):
+    """
+    Relación materializada vendedor-cliente
+    Un registro por vendedor que emitió al menos un documento al cliente;
+    se mantiene en DocumentoElectronico.save y evita el JOIN con DISTINCT sobre los documentos
+    """
+    
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name='vinculos_vendedor',
+        verbose_name='Cliente'
+    )
+    
+    vendedor = models.ForeignKey(
+        'usuarios.Usuario',
+        on_delete=models.CASCADE,
+        related_name='vinculos_cliente',
+        verbose_name='Vendedor'
+    )
+    
+    class Meta:
+        db_table = 'clientes_cliente_vendedor'
+        verbose_name = 'Cliente de Vendedor'
+        verbose_name_plural = 'Clientes de Vendedores'
+        unique_together = [['vendedor', 'cliente']]
+    
+    def __str__(self):
+        return f"{self.vendedor_id} - {self.cliente_id}"
+    
+    @classmethod
+    def vincular(cls, pares):
+        """Registra pares (cliente_id, vendedor_id); los existentes se ignoran"""
+        cls.objects.bulk_create(
+            [
+                cls(cliente_id=cliente_id, vendedor_id=vendedor_id)
+                for cliente_id, vendedor_id in set(pares)
+                if cliente_id and vendedor_id
+            ],
+            ignore_conflicts=True
+        )
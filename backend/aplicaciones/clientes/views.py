@@ -9,14 +9,15 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Count, Sum, Avg, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import datetime, timedelta
 import logging
 
-from .models import TipoDocumento, Cliente, ContactoCliente
+from .models import TipoDocumento, Cliente, ContactoCliente, TerminoBusquedaCliente
 from .serializers import (
     TipoDocumentoSerializer, ClienteSerializer, ClienteListSerializer,
     ClienteCreateSerializer, ClienteUpdateSerializer, ClienteBusquedaSerializer,
@@ -27,6 +28,7 @@ from aplicaciones.core.permissions import (
 )
 from aplicaciones.core.utils import obtener_usuario_actual
 from aplicaciones.core.pagination import PaginacionEstandar
+from aplicaciones.reportes.exporters import ExportacionMixin
 
 logger = logging.getLogger(__name__)
 
@@ -102,7 +104,7 @@ class TipoDocumentoViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(ExportacionMixin, viewsets.ModelViewSet):
     """
     ViewSet principal para gestión de clientes
     CRUD completo con funcionalidades específicas
@@ -143,6 +145,22 @@ class ClienteViewSet(viewsets.ModelViewSet):
     ]
     ordering = ['-fecha_creacion']
     
+    # Acción exportar de ExportacionMixin: nombre del archivo y columnas (campo, título[, formateador])
+    NOMBRE_EXPORTACION = 'clientes'
+    COLUMNAS_EXPORTACION = [
+        ('tipo_cliente', 'Tipo Cliente'),
+        ('tipo_documento__nombre', 'Tipo Documento'),
+        ('numero_documento', 'Número Documento'),
+        ('razon_social', 'Razón Social'),
+        ('email', 'Email'),
+        (Coalesce(NullIf('telefono', Value('')), 'celular'), 'Teléfono'),
+        ('departamento', 'Departamento'),
+        ('provincia', 'Provincia'),
+        ('total_compras', 'Total Compras'),
+        ('numero_compras', 'Número Compras'),
+        ('bloqueado', 'Estado', lambda bloqueado: 'BLOQUEADO' if bloqueado else 'ACTIVO'),
+    ]
+    
     def get_serializer_class(self):
         """Seleccionar serializer según acción"""
         if self.action == 'list':
@@ -170,10 +188,8 @@ class ClienteViewSet(viewsets.ModelViewSet):
         
         # Los vendedores solo ven sus clientes
         if hasattr(user, 'rol') and user.rol.codigo == 'vendedor':
-            # Filtrar clientes del vendedor (por documentos creados)
-            queryset = queryset.filter(
-                documentos_electronicos__vendedor=user
-            ).distinct()
+            # Filtrar clientes del vendedor (relación mantenida por los documentos emitidos)
+            queryset = queryset.filter(vinculos_vendedor__vendedor=user)
         
         return queryset
     
@@ -228,13 +244,12 @@ class ClienteViewSet(viewsets.ModelViewSet):
         
         # Aplicar filtros
         if data.get('termino'):
-            termino = data['termino']
-            queryset = queryset.filter(
-                Q(numero_documento__icontains=termino) |
-                Q(razon_social__icontains=termino) |
-                Q(nombre_comercial__icontains=termino) |
-                Q(email__icontains=termino)
-            )
+            termino = data['termino'].strip()
+            if termino.isdigit():
+                # Número de documento: prefijo sobre idx_cliente_numero_doc
+                queryset = queryset.filter(numero_documento__startswith=termino)
+            else:
+                queryset = TerminoBusquedaCliente.buscar(queryset, termino)
         
         if data.get('tipo_cliente'):
             queryset = queryset.filter(tipo_cliente=data['tipo_cliente'])
@@ -545,54 +560,9 @@ class ClienteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=False, methods=['get'])
-    def exportar(self, request):
-        """Exportar listado de clientes"""
-        # Solo admin y contadores pueden exportar
-        if not request.user.has_perm('clientes.export_cliente'):
-            return Response(
-                {'error': 'No tiene permisos para exportar clientes'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        try:
-            from django.http import HttpResponse
-            import csv
-            
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="clientes.csv"'
-            
-            writer = csv.writer(response)
-            writer.writerow([
-                'Tipo Cliente', 'Tipo Documento', 'Número Documento',
-                'Razón Social', 'Email', 'Teléfono', 'Departamento',
-                'Provincia', 'Total Compras', 'Número Compras', 'Estado'
-            ])
-            
-            for cliente in self.get_queryset():
-                writer.writerow([
-                    cliente.tipo_cliente,
-                    cliente.tipo_documento.nombre,
-                    cliente.numero_documento,
-                    cliente.razon_social,
-                    cliente.email or '',
-                    cliente.telefono or cliente.celular or '',
-                    cliente.departamento,
-                    cliente.provincia,
-                    float(cliente.total_compras),
-                    cliente.numero_compras,
-                    'BLOQUEADO' if cliente.bloqueado else 'ACTIVO'
-                ])
-            
-            logger.info(f"Exportación de clientes realizada por {request.user.username}")
-            return response
-        
-        except Exception as e:
-            logger.error(f"Error exportando clientes: {str(e)}")
-            return Response(
-                {'error': 'Error interno del servidor'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+    def puede_exportar(self, request):
+        """Solo admin y contadores pueden exportar"""
+        return request.user.has_perm('clientes.export_cliente')
 
 
 class ContactoClienteViewSet(viewsets.ModelViewSet):
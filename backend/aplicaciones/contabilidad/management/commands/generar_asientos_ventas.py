@@ -0,0 +1,58 @@
+"""
+Comando generar_asientos_ventas - FELICITAFAC
+Genera en lote los asientos de venta y costo de venta de un rango de fechas
+Uso: python manage.py generar_asientos_ventas --usuario contador@empresa.pe [--desde 2025-01-31] [--hasta 2025-01-31] [--por-documento]
+"""
+
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from aplicaciones.contabilidad.services import ServicioContabilidad
+from aplicaciones.usuarios.models import Usuario
+
+
+class Command(BaseCommand):
+    help = 'Contabiliza las ventas del día (o de un rango de fechas) con asientos consolidados o por documento'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--usuario',
+            required=True,
+            help='Email del usuario que registra los asientos'
+        )
+        parser.add_argument(
+            '--desde',
+            type=date.fromisoformat,
+            help='Fecha inicial (AAAA-MM-DD), por defecto hoy'
+        )
+        parser.add_argument(
+            '--hasta',
+            type=date.fromisoformat,
+            help='Fecha final (AAAA-MM-DD), por defecto la fecha inicial'
+        )
+        parser.add_argument(
+            '--por-documento',
+            action='store_true',
+            help='Genera un asiento por documento en lugar de uno por día, serie y moneda'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(email=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}")
+        
+        fecha_desde = options['desde'] or timezone.localdate()
+        fecha_hasta = options['hasta'] or fecha_desde
+        
+        resultado = ServicioContabilidad.generar_asientos_ventas_lote(
+            fecha_desde,
+            fecha_hasta,
+            usuario,
+            consolidar=not options['por_documento']
+        )
+        
+        if not resultado['exitoso']:
+            raise CommandError(resultado['mensaje'])
+        
+        self.stdout.write(self.style.SUCCESS(resultado['mensaje']))
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:22
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth
+
+
+def inicializar_saldos_periodo(apps, schema_editor):
+    """Los saldos parten de las líneas de asientos definitivos existentes"""
+    DetalleAsiento = apps.get_model('contabilidad', 'DetalleAsiento')
+    SaldoPeriodo = apps.get_model('contabilidad', 'SaldoPeriodo')
+    
+    totales = DetalleAsiento.objects.filter(
+        activo=True,
+        asiento__estado='definitivo'
+    ).annotate(
+        periodo=ExtractMonth('asiento__fecha')
+    ).values(
+        'asiento__ejercicio_id', 'periodo', 'cuenta_id'
+    ).annotate(
+        total_debe=Sum('debe'),
+        total_haber=Sum('haber')
+    ).order_by()
+    
+    SaldoPeriodo.objects.bulk_create(
+        (
+            SaldoPeriodo(
+                ejercicio_id=total['asiento__ejercicio_id'],
+                periodo=total['periodo'],
+                cuenta_id=total['cuenta_id'],
+                debe=total['total_debe'],
+                haber=total['total_haber']
+            )
+            for total in totales
+        ),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Fecha y hora de creación del registro', verbose_name='Fecha de Creación')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, db_index=True, help_text='Fecha y hora de última actualización', verbose_name='Fecha de Actualización')),
+                ('activo', models.BooleanField(db_index=True, default=True, help_text='Indica si el registro está activo', verbose_name='Activo')),
+                ('periodo', models.PositiveSmallIntegerField(help_text='Mes del ejercicio (1-12)', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Período')),
+                ('debe', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Movimientos al debe del período', max_digits=15, verbose_name='Debe')),
+                ('haber', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Movimientos al haber del período', max_digits=15, verbose_name='Haber')),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='saldos_periodo', to='contabilidad.plancuentas', verbose_name='Cuenta')),
+                ('ejercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_periodo', to='contabilidad.ejerciciocontable', verbose_name='Ejercicio')),
+            ],
+            options={
+                'verbose_name': 'Saldo por Período',
+                'verbose_name_plural': 'Saldos por Período',
+                'db_table': 'contabilidad_saldo_periodo',
+                'ordering': ['ejercicio', 'periodo', 'cuenta'],
+                'indexes': [models.Index(fields=['cuenta', 'ejercicio', 'periodo'], name='idx_saldo_cuenta_periodo')],
+                'unique_together': {('ejercicio', 'periodo', 'cuenta')},
+            },
+        ),
+        migrations.RunPython(inicializar_saldos_periodo, migrations.RunPython.noop),
+    ]
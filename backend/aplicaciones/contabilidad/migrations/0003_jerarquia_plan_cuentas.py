@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def inicializar_jerarquia_plan_cuentas(apps, schema_editor):
+    """La tabla de clausura parte de las relaciones padre existentes"""
+    Nodo = apps.get_model('contabilidad', 'PlanCuentas')
+    Relacion = apps.get_model('contabilidad', 'JerarquiaPlanCuentas')
+    
+    padres = dict(Nodo.objects.values_list('id', 'cuenta_padre_id'))
+    relaciones = []
+    for nodo_id in padres:
+        ancestro_id, profundidad, vistos = nodo_id, 0, set()
+        # Se corta al repetir un ancestro para tolerar ciclos en datos inconsistentes
+        while ancestro_id is not None and ancestro_id not in vistos:
+            vistos.add(ancestro_id)
+            relaciones.append(Relacion(ancestro_id=ancestro_id, descendiente_id=nodo_id, profundidad=profundidad))
+            ancestro_id, profundidad = padres.get(ancestro_id), profundidad + 1
+    
+    Relacion.objects.bulk_create(relaciones, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0002_saldos_periodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JerarquiaPlanCuentas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidad', models.PositiveSmallIntegerField(default=0, help_text='Niveles entre el ancestro y el descendiente', verbose_name='Profundidad')),
+                ('ancestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_descendientes', to='contabilidad.plancuentas', verbose_name='Cuenta Ancestro')),
+                ('descendiente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_ancestros', to='contabilidad.plancuentas', verbose_name='Cuenta Descendiente')),
+            ],
+            options={
+                'verbose_name': 'Jerarquía del Plan de Cuentas',
+                'verbose_name_plural': 'Jerarquías del Plan de Cuentas',
+                'db_table': 'contabilidad_jerarquia_plan_cuentas',
+                'indexes': [models.Index(fields=['descendiente', 'profundidad'], name='idx_jerarq_cuenta_desc')],
+                'unique_together': {('ancestro', 'descendiente')},
+            },
+        ),
+        migrations.RunPython(inicializar_jerarquia_plan_cuentas, migrations.RunPython.noop),
+    ]
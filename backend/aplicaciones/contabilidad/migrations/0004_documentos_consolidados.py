@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0003_saldo_pendiente_documentos'),
+        ('contabilidad', '0003_jerarquia_plan_cuentas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoConsolidado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documentos_consolidados', to='contabilidad.asientocontable', verbose_name='Asiento')),
+                ('documento_electronico', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='asientos_consolidados', to='facturacion.documentoelectronico', verbose_name='Documento Electrónico')),
+            ],
+            options={
+                'verbose_name': 'Documento Consolidado',
+                'verbose_name_plural': 'Documentos Consolidados',
+                'db_table': 'contabilidad_documento_consolidado',
+                'unique_together': {('asiento', 'documento_electronico')},
+            },
+        ),
+    ]
@@ -5,13 +5,13 @@ Implementación del Plan Contable General Empresarial (PCGE)
 Optimizado para MySQL y hosting compartido
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
 import uuid
-from aplicaciones.core.models import ModeloBase
+from aplicaciones.core.models import ModeloBase, RelacionJerarquica
 
 
 class PlanCuentas(ModeloBase):
@@ -314,7 +314,9 @@ class PlanCuentas(ModeloBase):
         elif self.elemento_pcge in ['8', '9']:  # Resultados
             self.tipo_cuenta = 'resultado'
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            JerarquiaPlanCuentas.sincronizar(self.pk, self.cuenta_padre_id)
     
     def obtener_saldo_real(self):
         """Calcula el saldo real basado en la naturaleza"""
@@ -325,23 +327,109 @@ class PlanCuentas(ModeloBase):
     
     def obtener_ruta_completa(self):
         """Retorna la ruta completa de la cuenta"""
-        if self.cuenta_padre:
-            return f"{self.cuenta_padre.obtener_ruta_completa()} > {self.nombre}"
-        return self.nombre
+        nombres = PlanCuentas.objects.filter(
+            relaciones_descendientes__descendiente=self
+        ).order_by('-relaciones_descendientes__profundidad').values_list('nombre', flat=True)
+        return ' > '.join(nombres) or self.nombre
     
     def obtener_cuentas_hijas(self):
-        """Retorna todas las cuentas hijas recursivamente"""
-        hijas = list(self.cuentas_hijas.filter(activo=True))
-        for hija in self.cuentas_hijas.filter(activo=True):
-            hijas.extend(hija.obtener_cuentas_hijas())
-        return hijas
+        """Retorna todas las cuentas hijas activas del subárbol con una sola consulta"""
+        # Una cuenta inactiva oculta también a sus descendientes
+        inactivas = JerarquiaPlanCuentas.objects.filter(
+            ancestro=self,
+            profundidad__gt=0,
+            descendiente__activo=False
+        ).values('descendiente_id')
+        
+        return list(
+            PlanCuentas.objects.filter(
+                relaciones_ancestros__ancestro=self,
+                relaciones_ancestros__profundidad__gt=0
+            ).exclude(
+                relaciones_ancestros__ancestro_id__in=inactivas
+            ).order_by('codigo')
+        )
+    
+    @classmethod
+    def totales_jerarquicos(cls):
+        """
+        Saldos acumulados de cada cuenta con todo su subárbol en una sola consulta
+        Retorna {cuenta_id: {'saldo_debe', 'saldo_haber', 'saldo_actual'}}
+        """
+        totales = JerarquiaPlanCuentas.objects.values('ancestro_id').annotate(
+            total_debe=models.Sum('descendiente__saldo_debe'),
+            total_haber=models.Sum('descendiente__saldo_haber'),
+            total_actual=models.Sum('descendiente__saldo_actual')
+        ).order_by()
+        
+        return {
+            total['ancestro_id']: {
+                'saldo_debe': total['total_debe'],
+                'saldo_haber': total['total_haber'],
+                'saldo_actual': total['total_actual'],
+            }
+            for total in totales
+        }
     
     def actualizar_saldo(self, debe=0, haber=0):
         """Actualiza los saldos de la cuenta"""
-        self.saldo_debe += Decimal(str(debe))
-        self.saldo_haber += Decimal(str(haber))
+        debe = Decimal(str(debe))
+        haber = Decimal(str(haber))
+        PlanCuentas.aplicar_movimientos([(self.pk, self.naturaleza, debe, haber)])
+        
+        self.saldo_debe += debe
+        self.saldo_haber += haber
         self.saldo_actual = self.obtener_saldo_real()
-        self.save(update_fields=['saldo_debe', 'saldo_haber', 'saldo_actual'])
+    
+    @staticmethod
+    def variacion_saldo(naturaleza, debe, haber):
+        """Variación del saldo actual según la naturaleza de la cuenta"""
+        return debe - haber if naturaleza == 'deudora' else haber - debe
+    
+    @classmethod
+    def aplicar_movimientos(cls, movimientos):
+        """
+        Suma importes a los saldos con un UPDATE por cuenta usando expresiones F()
+        movimientos: iterable de (cuenta_id, naturaleza, debe, haber)
+        Las cuentas se actualizan en orden de id para que dos asientos concurrentes
+        bloqueen las filas en el mismo orden
+        """
+        for cuenta_id, naturaleza, debe, haber in sorted(movimientos, key=lambda movimiento: movimiento[0]):
+            cls.objects.filter(pk=cuenta_id).update(
+                saldo_debe=models.F('saldo_debe') + debe,
+                saldo_haber=models.F('saldo_haber') + haber,
+                saldo_actual=models.F('saldo_actual') + cls.variacion_saldo(naturaleza, debe, haber)
+            )
+
+
+class JerarquiaPlanCuentas(RelacionJerarquica):
+    """
+    Tabla de clausura del plan de cuentas
+    Relaciona cada cuenta con todos sus ancestros para subárboles y acumulados por nivel
+    """
+    
+    ancestro = models.ForeignKey(
+        PlanCuentas,
+        on_delete=models.CASCADE,
+        related_name='relaciones_descendientes',
+        verbose_name='Cuenta Ancestro'
+    )
+    
+    descendiente = models.ForeignKey(
+        PlanCuentas,
+        on_delete=models.CASCADE,
+        related_name='relaciones_ancestros',
+        verbose_name='Cuenta Descendiente'
+    )
+    
+    class Meta:
+        db_table = 'contabilidad_jerarquia_plan_cuentas'
+        verbose_name = 'Jerarquía del Plan de Cuentas'
+        verbose_name_plural = 'Jerarquías del Plan de Cuentas'
+        unique_together = [['ancestro', 'descendiente']]
+        indexes = [
+            models.Index(fields=['descendiente', 'profundidad'], name='idx_jerarq_cuenta_desc'),
+        ]
 
 
 class EjercicioContable(ModeloBase):
@@ -481,6 +569,8 @@ class AsientoContable(ModeloBase):
         ('anulado', 'Anulado'),
     ]
     
+    AMBITO_CORRELATIVO = 'contabilidad.asiento'
+    
     # Identificación única
     uuid = models.UUIDField(
         'UUID',
@@ -694,39 +784,55 @@ class AsientoContable(ModeloBase):
     
     def _generar_numero(self):
         """Genera número automático para el asiento"""
-        prefijo = f"{self.ejercicio.codigo}-"
-        if self.tipo_asiento == 'automatico':
-            prefijo += "AUTO-"
+        return self.reservar_numeros(self.ejercicio, self.tipo_asiento)[0]
+    
+    @classmethod
+    def reservar_numeros(cls, ejercicio, tipo_asiento, cantidad=1):
+        """
+        Reserva un bloque consecutivo de números con un solo incremento del contador
+        Usado por la generación en lote para numerar los asientos antes de insertarlos
+        """
+        from aplicaciones.core.models import Correlativo
         
-        ultimo = AsientoContable.objects.filter(
-            ejercicio=self.ejercicio,
-            numero__startswith=prefijo
-        ).order_by('-numero').first()
+        prefijo = f"{ejercicio.codigo}-"
+        if tipo_asiento == 'automatico':
+            prefijo += "AUTO-"
         
-        if ultimo:
-            numero_str = ultimo.numero.replace(prefijo, '')
+        def ultimo_usado():
+            ultimo = cls.objects.filter(
+                ejercicio=ejercicio,
+                numero__startswith=prefijo
+            ).order_by('-numero').first()
+            
             try:
-                ultimo_numero = int(numero_str)
-                nuevo_numero = ultimo_numero + 1
+                return int(ultimo.numero.replace(prefijo, '')) if ultimo else 0
             except ValueError:
-                nuevo_numero = 1
-        else:
-            nuevo_numero = 1
+                return 0
         
-        return f"{prefijo}{nuevo_numero:06d}"
+        ultimo_numero = Correlativo.siguiente(cls.AMBITO_CORRELATIVO, prefijo, semilla=ultimo_usado, cantidad=cantidad)
+        return [f"{prefijo}{numero:06d}" for numero in range(ultimo_numero - cantidad + 1, ultimo_numero + 1)]
     
     def esta_balanceado(self):
         """Verifica si el asiento está balanceado"""
         return abs(self.diferencia) < Decimal('0.01')
     
-    def calcular_totales(self):
-        """Calcula los totales del asiento"""
-        detalles = self.detalles.filter(activo=True)
-        self.total_debe = sum(d.debe for d in detalles)
-        self.total_haber = sum(d.haber for d in detalles)
-        self.diferencia = self.total_debe - self.total_haber
+    def calcular_totales(self, detalles=None):
+        """
+        Calcula los totales del asiento
+        Acepta los detalles ya construidos en memoria para evitar releerlos
+        """
+        self.asignar_totales(detalles)
         self.save(update_fields=['total_debe', 'total_haber', 'diferencia'])
     
+    def asignar_totales(self, detalles=None):
+        """Asigna totales y diferencia sin guardar"""
+        if detalles is None:
+            detalles = self.detalles.filter(activo=True)
+        
+        self.total_debe = sum((d.debe for d in detalles), Decimal('0.00'))
+        self.total_haber = sum((d.haber for d in detalles), Decimal('0.00'))
+        self.diferencia = self.total_debe - self.total_haber
+    
     def aprobar(self, usuario):
         """Aprueba el asiento contable"""
         if self.estado != 'provisional':
@@ -735,39 +841,55 @@ class AsientoContable(ModeloBase):
         if not self.esta_balanceado():
             raise ValidationError('El asiento no está balanceado')
         
-        self.estado = 'definitivo'
-        self.usuario_aprobacion = usuario
-        self.fecha_aprobacion = timezone.now()
-        self.save()
-        
-        # Actualizar saldos de las cuentas
-        self._actualizar_saldos_cuentas()
+        with transaction.atomic():
+            self.estado = 'definitivo'
+            self.usuario_aprobacion = usuario
+            self.fecha_aprobacion = timezone.now()
+            self.save()
+            
+            # Actualizar saldos de las cuentas
+            self._actualizar_saldos_cuentas()
     
     def anular(self, motivo):
         """Anula el asiento contable"""
-        if self.estado == 'definitivo':
-            # Reversar saldos de las cuentas
-            self._reversar_saldos_cuentas()
+        with transaction.atomic():
+            if self.estado == 'definitivo':
+                # Reversar saldos de las cuentas
+                self._reversar_saldos_cuentas()
+            
+            self.estado = 'anulado'
+            self.observaciones = f"{self.observaciones or ''}\nAnulado: {motivo}"
+            self.save()
+    
+    def _actualizar_saldos_cuentas(self, signo=1, detalles=None):
+        """
+        Actualiza los saldos de las cuentas involucradas con un UPDATE por cuenta
+        Con detalles en memoria se agrupan sin volver a consultarlos
+        """
+        if detalles is None:
+            totales = self.detalles.filter(activo=True).values(
+                'cuenta_id', 'cuenta__naturaleza'
+            ).annotate(
+                total_debe=models.Sum('debe'),
+                total_haber=models.Sum('haber')
+            ).order_by('cuenta_id')
+            movimientos = [
+                (total['cuenta_id'], total['cuenta__naturaleza'], total['total_debe'], total['total_haber'])
+                for total in totales
+            ]
+        else:
+            movimientos = DetalleAsiento.agrupar_por_cuenta(detalles)
         
-        self.estado = 'anulado'
-        self.observaciones = f"{self.observaciones or ''}\nAnulado: {motivo}"
-        self.save()
-    
-    def _actualizar_saldos_cuentas(self):
-        """Actualiza los saldos de las cuentas involucradas"""
-        for detalle in self.detalles.filter(activo=True):
-            detalle.cuenta.actualizar_saldo(
-                debe=detalle.debe,
-                haber=detalle.haber
-            )
+        movimientos = [
+            (cuenta_id, naturaleza, signo * debe, signo * haber)
+            for cuenta_id, naturaleza, debe, haber in movimientos
+        ]
+        PlanCuentas.aplicar_movimientos(movimientos)
+        SaldoPeriodo.aplicar_movimientos(self.ejercicio_id, self.fecha.month, movimientos)
     
     def _reversar_saldos_cuentas(self):
         """Reversa los saldos de las cuentas involucradas"""
-        for detalle in self.detalles.filter(activo=True):
-            detalle.cuenta.actualizar_saldo(
-                debe=-detalle.debe,
-                haber=-detalle.haber
-            )
+        self._actualizar_saldos_cuentas(signo=-1)
 
 
 class DetalleAsiento(ModeloBase):
@@ -935,24 +1057,168 @@ class DetalleAsiento(ModeloBase):
             raise ValidationError('La cuenta seleccionada no acepta movimientos directos')
     
     def save(self, *args, **kwargs):
-        """Override save para cálculos automáticos"""
-        # Calcular moneda extranjera si es necesario
-        if self.asiento.tipo_cambio != 1 and self.asiento.moneda != 'PEN':
-            if self.debe > 0:
-                self.debe_me = self.debe / self.asiento.tipo_cambio
-            if self.haber > 0:
-                self.haber_me = self.haber / self.asiento.tipo_cambio
+        """
+        Override save para cálculos automáticos
+        Pensado para ediciones individuales; los asientos automáticos usan preparar_en_memoria
+        """
+        self._calcular_moneda_extranjera()
         
         super().save(*args, **kwargs)
         
         # Actualizar totales del asiento padre
         self.asiento.calcular_totales()
     
+    def _calcular_moneda_extranjera(self):
+        """Calcula los importes en moneda extranjera si es necesario"""
+        if self.asiento.tipo_cambio != 1 and self.asiento.moneda != 'PEN':
+            if self.debe > 0:
+                self.debe_me = self.debe / self.asiento.tipo_cambio
+            if self.haber > 0:
+                self.haber_me = self.haber / self.asiento.tipo_cambio
+    
+    @classmethod
+    def preparar_en_memoria(cls, asiento, lineas_data):
+        """
+        Construye las líneas numeradas sin guardarlas
+        Permite insertarlas luego con un único bulk_create
+        """
+        detalles = []
+        for numero_linea, linea_data in enumerate(lineas_data, start=1):
+            detalle = cls(asiento=asiento, numero_linea=numero_linea, **linea_data)
+            detalle._calcular_moneda_extranjera()
+            detalles.append(detalle)
+        return detalles
+    
+    @staticmethod
+    def agrupar_por_cuenta(detalles):
+        """
+        Agrupa líneas en memoria por cuenta
+        Retorna movimientos (cuenta_id, naturaleza, debe, haber) para aplicar a los saldos
+        """
+        acumulado = {}
+        for detalle in detalles:
+            naturaleza, debe, haber = acumulado.get(
+                detalle.cuenta_id, (detalle.cuenta.naturaleza, Decimal('0.00'), Decimal('0.00'))
+            )
+            acumulado[detalle.cuenta_id] = (naturaleza, debe + detalle.debe, haber + detalle.haber)
+        return [
+            (cuenta_id, naturaleza, debe, haber)
+            for cuenta_id, (naturaleza, debe, haber) in acumulado.items()
+        ]
+    
     def obtener_importe_neto(self):
         """Retorna el importe neto del movimiento"""
         return self.debe - self.haber
 
 
+class DocumentoConsolidado(models.Model):
+    """
+    Documentos cubiertos por un asiento consolidado de ventas o de costo de ventas
+    Permite registrar asientos complementarios con los documentos emitidos tras un cierre
+    """
+    
+    asiento = models.ForeignKey(
+        AsientoContable,
+        on_delete=models.CASCADE,
+        related_name='documentos_consolidados',
+        verbose_name='Asiento'
+    )
+    
+    documento_electronico = models.ForeignKey(
+        'facturacion.DocumentoElectronico',
+        on_delete=models.PROTECT,
+        related_name='asientos_consolidados',
+        verbose_name='Documento Electrónico'
+    )
+    
+    class Meta:
+        db_table = 'contabilidad_documento_consolidado'
+        verbose_name = 'Documento Consolidado'
+        verbose_name_plural = 'Documentos Consolidados'
+        unique_together = [['asiento', 'documento_electronico']]
+    
+    def __str__(self):
+        return f"{self.asiento.numero} - {self.documento_electronico_id}"
+
+
+class SaldoPeriodo(ModeloBase):
+    """
+    Saldos mensuales por cuenta y ejercicio
+    Acumulan los asientos definitivos para obtener balances sin sumar todas las líneas
+    """
+    
+    ejercicio = models.ForeignKey(
+        EjercicioContable,
+        on_delete=models.CASCADE,
+        related_name='saldos_periodo',
+        verbose_name='Ejercicio'
+    )
+    
+    periodo = models.PositiveSmallIntegerField(
+        'Período',
+        validators=[MinValueValidator(1)],
+        help_text='Mes del ejercicio (1-12)'
+    )
+    
+    cuenta = models.ForeignKey(
+        PlanCuentas,
+        on_delete=models.PROTECT,
+        related_name='saldos_periodo',
+        verbose_name='Cuenta'
+    )
+    
+    debe = models.DecimalField(
+        'Debe',
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='Movimientos al debe del período'
+    )
+    
+    haber = models.DecimalField(
+        'Haber',
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='Movimientos al haber del período'
+    )
+    
+    class Meta:
+        db_table = 'contabilidad_saldo_periodo'
+        verbose_name = 'Saldo por Período'
+        verbose_name_plural = 'Saldos por Período'
+        unique_together = [['ejercicio', 'periodo', 'cuenta']]
+        indexes = [
+            models.Index(fields=['cuenta', 'ejercicio', 'periodo'], name='idx_saldo_cuenta_periodo'),
+        ]
+        ordering = ['ejercicio', 'periodo', 'cuenta']
+    
+    def __str__(self):
+        return f"{self.ejercicio.codigo}-{self.periodo:02d} {self.cuenta.codigo}"
+    
+    @classmethod
+    def aplicar_movimientos(cls, ejercicio_id, periodo, movimientos):
+        """
+        Suma importes al saldo del período con un UPDATE por cuenta
+        movimientos: iterable de (cuenta_id, naturaleza, debe, haber)
+        """
+        movimientos = sorted(movimientos, key=lambda movimiento: movimiento[0])
+        if not movimientos:
+            return
+        
+        # Crear los saldos que aún no existen; los demás se ignoran
+        cls.objects.bulk_create(
+            [cls(ejercicio_id=ejercicio_id, periodo=periodo, cuenta_id=cuenta_id) for cuenta_id, _, _, _ in movimientos],
+            ignore_conflicts=True
+        )
+        
+        for cuenta_id, _, debe, haber in movimientos:
+            cls.objects.filter(ejercicio_id=ejercicio_id, periodo=periodo, cuenta_id=cuenta_id).update(
+                debe=models.F('debe') + debe,
+                haber=models.F('haber') + haber
+            )
+
+
 class ConfiguracionContable(ModeloBase):
     """
     Modelo para configuración contable del sistema
@@ -4,13 +4,17 @@ Lógica automática PCGE y asientos contables
 """
 
 from django.db import transaction
+from django.db.models import Sum
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from datetime import datetime, timedelta
 from decimal import Decimal
+import calendar
 import logging
+import time
 from .models import (
-    PlanCuentas, AsientoContable, DetalleAsiento, 
-    EjercicioContable, ConfiguracionContable
+    PlanCuentas, AsientoContable, DetalleAsiento, DocumentoConsolidado,
+    EjercicioContable, ConfiguracionContable, SaldoPeriodo
 )
 
 logger = logging.getLogger(__name__)
@@ -19,6 +23,51 @@ logger = logging.getLogger(__name__)
 class ServicioContabilidad:
     """Servicio para generación automática de asientos contables"""
     
+    # Documentos que generan asientos de venta
+    ESTADOS_CONTABILIZABLES = ['emitido', 'enviado_sunat', 'aceptado_sunat', 'observado']
+    
+    # Cuentas de ConfiguracionContable usadas por los asientos de venta y costo
+    CUENTAS_CONFIGURACION = [
+        'cuenta_caja',
+        'cuenta_cuentas_cobrar_facturas',
+        'cuenta_cuentas_cobrar_boletas',
+        'cuenta_ventas_gravadas',
+        'cuenta_ventas_exoneradas',
+        'cuenta_ventas_inafectas',
+        'cuenta_igv_ventas',
+        'cuenta_costo_ventas',
+        'cuenta_inventario_mercaderias',
+    ]
+    
+    # Filas por sentencia en las inserciones en lote
+    TAMANO_LOTE = 500
+    
+    @staticmethod
+    def registrar_asiento_automatico(lineas, usuario, **datos_asiento):
+        """
+        Crea un asiento automático aprobado con todas sus líneas
+        Las líneas se construyen en memoria, se insertan con un único bulk_create
+        y los totales se asignan una sola vez antes de guardar el asiento
+        """
+        asiento = AsientoContable(
+            tipo_asiento='automatico',
+            estado='definitivo',
+            usuario_creacion=usuario,
+            usuario_aprobacion=usuario,
+            fecha_aprobacion=timezone.now(),
+            es_automatico=True,
+            **datos_asiento
+        )
+        detalles = DetalleAsiento.preparar_en_memoria(asiento, lineas)
+        asiento.asignar_totales(detalles)
+        asiento.save()
+        
+        DetalleAsiento.objects.bulk_create(detalles)
+        
+        # Actualizar saldos
+        asiento._actualizar_saldos_cuentas(detalles=detalles)
+        return asiento
+    
     @staticmethod
     def generar_asiento_venta(documento_electronico, usuario):
         """Generar asiento contable por venta"""
@@ -33,102 +82,21 @@ class ServicioContabilidad:
                 if not ejercicio:
                     raise ValidationError("No hay ejercicio contable activo")
                 
-                # Crear asiento principal
-                asiento = AsientoContable.objects.create(
+                lineas = ServicioContabilidad._lineas_venta(documento_electronico, configuracion)
+                
+                # Crear asiento aprobado con sus líneas y actualizar saldos
+                asiento = ServicioContabilidad.registrar_asiento_automatico(
+                    lineas,
+                    usuario,
                     ejercicio=ejercicio,
                     fecha=documento_electronico.fecha_emision.date(),
-                    tipo_asiento='automatico',
                     glosa=f"Venta {documento_electronico.numero_completo} - {documento_electronico.cliente_razon_social}",
                     documento_electronico=documento_electronico,
                     moneda=documento_electronico.moneda,
                     tipo_cambio=documento_electronico.tipo_cambio,
-                    usuario_creacion=usuario,
-                    es_automatico=True,
                     proceso_origen='venta_automatica'
                 )
                 
-                numero_linea = 1
-                
-                # 1. Cuentas por cobrar o Efectivo (DEBE)
-                if documento_electronico.condiciones_pago == 'CONTADO':
-                    cuenta_debe = configuracion.cuenta_caja
-                else:
-                    if documento_electronico.tipo_documento.codigo_sunat == '01':
-                        cuenta_debe = configuracion.cuenta_cuentas_cobrar_facturas
-                    else:
-                        cuenta_debe = configuracion.cuenta_cuentas_cobrar_boletas
-                
-                DetalleAsiento.objects.create(
-                    asiento=asiento,
-                    numero_linea=numero_linea,
-                    cuenta=cuenta_debe,
-                    glosa=f"Por venta {documento_electronico.numero_completo}",
-                    debe=documento_electronico.total,
-                    haber=Decimal('0.00'),
-                    cliente_proveedor=documento_electronico.cliente,
-                    tipo_documento_tercero=documento_electronico.cliente_tipo_documento,
-                    numero_documento_tercero=documento_electronico.cliente_numero_documento,
-                    fecha_vencimiento=documento_electronico.fecha_vencimiento
-                )
-                numero_linea += 1
-                
-                # 2. Ventas gravadas (HABER)
-                if documento_electronico.base_imponible > 0:
-                    DetalleAsiento.objects.create(
-                        asiento=asiento,
-                        numero_linea=numero_linea,
-                        cuenta=configuracion.cuenta_ventas_gravadas,
-                        glosa="Ventas gravadas",
-                        debe=Decimal('0.00'),
-                        haber=documento_electronico.base_imponible
-                    )
-                    numero_linea += 1
-                
-                # 3. Ventas exoneradas (HABER)
-                if documento_electronico.total_exonerado > 0:
-                    DetalleAsiento.objects.create(
-                        asiento=asiento,
-                        numero_linea=numero_linea,
-                        cuenta=configuracion.cuenta_ventas_exoneradas,
-                        glosa="Ventas exoneradas",
-                        debe=Decimal('0.00'),
-                        haber=documento_electronico.total_exonerado
-                    )
-                    numero_linea += 1
-                
-                # 4. Ventas inafectas (HABER)
-                if documento_electronico.total_inafecto > 0:
-                    DetalleAsiento.objects.create(
-                        asiento=asiento,
-                        numero_linea=numero_linea,
-                        cuenta=configuracion.cuenta_ventas_inafectas,
-                        glosa="Ventas inafectas",
-                        debe=Decimal('0.00'),
-                        haber=documento_electronico.total_inafecto
-                    )
-                    numero_linea += 1
-                
-                # 5. IGV por pagar (HABER)
-                if documento_electronico.igv > 0:
-                    DetalleAsiento.objects.create(
-                        asiento=asiento,
-                        numero_linea=numero_linea,
-                        cuenta=configuracion.cuenta_igv_ventas,
-                        glosa="IGV por pagar",
-                        debe=Decimal('0.00'),
-                        haber=documento_electronico.igv
-                    )
-                    numero_linea += 1
-                
-                # Aprobar asiento automáticamente
-                asiento.estado = 'definitivo'
-                asiento.usuario_aprobacion = usuario
-                asiento.fecha_aprobacion = timezone.now()
-                asiento.save()
-                
-                # Actualizar saldos
-                asiento._actualizar_saldos_cuentas()
-                
                 logger.info(f"Asiento de venta generado: {asiento.numero}")
                 return asiento
                 
@@ -150,71 +118,36 @@ class ServicioContabilidad:
                 if not ejercicio:
                     return None
                 
-                # Calcular costo total de la venta
-                costo_total = Decimal('0.00')
-                detalles_costo = []
+                # Costo PEPS registrado al procesar la salida, en una consulta
+                from aplicaciones.inventario.models import ConsumoLote
+                costo_total = ConsumoLote.costos_por_documento([documento_electronico.id]).get(documento_electronico.id)
                 
-                for detalle in documento_electronico.detalles.filter(activo=True):
-                    if detalle.producto.controla_stock:
-                        # Obtener costo promedio del producto
-                        from aplicaciones.inventario.services import ServicioInventario
-                        costo_unitario = ServicioInventario.calcular_costo_promedio_producto(
-                            detalle.producto, 
-                            documento_electronico.serie_documento.sucursal.almacenes.first()
-                        )
-                        costo_detalle = detalle.cantidad * costo_unitario
-                        costo_total += costo_detalle
-                        
-                        detalles_costo.append({
-                            'producto': detalle.producto,
-                            'cantidad': detalle.cantidad,
-                            'costo_unitario': costo_unitario,
-                            'costo_total': costo_detalle
-                        })
+                if costo_total is None:
+                    # Documentos sin costo registrado: costo promedio por línea
+                    from aplicaciones.inventario.services import ServicioInventario
+                    costo_total = Decimal('0.00')
+                    almacen = documento_electronico.serie_documento.sucursal.almacenes.first()
+                    
+                    for detalle in documento_electronico.detalles.filter(
+                        activo=True, producto__controla_stock=True
+                    ).select_related('producto'):
+                        costo_unitario = ServicioInventario.calcular_costo_promedio_producto(detalle.producto, almacen)
+                        costo_total += detalle.cantidad * costo_unitario
                 
                 if costo_total == 0:
                     return None
                 
-                # Crear asiento de costo
-                asiento = AsientoContable.objects.create(
+                # Crear asiento de costo: costo de ventas (DEBE) contra inventario (HABER)
+                asiento = ServicioContabilidad.registrar_asiento_automatico(
+                    ServicioContabilidad._lineas_costo(configuracion, costo_total),
+                    usuario,
                     ejercicio=ejercicio,
                     fecha=documento_electronico.fecha_emision.date(),
-                    tipo_asiento='automatico',
                     glosa=f"Costo venta {documento_electronico.numero_completo}",
                     documento_electronico=documento_electronico,
-                    usuario_creacion=usuario,
-                    es_automatico=True,
                     proceso_origen='costo_venta_automatico'
                 )
                 
-                # 1. Costo de ventas (DEBE)
-                DetalleAsiento.objects.create(
-                    asiento=asiento,
-                    numero_linea=1,
-                    cuenta=configuracion.cuenta_costo_ventas,
-                    glosa="Costo de productos vendidos",
-                    debe=costo_total,
-                    haber=Decimal('0.00')
-                )
-                
-                # 2. Inventario de mercaderías (HABER)
-                DetalleAsiento.objects.create(
-                    asiento=asiento,
-                    numero_linea=2,
-                    cuenta=configuracion.cuenta_inventario_mercaderias,
-                    glosa="Salida de inventario por venta",
-                    debe=Decimal('0.00'),
-                    haber=costo_total
-                )
-                
-                # Aprobar asiento
-                asiento.estado = 'definitivo'
-                asiento.usuario_aprobacion = usuario
-                asiento.fecha_aprobacion = timezone.now()
-                asiento.save()
-                
-                asiento._actualizar_saldos_cuentas()
-                
                 logger.info(f"Asiento de costo generado: {asiento.numero}")
                 return asiento
                 
@@ -222,6 +155,407 @@ class ServicioContabilidad:
                 logger.error(f"Error generando asiento de costo: {str(e)}")
                 return None
     
+    @staticmethod
+    def _lineas_venta(documento_electronico, configuracion):
+        """Líneas del asiento de venta de un documento"""
+        
+        # 1. Cuentas por cobrar o Efectivo (DEBE)
+        if documento_electronico.condiciones_pago == 'CONTADO':
+            cuenta_debe = configuracion.cuenta_caja
+        else:
+            if documento_electronico.tipo_documento.codigo_sunat == '01':
+                cuenta_debe = configuracion.cuenta_cuentas_cobrar_facturas
+            else:
+                cuenta_debe = configuracion.cuenta_cuentas_cobrar_boletas
+        
+        lineas = [{
+            'cuenta': cuenta_debe,
+            'glosa': f"Por venta {documento_electronico.numero_completo}",
+            'debe': documento_electronico.total,
+            'haber': Decimal('0.00'),
+            'cliente_proveedor_id': documento_electronico.cliente_id,
+            'tipo_documento_tercero': documento_electronico.cliente_tipo_documento,
+            'numero_documento_tercero': documento_electronico.cliente_numero_documento,
+            'fecha_vencimiento': documento_electronico.fecha_vencimiento
+        }]
+        
+        # 2-5. Ventas gravadas, exoneradas, inafectas e IGV por pagar (HABER)
+        importes_haber = [
+            (configuracion.cuenta_ventas_gravadas, "Ventas gravadas", documento_electronico.base_imponible),
+            (configuracion.cuenta_ventas_exoneradas, "Ventas exoneradas", documento_electronico.total_exonerado),
+            (configuracion.cuenta_ventas_inafectas, "Ventas inafectas", documento_electronico.total_inafecto),
+            (configuracion.cuenta_igv_ventas, "IGV por pagar", documento_electronico.igv),
+        ]
+        lineas.extend(
+            {'cuenta': cuenta, 'glosa': glosa, 'debe': Decimal('0.00'), 'haber': importe}
+            for cuenta, glosa, importe in importes_haber
+            if importe > 0
+        )
+        return lineas
+    
+    @staticmethod
+    def _lineas_costo(configuracion, costo_total):
+        """Líneas del asiento de costo: costo de ventas (DEBE) contra inventario (HABER)"""
+        return [
+            {
+                'cuenta': configuracion.cuenta_costo_ventas,
+                'glosa': "Costo de productos vendidos",
+                'debe': costo_total,
+                'haber': Decimal('0.00')
+            },
+            {
+                'cuenta': configuracion.cuenta_inventario_mercaderias,
+                'glosa': "Salida de inventario por venta",
+                'debe': Decimal('0.00'),
+                'haber': costo_total
+            },
+        ]
+    
+    @staticmethod
+    def generar_asientos_ventas_lote(fecha_desde, fecha_hasta, usuario, consolidar=True):
+        """
+        Genera en lote los asientos de venta y de costo de venta de un rango de fechas
+        Con consolidar=True registra un asiento por día, serie, moneda y tipo de cambio;
+        si no, uno por documento
+        La configuración y el ejercicio se leen una vez, los costos se calculan con una consulta
+        por tabla y asientos y líneas se insertan con bulk_create
+        Los documentos ya contabilizados se omiten; los emitidos después de un cierre consolidado
+        del mismo día van en un asiento complementario
+        """
+        from aplicaciones.facturacion.models import DocumentoElectronico
+        
+        inicio_proceso = time.perf_counter()
+        
+        with transaction.atomic():
+            configuracion = ConfiguracionContable.objects.select_related(
+                *ServicioContabilidad.CUENTAS_CONFIGURACION
+            ).first()
+            if not configuracion or not (
+                configuracion.generar_asientos_venta or configuracion.generar_asientos_inventario
+            ):
+                return {'exitoso': False, 'mensaje': 'La generación automática de asientos está desactivada'}
+            
+            ejercicio = EjercicioContable.objects.filter(es_actual=True).first()
+            if not ejercicio:
+                return {'exitoso': False, 'mensaje': 'No hay ejercicio contable activo'}
+            
+            # Rango por límites de día para aprovechar el índice de fecha_emision
+            documentos_qs = DocumentoElectronico.objects.filter(
+                fecha_emision__gte=timezone.make_aware(datetime.combine(fecha_desde, datetime.min.time())),
+                fecha_emision__lt=timezone.make_aware(
+                    datetime.combine(fecha_hasta + timedelta(days=1), datetime.min.time())
+                ),
+                estado__in=ServicioContabilidad.ESTADOS_CONTABILIZABLES,
+                activo=True
+            )
+            documentos = list(
+                documentos_qs.select_related('tipo_documento', 'serie_documento').order_by('fecha_emision', 'id')
+            )
+            
+            # Documentos ya contabilizados, en asientos propios o consolidados
+            existentes = set(
+                AsientoContable.objects.filter(
+                    documento_electronico__in=documentos_qs.values('id'),
+                    proceso_origen__in=['venta_automatica', 'costo_venta_automatico']
+                ).exclude(
+                    estado='anulado'
+                ).values_list('proceso_origen', 'documento_electronico_id')
+            )
+            existentes.update(
+                DocumentoConsolidado.objects.filter(
+                    documento_electronico__in=documentos_qs.values('id')
+                ).exclude(
+                    asiento__estado='anulado'
+                ).values_list('asiento__proceso_origen', 'documento_electronico_id')
+            )
+            
+            costos = {}
+            if configuracion.generar_asientos_inventario:
+                costos = ServicioContabilidad._costos_documentos(documentos, documentos_qs)
+            
+            if consolidar:
+                asientos_datos = ServicioContabilidad._asientos_consolidados(
+                    documentos, costos, configuracion, ejercicio, existentes
+                )
+            else:
+                asientos_datos = ServicioContabilidad._asientos_por_documento(
+                    documentos, costos, configuracion, ejercicio, existentes
+                )
+            
+            asientos = ServicioContabilidad._registrar_asientos_lote(asientos_datos, usuario, ejercicio)
+        
+        duracion = time.perf_counter() - inicio_proceso
+        logger.info(
+            f"Asientos de ventas en lote {fecha_desde} a {fecha_hasta}: {len(documentos)} documentos, "
+            f"{len(asientos)} asientos, {duracion:.2f} s"
+        )
+        return {
+            'exitoso': True,
+            'mensaje': f"Se generaron {len(asientos)} asientos para {len(documentos)} documentos",
+            'documentos': len(documentos),
+            'asientos': len(asientos)
+        }
+    
+    @staticmethod
+    def _costos_documentos(documentos, documentos_qs):
+        """
+        Costo de venta por documento; retorna {documento_id: costo}
+        Usa el costo PEPS registrado al procesar la salida y, para los documentos sin él,
+        el costo promedio de cada producto en el primer almacén de la sucursal
+        """
+        from aplicaciones.facturacion.models import DetalleDocumento
+        from aplicaciones.inventario.models import Almacen, ConsumoLote, StockProducto
+        from aplicaciones.inventario.services import ServicioInventario
+        from aplicaciones.productos.models import Producto
+        
+        costos = ConsumoLote.costos_por_documento(documentos_qs.values('id'))
+        
+        almacen_por_sucursal = {}
+        for almacen_id, sucursal_id in Almacen.objects.filter(
+            sucursal_id__in={documento.serie_documento.sucursal_id for documento in documentos}
+        ).values_list('id', 'sucursal_id'):
+            almacen_por_sucursal.setdefault(sucursal_id, almacen_id)
+        almacen_por_documento = {
+            documento.id: almacen_por_sucursal.get(documento.serie_documento.sucursal_id)
+            for documento in documentos
+        }
+        
+        detalles = list(
+            DetalleDocumento.objects.filter(
+                documento__in=documentos_qs.values('id'),
+                documento__consumos_lote__isnull=True,
+                activo=True,
+                producto__controla_stock=True
+            ).values_list('documento_id', 'producto_id', 'cantidad')
+        )
+        if not detalles:
+            return costos
+        
+        costos_unitarios = {
+            (producto_id, almacen_id): costo_promedio
+            for producto_id, almacen_id, costo_promedio in StockProducto.objects.filter(
+                producto_id__in={producto_id for _, producto_id, _ in detalles},
+                almacen_id__in=set(almacen_por_sucursal.values()),
+                cantidad_actual__gt=0
+            ).values_list('producto_id', 'almacen_id', 'costo_promedio')
+            if costo_promedio
+        }
+        
+        # Sin costo promedio se recurre al cálculo individual, una vez por producto y almacén
+        faltantes = {
+            (producto_id, almacen_por_documento.get(documento_id))
+            for documento_id, producto_id, _ in detalles
+        } - costos_unitarios.keys()
+        if faltantes:
+            productos = Producto.objects.in_bulk({producto_id for producto_id, _ in faltantes})
+            almacenes = Almacen.objects.in_bulk({almacen_id for _, almacen_id in faltantes if almacen_id})
+            for producto_id, almacen_id in faltantes:
+                costos_unitarios[(producto_id, almacen_id)] = ServicioInventario.calcular_costo_promedio_producto(
+                    productos[producto_id], almacenes.get(almacen_id)
+                )
+        
+        for documento_id, producto_id, cantidad in detalles:
+            costo_unitario = costos_unitarios[(producto_id, almacen_por_documento.get(documento_id))]
+            costos[documento_id] = costos.get(documento_id, Decimal('0.00')) + cantidad * costo_unitario
+        return costos
+    
+    @staticmethod
+    def _asientos_por_documento(documentos, costos, configuracion, ejercicio, existentes):
+        """Datos y líneas de un asiento de venta y uno de costo por documento"""
+        asientos_datos = []
+        for documento in documentos:
+            fecha = timezone.localdate(documento.fecha_emision)
+            
+            if configuracion.generar_asientos_venta and not (
+                {('venta_automatica', documento.id), ('venta_diaria', documento.id)} & existentes
+            ):
+                asientos_datos.append(({
+                    'ejercicio': ejercicio,
+                    'fecha': fecha,
+                    'glosa': f"Venta {documento.numero_completo} - {documento.cliente_razon_social}",
+                    'documento_electronico': documento,
+                    'moneda': documento.moneda,
+                    'tipo_cambio': documento.tipo_cambio,
+                    'proceso_origen': 'venta_automatica'
+                }, ServicioContabilidad._lineas_venta(documento, configuracion), ()))
+            
+            costo_total = costos.get(documento.id)
+            if costo_total and not (
+                {('costo_venta_automatico', documento.id), ('costo_venta_diario', documento.id)} & existentes
+            ):
+                asientos_datos.append(({
+                    'ejercicio': ejercicio,
+                    'fecha': fecha,
+                    'glosa': f"Costo venta {documento.numero_completo}",
+                    'documento_electronico': documento,
+                    'proceso_origen': 'costo_venta_automatico'
+                }, ServicioContabilidad._lineas_costo(configuracion, costo_total), ()))
+        return asientos_datos
+    
+    @staticmethod
+    def _asientos_consolidados(documentos, costos, configuracion, ejercicio, existentes):
+        """
+        Datos y líneas de un asiento de venta y uno de costo por día, serie, moneda y tipo de cambio
+        Cada asiento lleva los documentos que cubre; si el grupo ya tenía un asiento consolidado,
+        el nuevo es complementario y solo incluye los documentos pendientes
+        """
+        grupos = {}
+        for documento in documentos:
+            fecha = timezone.localdate(documento.fecha_emision)
+            clave = f"{documento.serie_documento.serie} {fecha.isoformat()} {documento.moneda}"
+            if documento.moneda != 'PEN':
+                clave += f" TC {documento.tipo_cambio}"
+            grupos.setdefault((clave, fecha), []).append(documento)
+        
+        asientos_datos = []
+        for (clave, fecha), documentos_grupo in grupos.items():
+            primero = documentos_grupo[0]
+            descripcion = f"{primero.serie_documento.serie} del {fecha.strftime('%d/%m/%Y')}"
+            
+            if configuracion.generar_asientos_venta:
+                pendientes = [
+                    documento for documento in documentos_grupo
+                    if not {('venta_automatica', documento.id), ('venta_diaria', documento.id)} & existentes
+                ]
+                if pendientes:
+                    lineas = ServicioContabilidad._consolidar_lineas(
+                        [
+                            linea
+                            for documento in pendientes
+                            for linea in ServicioContabilidad._lineas_venta(documento, configuracion)
+                        ],
+                        f"Por ventas {descripcion}"
+                    )
+                    complementario = ServicioContabilidad._es_complementario(
+                        'venta_diaria', documentos_grupo, existentes
+                    )
+                    asientos_datos.append(({
+                        'ejercicio': ejercicio,
+                        'fecha': fecha,
+                        'glosa': f"Ventas {descripcion}{complementario} ({len(pendientes)} documentos)",
+                        'documento_origen': clave,
+                        'moneda': primero.moneda,
+                        'tipo_cambio': primero.tipo_cambio,
+                        'proceso_origen': 'venta_diaria'
+                    }, lineas, pendientes))
+            
+            pendientes = [
+                documento for documento in documentos_grupo
+                if costos.get(documento.id)
+                and not {('costo_venta_automatico', documento.id), ('costo_venta_diario', documento.id)} & existentes
+            ]
+            if pendientes:
+                costo_total = sum((costos[documento.id] for documento in pendientes), Decimal('0.00'))
+                complementario = ServicioContabilidad._es_complementario(
+                    'costo_venta_diario', documentos_grupo, existentes
+                )
+                asientos_datos.append(({
+                    'ejercicio': ejercicio,
+                    'fecha': fecha,
+                    'glosa': f"Costo ventas {descripcion}{complementario}",
+                    'documento_origen': clave,
+                    'proceso_origen': 'costo_venta_diario'
+                }, ServicioContabilidad._lineas_costo(configuracion, costo_total), pendientes))
+        return asientos_datos
+    
+    @staticmethod
+    def _es_complementario(proceso_origen, documentos_grupo, existentes):
+        """Sufijo de la glosa cuando el grupo ya tiene un asiento consolidado del proceso"""
+        if any((proceso_origen, documento.id) in existentes for documento in documentos_grupo):
+            return " - complementario"
+        return ""
+    
+    @staticmethod
+    def _consolidar_lineas(lineas, glosa_debe):
+        """
+        Suma las líneas de varios documentos por cuenta y lado (debe/haber)
+        Las líneas al debe van primero y sin datos del tercero
+        """
+        acumulado = {}
+        for linea in lineas:
+            lado = 'debe' if linea['debe'] > 0 else 'haber'
+            clave = (linea['cuenta'].id, lado)
+            if clave not in acumulado:
+                acumulado[clave] = {
+                    'cuenta': linea['cuenta'],
+                    'glosa': glosa_debe if lado == 'debe' else linea['glosa'],
+                    'debe': Decimal('0.00'),
+                    'haber': Decimal('0.00')
+                }
+            acumulado[clave]['debe'] += linea['debe']
+            acumulado[clave]['haber'] += linea['haber']
+        
+        return sorted(acumulado.values(), key=lambda linea: linea['debe'] == 0)
+    
+    @staticmethod
+    def _registrar_asientos_lote(asientos_datos, usuario, ejercicio):
+        """
+        Inserta asientos aprobados y sus líneas con bulk_create
+        Los números se reservan en bloque y los saldos se actualizan una vez por cuenta y período
+        asientos_datos: lista de (datos_asiento, lineas, documentos); documentos son los que cubre
+        un asiento consolidado, vacío para los asientos por documento
+        """
+        if not asientos_datos:
+            return []
+        
+        numeros = AsientoContable.reservar_numeros(ejercicio, 'automatico', len(asientos_datos))
+        fecha_aprobacion = timezone.now()
+        asientos = []
+        detalles = []
+        
+        for numero, (datos_asiento, lineas, _) in zip(numeros, asientos_datos):
+            asiento = AsientoContable(
+                numero=numero,
+                tipo_asiento='automatico',
+                estado='definitivo',
+                usuario_creacion=usuario,
+                usuario_aprobacion=usuario,
+                fecha_aprobacion=fecha_aprobacion,
+                es_automatico=True,
+                **datos_asiento
+            )
+            detalles_asiento = DetalleAsiento.preparar_en_memoria(asiento, lineas)
+            asiento.asignar_totales(detalles_asiento)
+            asientos.append(asiento)
+            detalles.extend(detalles_asiento)
+        
+        AsientoContable.objects.bulk_create(asientos, batch_size=ServicioContabilidad.TAMANO_LOTE)
+        
+        if asientos[0].pk is None:
+            # MySQL no retorna los ids insertados por bulk_create; se recuperan por uuid
+            ids = {}
+            for inicio in range(0, len(asientos), ServicioContabilidad.TAMANO_LOTE):
+                ids.update(
+                    AsientoContable.objects.filter(
+                        uuid__in=[asiento.uuid for asiento in asientos[inicio:inicio + ServicioContabilidad.TAMANO_LOTE]]
+                    ).values_list('uuid', 'id')
+                )
+            for asiento in asientos:
+                asiento.pk = ids[asiento.uuid]
+        
+        DetalleAsiento.objects.bulk_create(detalles, batch_size=ServicioContabilidad.TAMANO_LOTE)
+        
+        documentos_consolidados = [
+            DocumentoConsolidado(asiento=asiento, documento_electronico_id=documento.id)
+            for asiento, (_, _, documentos) in zip(asientos, asientos_datos)
+            for documento in documentos
+        ]
+        if documentos_consolidados:
+            DocumentoConsolidado.objects.bulk_create(
+                documentos_consolidados, batch_size=ServicioContabilidad.TAMANO_LOTE
+            )
+        
+        # Saldos acumulados y por período con un UPDATE por cuenta
+        detalles_por_periodo = {}
+        for detalle in detalles:
+            detalles_por_periodo.setdefault(detalle.asiento.fecha.month, []).append(detalle)
+        
+        PlanCuentas.aplicar_movimientos(DetalleAsiento.agrupar_por_cuenta(detalles))
+        for periodo, detalles_periodo in detalles_por_periodo.items():
+            SaldoPeriodo.aplicar_movimientos(ejercicio.id, periodo, DetalleAsiento.agrupar_por_cuenta(detalles_periodo))
+        
+        return asientos
+    
     @staticmethod
     def generar_asiento_compra(documento_compra, usuario):
         """Generar asiento por compra (futuro)"""
@@ -242,58 +576,44 @@ class ServicioContabilidad:
                 if not ejercicio:
                     return None
                 
-                asiento = AsientoContable.objects.create(
-                    ejercicio=ejercicio,
-                    fecha=pago.fecha_pago.date(),
-                    tipo_asiento='automatico',
-                    glosa=f"Pago {documento_electronico.numero_completo} - {pago.forma_pago.nombre}",
-                    usuario_creacion=usuario,
-                    es_automatico=True,
-                    proceso_origen='pago_automatico'
-                )
-                
                 # 1. Efectivo/Banco (DEBE)
                 if pago.forma_pago.tipo in ['efectivo', 'yape', 'plin']:
                     cuenta_debe = configuracion.cuenta_caja
                 else:
                     cuenta_debe = configuracion.cuenta_banco_principal or configuracion.cuenta_caja
                 
-                DetalleAsiento.objects.create(
-                    asiento=asiento,
-                    numero_linea=1,
-                    cuenta=cuenta_debe,
-                    glosa=f"Pago recibido - {pago.forma_pago.nombre}",
-                    debe=pago.monto,
-                    haber=Decimal('0.00'),
-                    documento_referencia=pago.referencia
-                )
-                
                 # 2. Cuentas por cobrar (HABER)
                 if documento_electronico.tipo_documento.codigo_sunat == '01':
                     cuenta_haber = configuracion.cuenta_cuentas_cobrar_facturas
                 else:
                     cuenta_haber = configuracion.cuenta_cuentas_cobrar_boletas
                 
-                DetalleAsiento.objects.create(
-                    asiento=asiento,
-                    numero_linea=2,
-                    cuenta=cuenta_haber,
-                    glosa=f"Cancelación {documento_electronico.numero_completo}",
-                    debe=Decimal('0.00'),
-                    haber=pago.monto,
-                    cliente_proveedor=documento_electronico.cliente,
-                    tipo_documento_tercero=documento_electronico.cliente_tipo_documento,
-                    numero_documento_tercero=documento_electronico.cliente_numero_documento
+                asiento = ServicioContabilidad.registrar_asiento_automatico(
+                    [
+                        {
+                            'cuenta': cuenta_debe,
+                            'glosa': f"Pago recibido - {pago.forma_pago.nombre}",
+                            'debe': pago.monto,
+                            'haber': Decimal('0.00'),
+                            'documento_referencia': pago.referencia
+                        },
+                        {
+                            'cuenta': cuenta_haber,
+                            'glosa': f"Cancelación {documento_electronico.numero_completo}",
+                            'debe': Decimal('0.00'),
+                            'haber': pago.monto,
+                            'cliente_proveedor': documento_electronico.cliente,
+                            'tipo_documento_tercero': documento_electronico.cliente_tipo_documento,
+                            'numero_documento_tercero': documento_electronico.cliente_numero_documento
+                        },
+                    ],
+                    usuario,
+                    ejercicio=ejercicio,
+                    fecha=pago.fecha_pago.date(),
+                    glosa=f"Pago {documento_electronico.numero_completo} - {pago.forma_pago.nombre}",
+                    proceso_origen='pago_automatico'
                 )
                 
-                # Aprobar asiento
-                asiento.estado = 'definitivo'
-                asiento.usuario_aprobacion = usuario
-                asiento.fecha_aprobacion = timezone.now()
-                asiento.save()
-                
-                asiento._actualizar_saldos_cuentas()
-                
                 logger.info(f"Asiento de pago generado: {asiento.numero}")
                 return asiento
                 
@@ -406,4 +726,112 @@ class ServicioContabilidad:
             logger.info("Configuración contable inicial creada")
             
         except Exception as e:
-            logger.error(f"Error creando configuración inicial: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error creando configuración inicial: {str(e)}")
+    
+    @staticmethod
+    def sumas_por_cuenta(ejercicio, fecha_hasta, cuentas=None):
+        """
+        Sumas del debe y haber por cuenta desde el inicio del ejercicio hasta la fecha
+        Los meses completos se leen de SaldoPeriodo y solo el mes en curso de las líneas
+        Retorna {cuenta_id: (debe, haber)}
+        """
+        fecha_hasta = min(fecha_hasta, ejercicio.fecha_fin)
+        sumas = {}
+        if fecha_hasta < ejercicio.fecha_inicio:
+            return sumas
+        
+        mes_completo = fecha_hasta.day == calendar.monthrange(fecha_hasta.year, fecha_hasta.month)[1]
+        ultimo_periodo = fecha_hasta.month if mes_completo else fecha_hasta.month - 1
+        
+        saldos = SaldoPeriodo.objects.filter(ejercicio=ejercicio, periodo__lte=ultimo_periodo)
+        if cuentas is not None:
+            saldos = saldos.filter(cuenta__in=cuentas)
+        consultas = [saldos]
+        
+        if not mes_completo:
+            lineas = DetalleAsiento.objects.filter(
+                activo=True,
+                asiento__ejercicio=ejercicio,
+                asiento__estado='definitivo',
+                asiento__fecha__gte=fecha_hasta.replace(day=1),
+                asiento__fecha__lte=fecha_hasta
+            )
+            if cuentas is not None:
+                lineas = lineas.filter(cuenta__in=cuentas)
+            consultas.append(lineas)
+        
+        for consulta in consultas:
+            totales = consulta.values('cuenta_id').annotate(
+                total_debe=Sum('debe'),
+                total_haber=Sum('haber')
+            ).order_by()
+            
+            for total in totales:
+                debe, haber = sumas.get(total['cuenta_id'], (Decimal('0.00'), Decimal('0.00')))
+                sumas[total['cuenta_id']] = (debe + total['total_debe'], haber + total['total_haber'])
+        
+        return sumas
+    
+    @staticmethod
+    def balance_comprobacion(ejercicio, fecha_hasta=None):
+        """Balance de comprobación de sumas y saldos por cuenta a la fecha indicada"""
+        sumas = ServicioContabilidad.sumas_por_cuenta(ejercicio, fecha_hasta or ejercicio.fecha_fin)
+        cuentas = PlanCuentas.objects.filter(id__in=sumas).only('id', 'codigo', 'nombre').order_by('codigo')
+        
+        balance = []
+        for cuenta in cuentas:
+            debe, haber = sumas[cuenta.id]
+            balance.append({
+                'cuenta_id': cuenta.id,
+                'codigo': cuenta.codigo,
+                'nombre': cuenta.nombre,
+                'debe': debe,
+                'haber': haber,
+                'saldo_deudor': max(debe - haber, Decimal('0.00')),
+                'saldo_acreedor': max(haber - debe, Decimal('0.00')),
+            })
+        
+        return balance
+    
+    @staticmethod
+    def libro_mayor(cuenta, fecha_desde, fecha_hasta, ejercicio=None):
+        """Movimientos de la cuenta entre fechas con saldo anterior y saldo acumulado"""
+        if ejercicio is None:
+            ejercicio = EjercicioContable.objects.get(fecha_inicio__lte=fecha_desde, fecha_fin__gte=fecha_desde)
+        
+        anteriores = ServicioContabilidad.sumas_por_cuenta(ejercicio, fecha_desde - timedelta(days=1), cuentas=[cuenta])
+        debe_anterior, haber_anterior = anteriores.get(cuenta.id, (Decimal('0.00'), Decimal('0.00')))
+        saldo_anterior = PlanCuentas.variacion_saldo(cuenta.naturaleza, debe_anterior, haber_anterior)
+        
+        lineas = DetalleAsiento.objects.filter(
+            cuenta=cuenta,
+            activo=True,
+            asiento__ejercicio=ejercicio,
+            asiento__estado='definitivo',
+            asiento__fecha__gte=fecha_desde,
+            asiento__fecha__lte=fecha_hasta
+        ).values(
+            'asiento__fecha', 'asiento__numero', 'glosa', 'debe', 'haber'
+        ).order_by('asiento__fecha', 'asiento__numero', 'numero_linea')
+        
+        saldo = saldo_anterior
+        movimientos = []
+        for linea in lineas:
+            saldo += PlanCuentas.variacion_saldo(cuenta.naturaleza, linea['debe'], linea['haber'])
+            movimientos.append({
+                'fecha': linea['asiento__fecha'],
+                'asiento': linea['asiento__numero'],
+                'glosa': linea['glosa'],
+                'debe': linea['debe'],
+                'haber': linea['haber'],
+                'saldo': saldo,
+            })
+        
+        return {
+            'cuenta': cuenta.codigo,
+            'saldo_anterior': saldo_anterior,
+            'movimientos': movimientos,
+            'total_debe': sum((m['debe'] for m in movimientos), Decimal('0.00')),
+            'total_haber': sum((m['haber'] for m in movimientos), Decimal('0.00')),
+            'saldo_final': saldo,
+        }
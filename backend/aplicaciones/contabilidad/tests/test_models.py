@@ -0,0 +1,271 @@
+"""
+Tests de modelos de Contabilidad - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de la numeración de asientos contables, de los saldos de cuentas
+y de la jerarquía del plan de cuentas
+"""
+
+import threading
+from datetime import date
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from aplicaciones.usuarios.models import Rol, Usuario
+from ..models import AsientoContable, DetalleAsiento, EjercicioContable, JerarquiaPlanCuentas, PlanCuentas
+
+
+class TestNumeracionAsientos(TransactionTestCase):
+    """Tests para AsientoContable._generar_numero con el contador core.Correlativo"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        self.ejercicio = EjercicioContable.objects.create(
+            codigo='2026',
+            nombre='Ejercicio 2026',
+            fecha_inicio=date(2026, 1, 1),
+            fecha_fin=date(2026, 12, 31),
+            es_actual=True
+        )
+        self.usuario = Usuario.objects.create_user(
+            email='contador@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Contador',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Contador', codigo='contador')
+        )
+    
+    def _crear_asiento(self, **kwargs):
+        """Crea un asiento del ejercicio de prueba"""
+        return AsientoContable.objects.create(
+            ejercicio=self.ejercicio,
+            fecha=date(2026, 3, 15),
+            glosa='Asiento de prueba',
+            usuario_creacion=self.usuario,
+            **kwargs
+        )
+    
+    def test_continua_desde_asientos_existentes(self):
+        """Test sin contador se parte del último número guardado del prefijo"""
+        self._crear_asiento(numero='2026-000041')
+        
+        self.assertEqual(self._crear_asiento().numero, '2026-000042')
+        self.assertEqual(self._crear_asiento(tipo_asiento='automatico').numero, '2026-AUTO-000001')
+        self.assertEqual(self._crear_asiento().numero, '2026-000043')
+    
+    def test_hilos_concurrentes_sin_numeros_duplicados(self):
+        """Test asientos creados en paralelo reciben números distintos"""
+        errores = []
+        
+        def trabajador():
+            try:
+                for _ in range(10):
+                    self._crear_asiento()
+            except Exception as e:
+                errores.append(e)
+            finally:
+                close_old_connections()
+        
+        hilos = [threading.Thread(target=trabajador) for _ in range(5)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        
+        self.assertEqual(errores, [])
+        numeros = sorted(AsientoContable.objects.values_list('numero', flat=True))
+        self.assertEqual(numeros, [f'2026-{numero:06d}' for numero in range(1, 51)])
+
+
+class TestSaldosCuentasConcurrentes(TransactionTestCase):
+    """Tests para AsientoContable._actualizar_saldos_cuentas con expresiones F()"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        self.ejercicio = EjercicioContable.objects.create(
+            codigo='2026',
+            nombre='Ejercicio 2026',
+            fecha_inicio=date(2026, 1, 1),
+            fecha_fin=date(2026, 12, 31),
+            es_actual=True
+        )
+        self.usuario = Usuario.objects.create_user(
+            email='contador@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Contador',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Contador', codigo='contador')
+        )
+        self.caja = PlanCuentas.objects.create(codigo='10101', nombre='Caja', nivel=5, elemento_pcge='1')
+        self.igv = PlanCuentas.objects.create(codigo='40111', nombre='IGV', nivel=5, elemento_pcge='4')
+        self.ventas = PlanCuentas.objects.create(codigo='70111', nombre='Ventas', nivel=5, elemento_pcge='7')
+    
+    def _crear_asiento_venta(self, base):
+        """Crea un asiento provisional de venta por la base indicada"""
+        asiento = AsientoContable.objects.create(
+            ejercicio=self.ejercicio,
+            fecha=date(2026, 3, 15),
+            glosa='Venta',
+            estado='provisional',
+            usuario_creacion=self.usuario
+        )
+        igv = (base * Decimal('0.18')).quantize(Decimal('0.01'))
+        lineas = [(self.caja, base + igv, Decimal('0.00')), (self.ventas, Decimal('0.00'), base), (self.igv, Decimal('0.00'), igv)]
+        for numero_linea, (cuenta, debe, haber) in enumerate(lineas, start=1):
+            DetalleAsiento.objects.create(
+                asiento=asiento,
+                numero_linea=numero_linea,
+                cuenta=cuenta,
+                glosa='Venta',
+                debe=debe,
+                haber=haber
+            )
+        return asiento
+    
+    def test_un_update_por_cuenta(self):
+        """Test las líneas de una misma cuenta se aplican con una sola sentencia"""
+        asiento = self._crear_asiento_venta(Decimal('100.00'))
+        DetalleAsiento.objects.create(
+            asiento=asiento,
+            numero_linea=4,
+            cuenta=self.caja,
+            glosa='Redondeo',
+            debe=Decimal('0.01')
+        )
+        DetalleAsiento.objects.create(
+            asiento=asiento,
+            numero_linea=5,
+            cuenta=self.ventas,
+            glosa='Redondeo',
+            haber=Decimal('0.01')
+        )
+        asiento.refresh_from_db()
+        
+        tabla = PlanCuentas._meta.db_table
+        with CaptureQueriesContext(connection) as consultas:
+            asiento.aprobar(self.usuario)
+        
+        actualizaciones = [q for q in consultas if q['sql'].startswith('UPDATE') and tabla in q['sql']]
+        self.assertEqual(len(actualizaciones), 3)
+        
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.saldo_debe, Decimal('118.01'))
+        self.assertEqual(self.caja.saldo_actual, Decimal('118.01'))
+        
+        asiento.anular('Prueba')
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.saldo_debe, Decimal('0.00'))
+        self.assertEqual(self.caja.saldo_actual, Decimal('0.00'))
+    
+    def test_aprobaciones_concurrentes_sin_perder_importes(self):
+        """Test asientos aprobados en paralelo dejan saldos exactos"""
+        asientos = [self._crear_asiento_venta(Decimal('10.00') + indice) for indice in range(30)]
+        errores = []
+        
+        def trabajador(ids):
+            try:
+                for asiento in AsientoContable.objects.filter(id__in=ids):
+                    asiento.aprobar(self.usuario)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                close_old_connections()
+        
+        hilos = [
+            threading.Thread(target=trabajador, args=([asiento.id for asiento in asientos[indice::5]],))
+            for indice in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        
+        self.assertEqual(errores, [])
+        total_debe = sum(asiento.total_debe for asiento in AsientoContable.objects.all())
+        total_igv = sum(detalle.haber for detalle in DetalleAsiento.objects.filter(cuenta=self.igv))
+        
+        for cuenta in (self.caja, self.igv, self.ventas):
+            cuenta.refresh_from_db()
+        self.assertEqual(self.caja.saldo_debe, total_debe)
+        self.assertEqual(self.caja.saldo_actual, total_debe)
+        self.assertEqual(self.igv.saldo_haber, total_igv)
+        self.assertEqual(self.igv.saldo_actual, total_igv)
+        self.assertEqual(self.ventas.saldo_haber, total_debe - total_igv)
+
+
+class TestJerarquiaPlanCuentas(TestCase):
+    """Tests para la tabla de clausura JerarquiaPlanCuentas"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        self.cuentas = {}
+        for codigo, nombre, padre, saldo in [
+            ('10', 'Efectivo', None, None),
+            ('101', 'Caja', '10', None),
+            ('1011', 'Caja MN', '101', '100.00'),
+            ('1012', 'Caja ME', '101', '40.00'),
+            ('12', 'Cuentas por cobrar', None, None),
+            ('1212', 'Emitidas', '12', '25.00'),
+        ]:
+            cuenta = PlanCuentas.objects.create(
+                codigo=codigo,
+                nombre=nombre,
+                nivel=len(codigo),
+                elemento_pcge='1',
+                cuenta_padre=self.cuentas.get(padre)
+            )
+            if saldo:
+                cuenta.actualizar_saldo(debe=Decimal(saldo))
+            self.cuentas[codigo] = cuenta
+    
+    def test_subarbol_y_ruta_en_una_consulta(self):
+        """Test las cuentas hijas y la ruta se obtienen con una consulta cada una"""
+        with self.assertNumQueries(1):
+            hijas = self.cuentas['10'].obtener_cuentas_hijas()
+        self.assertEqual([cuenta.codigo for cuenta in hijas], ['101', '1011', '1012'])
+        
+        with self.assertNumQueries(1):
+            ruta = self.cuentas['1011'].obtener_ruta_completa()
+        self.assertEqual(ruta, 'Efectivo > Caja > Caja MN')
+    
+    def test_cuenta_inactiva_oculta_su_subarbol(self):
+        """Test las cuentas bajo una cuenta inactiva no se listan"""
+        self.cuentas['101'].soft_delete()
+        
+        self.assertEqual(self.cuentas['10'].obtener_cuentas_hijas(), [])
+    
+    def test_totales_jerarquicos_en_una_consulta(self):
+        """Test los saldos acumulados de todo el plan se obtienen en una sola consulta"""
+        with self.assertNumQueries(1):
+            totales = PlanCuentas.totales_jerarquicos()
+        
+        self.assertEqual(totales[self.cuentas['10'].id]['saldo_debe'], Decimal('140.00'))
+        self.assertEqual(totales[self.cuentas['101'].id]['saldo_actual'], Decimal('140.00'))
+        self.assertEqual(totales[self.cuentas['12'].id]['saldo_debe'], Decimal('25.00'))
+    
+    def test_mover_cuenta_reubica_su_subarbol(self):
+        """Test al cambiar la cuenta padre se actualizan las relaciones de todo el subárbol"""
+        caja = self.cuentas['101']
+        caja.cuenta_padre = self.cuentas['12']
+        caja.save()
+        
+        totales = PlanCuentas.totales_jerarquicos()
+        self.assertEqual(totales[self.cuentas['10'].id]['saldo_debe'], Decimal('0.00'))
+        self.assertEqual(totales[self.cuentas['12'].id]['saldo_debe'], Decimal('165.00'))
+        self.assertEqual(
+            JerarquiaPlanCuentas.objects.get(ancestro=self.cuentas['12'], descendiente=self.cuentas['1011']).profundidad,
+            2
+        )
+        self.assertEqual(self.cuentas['1011'].obtener_ruta_completa(), 'Cuentas por cobrar > Caja > Caja MN')
+    
+    def test_no_permite_ciclos(self):
+        """Test una cuenta no puede colgar de su propio subárbol"""
+        efectivo = self.cuentas['10']
+        efectivo.cuenta_padre = self.cuentas['1011']
+        
+        with self.assertRaises(ValidationError):
+            efectivo.save()
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+def inicializar_correlativos(apps, schema_editor):
+    """Los contadores parten del último número existente de cada prefijo"""
+    Correlativo = apps.get_model('core', 'Correlativo')
+    origenes = [
+        ('inventario.movimiento', apps.get_model('inventario', 'MovimientoInventario')),
+        ('contabilidad.asiento', apps.get_model('contabilidad', 'AsientoContable')),
+    ]
+    
+    correlativos = []
+    for ambito, modelo in origenes:
+        ultimos = {}
+        for numero in modelo.objects.values_list('numero', flat=True).iterator():
+            # Los números terminan en 6 dígitos precedidos por el prefijo
+            if numero and len(numero) > 6 and numero[-6:].isdigit():
+                prefijo = numero[:-6]
+                ultimos[prefijo] = max(ultimos.get(prefijo, 0), int(numero[-6:]))
+        
+        correlativos.extend(
+            Correlativo(ambito=ambito, prefijo=prefijo, ultimo_numero=ultimo)
+            for prefijo, ultimo in ultimos.items()
+        )
+    
+    Correlativo.objects.bulk_create(correlativos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_rename_idx_config_clave_idx_core_config_clave_and_more'),
+        ('inventario', '0002_valor_costo_stock'),
+        ('contabilidad', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Correlativo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Fecha y hora de creación del registro', verbose_name='Fecha de Creación')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, db_index=True, help_text='Fecha y hora de última actualización', verbose_name='Fecha de Actualización')),
+                ('activo', models.BooleanField(db_index=True, default=True, help_text='Indica si el registro está activo', verbose_name='Activo')),
+                ('ambito', models.CharField(help_text='Modelo o proceso que usa el contador (ej: inventario.movimiento)', max_length=100, verbose_name='Ámbito')),
+                ('prefijo', models.CharField(blank=True, default='', help_text='Prefijo de la numeración (ej: MOV202501)', max_length=50, verbose_name='Prefijo')),
+                ('ultimo_numero', models.PositiveIntegerField(default=0, help_text='Último número asignado para el prefijo', verbose_name='Último Número')),
+            ],
+            options={
+                'verbose_name': 'Correlativo',
+                'verbose_name_plural': 'Correlativos',
+                'db_table': 'core_correlativo',
+                'unique_together': {('ambito', 'prefijo')},
+            },
+        ),
+        migrations.RunPython(inicializar_correlativos, migrations.RunPython.noop),
+    ]
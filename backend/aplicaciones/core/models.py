@@ -48,6 +48,165 @@ class ModeloBase(models.Model):
         self.save(update_fields=['activo', 'fecha_actualizacion'])
 
 
+class RelacionJerarquica(models.Model):
+    """
+    Tabla de clausura abstracta para modelos jerárquicos
+    Guarda una fila por cada par ancestro-descendiente (incluido el propio nodo)
+    para consultar subárboles, rutas y acumulados con una sola consulta.
+    Las subclases definen los campos ancestro y descendiente.
+    """
+    profundidad = models.PositiveSmallIntegerField(
+        'Profundidad',
+        default=0,
+        help_text='Niveles entre el ancestro y el descendiente'
+    )
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def sincronizar(cls, nodo_id, padre_id):
+        """
+        Mantiene las filas del nodo después de guardarlo
+        Crea las relaciones de un nodo nuevo o mueve su subárbol si cambió el padre
+        """
+        from django.core.exceptions import ValidationError
+        
+        subarbol = list(cls.objects.filter(ancestro_id=nodo_id).values_list('descendiente_id', 'profundidad'))
+        if not subarbol:
+            subarbol = [(nodo_id, 0)]
+            cls.objects.bulk_create([cls(ancestro_id=nodo_id, descendiente_id=nodo_id, profundidad=0)])
+        else:
+            padre_actual = cls.objects.filter(
+                descendiente_id=nodo_id,
+                profundidad=1
+            ).values_list('ancestro_id', flat=True).first()
+            if padre_actual == padre_id:
+                return
+            
+            ids_subarbol = [descendiente_id for descendiente_id, _ in subarbol]
+            if padre_id in ids_subarbol:
+                raise ValidationError('El padre no puede ser el mismo nodo ni uno de sus descendientes')
+            
+            # Desvincular el subárbol de sus ancestros anteriores
+            cls.objects.filter(descendiente_id__in=ids_subarbol).exclude(ancestro_id__in=ids_subarbol).delete()
+        
+        if padre_id:
+            ancestros = cls.objects.filter(descendiente_id=padre_id).values_list('ancestro_id', 'profundidad')
+            cls.objects.bulk_create([
+                cls(
+                    ancestro_id=ancestro_id,
+                    descendiente_id=descendiente_id,
+                    profundidad=profundidad_ancestro + 1 + profundidad_descendiente
+                )
+                for ancestro_id, profundidad_ancestro in ancestros
+                for descendiente_id, profundidad_descendiente in subarbol
+            ])
+
+
+class TerminoBusqueda(models.Model):
+    """
+    Índice de búsqueda abstracto por términos
+    Un término normalizado (sin tildes, en mayúsculas) por palabra de los campos buscables;
+    la búsqueda por prefijo recorre el índice de termino en lugar de escanear la tabla con LIKE '%...%'
+    Las subclases definen el FK al objeto indexado (CAMPO_OBJETO, related_name 'terminos_busqueda')
+    y el peso de cada campo en PESOS_CAMPOS
+    """
+    
+    PESOS_CAMPOS = {}
+    
+    # Campos de código: también se indexan sin separadores (PROD-001 -> PROD001)
+    CAMPOS_CODIGO = []
+    
+    CAMPO_OBJETO = None
+    LONGITUD_TERMINO = 50
+    MAXIMO_TERMINOS_CONSULTA = 5
+    
+    termino = models.CharField(
+        'Término',
+        max_length=50,
+        help_text='Palabra normalizada sin tildes y en mayúsculas'
+    )
+    
+    peso = models.PositiveSmallIntegerField(
+        'Peso',
+        help_text='Peso del campo de mayor relevancia que contiene el término'
+    )
+    
+    class Meta:
+        abstract = True
+    
+    def __str__(self):
+        return f"{self.termino} ({self.peso})"
+    
+    @classmethod
+    def terminos_objeto(cls, objeto):
+        """Términos del objeto con el mayor peso de los campos donde aparecen"""
+        from aplicaciones.core.utils import tokenizar_busqueda
+        
+        terminos = {}
+        for campo, peso in cls.PESOS_CAMPOS.items():
+            tokens = tokenizar_busqueda(getattr(objeto, campo))
+            if campo in cls.CAMPOS_CODIGO and len(tokens) > 1:
+                tokens.append(''.join(tokens))
+            
+            for token in tokens:
+                token = token[:cls.LONGITUD_TERMINO]
+                terminos[token] = max(peso, terminos.get(token, 0))
+        
+        return terminos
+    
+    @classmethod
+    def indexar(cls, objetos):
+        """Reemplaza los términos de los objetos con un DELETE y un INSERT en lote"""
+        from django.db import transaction
+        
+        campo_id = f'{cls.CAMPO_OBJETO}_id'
+        with transaction.atomic(savepoint=False):
+            cls.objects.filter(**{f'{campo_id}__in': [objeto.pk for objeto in objetos]}).delete()
+            cls.objects.bulk_create([
+                cls(**{campo_id: objeto.pk, 'termino': termino, 'peso': peso})
+                for objeto in objetos
+                for termino, peso in cls.terminos_objeto(objeto).items()
+            ])
+    
+    @classmethod
+    def buscar(cls, queryset, texto):
+        """
+        Objetos que tienen, para cada palabra buscada, un término que empieza por ella
+        Ordenados por relevancia: suma de pesos, con doble peso para coincidencias exactas
+        """
+        from aplicaciones.core.utils import tokenizar_busqueda
+        
+        tokens = tokenizar_busqueda(texto)[:cls.MAXIMO_TERMINOS_CONSULTA]
+        if not tokens:
+            return queryset
+        
+        coincidencia = models.Q()
+        for token in tokens:
+            coincidencia |= models.Q(terminos_busqueda__termino__startswith=token)
+        
+        # Una cuenta por palabra buscada: todas deben coincidir con algún término
+        cuentas = {
+            f'coincidencias_{indice}': models.Count(
+                'terminos_busqueda',
+                filter=models.Q(terminos_busqueda__termino__startswith=token)
+            )
+            for indice, token in enumerate(tokens)
+        }
+        
+        return queryset.filter(coincidencia).annotate(
+            relevancia=models.Sum('terminos_busqueda__peso') + models.Sum(
+                'terminos_busqueda__peso',
+                filter=models.Q(terminos_busqueda__termino__in=tokens),
+                default=0
+            ),
+            **cuentas
+        ).filter(
+            **{f'{alias}__gt': 0 for alias in cuentas}
+        )
+
+
 class Empresa(ModeloBase):
     """
     Modelo para datos de la empresa emisora
@@ -407,28 +566,26 @@ class Sucursal(ModeloBase):
     def obtener_siguiente_numero(self, tipo_documento):
         """
         Obtiene el siguiente número para un tipo de documento
+        Incrementa el contador en la base de datos sin bloquear la sucursal completa
         """
         from django.db import transaction
         
+        campos = {
+            'factura': ('contador_factura', 'serie_factura'),
+            'boleta': ('contador_boleta', 'serie_boleta'),
+            'nota_credito': ('contador_nota_credito', 'serie_nota_credito'),
+            'nota_debito': ('contador_nota_debito', 'serie_nota_debito'),
+        }
+        if tipo_documento not in campos:
+            raise ValueError(f"Tipo de documento no válido: {tipo_documento}")
+        
+        contador, serie = campos[tipo_documento]
         with transaction.atomic():
-            if tipo_documento == 'factura':
-                self.contador_factura += 1
-                self.save(update_fields=['contador_factura'])
-                return f"{self.serie_factura}-{self.contador_factura:08d}"
-            elif tipo_documento == 'boleta':
-                self.contador_boleta += 1
-                self.save(update_fields=['contador_boleta'])
-                return f"{self.serie_boleta}-{self.contador_boleta:08d}"
-            elif tipo_documento == 'nota_credito':
-                self.contador_nota_credito += 1
-                self.save(update_fields=['contador_nota_credito'])
-                return f"{self.serie_nota_credito}-{self.contador_nota_credito:08d}"
-            elif tipo_documento == 'nota_debito':
-                self.contador_nota_debito += 1
-                self.save(update_fields=['contador_nota_debito'])
-                return f"{self.serie_nota_debito}-{self.contador_nota_debito:08d}"
-            else:
-                raise ValueError(f"Tipo de documento no válido: {tipo_documento}")
+            Sucursal.objects.filter(pk=self.pk).update(**{contador: models.F(contador) + 1})
+            numero = Sucursal.objects.filter(pk=self.pk).values_list(contador, flat=True).get()
+        
+        setattr(self, contador, numero)
+        return f"{getattr(self, serie)}-{numero:08d}"
 
 
 class ConfiguracionSistema(ModeloBase):
@@ -502,4 +659,61 @@ class ConfiguracionSistema(ModeloBase):
             config = cls.objects.get(clave=clave, activo=True)
             return config.obtener_valor()
         except cls.DoesNotExist:
-            return valor_defecto
\ No newline at end of file
+            return valor_defecto
+
+
+class Correlativo(ModeloBase):
+    """
+    Contadores de numeración por ámbito y prefijo
+    Reemplaza la búsqueda del último número por prefijo en cada inserción
+    """
+    ambito = models.CharField(
+        'Ámbito',
+        max_length=100,
+        help_text='Modelo o proceso que usa el contador (ej: inventario.movimiento)'
+    )
+    
+    prefijo = models.CharField(
+        'Prefijo',
+        max_length=50,
+        blank=True,
+        default='',
+        help_text='Prefijo de la numeración (ej: MOV202501)'
+    )
+    
+    ultimo_numero = models.PositiveIntegerField(
+        'Último Número',
+        default=0,
+        help_text='Último número asignado para el prefijo'
+    )
+    
+    class Meta:
+        db_table = 'core_correlativo'
+        verbose_name = 'Correlativo'
+        verbose_name_plural = 'Correlativos'
+        unique_together = [['ambito', 'prefijo']]
+    
+    def __str__(self):
+        return f"{self.ambito} {self.prefijo}: {self.ultimo_numero}"
+    
+    @classmethod
+    def siguiente(cls, ambito, prefijo='', semilla=None, cantidad=1):
+        """
+        Incrementa el contador en la base de datos y retorna el nuevo número
+        semilla: función que retorna el último número ya usado cuando el contador aún no existe
+        cantidad: números reservados de una vez; se retorna el último del bloque
+        """
+        from django.db import transaction
+        
+        contador = cls.objects.filter(ambito=ambito, prefijo=prefijo)
+        
+        with transaction.atomic(savepoint=False):
+            if not contador.update(ultimo_numero=models.F('ultimo_numero') + cantidad):
+                # Si otro proceso crea el contador primero se ignora el conflicto y se incrementa el suyo
+                cls.objects.bulk_create(
+                    [cls(ambito=ambito, prefijo=prefijo, ultimo_numero=semilla() if semilla else 0)],
+                    ignore_conflicts=True
+                )
+                contador.update(ultimo_numero=models.F('ultimo_numero') + cantidad)
+            
+            return contador.values_list('ultimo_numero', flat=True).get()
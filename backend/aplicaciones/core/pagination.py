@@ -4,10 +4,130 @@ Clases de paginación personalizadas para el sistema
 Optimizado para hosting compartido con MySQL
 """
 
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db import connections
+from django.db.models import Count, F, Q, Sum
 from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+import base64
+import binascii
+import hashlib
+import json
 import math
+import uuid
+
+
+class TotalesAgregadosMixin:
+    """
+    Totales de la página y de todo el filtro calculados con un solo aggregate()
+    Se activa con totales_en_bd en la clase o en la vista; la vista puede reemplazar
+    agregados_totales ({nombre: Sum(...)/Count(...)}) según su modelo
+    Los totales del filtro se guardan unos segundos en caché por hash de la consulta
+    Con totales_filtro_por_defecto=False los del filtro solo se calculan si se piden
+    con ?totales_filtro=true; si no, solo se suman las filas de la página
+    """
+    
+    totales_en_bd = False
+    agregados_totales = {}
+    segundos_cache_totales = 60
+    totales_filtro_por_defecto = True
+    totales_filtro_query_param = 'totales_filtro'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.totales_pagina_bd = None
+        self.totales_filtro = None
+        
+        pagina = super().paginate_queryset(queryset, request, view=view)
+        
+        agregados = getattr(view, 'agregados_totales', None) or self.agregados_totales
+        if pagina is not None and agregados and getattr(view, 'totales_en_bd', self.totales_en_bd):
+            self.totales_pagina_bd, self.totales_filtro = self.calcular_totales_bd(
+                queryset, pagina, agregados, incluir_filtro=self.solicita_totales_filtro(request)
+            )
+        
+        return pagina
+    
+    def solicita_totales_filtro(self, request):
+        """Indica si se calculan los totales de todo el filtro para esta solicitud"""
+        if self.totales_filtro_por_defecto:
+            return True
+        return request.query_params.get(self.totales_filtro_query_param, '').lower() == 'true'
+    
+    def calcular_totales_bd(self, queryset, pagina, agregados, incluir_filtro=True):
+        """
+        (totales de la página, totales del filtro) con una consulta
+        Sin caché, las sumas de la página van como agregados condicionales junto a las del filtro
+        Con incluir_filtro=False solo se agregan las filas de la página y el filtro queda en None
+        """
+        queryset = queryset.order_by()
+        ids = [instancia.pk for instancia in pagina]
+        vacios = {nombre: agregado.default for nombre, agregado in agregados.items()}
+        
+        if not incluir_filtro:
+            resultado = queryset.filter(pk__in=ids).aggregate(**agregados) if ids else vacios
+            return self._formatear_totales(resultado), None
+        
+        try:
+            clave = self._clave_cache_totales(queryset, agregados)
+        except EmptyResultSet:
+            # Filtro que no puede devolver filas
+            totales = self._formatear_totales(vacios)
+            return totales, totales
+        
+        # Alias con prefijo: un alias no puede coincidir con un campo del modelo (subtotal, total...)
+        agregados_pagina = {
+            f'pagina__{nombre}': self._agregado_pagina(agregado, ids)
+            for nombre, agregado in agregados.items()
+        } if ids else {}
+        
+        totales_filtro = cache.get(clave)
+        if totales_filtro is None:
+            resultado = queryset.aggregate(
+                **{f'filtro__{nombre}': agregado for nombre, agregado in agregados.items()},
+                **agregados_pagina
+            )
+            totales_filtro = self._formatear_totales({
+                nombre: resultado[f'filtro__{nombre}'] for nombre in agregados
+            })
+            cache.set(clave, totales_filtro, self.segundos_cache_totales)
+        elif agregados_pagina:
+            resultado = queryset.filter(pk__in=ids).aggregate(**agregados_pagina)
+        else:
+            resultado = {}
+        
+        totales_pagina = {
+            nombre: resultado.get(f'pagina__{nombre}', vacios[nombre]) for nombre in agregados
+        }
+        
+        return self._formatear_totales(totales_pagina), totales_filtro
+    
+    @staticmethod
+    def _agregado_pagina(agregado, ids):
+        """Copia del agregado restringida a las filas de la página"""
+        copia = agregado.copy()
+        filtro = Q(pk__in=ids)
+        copia.filter = filtro & copia.filter if copia.filter else filtro
+        return copia
+    
+    @staticmethod
+    def _clave_cache_totales(queryset, agregados):
+        sql, params = queryset.query.sql_with_params()
+        firma = f"{queryset.model._meta.label}|{sql}|{params}|{sorted(agregados.items())}"
+        return f"totales_paginacion_{hashlib.md5(firma.encode()).hexdigest()}"
+    
+    @staticmethod
+    def _formatear_totales(totales):
+        """Decimales a string con dos decimales para JSON; agregados sin filas en cero"""
+        return {
+            nombre: str(valor.quantize(Decimal('0.01'))) if isinstance(valor, Decimal) else (valor or 0)
+            for nombre, valor in totales.items()
+        }
 
 
 class PaginacionEstandar(PageNumberPagination):
@@ -69,10 +189,10 @@ class PaginacionGrande(PaginacionEstandar):
     max_page_size = 200
 
 
-class PaginacionReportes(PaginacionEstandar):
+class PaginacionReportes(TotalesAgregadosMixin, PaginacionEstandar):
     """
     Paginación especial para reportes
-    Con información adicional de totales
+    Con información adicional de totales; con totales_en_bd se calculan con agregados_totales de la vista
     """
     page_size = 100
     max_page_size = 500
@@ -81,6 +201,12 @@ class PaginacionReportes(PaginacionEstandar):
         super().__init__()
         self.totales = {}
     
+    def paginate_queryset(self, queryset, request, view=None):
+        pagina = super().paginate_queryset(queryset, request, view=view)
+        if self.totales_filtro is not None:
+            self.set_totales(self.totales_filtro)
+        return pagina
+    
     def set_totales(self, totales_dict):
         """
         Establecer totales para mostrar en la respuesta
@@ -106,44 +232,32 @@ class PaginacionReportes(PaginacionEstandar):
         # Agregar totales si están disponibles
         if self.totales:
             response_data['totales'] = self.totales
+        if self.totales_pagina_bd is not None:
+            response_data['totales_pagina'] = self.totales_pagina_bd
         
         return Response(response_data)
 
 
-class PaginacionFacturacion(PaginacionEstandar):
+class TotalesFacturacionMixin(TotalesAgregadosMixin):
     """
-    Paginación específica para documentos de facturación
+    Totales de la página actual para listados de facturación
+    Compartido por la paginación por número de página y la keyset
     """
-    page_size = 25
-    max_page_size = 100
     
-    def get_paginated_response(self, data):
-        """
-        Respuesta con información específica de facturación
-        """
-        # Calcular totales si hay datos
-        totales = self._calcular_totales_facturacion(data)
-        
-        response_data = OrderedDict([
-            ('count', self.page.paginator.count),
-            ('total_pages', self.page.paginator.num_pages),
-            ('current_page', self.page.number),
-            ('page_size', self.get_page_size(self.request)),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('has_next', self.page.has_next()),
-            ('has_previous', self.page.has_previous()),
-            ('totales_pagina', totales),
-            ('results', data)
-        ])
-        
-        return Response(response_data)
+    agregados_totales = {
+        'cantidad_documentos': Count('pk'),
+        'total_general': Sum('total', default=Decimal('0.00')),
+        'total_igv': Sum('igv', default=Decimal('0.00')),
+        'subtotal': Sum('subtotal', default=Decimal('0.00')),
+    }
     
     def _calcular_totales_facturacion(self, data):
         """
         Calcular totales de la página actual para facturación
+        Usa los totales de la base de datos si se calcularon al paginar
         """
-        from decimal import Decimal
+        if self.totales_pagina_bd is not None:
+            return self.totales_pagina_bd
         
         totales = {
             'cantidad_documentos': len(data),
@@ -166,40 +280,27 @@ class PaginacionFacturacion(PaginacionEstandar):
         return totales
 
 
-class PaginacionInventario(PaginacionEstandar):
+class TotalesInventarioMixin(TotalesAgregadosMixin):
     """
-    Paginación específica para inventario y productos
+    Totales de la página actual para listados de inventario
+    Compartido por la paginación por número de página y la keyset
+    Los agregados por defecto son de productos; otras vistas definen agregados_totales
     """
-    page_size = 30
-    max_page_size = 150
     
-    def get_paginated_response(self, data):
-        """
-        Respuesta con información específica de inventario
-        """
-        # Calcular totales de inventario si hay datos
-        totales = self._calcular_totales_inventario(data)
-        
-        response_data = OrderedDict([
-            ('count', self.page.paginator.count),
-            ('total_pages', self.page.paginator.num_pages),
-            ('current_page', self.page.number),
-            ('page_size', self.get_page_size(self.request)),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('has_next', self.page.has_next()),
-            ('has_previous', self.page.has_previous()),
-            ('totales_pagina', totales),
-            ('results', data)
-        ])
-        
-        return Response(response_data)
+    agregados_totales = {
+        'cantidad_productos': Count('pk'),
+        'stock_total': Sum('stock_actual', default=Decimal('0.00')),
+        'valor_total': Sum(F('stock_actual') * F('precio_compra'), default=Decimal('0.00')),
+        'productos_stock_bajo': Count('pk', filter=Q(stock_actual__lte=F('stock_minimo'))),
+    }
     
     def _calcular_totales_inventario(self, data):
         """
         Calcular totales de la página actual para inventario
+        Usa los totales de la base de datos si se calcularon al paginar
         """
-        from decimal import Decimal
+        if self.totales_pagina_bd is not None:
+            return self.totales_pagina_bd
         
         totales = {
             'cantidad_productos': len(data),
@@ -228,6 +329,116 @@ class PaginacionInventario(PaginacionEstandar):
         return totales
 
 
+class TotalesMovimientosMixin(TotalesAgregadosMixin):
+    """
+    Totales de la página actual para listados de movimientos de inventario
+    Suma los totales ya guardados en cada movimiento (líneas, cantidad y valor)
+    """
+    
+    agregados_totales = {
+        'cantidad_movimientos': Count('pk'),
+        'total_items': Sum('total_items', default=0),
+        'total_cantidad': Sum('total_cantidad', default=Decimal('0.00')),
+        'total_valor': Sum('total_valor', default=Decimal('0.00')),
+    }
+    
+    def _calcular_totales_movimientos(self, data):
+        """
+        Calcular totales de la página actual para movimientos
+        Usa los totales de la base de datos si se calcularon al paginar
+        """
+        if self.totales_pagina_bd is not None:
+            return self.totales_pagina_bd
+        
+        totales = {
+            'cantidad_movimientos': len(data),
+            'total_items': 0,
+            'total_cantidad': Decimal('0.00'),
+            'total_valor': Decimal('0.00')
+        }
+        
+        for item in data:
+            if isinstance(item, dict):
+                totales['total_items'] += int(item.get('total_items') or 0)
+                totales['total_cantidad'] += Decimal(str(item.get('total_cantidad', 0)))
+                totales['total_valor'] += Decimal(str(item.get('total_valor', 0)))
+        
+        # Convertir decimales a string para JSON
+        for key, value in totales.items():
+            if isinstance(value, Decimal):
+                totales[key] = str(value)
+        
+        return totales
+
+
+class PaginacionFacturacion(TotalesFacturacionMixin, PaginacionEstandar):
+    """
+    Paginación específica para documentos de facturación
+    """
+    page_size = 25
+    max_page_size = 100
+    
+    def get_paginated_response(self, data):
+        """
+        Respuesta con información específica de facturación
+        """
+        # Calcular totales si hay datos
+        totales = self._calcular_totales_facturacion(data)
+        
+        response_data = OrderedDict([
+            ('count', self.page.paginator.count),
+            ('total_pages', self.page.paginator.num_pages),
+            ('current_page', self.page.number),
+            ('page_size', self.get_page_size(self.request)),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('has_next', self.page.has_next()),
+            ('has_previous', self.page.has_previous()),
+            ('totales_pagina', totales),
+            ('results', data)
+        ])
+        
+        if self.totales_filtro is not None:
+            response_data['totales_filtro'] = self.totales_filtro
+            response_data.move_to_end('results')
+        
+        return Response(response_data)
+
+
+class PaginacionInventario(TotalesInventarioMixin, PaginacionEstandar):
+    """
+    Paginación específica para inventario y productos
+    """
+    page_size = 30
+    max_page_size = 150
+    
+    def get_paginated_response(self, data):
+        """
+        Respuesta con información específica de inventario
+        """
+        # Calcular totales de inventario si hay datos
+        totales = self._calcular_totales_inventario(data)
+        
+        response_data = OrderedDict([
+            ('count', self.page.paginator.count),
+            ('total_pages', self.page.paginator.num_pages),
+            ('current_page', self.page.number),
+            ('page_size', self.get_page_size(self.request)),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('has_next', self.page.has_next()),
+            ('has_previous', self.page.has_previous()),
+            ('totales_pagina', totales),
+            ('results', data)
+        ])
+        
+        if self.totales_filtro is not None:
+            response_data['totales_filtro'] = self.totales_filtro
+            response_data.move_to_end('results')
+        
+        return Response(response_data)
+
+
 class SinPaginacion:
     """
     Clase para desactivar paginación en casos específicos
@@ -289,12 +500,221 @@ class PaginacionBusqueda(PaginacionEstandar):
         }
 
 
+class PaginacionKeyset(PaginacionEstandar):
+    """
+    Paginación keyset (por cursor) para tablas grandes
+    Filtra por la posición del último registro en lugar de usar OFFSET y no ejecuta COUNT(*),
+    así la página 1.000 cuesta lo mismo que la primera
+    
+    El ordenamiento sale de `ordenamiento_keyset` de la vista o de `ordenamiento` de la clase;
+    debe terminar en un campo único (id) y sus campos no deben admitir nulos
+    """
+    
+    ordenamiento = ('-id',)
+    cursor_query_param = 'cursor'
+    
+    # Conteo aproximado desde las estadísticas de la tabla (no aplica filtros)
+    conteo_aproximado = False
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Página siguiente (o anterior) a la posición indicada por el cursor
+        Se lee un registro extra para saber si hay más páginas en esa dirección
+        """
+        self.request = request
+        self.ordenamiento_activo = tuple(getattr(view, 'ordenamiento_keyset', None) or self.ordenamiento)
+        page_size = self.get_page_size(request)
+        
+        posicion, reverso = self._decodificar_cursor(request.query_params.get(self.cursor_query_param))
+        
+        campos = self._campos_ordenamiento(reverso)
+        queryset = queryset.order_by(*[
+            f'-{nombre}' if descendente else nombre for nombre, descendente in campos
+        ])
+        if posicion is not None:
+            try:
+                queryset = queryset.filter(self._filtro_posicion(queryset.model, campos, posicion))
+            except ValidationError:
+                raise NotFound('Cursor inválido')
+        
+        resultados = list(queryset[:page_size + 1])
+        hay_mas = len(resultados) > page_size
+        resultados = resultados[:page_size]
+        
+        if reverso:
+            resultados.reverse()
+            self.has_next = True
+            self.has_previous = hay_mas
+        else:
+            self.has_next = hay_mas
+            self.has_previous = posicion is not None
+        
+        self.page = resultados
+        self.count = contar_aproximado(queryset) if self.conteo_aproximado else None
+        return resultados
+    
+    def get_paginated_response(self, data):
+        """
+        Respuesta con cursores opacos para la página siguiente y anterior
+        """
+        response_data = OrderedDict()
+        if self.conteo_aproximado:
+            response_data['count'] = self.count
+            response_data['count_aproximado'] = True
+        
+        response_data.update([
+            ('page_size', self.get_page_size(self.request)),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('has_next', self.has_next),
+            ('has_previous', self.has_previous),
+        ])
+        response_data.update(self.get_datos_adicionales(data))
+        response_data['results'] = data
+        
+        return Response(response_data)
+    
+    def get_datos_adicionales(self, data):
+        """
+        Datos extra de la respuesta para las subclases (totales de página, etc.)
+        """
+        return {}
+    
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._enlace(self.page[-1], reverso=False)
+    
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._enlace(self.page[0], reverso=True)
+    
+    def _enlace(self, instancia, reverso):
+        """URL actual con el cursor apuntando a la instancia"""
+        posicion = [
+            self._serializar_valor(getattr(instancia, instancia._meta.get_field(nombre).attname))
+            for nombre, _ in self._campos_ordenamiento(False)
+        ]
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({'p': posicion, 'r': int(reverso)}, separators=(',', ':')).encode()
+        ).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+    
+    def _campos_ordenamiento(self, reverso):
+        """Pares (campo, descendente); en reverso se invierte la dirección de cada campo"""
+        return [
+            (campo.lstrip('-'), campo.startswith('-') != reverso)
+            for campo in self.ordenamiento_activo
+        ]
+    
+    @staticmethod
+    def _filtro_posicion(modelo, campos, posicion):
+        """
+        Registros posteriores a la posición en el orden indicado:
+        (a > x) OR (a = x AND b > y) OR ... con < para los campos descendentes
+        """
+        valores = [
+            modelo._meta.get_field(nombre).to_python(valor)
+            for (nombre, _), valor in zip(campos, posicion)
+        ]
+        
+        filtro = Q()
+        for indice, (nombre, descendente) in enumerate(campos):
+            condicion = Q(**{f"{nombre}__{'lt' if descendente else 'gt'}": valores[indice]})
+            for previo in range(indice):
+                condicion &= Q(**{campos[previo][0]: valores[previo]})
+            filtro |= condicion
+        return filtro
+    
+    def _decodificar_cursor(self, cursor):
+        """(posición, reverso) del cursor; sin cursor se parte del inicio"""
+        if not cursor:
+            return None, False
+        
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            posicion = datos['p']
+            if not isinstance(posicion, list) or len(posicion) != len(self.ordenamiento_activo):
+                raise ValueError('Posición inválida')
+            return posicion, bool(datos.get('r'))
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise NotFound('Cursor inválido')
+    
+    @staticmethod
+    def _serializar_valor(valor):
+        """Valor JSON sin pérdida de precisión (microsegundos, decimales)"""
+        if isinstance(valor, (datetime, date)):
+            return valor.isoformat()
+        if isinstance(valor, (Decimal, uuid.UUID)):
+            return str(valor)
+        return valor
+
+
+class PaginacionKeysetFacturacion(TotalesFacturacionMixin, PaginacionKeyset):
+    """
+    Paginación keyset para documentos electrónicos, por (fecha_emision, id)
+    """
+    page_size = 25
+    max_page_size = 100
+    ordenamiento = ('-fecha_emision', '-id')
+    
+    # Sumar todo el historial filtrado en cada página anularía la ventaja del cursor
+    totales_filtro_por_defecto = False
+    
+    def get_datos_adicionales(self, data):
+        datos = {'totales_pagina': self._calcular_totales_facturacion(data)}
+        if self.totales_filtro is not None:
+            datos['totales_filtro'] = self.totales_filtro
+        return datos
+
+
+class PaginacionKeysetInventario(TotalesMovimientosMixin, PaginacionKeyset):
+    """
+    Paginación keyset para movimientos de inventario, por (fecha_movimiento, id)
+    """
+    page_size = 30
+    max_page_size = 150
+    ordenamiento = ('-fecha_movimiento', '-id')
+    totales_filtro_por_defecto = False
+    
+    def get_datos_adicionales(self, data):
+        datos = {'totales_pagina': self._calcular_totales_movimientos(data)}
+        if self.totales_filtro is not None:
+            datos['totales_filtro'] = self.totales_filtro
+        return datos
+
+
+class PaginacionKeysetLogs(PaginacionKeyset):
+    """
+    Paginación keyset para logs de integración, por (fecha_envio, id)
+    """
+    page_size = 50
+    max_page_size = 200
+    ordenamiento = ('-fecha_envio', '-id')
+
+
 # Funciones auxiliares para paginación
 
-def obtener_paginacion_por_vista(vista_nombre):
+def obtener_paginacion_por_vista(vista_nombre, keyset=False):
     """
     Obtener clase de paginación según nombre de vista
+    Con keyset=True retorna la variante por cursor para tablas grandes
     """
+    if keyset:
+        mapeo_keyset = {
+            'factura': PaginacionKeysetFacturacion,
+            'documento': PaginacionKeysetFacturacion,
+            'movimiento': PaginacionKeysetInventario,
+            'log': PaginacionKeysetLogs,
+        }
+        
+        for palabra_clave, clase_paginacion in mapeo_keyset.items():
+            if palabra_clave in vista_nombre.lower():
+                return clase_paginacion
+        
+        return PaginacionKeyset
+    
     mapeo_paginacion = {
         'factura': PaginacionFacturacion,
         'producto': PaginacionInventario,
@@ -314,6 +734,28 @@ def obtener_paginacion_por_vista(vista_nombre):
     return PaginacionEstandar
 
 
+def contar_aproximado(queryset):
+    """
+    Filas estimadas de la tabla del queryset según las estadísticas del motor
+    Retorna None si el motor no las expone
+    """
+    conexion = connections[queryset.db]
+    tabla = queryset.model._meta.db_table
+    
+    if conexion.vendor == 'mysql':
+        sql = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    elif conexion.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    
+    with conexion.cursor() as cursor:
+        cursor.execute(sql, [tabla])
+        fila = cursor.fetchone()
+    
+    return int(fila[0]) if fila and fila[0] is not None else None
+
+
 def calcular_info_paginacion(queryset, page_size=20):
     """
     Calcular información de paginación sin paginar
@@ -0,0 +1,149 @@
+"""
+Tests de búsqueda de clientes - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests del índice de términos de clientes y de la relación vendedor-cliente
+"""
+
+from decimal import Decimal
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from aplicaciones.clientes.models import Cliente, ClienteVendedor, TerminoBusquedaCliente, TipoDocumento
+from aplicaciones.clientes.views import ClienteViewSet
+from aplicaciones.core.models import Empresa
+from aplicaciones.facturacion.models import DocumentoElectronico, SerieDocumento, TipoDocumentoElectronico
+from aplicaciones.usuarios.models import Rol, Usuario
+
+
+class TestBusquedaClientes(TestCase):
+    """Tests para TerminoBusquedaCliente, ClienteVendedor y ClienteViewSet"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.vendedor = Usuario.objects.create_user(
+            email='vendedor@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Vendedor',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Vendedor', codigo='vendedor')
+        )
+        tipo_dni = TipoDocumento.objects.create(codigo='1', nombre='DNI')
+        self.clientes = [
+            Cliente.objects.create(
+                tipo_documento=tipo_dni,
+                numero_documento=numero,
+                razon_social=razon_social,
+                email=email,
+                direccion='Av. Cliente 456'
+            )
+            for numero, razon_social, email in [
+                ('45678912', 'José Pérez Núñez', 'jose@correo.pe'),
+                ('45670000', 'Ana Perales', 'ana@correo.pe'),
+                ('10000001', 'Distribuidora Pereira', 'ventas@pereira.pe'),
+            ]
+        ]
+        self.tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        self.serie = SerieDocumento.objects.create(
+            sucursal=empresa.sucursales.first(),
+            tipo_documento=self.tipo_documento,
+            serie='B001'
+        )
+    
+    def _emitir(self, numero, cliente, vendedor=None):
+        return DocumentoElectronico.objects.create(
+            tipo_documento=self.tipo_documento,
+            serie_documento=self.serie,
+            numero=numero,
+            cliente=cliente,
+            vendedor=vendedor,
+            cliente_tipo_documento='1',
+            cliente_numero_documento=cliente.numero_documento,
+            cliente_razon_social=cliente.razon_social,
+            cliente_direccion=cliente.direccion,
+            total=Decimal('118.00')
+        )
+    
+    def _buscar(self, texto):
+        return list(
+            TerminoBusquedaCliente.buscar(Cliente.objects.all(), texto).values_list('numero_documento', flat=True)
+        )
+    
+    def _solicitud(self, metodo, accion, ruta, **parametros):
+        vista = ClienteViewSet.as_view({metodo: accion})
+        solicitud = getattr(APIRequestFactory(), metodo)(ruta, parametros, format='json' if metodo == 'post' else None)
+        force_authenticate(solicitud, user=self.vendedor)
+        return vista(solicitud)
+    
+    def test_busqueda_por_prefijo_sin_tildes(self):
+        """Test la búsqueda normaliza tildes y exige un término por cada palabra"""
+        self.assertEqual(self._buscar('perez'), ['45678912'])
+        self.assertEqual(self._buscar('PER'), ['45670000', '10000001', '45678912'])
+        self.assertEqual(self._buscar('jose nuñez'), ['45678912'])
+        self.assertEqual(self._buscar('ventas@pereira'), ['10000001'])
+        self.assertEqual(self._buscar('perez ana'), [])
+    
+    def test_cambio_de_razon_social_reindexa(self):
+        """Test al guardar el cliente se reemplazan sus términos; las estadísticas no reindexan"""
+        cliente = self.clientes[1]
+        cliente.razon_social = 'Ana Quispe'
+        cliente.save()
+        self.assertEqual(self._buscar('quispe'), ['45670000'])
+        self.assertEqual(self._buscar('perales'), [])
+        
+        # Solo el UPDATE de estadísticas: sin DELETE/INSERT de términos
+        cliente = Cliente.objects.select_related('tipo_documento').get(pk=cliente.pk)
+        with self.assertNumQueries(1):
+            cliente.actualizar_estadisticas_compra(Decimal('10.00'))
+    
+    def test_vinculo_vendedor_una_vez_por_cliente(self):
+        """Test cada documento con vendedor registra el par vendedor-cliente sin duplicarlo"""
+        self._emitir(1, self.clientes[0], self.vendedor)
+        self._emitir(2, self.clientes[0], self.vendedor)
+        self._emitir(3, self.clientes[1], self.vendedor)
+        self._emitir(4, self.clientes[2])
+        
+        self.assertEqual(
+            sorted(ClienteVendedor.objects.values_list('cliente__numero_documento', flat=True)),
+            ['45670000', '45678912']
+        )
+    
+    def test_vendedor_lista_sus_clientes_sin_repetir(self):
+        """Test el vendedor ve cada cliente una sola vez aunque tenga varios documentos"""
+        for numero in range(1, 6):
+            self._emitir(numero, self.clientes[0], self.vendedor)
+        self._emitir(6, self.clientes[2])
+        
+        respuesta = self._solicitud('get', 'list', '/api/clientes/')
+        
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['count'], 1)
+        self.assertEqual(respuesta.data['results'][0]['numero_documento'], '45678912')
+    
+    def test_busqueda_avanzada_por_documento_y_nombre(self):
+        """Test busqueda_avanzada usa prefijo de documento para dígitos y el índice para texto"""
+        for numero, cliente in enumerate(self.clientes, start=1):
+            self._emitir(numero, cliente, self.vendedor)
+        
+        respuesta = self._solicitud('post', 'busqueda_avanzada', '/api/clientes/busqueda_avanzada/', termino='4567')
+        self.assertEqual(
+            sorted(cliente['numero_documento'] for cliente in respuesta.data['results']),
+            ['45670000', '45678912']
+        )
+        
+        respuesta = self._solicitud('post', 'busqueda_avanzada', '/api/clientes/busqueda_avanzada/', termino='pereira')
+        self.assertEqual([cliente['numero_documento'] for cliente in respuesta.data['results']], ['10000001'])
@@ -0,0 +1,130 @@
+"""
+Tests de modelos Core - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de los contadores de numeración y de las relaciones jerárquicas
+"""
+
+import threading
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import ConfiguracionSistema, Correlativo
+from ..utils import obtener_siguiente_correlativo
+from aplicaciones.productos.models import Categoria, JerarquiaCategoria
+
+
+class TestCorrelativo(TestCase):
+    """Tests para Correlativo.siguiente y obtener_siguiente_correlativo"""
+    
+    def test_contadores_independientes_por_prefijo(self):
+        """Test cada (ámbito, prefijo) lleva su propio contador"""
+        self.assertEqual(Correlativo.siguiente('pruebas', 'A-'), 1)
+        self.assertEqual(Correlativo.siguiente('pruebas', 'A-'), 2)
+        self.assertEqual(Correlativo.siguiente('pruebas', 'B-'), 1)
+        self.assertEqual(Correlativo.siguiente('otras', 'A-'), 1)
+    
+    def test_semilla_solo_al_crear_contador(self):
+        """Test la semilla se consulta una vez y luego se incrementa el contador"""
+        llamadas = []
+        
+        def semilla():
+            llamadas.append(1)
+            return 41
+        
+        self.assertEqual(Correlativo.siguiente('pruebas', 'A-', semilla=semilla), 42)
+        with self.assertNumQueries(2):
+            self.assertEqual(Correlativo.siguiente('pruebas', 'A-', semilla=semilla), 43)
+        self.assertEqual(len(llamadas), 1)
+    
+    def test_correlativo_continua_desde_datos_existentes(self):
+        """Test obtener_siguiente_correlativo continúa desde el último valor guardado"""
+        ConfiguracionSistema.objects.create(clave='DOC00000007', valor='x')
+        
+        self.assertEqual(obtener_siguiente_correlativo(ConfiguracionSistema, 'clave', 'DOC'), 'DOC00000008')
+        self.assertEqual(obtener_siguiente_correlativo(ConfiguracionSistema, 'clave', 'DOC'), 'DOC00000009')
+
+
+class TestCorrelativoConcurrente(TransactionTestCase):
+    """Tests de Correlativo.siguiente con hilos concurrentes"""
+    
+    def test_hilos_concurrentes_sin_duplicados(self):
+        """Test varios hilos obtienen números únicos y consecutivos"""
+        numeros, errores = [], []
+        
+        def trabajador():
+            try:
+                for _ in range(25):
+                    numeros.append(Correlativo.siguiente('pruebas', 'MOV-'))
+            except Exception as e:
+                errores.append(e)
+            finally:
+                close_old_connections()
+        
+        hilos = [threading.Thread(target=trabajador) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        
+        self.assertEqual(errores, [])
+        self.assertEqual(sorted(numeros), list(range(1, 151)))
+        self.assertEqual(Correlativo.objects.get(ambito='pruebas', prefijo='MOV-').ultimo_numero, 150)
+
+
+class TestRelacionJerarquica(TestCase):
+    """Tests para RelacionJerarquica.sincronizar usando la jerarquía de categorías"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        self.raiz = Categoria.objects.create(codigo='ALI', nombre='Alimentos')
+        self.bebidas = Categoria.objects.create(codigo='BEB', nombre='Bebidas', categoria_padre=self.raiz)
+        self.gaseosas = Categoria.objects.create(codigo='GAS', nombre='Gaseosas', categoria_padre=self.bebidas)
+        self.limpieza = Categoria.objects.create(codigo='LIM', nombre='Limpieza')
+    
+    def _relaciones(self, descendiente):
+        return dict(
+            JerarquiaCategoria.objects.filter(descendiente=descendiente).values_list('ancestro__codigo', 'profundidad')
+        )
+    
+    def test_relaciones_al_crear(self):
+        """Test cada nodo se relaciona consigo mismo y con todos sus ancestros"""
+        self.assertEqual(self._relaciones(self.gaseosas), {'GAS': 0, 'BEB': 1, 'ALI': 2})
+        self.assertEqual(list(self.raiz.obtener_subcategorias()), [self.bebidas, self.gaseosas])
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(self.gaseosas.obtener_ruta_completa(), 'Alimentos > Bebidas > Gaseosas')
+    
+    def test_mover_subarbol(self):
+        """Test al cambiar el padre se reubica el subárbol completo"""
+        self.bebidas.categoria_padre = self.limpieza
+        self.bebidas.save()
+        
+        self.assertEqual(self._relaciones(self.gaseosas), {'GAS': 0, 'BEB': 1, 'LIM': 2})
+        self.assertFalse(self.raiz.obtener_subcategorias().exists())
+        
+        self.bebidas.categoria_padre = None
+        self.bebidas.save()
+        self.assertEqual(self._relaciones(self.gaseosas), {'GAS': 0, 'BEB': 1})
+    
+    def test_guardar_sin_cambio_de_padre(self):
+        """Test guardar sin mover el nodo no reescribe sus relaciones"""
+        self.bebidas.nombre = 'Bebidas y jugos'
+        tabla = JerarquiaCategoria._meta.db_table
+        
+        with CaptureQueriesContext(connection) as consultas:
+            self.bebidas.save()
+        
+        escrituras = [
+            q for q in consultas
+            if tabla in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(escrituras, [])
+    
+    def test_ciclo_no_permitido(self):
+        """Test un nodo no puede colgar de uno de sus descendientes"""
+        self.raiz.categoria_padre = self.gaseosas
+        
+        with self.assertRaises(ValidationError):
+            self.raiz.save()
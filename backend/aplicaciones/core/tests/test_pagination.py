@@ -0,0 +1,144 @@
+"""
+Tests de paginación Core - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de los totales de página y de filtro calculados en la base de datos
+"""
+
+from types import SimpleNamespace
+from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from aplicaciones.inventario.models import Almacen, MovimientoInventario, TipoMovimiento
+from aplicaciones.productos.models import Categoria, Producto, TipoProducto
+from aplicaciones.usuarios.models import Rol, Usuario
+from ..models import Empresa
+from ..pagination import PaginacionInventario, PaginacionKeysetInventario, PaginacionReportes
+
+
+class TestTotalesAgregados(TestCase):
+    """Tests para TotalesAgregadosMixin"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        cache.clear()
+        tipo_producto = TipoProducto.objects.create(codigo='BIEN', nombre='Bien')
+        categoria = Categoria.objects.create(codigo='GEN', nombre='General')
+        for indice, stock in enumerate(['2.00', '10.00', '3.00', '20.00', '1.00'], start=1):
+            Producto.objects.create(
+                codigo=f'P{indice:03d}',
+                nombre=f'Producto {indice}',
+                tipo_producto=tipo_producto,
+                categoria=categoria,
+                precio_compra=Decimal('5.00'),
+                precio_venta=Decimal('10.00'),
+                stock_actual=Decimal(stock),
+                stock_minimo=Decimal('5.00')
+            )
+        self.queryset = Producto.objects.order_by('codigo')
+    
+    def _paginar(self, paginacion, vista, pagina):
+        solicitud = Request(APIRequestFactory().get('/api/productos/', {'page': pagina, 'page_size': 2}))
+        return paginacion.paginate_queryset(self.queryset, solicitud, view=vista)
+    
+    def test_totales_de_pagina_y_filtro_en_un_aggregate(self):
+        """Test la primera página calcula ambos totales con una consulta y luego usa la caché"""
+        vista = SimpleNamespace(totales_en_bd=True)
+        paginacion = PaginacionInventario()
+        
+        # COUNT y página del paginador más un aggregate()
+        with self.assertNumQueries(3):
+            self._paginar(paginacion, vista, 1)
+        
+        self.assertEqual(paginacion.totales_filtro, {
+            'cantidad_productos': 5,
+            'stock_total': '36.00',
+            'valor_total': '180.00',
+            'productos_stock_bajo': 3,
+        })
+        self.assertEqual(paginacion._calcular_totales_inventario([]), {
+            'cantidad_productos': 2,
+            'stock_total': '12.00',
+            'valor_total': '60.00',
+            'productos_stock_bajo': 1,
+        })
+        
+        paginacion = PaginacionInventario()
+        with self.assertNumQueries(3):
+            self._paginar(paginacion, vista, 3)
+        
+        self.assertEqual(paginacion.totales_filtro['stock_total'], '36.00')
+        self.assertEqual(paginacion.totales_pagina_bd['stock_total'], '1.00')
+    
+    def test_sin_opcion_usa_totales_de_la_respuesta(self):
+        """Test sin totales_en_bd se conservan los totales calculados desde los datos serializados"""
+        paginacion = PaginacionInventario()
+        self._paginar(paginacion, SimpleNamespace(), 1)
+        
+        self.assertIsNone(paginacion.totales_filtro)
+        totales = paginacion._calcular_totales_inventario([{'stock_actual': '4.00', 'precio_promedio': '2.50'}])
+        self.assertEqual(totales['valor_total'], '10.0000')
+    
+    def test_reportes_con_agregados_de_la_vista(self):
+        """Test los reportes toman los totales del filtro desde agregados_totales de la vista"""
+        vista = SimpleNamespace(
+            totales_en_bd=True,
+            agregados_totales={'productos': Count('pk'), 'stock': Sum('stock_actual')}
+        )
+        paginacion = PaginacionReportes()
+        self._paginar(paginacion, vista, 1)
+        
+        self.assertEqual(paginacion.totales, {'productos': 5, 'stock': '36.00'})
+        self.assertEqual(paginacion.totales_pagina_bd, {'productos': 2, 'stock': '12.00'})
+    
+    def test_keyset_de_movimientos_con_agregados_de_movimientos(self):
+        """Test la paginación keyset de movimientos suma campos de MovimientoInventario, no de productos"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        almacen = Almacen.objects.create(codigo='ALM01', nombre='Almacén Principal', sucursal=empresa.sucursales.first())
+        usuario = Usuario.objects.create_user(
+            email='almacen@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Almacén',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Administrador', codigo='administrador')
+        )
+        tipo_movimiento = TipoMovimiento.objects.create(codigo='COMPRA', nombre='Compra', tipo='entrada', categoria='compra')
+        for total_items, total_cantidad, total_valor in [(1, '2.00', '10.00'), (3, '5.00', '40.00'), (2, '1.50', '7.50')]:
+            MovimientoInventario.objects.create(
+                tipo_movimiento=tipo_movimiento,
+                almacen=almacen,
+                usuario_creacion=usuario,
+                total_items=total_items,
+                total_cantidad=Decimal(total_cantidad),
+                total_valor=Decimal(total_valor)
+            )
+        
+        solicitud = Request(APIRequestFactory().get('/api/inventario/movimientos/', {'page_size': 2}))
+        paginacion = PaginacionKeysetInventario()
+        paginacion.paginate_queryset(MovimientoInventario.objects.all(), solicitud, view=SimpleNamespace(totales_en_bd=True))
+        
+        self.assertIsNone(paginacion.totales_filtro)
+        self.assertEqual(paginacion.get_datos_adicionales([])['totales_pagina'], {
+            'cantidad_movimientos': 2,
+            'total_items': 5,
+            'total_cantidad': '6.50',
+            'total_valor': '47.50',
+        })
+        
+        # Sin totales_en_bd se suman los totales serializados de cada movimiento
+        paginacion = PaginacionKeysetInventario()
+        paginacion.paginate_queryset(MovimientoInventario.objects.all(), solicitud, view=SimpleNamespace())
+        totales = paginacion.get_datos_adicionales([{'total_items': 3, 'total_cantidad': '5.00', 'total_valor': '40.00'}])
+        self.assertEqual(totales['totales_pagina']['total_valor'], '40.00')
@@ -8,6 +8,7 @@ import re
 import random
 import string
 import hashlib
+import unicodedata
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime, date, timedelta
 from django.contrib.auth import get_user_model
@@ -343,6 +344,26 @@ def normalizar_texto_mayusculas(texto):
     return str(texto).upper().strip()
 
 
+def normalizar_texto_busqueda(texto):
+    """
+    Normalizar texto para búsquedas: sin tildes, en mayúsculas y con espacios simples
+    """
+    if not texto:
+        return ""
+    
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    return ' '.join(texto.upper().split())
+
+
+def tokenizar_busqueda(texto):
+    """
+    Términos de búsqueda del texto normalizado, en orden y sin repetir
+    """
+    terminos = re.findall(r'[A-Z0-9]+', normalizar_texto_busqueda(texto))
+    return list(dict.fromkeys(terminos))
+
+
 def validar_codigo_producto(codigo):
     """
     Validar código de producto
@@ -434,22 +455,23 @@ def validar_periodo_fiscal(periodo):
 def obtener_siguiente_correlativo(modelo, campo, prefijo="", longitud=8):
     """
     Obtener siguiente número correlativo para un modelo
+    Usa el contador core.Correlativo del modelo y prefijo
     """
-    try:
+    from aplicaciones.core.models import Correlativo
+    
+    def ultimo_usado():
         ultimo_objeto = modelo.objects.filter(
             **{f"{campo}__startswith": prefijo}
         ).order_by(f"-{campo}").first()
         
-        if ultimo_objeto:
-            ultimo_numero = getattr(ultimo_objeto, campo)
-            # Extraer número del final
-            numero_str = ultimo_numero.replace(prefijo, "")
-            numero = int(numero_str) + 1
-        else:
-            numero = 1
+        if not ultimo_objeto:
+            return 0
         
-        return f"{prefijo}{str(numero).zfill(longitud)}"
+        try:
+            # Extraer número del final
+            return int(getattr(ultimo_objeto, campo).replace(prefijo, "", 1))
+        except ValueError:
+            return 0
     
-    except Exception as e:
-        logger.error(f"Error al obtener correlativo: {e}")
-        return f"{prefijo}{str(1).zfill(longitud)}"
\ No newline at end of file
+    numero = Correlativo.siguiente(f"{modelo._meta.label_lower}.{campo}", prefijo, semilla=ultimo_usado)
+    return f"{prefijo}{str(numero).zfill(longitud)}"
\ No newline at end of file
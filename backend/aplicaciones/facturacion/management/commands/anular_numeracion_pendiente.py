@@ -0,0 +1,34 @@
+"""
+Comando anular_numeracion_pendiente - FELICITAFAC
+Anula los números de serie reservados que no llegaron a utilizarse
+Uso: python manage.py anular_numeracion_pendiente [--horas 24]
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from aplicaciones.facturacion.services import AsignadorNumeracion
+
+
+class Command(BaseCommand):
+    help = 'Anula los números reservados no utilizados y lista los saltos de numeración para SUNAT'
+    
+    def add_arguments(self, parser):
+        configuracion = getattr(settings, 'CONFIGURACION_SUNAT', {})
+        
+        parser.add_argument(
+            '--horas',
+            type=int,
+            default=configuracion.get('NUMERACION_VIGENCIA_HORAS', 24),
+            help='Antigüedad mínima en horas de las reservas a anular'
+        )
+    
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(hours=options['horas'])
+        anulados = AsignadorNumeracion().anular_pendientes(antes_de=antes_de)
+        
+        for serie, numero in anulados:
+            self.stdout.write(f"{serie}-{numero:08d}")
+        
+        self.stdout.write(self.style.SUCCESS(f"Números anulados: {len(anulados)}"))
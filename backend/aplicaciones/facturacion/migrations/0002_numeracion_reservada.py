@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='seriedocumento',
+            name='numero_actual',
+            field=models.PositiveIntegerField(default=0, help_text='Último número reservado', verbose_name='Número Actual'),
+        ),
+        migrations.CreateModel(
+            name='NumeroReservado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Fecha y hora de creación del registro', verbose_name='Fecha de Creación')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, db_index=True, help_text='Fecha y hora de última actualización', verbose_name='Fecha de Actualización')),
+                ('activo', models.BooleanField(db_index=True, default=True, help_text='Indica si el registro está activo', verbose_name='Activo')),
+                ('numero', models.PositiveIntegerField(help_text='Número correlativo reservado', verbose_name='Número')),
+                ('estado', models.CharField(choices=[('reservado', 'Reservado'), ('utilizado', 'Utilizado'), ('anulado', 'Anulado')], default='reservado', help_text='Estado del número reservado', max_length=10, verbose_name='Estado')),
+                ('reservado_por', models.CharField(help_text='Proceso o hilo que reservó el número', max_length=100, verbose_name='Reservado por')),
+                ('fecha_uso', models.DateTimeField(blank=True, help_text='Fecha en que el número fue utilizado o anulado', null=True, verbose_name='Fecha de Uso')),
+                ('motivo_anulacion', models.CharField(blank=True, help_text='Motivo por el que el número no fue utilizado', max_length=200, null=True, verbose_name='Motivo de Anulación')),
+                ('documento', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='numero_reservado', to='facturacion.documentoelectronico', verbose_name='Documento')),
+                ('serie_documento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='numeros_reservados', to='facturacion.seriedocumento', verbose_name='Serie')),
+            ],
+            options={
+                'verbose_name': 'Número Reservado',
+                'verbose_name_plural': 'Números Reservados',
+                'db_table': 'facturacion_numero_reservado',
+                'indexes': [models.Index(fields=['serie_documento', 'estado'], name='idx_num_reserva_serie_estado'), models.Index(fields=['estado', 'fecha_creacion'], name='idx_num_reserva_estado_fecha')],
+                'unique_together': {('serie_documento', 'numero')},
+            },
+        ),
+    ]
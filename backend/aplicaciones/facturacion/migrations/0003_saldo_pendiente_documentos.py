@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:38
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def inicializar_saldos(apps, schema_editor):
+    """Total pagado desde los pagos activos; luego saldo y estado de pago"""
+    DocumentoElectronico = apps.get_model('facturacion', 'DocumentoElectronico')
+    PagoDocumento = apps.get_model('facturacion', 'PagoDocumento')
+    
+    pagos = PagoDocumento.objects.filter(
+        documento=models.OuterRef('pk'),
+        activo=True
+    ).values('documento').annotate(total=models.Sum('monto')).values('total')
+    
+    DocumentoElectronico.objects.update(
+        total_pagado=Coalesce(
+            models.Subquery(pagos, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+            models.Value(Decimal('0.00'))
+        )
+    )
+    DocumentoElectronico.objects.update(
+        saldo_pendiente=models.F('total') - models.F('total_pagado'),
+        estado_pago=models.Case(
+            models.When(total_pagado__lte=0, then=models.Value('pendiente')),
+            models.When(total_pagado__gte=models.F('total'), then=models.Value('pagado')),
+            default=models.Value('parcial')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0002_numeracion_reservada'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='documentoelectronico',
+            name='estado_pago',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('parcial', 'Parcial'), ('pagado', 'Pagado')], default='pendiente', help_text='Estado de cobranza del documento', max_length=10, verbose_name='Estado de Pago'),
+        ),
+        migrations.AddField(
+            model_name='documentoelectronico',
+            name='saldo_pendiente',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Total menos lo pagado', max_digits=12, verbose_name='Saldo Pendiente'),
+        ),
+        migrations.AddField(
+            model_name='documentoelectronico',
+            name='total_pagado',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Suma de los pagos activos del documento', max_digits=12, verbose_name='Total Pagado'),
+        ),
+        migrations.AddIndex(
+            model_name='documentoelectronico',
+            index=models.Index(fields=['estado_pago', 'fecha_vencimiento'], name='idx_doc_estado_pago_venc'),
+        ),
+        migrations.RunPython(inicializar_saldos, migrations.RunPython.noop),
+    ]
@@ -137,7 +137,7 @@ class SerieDocumento(ModeloBase):
     numero_actual = models.PositiveIntegerField(
         'Número Actual',
         default=0,
-        help_text='Último número emitido'
+        help_text='Último número reservado'
     )
     
     numero_maximo = models.PositiveIntegerField(
@@ -183,10 +183,88 @@ class SerieDocumento(ModeloBase):
         return siguiente
     
     def incrementar_numero(self):
-        """Incrementa el número actual"""
-        self.numero_actual = self.obtener_siguiente_numero()
-        self.save(update_fields=['numero_actual'])
-        return self.numero_actual
+        """Reserva y retorna el siguiente número mediante AsignadorNumeracion"""
+        from .services import AsignadorNumeracion
+        
+        numero = AsignadorNumeracion().asignar(self)
+        self.numero_actual = max(self.numero_actual, numero)
+        return numero
+
+
+class NumeroReservado(ModeloBase):
+    """
+    Números de serie reservados por AsignadorNumeracion
+    Permite identificar los números no utilizados y anularlos ante SUNAT
+    """
+    
+    ESTADOS_NUMERO = [
+        ('reservado', 'Reservado'),
+        ('utilizado', 'Utilizado'),
+        ('anulado', 'Anulado'),
+    ]
+    
+    serie_documento = models.ForeignKey(
+        SerieDocumento,
+        on_delete=models.CASCADE,
+        related_name='numeros_reservados',
+        verbose_name='Serie'
+    )
+    
+    numero = models.PositiveIntegerField(
+        'Número',
+        help_text='Número correlativo reservado'
+    )
+    
+    estado = models.CharField(
+        'Estado',
+        max_length=10,
+        choices=ESTADOS_NUMERO,
+        default='reservado',
+        help_text='Estado del número reservado'
+    )
+    
+    reservado_por = models.CharField(
+        'Reservado por',
+        max_length=100,
+        help_text='Proceso o hilo que reservó el número'
+    )
+    
+    documento = models.OneToOneField(
+        'DocumentoElectronico',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='numero_reservado',
+        verbose_name='Documento'
+    )
+    
+    fecha_uso = models.DateTimeField(
+        'Fecha de Uso',
+        blank=True,
+        null=True,
+        help_text='Fecha en que el número fue utilizado o anulado'
+    )
+    
+    motivo_anulacion = models.CharField(
+        'Motivo de Anulación',
+        max_length=200,
+        blank=True,
+        null=True,
+        help_text='Motivo por el que el número no fue utilizado'
+    )
+    
+    class Meta:
+        db_table = 'facturacion_numero_reservado'
+        verbose_name = 'Número Reservado'
+        verbose_name_plural = 'Números Reservados'
+        unique_together = [['serie_documento', 'numero']]
+        indexes = [
+            models.Index(fields=['serie_documento', 'estado'], name='idx_num_reserva_serie_estado'),
+            models.Index(fields=['estado', 'fecha_creacion'], name='idx_num_reserva_estado_fecha'),
+        ]
+    
+    def __str__(self):
+        return f"{self.serie_documento.serie}-{self.numero:08d} ({self.estado})"
 
 
 class DocumentoElectronico(ModeloBase):
@@ -211,6 +289,18 @@ class DocumentoElectronico(ModeloBase):
         ('EUR', 'Euros'),
     ]
     
+    ESTADOS_PAGO = [
+        ('pendiente', 'Pendiente'),
+        ('parcial', 'Parcial'),
+        ('pagado', 'Pagado'),
+    ]
+    
+    # Campos de totales que se guardan al recalcular el documento
+    CAMPOS_TOTALES = [
+        'subtotal', 'total_descuentos', 'base_imponible', 'igv',
+        'total_exonerado', 'total_inafecto', 'total_gratuito', 'total'
+    ]
+    
     # Identificación única
     uuid = models.UUIDField(
         'UUID',
@@ -384,6 +474,31 @@ class DocumentoElectronico(ModeloBase):
         help_text='Total del documento'
     )
     
+    # Cobranza (mantenidos por PagoDocumento)
+    total_pagado = models.DecimalField(
+        'Total Pagado',
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='Suma de los pagos activos del documento'
+    )
+    
+    saldo_pendiente = models.DecimalField(
+        'Saldo Pendiente',
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='Total menos lo pagado'
+    )
+    
+    estado_pago = models.CharField(
+        'Estado de Pago',
+        max_length=10,
+        choices=ESTADOS_PAGO,
+        default='pendiente',
+        help_text='Estado de cobranza del documento'
+    )
+    
     # Información adicional
     observaciones = models.TextField(
         'Observaciones',
@@ -519,6 +634,7 @@ class DocumentoElectronico(ModeloBase):
             models.Index(fields=['uuid'], name='idx_doc_uuid'),
             models.Index(fields=['hash_documento'], name='idx_doc_hash'),
             models.Index(fields=['fecha_vencimiento'], name='idx_doc_vencimiento'),
+            models.Index(fields=['estado_pago', 'fecha_vencimiento'], name='idx_doc_estado_pago_venc'),
             models.Index(fields=['activo'], name='idx_doc_activo'),
         ]
         ordering = ['-fecha_emision', '-numero']
@@ -535,7 +651,66 @@ class DocumentoElectronico(ModeloBase):
         if self.estado in ['emitido', 'aceptado_sunat'] and not self.codigo_qr:
             self.codigo_qr = self._generar_codigo_qr()
         
+        # Saldo inicial; luego lo mantienen los pagos y el recálculo de totales
+        if self._state.adding:
+            self.saldo_pendiente = self.total - self.total_pagado
+            self.estado_pago = self.calcular_estado_pago(self.total, self.total_pagado)
+        
         super().save(*args, **kwargs)
+        
+        # Relación vendedor-cliente usada para filtrar los clientes de cada vendedor
+        campos = kwargs.get('update_fields')
+        if self.vendedor_id and (campos is None or {'vendedor', 'cliente'} & set(campos)):
+            from aplicaciones.clientes.models import ClienteVendedor
+            ClienteVendedor.vincular([(self.cliente_id, self.vendedor_id)])
+    
+    @staticmethod
+    def calcular_estado_pago(total, total_pagado):
+        """Estado de pago según lo pagado respecto al total"""
+        if total_pagado <= 0:
+            return 'pendiente'
+        elif total_pagado >= total:
+            return 'pagado'
+        return 'parcial'
+    
+    @staticmethod
+    def _expresiones_saldo(total, total_pagado):
+        """saldo_pendiente y estado_pago como expresiones SQL equivalentes a calcular_estado_pago"""
+        from django.db.models.lookups import GreaterThanOrEqual, LessThanOrEqual
+        
+        return {
+            'saldo_pendiente': total - total_pagado,
+            'estado_pago': models.Case(
+                models.When(LessThanOrEqual(total_pagado, Decimal('0.00')), then=models.Value('pendiente')),
+                models.When(GreaterThanOrEqual(total_pagado, total), then=models.Value('pagado')),
+                default=models.Value('parcial')
+            ),
+        }
+    
+    @classmethod
+    def registrar_pago(cls, documento_id, monto):
+        """
+        Suma un pago (o lo resta con monto negativo) con un solo UPDATE atómico
+        saldo_pendiente y estado_pago van antes que total_pagado en el SET porque MySQL
+        evalúa las asignaciones en orden; así todas usan el total pagado previo
+        """
+        total_pagado = models.F('total_pagado') + monto
+        cls.objects.filter(pk=documento_id).update(
+            **cls._expresiones_saldo(models.F('total'), total_pagado),
+            total_pagado=total_pagado
+        )
+    
+    def guardar_totales(self):
+        """
+        Guarda los totales y recalcula saldo y estado de pago en el mismo UPDATE
+        El saldo se calcula con el total pagado de la base de datos, no con el valor en memoria
+        """
+        type(self).objects.filter(pk=self.pk).update(
+            **{campo: getattr(self, campo) for campo in self.CAMPOS_TOTALES},
+            **self._expresiones_saldo(models.Value(self.total), models.F('total_pagado'))
+        )
+        self.saldo_pendiente = self.total - self.total_pagado
+        self.estado_pago = self.calcular_estado_pago(self.total, self.total_pagado)
     
     def _generar_codigo_qr(self):
         """Genera datos para código QR según formato SUNAT"""
@@ -582,18 +757,31 @@ class DocumentoElectronico(ModeloBase):
         self._reversar_inventario()
     
     def _reversar_inventario(self):
-        """Reversa la afectación al inventario"""
+        """
+        Reversa la afectación al inventario: el stock del producto y, con los ConsumoLote
+        registrados en la salida, los lotes y el stock valorizado del almacén
+        """
+        from django.db import transaction
+        from aplicaciones.inventario.services import ServicioInventario
+        
         if self.tipo_documento.afecta_inventario:
-            for detalle in self.detalles.all():
-                if detalle.producto.controla_stock:
-                    detalle.producto.actualizar_stock(
-                        detalle.cantidad, 
-                        'entrada'  # Reversa: entrada si era salida
-                    )
-    
-    def calcular_totales(self):
-        """Calcula los totales del documento basado en los detalles"""
-        detalles = self.detalles.all()
+            with transaction.atomic():
+                for detalle in self.detalles.all():
+                    if detalle.producto.controla_stock:
+                        detalle.producto.actualizar_stock(
+                            detalle.cantidad, 
+                            'entrada'  # Reversa: entrada si era salida
+                        )
+                
+                ServicioInventario.reversar_salida_documento(self)
+    
+    def calcular_totales(self, detalles=None):
+        """
+        Calcula los totales del documento basado en los detalles
+        Acepta los detalles ya calculados en memoria para evitar releerlos
+        """
+        if detalles is None:
+            detalles = self.detalles.all()
         
         self.subtotal = sum(d.subtotal for d in detalles)
         self.total_descuentos = sum(d.descuento for d in detalles)
@@ -604,10 +792,7 @@ class DocumentoElectronico(ModeloBase):
         self.total_gratuito = sum(d.subtotal for d in detalles if d.es_gratuito)
         self.total = self.base_imponible + self.igv + self.total_exonerado + self.total_inafecto
         
-        self.save(update_fields=[
-            'subtotal', 'total_descuentos', 'base_imponible', 'igv',
-            'total_exonerado', 'total_inafecto', 'total_gratuito', 'total'
-        ])
+        self.guardar_totales()
 
 
 class DetalleDocumento(ModeloBase):
@@ -616,6 +801,12 @@ class DetalleDocumento(ModeloBase):
     Items individuales de facturas, boletas, etc.
     """
     
+    # Importes calculados por _calcular_importes
+    CAMPOS_IMPORTE = [
+        'precio_unitario_con_igv', 'descuento', 'subtotal',
+        'base_imponible', 'igv', 'total_item'
+    ]
+    
     documento = models.ForeignKey(
         DocumentoElectronico,
         on_delete=models.CASCADE,
@@ -831,6 +1022,69 @@ class DetalleDocumento(ModeloBase):
         # Calcular total del item
         self.total_item = self.base_imponible + self.igv
     
+    def _redondear_importes(self):
+        """Redondea los importes a la precisión de sus columnas, igual que al guardar"""
+        for nombre_campo in self.CAMPOS_IMPORTE:
+            campo = self._meta.get_field(nombre_campo)
+            valor = getattr(self, nombre_campo)
+            setattr(self, nombre_campo, valor.quantize(Decimal(1).scaleb(-campo.decimal_places)))
+    
+    @classmethod
+    def preparar_en_memoria(cls, documento, detalles_data):
+        """
+        Construye los detalles sin guardarlos, con importes calculados
+        Permite insertarlos luego con un único bulk_create
+        """
+        detalles = []
+        for detalle_data in detalles_data:
+            detalle = cls(documento=documento, **detalle_data)
+            detalle._calcular_importes()
+            detalle._redondear_importes()
+            detalles.append(detalle)
+        return detalles
+    
+    @classmethod
+    def afectar_inventario_en_lote(cls, documento, detalles):
+        """
+        Afecta el inventario de varios detalles con una actualización por producto
+        Equivale a llamar afectar_inventario en cada detalle; además consume los lotes PEPS
+        del almacén de la sucursal y registra su costo para el asiento de costo de venta
+        """
+        from django.db.models import F
+        from aplicaciones.inventario.services import ServicioInventario
+        from aplicaciones.productos.models import Producto
+        
+        if not documento.tipo_documento.afecta_inventario:
+            return
+        
+        acumulado = {}
+        for detalle in detalles:
+            if not detalle.producto.controla_stock:
+                continue
+            cantidad, monto, lineas = acumulado.get(detalle.producto_id, (Decimal('0'), Decimal('0'), 0))
+            acumulado[detalle.producto_id] = (cantidad + detalle.cantidad, monto + detalle.total_item, lineas + 1)
+        
+        ahora = timezone.now()
+        for producto_id, (cantidad, monto, lineas) in acumulado.items():
+            stock_actual = F('stock_actual') - cantidad
+            Producto.objects.filter(pk=producto_id).update(
+                estado_stock=Producto.expresion_estado_stock(stock_actual),
+                stock_actual=stock_actual,
+                total_vendido=F('total_vendido') + cantidad,
+                monto_total_ventas=F('monto_total_ventas') + monto,
+                numero_ventas=F('numero_ventas') + lineas,
+                fecha_ultima_venta=ahora
+            )
+        
+        detalles = [detalle for detalle in detalles if detalle.producto.controla_stock]
+        if detalles and detalles[0].pk is None:
+            # MySQL no retorna los ids insertados por bulk_create; se recuperan por número de ítem
+            ids = dict(cls.objects.filter(documento=documento).values_list('numero_item', 'id'))
+            for detalle in detalles:
+                detalle.pk = ids[detalle.numero_item]
+        
+        ServicioInventario.procesar_salida_documento(documento, detalles)
+    
     def afectar_inventario(self):
         """Afecta el inventario del producto"""
         if self.producto.controla_stock and self.documento.tipo_documento.afecta_inventario:
@@ -988,4 +1242,99 @@ class PagoDocumento(ModeloBase):
         ordering = ['fecha_pago']
     
     def __str__(self):
-        return f"{self.documento.numero_completo} - {self.forma_pago.nombre} - S/ {self.monto}"
\ No newline at end of file
+        return f"{self.documento.numero_completo} - {self.forma_pago.nombre} - S/ {self.monto}"
+    
+    # Campos que afectan el total pagado del documento
+    CAMPOS_SALDO = {'documento', 'documento_id', 'monto', 'activo'}
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save para mantener el total pagado del documento
+        Un pago nuevo suma su monto; al modificar uno existente se aplica la diferencia
+        entre la fila guardada antes y después de la actualización
+        """
+        from django.db import transaction
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self.CAMPOS_SALDO & set(update_fields):
+            return super().save(*args, **kwargs)
+        
+        with transaction.atomic():
+            anterior = None
+            if not self._state.adding:
+                anterior = self._importe_guardado(bloquear=True)
+            
+            super().save(*args, **kwargs)
+            
+            # Se revierte lo guardado antes y se suma lo guardado ahora
+            movimientos = [(self.documento_id, self.monto, self.activo, 1)]
+            if anterior:
+                movimientos = [(*anterior, -1), (*self._importe_guardado(), 1)]
+            
+            importes = {}
+            for documento_id, monto, activo, signo in movimientos:
+                if activo:
+                    importes[documento_id] = importes.get(documento_id, Decimal('0.00')) + signo * monto
+            
+            for documento_id, monto in importes.items():
+                if monto:
+                    DocumentoElectronico.registrar_pago(documento_id, monto)
+    
+    def _importe_guardado(self, bloquear=False):
+        """(documento_id, monto, activo) del pago en la base de datos; None si no existe"""
+        consulta = PagoDocumento.objects.filter(pk=self.pk)
+        if bloquear:
+            consulta = consulta.select_for_update()
+        return consulta.values_list('documento_id', 'monto', 'activo').first()
+    
+    def anular(self, motivo=None):
+        """Anula el pago y descuenta su monto del documento"""
+        from django.db import transaction
+        
+        if motivo:
+            self.observaciones = f"{self.observaciones or ''}\nAnulado: {motivo}".strip()
+        
+        with transaction.atomic():
+            # Solo la primera anulación descuenta el monto
+            anulado = PagoDocumento.objects.filter(pk=self.pk, activo=True).update(
+                activo=False,
+                observaciones=self.observaciones,
+                fecha_actualizacion=timezone.now()
+            )
+            if anulado:
+                DocumentoElectronico.registrar_pago(self.documento_id, -self.monto)
+        
+        self.activo = False
+    
+    def soft_delete(self):
+        """Eliminación lógica: equivale a anular el pago"""
+        self.anular()
+    
+    def restaurar(self):
+        """Restaura un pago anulado y vuelve a sumarlo al documento"""
+        from django.db import transaction
+        
+        with transaction.atomic():
+            restaurado = PagoDocumento.objects.filter(pk=self.pk, activo=False).update(
+                activo=True,
+                fecha_actualizacion=timezone.now()
+            )
+            if restaurado:
+                DocumentoElectronico.registrar_pago(self.documento_id, self.monto)
+        
+        self.activo = True
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete para descontar el pago activo eliminado
+        Decide con la fila guardada y bloqueada: una instancia desactualizada no descuenta dos veces
+        """
+        from django.db import transaction
+        
+        with transaction.atomic():
+            guardado = self._importe_guardado(bloquear=True)
+            if guardado:
+                documento_id, monto, activo = guardado
+                if activo:
+                    DocumentoElectronico.registrar_pago(documento_id, -monto)
+            return super().delete(*args, **kwargs)
\ No newline at end of file
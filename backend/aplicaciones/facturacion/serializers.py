@@ -15,6 +15,7 @@ from .models import (
     TipoDocumentoElectronico, SerieDocumento, DocumentoElectronico,
     DetalleDocumento, FormaPago, PagoDocumento
 )
+from .services import AsignadorNumeracion
 
 
 class TipoDocumentoElectronicoSerializer(serializers.ModelSerializer):
@@ -407,14 +408,7 @@ class DocumentoElectronicoSerializer(serializers.ModelSerializer):
     
     def get_estado_pago(self, obj):
         """Estado de pago del documento"""
-        total_pagado = sum(pago.monto for pago in obj.pagos.filter(activo=True))
-        
-        if total_pagado == 0:
-            return 'PENDIENTE'
-        elif total_pagado >= obj.total:
-            return 'PAGADO'
-        else:
-            return 'PARCIAL'
+        return obj.estado_pago.upper()
     
     def get_dias_vencimiento(self, obj):
         """Días hasta el vencimiento"""
@@ -537,16 +531,35 @@ class DocumentoElectronicoCreateSerializer(serializers.ModelSerializer):
         
         return value
     
-    @transaction.atomic
     def create(self, validated_data):
         """Crear documento con detalles y pagos"""
+        serie_documento = validated_data['serie_documento']
+        asignador = AsignadorNumeracion()
+        
+        # Reservar número en su propia transacción corta, sin bloquear la serie durante la emisión
+        numero = asignador.asignar(serie_documento)
+        validated_data['numero'] = numero
+        
+        from aplicaciones.integraciones.models import ColaEnvioSunat
+        
+        try:
+            with transaction.atomic():
+                documento = self._crear_documento(validated_data)
+                asignador.confirmar(serie_documento, numero, documento)
+                
+                # Envío a SUNAT en la misma transacción: sin fila en la cola no se emite el documento
+                ColaEnvioSunat.encolar(documento, 'emision')
+        except Exception as e:
+            asignador.anular(serie_documento, [numero], f"Error al crear documento: {str(e)}")
+            raise
+        
+        return documento
+    
+    def _crear_documento(self, validated_data):
+        """Crear documento, detalles y pagos con el número ya asignado"""
         detalles_data = validated_data.pop('detalles_data')
         pagos_data = validated_data.pop('pagos_data', [])
         
-        # Obtener siguiente número de serie
-        serie_documento = validated_data['serie_documento']
-        validated_data['numero'] = serie_documento.obtener_siguiente_numero()
-        
         # Copiar datos del cliente
         cliente = validated_data['cliente']
         validated_data.update({
@@ -557,13 +570,14 @@ class DocumentoElectronicoCreateSerializer(serializers.ModelSerializer):
             'cliente_email': cliente.email,
         })
         
-        # Crear documento
-        documento = DocumentoElectronico.objects.create(**validated_data)
+        # Crear documento; los pagos se insertan en lote sin pasar por PagoDocumento.save
+        documento = DocumentoElectronico.objects.create(
+            total_pagado=sum((pago_data['monto'] for pago_data in pagos_data), Decimal('0.00')),
+            **validated_data
+        )
         
-        # Crear detalles
+        # Crear detalles en memoria y guardarlos en una sola inserción
         for detalle_data in detalles_data:
-            detalle_data['documento'] = documento
-            
             # Copiar datos del producto
             producto = detalle_data['producto']
             detalle_data.update({
@@ -572,21 +586,21 @@ class DocumentoElectronicoCreateSerializer(serializers.ModelSerializer):
                 'unidad_medida': detalle_data.get('unidad_medida', producto.unidad_medida_sunat),
                 'tipo_afectacion_igv': detalle_data.get('tipo_afectacion_igv', producto.tipo_afectacion_igv),
             })
-            
-            DetalleDocumento.objects.create(**detalle_data)
+        
+        detalles = DetalleDocumento.preparar_en_memoria(documento, detalles_data)
+        DetalleDocumento.objects.bulk_create(detalles)
         
         # Crear pagos
-        for pago_data in pagos_data:
-            pago_data['documento'] = documento
-            PagoDocumento.objects.create(**pago_data)
+        PagoDocumento.objects.bulk_create([
+            PagoDocumento(documento=documento, **pago_data)
+            for pago_data in pagos_data
+        ])
         
-        # Incrementar número de serie
-        serie_documento.incrementar_numero()
+        # Totales calculados una sola vez a partir de los detalles en memoria
+        documento.calcular_totales(detalles)
         
         # Afectar inventario si corresponde
-        if documento.tipo_documento.afecta_inventario:
-            for detalle in documento.detalles.all():
-                detalle.afectar_inventario()
+        DetalleDocumento.afectar_inventario_en_lote(documento, detalles)
         
         return documento
 
@@ -612,14 +626,7 @@ class DocumentoElectronicoListSerializer(serializers.ModelSerializer):
     
     def get_estado_pago(self, obj):
         """Estado de pago simplificado"""
-        total_pagado = sum(pago.monto for pago in obj.pagos.filter(activo=True))
-        
-        if total_pagado == 0:
-            return 'PENDIENTE'
-        elif total_pagado >= obj.total:
-            return 'PAGADO'
-        else:
-            return 'PARCIAL'
+        return obj.estado_pago.upper()
     
     def get_dias_vencimiento(self, obj):
         """Días hasta vencimiento"""
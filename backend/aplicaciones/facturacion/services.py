@@ -3,13 +3,20 @@ Services de Facturación - FELICITAFAC
 Validaciones SUNAT y lógica de negocio
 """
 
+from django.conf import settings
 from django.db import transaction
+from django.db.models import F
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from collections import deque
+from datetime import timedelta
 from decimal import Decimal
+import os
 import re
+import socket
+import threading
 import logging
-from .models import DocumentoElectronico, DetalleDocumento, SerieDocumento
+from .models import DocumentoElectronico, DetalleDocumento, NumeroReservado, SerieDocumento
 
 logger = logging.getLogger(__name__)
 
@@ -110,10 +117,8 @@ class ServicioFacturacion:
             documento.total_gratuito = total_gratuito
             documento.total = total
             
-            documento.save(update_fields=[
-                'subtotal', 'total_descuentos', 'base_imponible', 'igv',
-                'total_exonerado', 'total_inafecto', 'total_gratuito', 'total'
-            ])
+            # Totales, saldo pendiente y estado de pago en un solo UPDATE
+            documento.guardar_totales()
             
             return {
                 'exitoso': True,
@@ -182,18 +187,7 @@ class ServicioFacturacion:
     def generar_siguiente_numero(serie_documento):
         """Generar siguiente número para una serie"""
         try:
-            with transaction.atomic():
-                # Bloquear serie para evitar concurrencia
-                serie = SerieDocumento.objects.select_for_update().get(id=serie_documento.id)
-                
-                siguiente = serie.numero_actual + 1
-                if siguiente > serie.numero_maximo:
-                    raise ValidationError(f"Se alcanzó el número máximo para la serie {serie.serie}")
-                
-                serie.numero_actual = siguiente
-                serie.save(update_fields=['numero_actual'])
-                
-                return siguiente
+            return AsignadorNumeracion().asignar(serie_documento)
                 
         except Exception as e:
             logger.error(f"Error generando número: {str(e)}")
@@ -338,6 +332,53 @@ class ServicioFacturacion:
             logger.error(f"Error anulando documento: {str(e)}")
             return {'exitoso': False, 'error': str(e)}
     
+    # Tramos de antigüedad de saldos: (clave, días vencidos desde, hasta)
+    TRAMOS_ANTIGUEDAD = [
+        ('vencido_1_30', 1, 30),
+        ('vencido_31_60', 31, 60),
+        ('vencido_61_90', 61, 90),
+        ('vencido_mas_90', 91, None),
+    ]
+    
+    @staticmethod
+    def antiguedad_saldos(fecha_corte=None):
+        """
+        Antigüedad de cuentas por cobrar a una fecha de corte
+        Lee saldo_pendiente sobre el índice (estado_pago, fecha_vencimiento) en una sola consulta
+        """
+        from django.db.models import Case, Count, DecimalField, Q, Sum, When
+        
+        fecha_corte = fecha_corte or timezone.localdate()
+        
+        def saldo(condicion):
+            return Sum(
+                Case(When(condicion, then=F('saldo_pendiente'))),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        
+        tramos = {
+            'sin_vencimiento': saldo(Q(fecha_vencimiento__isnull=True)),
+            'por_vencer': saldo(Q(fecha_vencimiento__gte=fecha_corte)),
+        }
+        for clave, desde, hasta in ServicioFacturacion.TRAMOS_ANTIGUEDAD:
+            condicion = Q(fecha_vencimiento__lte=fecha_corte - timedelta(days=desde))
+            if hasta is not None:
+                condicion &= Q(fecha_vencimiento__gte=fecha_corte - timedelta(days=hasta))
+            tramos[clave] = saldo(condicion)
+        
+        resumen = DocumentoElectronico.objects.filter(
+            estado_pago__in=['pendiente', 'parcial'],
+            estado__in=['emitido', 'aceptado_sunat'],
+            activo=True
+        ).aggregate(documentos=Count('id'), total=Sum('saldo_pendiente'), **tramos)
+        
+        return {
+            'exitoso': True,
+            'fecha_corte': fecha_corte,
+            'documentos': resumen.pop('documentos'),
+            **{clave: valor or Decimal('0.00') for clave, valor in resumen.items()}
+        }
+    
     @staticmethod
     def generar_codigo_qr_sunat(documento):
         """Generar código QR según formato SUNAT"""
@@ -432,4 +473,155 @@ class ServicioFacturacion:
             
         except Exception as e:
             logger.error(f"Error obteniendo estadísticas: {str(e)}")
-            return {'error': str(e)}
\ No newline at end of file
+            return {'error': str(e)}
+
+
+class AsignadorNumeracion:
+    """
+    Asignador de números correlativos por serie
+    
+    Reserva los números en una transacción corta, antes de la transacción del
+    documento, para no mantener bloqueada la serie mientras se emite. Cada proceso
+    o hilo puede reservar un bloque de números y consumirlo sin volver a la base
+    de datos. Todo número reservado queda registrado en NumeroReservado y los que
+    no llegan a utilizarse se anulan para informarlos a SUNAT.
+    """
+    
+    _locales = threading.local()
+    
+    def __init__(self, tamano_bloque=None, trabajador=None):
+        """Inicializar asignador con la configuración de settings"""
+        configuracion = getattr(settings, 'CONFIGURACION_SUNAT', {})
+        
+        self.tamano_bloque = max(1, tamano_bloque or configuracion.get('NUMERACION_BLOQUE', 1))
+        self.vigencia = timedelta(hours=configuracion.get('NUMERACION_VIGENCIA_HORAS', 24))
+        self.trabajador = (
+            trabajador or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        )[:100]
+    
+    def asignar(self, serie_documento):
+        """
+        Retorna el siguiente número para la serie
+        Usa el bloque del hilo actual y reserva uno nuevo cuando se agota o vence
+        """
+        bloques = self._bloques_del_hilo()
+        bloque = bloques.get(serie_documento.pk)
+        
+        if bloque and bloque['vence'] <= timezone.now():
+            self.anular(serie_documento, list(bloque['numeros']), 'Bloque de numeración vencido')
+            bloque = None
+        
+        if not bloque or not bloque['numeros']:
+            # Dentro de una transacción abierta el bloque podría revertirse,
+            # por lo que solo se reserva el número necesario sin guardarlo en el hilo
+            if transaction.get_connection().in_atomic_block:
+                return self.reservar(serie_documento, 1)[0]
+            
+            bloque = {
+                'numeros': deque(self.reservar(serie_documento, self.tamano_bloque)),
+                'vence': timezone.now() + self.vigencia
+            }
+            bloques[serie_documento.pk] = bloque
+        
+        return bloque['numeros'].popleft()
+    
+    def reservar(self, serie_documento, cantidad=1):
+        """Reserva números consecutivos de la serie en una transacción corta"""
+        with transaction.atomic():
+            # El UPDATE toma el bloqueo de la fila al inicio y lo libera al confirmar
+            actualizadas = SerieDocumento.objects.filter(
+                pk=serie_documento.pk,
+                numero_maximo__gte=F('numero_actual') + cantidad
+            ).update(numero_actual=F('numero_actual') + cantidad)
+            
+            if not actualizadas:
+                raise ValidationError(f"Se ha alcanzado el número máximo para la serie {serie_documento.serie}")
+            
+            ultimo = SerieDocumento.objects.filter(
+                pk=serie_documento.pk
+            ).values_list('numero_actual', flat=True).get()
+            numeros = list(range(ultimo - cantidad + 1, ultimo + 1))
+            
+            NumeroReservado.objects.bulk_create([
+                NumeroReservado(
+                    serie_documento_id=serie_documento.pk,
+                    numero=numero,
+                    reservado_por=self.trabajador
+                )
+                for numero in numeros
+            ])
+        
+        logger.debug(f"Reservados {serie_documento.serie} {numeros[0]}-{numeros[-1]} por {self.trabajador}")
+        return numeros
+    
+    @staticmethod
+    def confirmar(serie_documento, numero, documento):
+        """Marca el número como utilizado por el documento"""
+        actualizados = NumeroReservado.objects.filter(
+            serie_documento_id=serie_documento.pk,
+            numero=numero,
+            estado='reservado'
+        ).update(estado='utilizado', documento=documento, fecha_uso=timezone.now())
+        
+        if not actualizados:
+            raise ValidationError(f"El número {serie_documento.serie}-{numero:08d} no está reservado o fue anulado")
+    
+    @staticmethod
+    def anular(serie_documento, numeros, motivo):
+        """Anula números reservados que no se utilizarán"""
+        if not numeros:
+            return 0
+        
+        anulados = NumeroReservado.objects.filter(
+            serie_documento_id=serie_documento.pk,
+            numero__in=numeros,
+            estado='reservado'
+        ).update(estado='anulado', motivo_anulacion=motivo[:200], fecha_uso=timezone.now())
+        
+        logger.info(f"Anulados {anulados} números de la serie {serie_documento.serie}: {motivo}")
+        return anulados
+    
+    def liberar(self):
+        """Anula los números pendientes de los bloques del hilo actual"""
+        bloques = self._bloques_del_hilo()
+        anulados = 0
+        
+        for serie_id, bloque in list(bloques.items()):
+            if bloque['numeros']:
+                serie_documento = SerieDocumento.objects.only('id', 'serie').get(pk=serie_id)
+                anulados += self.anular(serie_documento, list(bloque['numeros']), 'Bloque de numeración liberado')
+            del bloques[serie_id]
+        
+        return anulados
+    
+    def anular_pendientes(self, antes_de=None, motivo='Número reservado no utilizado'):
+        """
+        Anula los números reservados antes de la fecha indicada que no se utilizaron
+        Retorna la lista de (serie, numero) anulados para el reporte a SUNAT
+        """
+        if antes_de is None:
+            antes_de = timezone.now() - self.vigencia
+        
+        with transaction.atomic():
+            pendientes = list(
+                NumeroReservado.objects.select_for_update(of=('self',)).filter(
+                    estado='reservado',
+                    fecha_creacion__lt=antes_de
+                ).order_by('serie_documento_id', 'numero').values_list('id', 'serie_documento__serie', 'numero')
+            )
+            if not pendientes:
+                return []
+            
+            NumeroReservado.objects.filter(
+                id__in=[id_reserva for id_reserva, _, _ in pendientes]
+            ).update(estado='anulado', motivo_anulacion=motivo[:200], fecha_uso=timezone.now())
+        
+        logger.info(f"Anulados {len(pendientes)} números reservados no utilizados")
+        return [(serie, numero) for _, serie, numero in pendientes]
+    
+    @classmethod
+    def _bloques_del_hilo(cls):
+        """Bloques de números reservados por el hilo actual, por id de serie"""
+        if not hasattr(cls._locales, 'bloques'):
+            cls._locales.bloques = {}
+        return cls._locales.bloques
@@ -0,0 +1,202 @@
+"""
+Tests de modelos de Facturación - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests del saldo pendiente y estado de pago mantenidos por los pagos
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from ..models import DocumentoElectronico, FormaPago, PagoDocumento, SerieDocumento, TipoDocumentoElectronico
+from ..services import ServicioFacturacion
+
+
+class TestSaldoPendienteDocumento(TestCase):
+    """Tests para total_pagado, saldo_pendiente y estado_pago de DocumentoElectronico"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.cliente = Cliente.objects.create(
+            tipo_documento=TipoDocumento.objects.create(codigo='6', nombre='RUC'),
+            numero_documento='20987654321',
+            razon_social='Cliente SAC',
+            direccion='Av. Cliente 456'
+        )
+        self.tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='01',
+            nombre='Factura',
+            nomenclatura='F',
+            serie_defecto='F001'
+        )
+        self.serie = SerieDocumento.objects.create(
+            sucursal=empresa.sucursales.first(),
+            tipo_documento=self.tipo_documento,
+            serie='F001'
+        )
+        self.forma_pago = FormaPago.objects.create(codigo='EFE', nombre='Efectivo', tipo='efectivo')
+        self.hoy = timezone.localdate()
+    
+    def _crear_documento(self, numero, dias_vencimiento=None, **kwargs):
+        """Crea una factura emitida de 118.00"""
+        fecha_vencimiento = self.hoy + timedelta(days=dias_vencimiento) if dias_vencimiento is not None else None
+        return DocumentoElectronico.objects.create(
+            tipo_documento=self.tipo_documento,
+            serie_documento=self.serie,
+            numero=numero,
+            cliente=self.cliente,
+            cliente_tipo_documento='6',
+            cliente_numero_documento=self.cliente.numero_documento,
+            cliente_razon_social=self.cliente.razon_social,
+            cliente_direccion=self.cliente.direccion,
+            fecha_vencimiento=fecha_vencimiento,
+            estado='emitido',
+            total=Decimal('118.00'),
+            **kwargs
+        )
+    
+    def _pagar(self, documento, monto):
+        return PagoDocumento.objects.create(
+            documento=documento,
+            forma_pago=self.forma_pago,
+            monto=Decimal(monto)
+        )
+    
+    def test_documento_nuevo_pendiente(self):
+        """Test un documento sin pagos queda pendiente por su total"""
+        documento = self._crear_documento(1)
+        documento.refresh_from_db()
+        
+        self.assertEqual(documento.total_pagado, Decimal('0.00'))
+        self.assertEqual(documento.saldo_pendiente, Decimal('118.00'))
+        self.assertEqual(documento.estado_pago, 'pendiente')
+    
+    def test_pagos_actualizan_saldo_y_estado(self):
+        """Test cada pago suma al total pagado y recalcula el estado"""
+        documento = self._crear_documento(1)
+        
+        self._pagar(documento, '50.00')
+        documento.refresh_from_db()
+        self.assertEqual(documento.total_pagado, Decimal('50.00'))
+        self.assertEqual(documento.saldo_pendiente, Decimal('68.00'))
+        self.assertEqual(documento.estado_pago, 'parcial')
+        
+        self._pagar(documento, '68.00')
+        documento.refresh_from_db()
+        self.assertEqual(documento.saldo_pendiente, Decimal('0.00'))
+        self.assertEqual(documento.estado_pago, 'pagado')
+    
+    def test_anular_pago_revierte_una_sola_vez(self):
+        """Test anular un pago descuenta su monto y anularlo de nuevo no cambia nada"""
+        documento = self._crear_documento(1)
+        self._pagar(documento, '50.00')
+        pago = self._pagar(documento, '68.00')
+        
+        pago.anular('Cheque sin fondos')
+        PagoDocumento.objects.get(pk=pago.pk).anular()
+        
+        documento.refresh_from_db()
+        self.assertEqual(documento.total_pagado, Decimal('50.00'))
+        self.assertEqual(documento.saldo_pendiente, Decimal('68.00'))
+        self.assertEqual(documento.estado_pago, 'parcial')
+        
+        pago.restaurar()
+        documento.refresh_from_db()
+        self.assertEqual(documento.estado_pago, 'pagado')
+    
+    def test_modificar_pago_aplica_diferencia(self):
+        """Test editar monto, estado o documento de un pago guardado ajusta los totales pagados"""
+        documento = self._crear_documento(1)
+        otro_documento = self._crear_documento(2)
+        pago = self._pagar(documento, '50.00')
+        
+        pago.monto = Decimal('118.00')
+        pago.save()
+        documento.refresh_from_db()
+        self.assertEqual(documento.total_pagado, Decimal('118.00'))
+        self.assertEqual(documento.estado_pago, 'pagado')
+        
+        pago.activo = False
+        pago.save(update_fields=['activo'])
+        documento.refresh_from_db()
+        self.assertEqual(documento.total_pagado, Decimal('0.00'))
+        
+        pago.activo = True
+        pago.documento = otro_documento
+        pago.save()
+        documento.refresh_from_db()
+        otro_documento.refresh_from_db()
+        self.assertEqual(documento.total_pagado, Decimal('0.00'))
+        self.assertEqual(otro_documento.total_pagado, Decimal('118.00'))
+        
+        # Guardar campos que no afectan el saldo no vuelve a leer el pago
+        pago.observaciones = 'Depósito conciliado'
+        with self.assertNumQueries(1):
+            pago.save(update_fields=['observaciones'])
+    
+    def test_eliminar_pago_desactualizado_no_descuenta_dos_veces(self):
+        """Test eliminar una instancia de un pago anulado en otra solicitud no vuelve a descontarlo"""
+        documento = self._crear_documento(1)
+        self._pagar(documento, '50.00')
+        pago = self._pagar(documento, '68.00')
+        
+        PagoDocumento.objects.get(pk=pago.pk).anular('Cheque sin fondos')
+        pago.delete()
+        
+        documento.refresh_from_db()
+        self.assertEqual(documento.total_pagado, Decimal('50.00'))
+        
+        # Otra solicitud sube el monto a 30.00: se descuenta el monto guardado, no el de la instancia
+        otro = self._pagar(documento, '20.00')
+        PagoDocumento.objects.filter(pk=otro.pk).update(monto=Decimal('30.00'))
+        DocumentoElectronico.registrar_pago(documento.pk, Decimal('10.00'))
+        otro.delete()
+        
+        documento.refresh_from_db()
+        self.assertEqual(documento.total_pagado, Decimal('50.00'))
+    
+    def test_recalculo_de_totales_conserva_lo_pagado(self):
+        """Test al recalcular totales el saldo usa el total pagado de la base de datos"""
+        documento = self._crear_documento(1)
+        self._pagar(documento, '118.00')
+        
+        # Instancia sin refrescar: total_pagado en memoria sigue en cero
+        documento.total = Decimal('236.00')
+        documento.guardar_totales()
+        
+        documento.refresh_from_db()
+        self.assertEqual(documento.total, Decimal('236.00'))
+        self.assertEqual(documento.saldo_pendiente, Decimal('118.00'))
+        self.assertEqual(documento.estado_pago, 'parcial')
+    
+    def test_antiguedad_saldos_por_tramos(self):
+        """Test la antigüedad de saldos agrupa los saldos pendientes por días vencidos"""
+        self._crear_documento(1, dias_vencimiento=5)
+        self._crear_documento(2, dias_vencimiento=-10)
+        self._pagar(self._crear_documento(3, dias_vencimiento=-45), '18.00')
+        self._crear_documento(4, dias_vencimiento=-120)
+        self._pagar(self._crear_documento(5, dias_vencimiento=-10), '118.00')
+        self._crear_documento(6, dias_vencimiento=-10, activo=False)
+        
+        with self.assertNumQueries(1):
+            resultado = ServicioFacturacion.antiguedad_saldos(self.hoy)
+        
+        self.assertEqual(resultado['documentos'], 4)
+        self.assertEqual(resultado['total'], Decimal('454.00'))
+        self.assertEqual(resultado['por_vencer'], Decimal('118.00'))
+        self.assertEqual(resultado['vencido_1_30'], Decimal('118.00'))
+        self.assertEqual(resultado['vencido_31_60'], Decimal('100.00'))
+        self.assertEqual(resultado['vencido_61_90'], Decimal('0.00'))
+        self.assertEqual(resultado['vencido_mas_90'], Decimal('118.00'))
@@ -0,0 +1,249 @@
+"""
+Tests de serializers de Facturación - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests para la creación masiva de detalles de documentos y su salida de inventario
+"""
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from decimal import Decimal
+from unittest.mock import patch
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from aplicaciones.integraciones.models import ColaEnvioSunat
+from aplicaciones.inventario.models import Almacen, ConsumoLote, LoteProducto, StockProducto
+from aplicaciones.productos.models import Categoria, Producto, TipoProducto
+from ..models import DetalleDocumento, DocumentoElectronico, SerieDocumento, TipoDocumentoElectronico
+from ..serializers import DocumentoElectronicoCreateSerializer
+
+
+class TestCreacionMasivaDetalles(TestCase):
+    """Tests para DocumentoElectronicoCreateSerializer.create con muchos detalles"""
+
+    def setUp(self):
+        """Configuración inicial para tests"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.sucursal = empresa.sucursales.first()
+
+        tipo_doc_cliente = TipoDocumento.objects.create(codigo='1', nombre='DNI')
+        self.cliente = Cliente.objects.create(
+            tipo_documento=tipo_doc_cliente,
+            numero_documento='45678912',
+            razon_social='Juan Pérez',
+            direccion='Av. Cliente 456'
+        )
+
+        self.tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        self.serie = SerieDocumento.objects.create(
+            sucursal=self.sucursal,
+            tipo_documento=self.tipo_documento,
+            serie='B001'
+        )
+
+        tipo_producto = TipoProducto.objects.create(codigo='BIEN', nombre='Bien')
+        categoria = Categoria.objects.create(codigo='GEN', nombre='General')
+        self.productos = [
+            Producto.objects.create(
+                codigo=f'P{indice:03d}',
+                nombre=f'Producto {indice}',
+                tipo_producto=tipo_producto,
+                categoria=categoria,
+                precio_compra=Decimal('5.0000'),
+                precio_venta=Decimal('10.3333'),
+                stock_actual=Decimal('100000.0000'),
+                tipo_afectacion_igv='10' if indice % 3 else '20'
+            )
+            for indice in range(3)
+        ]
+
+    def _datos_documento(self, cantidad_lineas):
+        """Arma datos validados para un documento con N líneas"""
+        detalles = []
+        for numero in range(1, cantidad_lineas + 1):
+            producto = self.productos[numero % len(self.productos)]
+            detalles.append({
+                'numero_item': numero,
+                'producto': producto,
+                'cantidad': Decimal('1.5000'),
+                'precio_unitario': producto.precio_venta,
+                'descuento_porcentaje': Decimal('2.50') if numero % 2 else Decimal('0.00'),
+            })
+
+        return {
+            'tipo_documento': self.tipo_documento,
+            'serie_documento': self.serie,
+            'cliente': self.cliente,
+            'detalles_data': detalles,
+        }
+
+    def _crear_documento(self, cantidad_lineas):
+        """Crea un documento midiendo las consultas ejecutadas"""
+        datos = self._datos_documento(cantidad_lineas)
+        self.serie.refresh_from_db()
+
+        with CaptureQueriesContext(connection) as consultas:
+            documento = DocumentoElectronicoCreateSerializer().create(datos)
+
+        # Las inserciones de detalles se parten en lotes según el motor (SQLite limita variables)
+        tabla_detalles = DetalleDocumento._meta.db_table
+        inserciones = [q for q in consultas if q['sql'].startswith('INSERT') and tabla_detalles in q['sql']]
+        return documento, len(consultas) - len(inserciones), len(inserciones)
+
+    def test_consultas_constantes_documento_500_lineas(self):
+        """Test benchmark: un documento de 500 líneas usa las mismas consultas que uno de 5"""
+        _, consultas_pequeno, _ = self._crear_documento(5)
+        documento, consultas_grande, inserciones = self._crear_documento(500)
+
+        campos = [campo for campo in DetalleDocumento._meta.concrete_fields if not campo.primary_key]
+        lote = connection.ops.bulk_batch_size(campos, list(documento.detalles.all())) or 500
+        self.assertEqual(documento.detalles.count(), 500)
+        self.assertEqual(consultas_grande, consultas_pequeno)
+        self.assertEqual(inserciones, -(-500 // lote))
+
+    def test_encola_envio_en_la_transaccion(self):
+        """Test el envío a SUNAT queda en la cola junto con el documento; si falla, no se crea el documento"""
+        documento, _, _ = self._crear_documento(3)
+        self.assertEqual(
+            list(ColaEnvioSunat.objects.filter(documento_electronico=documento).values_list('tipo_operacion', 'estado')),
+            [('emision', 'pendiente')]
+        )
+
+        with patch.object(ColaEnvioSunat, 'encolar', side_effect=RuntimeError('cola no disponible')):
+            with self.assertRaises(RuntimeError):
+                self._crear_documento(3)
+        self.assertEqual(DocumentoElectronico.objects.count(), 1)
+
+    def test_totales_iguales_a_guardado_por_linea(self):
+        """Test los totales coinciden con los de guardar cada detalle por separado"""
+        documento, _, _ = self._crear_documento(40)
+        documento.refresh_from_db()
+
+        referencia = DocumentoElectronico.objects.create(
+            tipo_documento=self.tipo_documento,
+            serie_documento=self.serie,
+            numero=999,
+            cliente=self.cliente,
+            cliente_tipo_documento='1',
+            cliente_numero_documento=self.cliente.numero_documento,
+            cliente_razon_social=self.cliente.razon_social,
+            cliente_direccion=self.cliente.direccion
+        )
+        for detalle in documento.detalles.all():
+            DetalleDocumento.objects.create(
+                documento=referencia,
+                numero_item=detalle.numero_item,
+                producto=detalle.producto,
+                codigo_producto=detalle.codigo_producto,
+                descripcion=detalle.descripcion,
+                unidad_medida=detalle.unidad_medida,
+                cantidad=detalle.cantidad,
+                precio_unitario=detalle.precio_unitario,
+                descuento_porcentaje=detalle.descuento_porcentaje,
+                tipo_afectacion_igv=detalle.tipo_afectacion_igv
+            )
+        referencia.refresh_from_db()
+
+        for campo in ['subtotal', 'total_descuentos', 'base_imponible', 'igv', 'total_exonerado', 'total']:
+            self.assertEqual(getattr(documento, campo), getattr(referencia, campo), campo)
+
+    def test_afecta_inventario_por_producto(self):
+        """Test el stock y las estadísticas de venta se actualizan por producto"""
+        self._crear_documento(9)
+
+        for producto in self.productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock_actual, Decimal('99995.5000'))
+            self.assertEqual(producto.total_vendido, Decimal('4.5000'))
+            self.assertEqual(producto.numero_ventas, 3)
+
+    def _crear_stock_con_lotes(self, producto):
+        """Stock de 12 unidades en el almacén de la sucursal: lote L1 2 x 4.00 y lote L2 10 x 6.00"""
+        almacen = Almacen.objects.create(codigo='ALM01', nombre='Almacén Principal', sucursal=self.sucursal)
+        StockProducto.objects.create(
+            producto=producto,
+            almacen=almacen,
+            cantidad_actual=Decimal('12.0000'),
+            valor_costo=Decimal('68.0000'),
+            costo_promedio=Decimal('5.6667')
+        )
+        lotes = [
+            LoteProducto.objects.create(
+                producto=producto,
+                almacen=almacen,
+                numero_lote=numero_lote,
+                cantidad_inicial=cantidad,
+                cantidad_actual=cantidad,
+                costo_unitario=costo_unitario
+            )
+            for numero_lote, cantidad, costo_unitario in [
+                ('L1', Decimal('2.0000'), Decimal('4.0000')),
+                ('L2', Decimal('10.0000'), Decimal('6.0000')),
+            ]
+        ]
+        return almacen, lotes
+
+    def test_salida_consume_lotes_peps(self):
+        """Test al crear el documento se consumen los lotes PEPS y su costo queda por línea"""
+        producto = self.productos[0]
+        almacen, lotes = self._crear_stock_con_lotes(producto)
+
+        documento, _, _ = self._crear_documento(9)
+
+        consumos = ConsumoLote.objects.filter(documento_electronico=documento).order_by(
+            'detalle_documento__numero_item', 'lote__numero_lote'
+        )
+        self.assertEqual(
+            [(consumo.detalle_documento.numero_item, consumo.lote.numero_lote, consumo.cantidad) for consumo in consumos],
+            [
+                (3, 'L1', Decimal('1.5000')),
+                (6, 'L1', Decimal('0.5000')),
+                (6, 'L2', Decimal('1.0000')),
+                (9, 'L2', Decimal('1.5000')),
+            ]
+        )
+        for lote, cantidad in zip(lotes, [Decimal('0.0000'), Decimal('7.5000')]):
+            lote.refresh_from_db()
+            self.assertEqual(lote.cantidad_actual, cantidad)
+        stock = StockProducto.objects.get(producto=producto, almacen=almacen)
+        self.assertEqual(stock.cantidad_actual, Decimal('7.5000'))
+        self.assertEqual(stock.valor_costo, Decimal('45.0000'))
+
+        # El costo de venta usa los lotes consumidos: 2 x 4.00 + 2.5 x 6.00
+        self.assertEqual(ConsumoLote.costos_por_documento([documento.id]), {documento.id: Decimal('23.00')})
+
+    def test_anular_reversa_lotes_y_stock(self):
+        """Test al anular el documento los lotes, el stock y su valor vuelven a los de antes de la venta"""
+        producto = self.productos[0]
+        almacen, lotes = self._crear_stock_con_lotes(producto)
+        stock_producto = Producto.objects.get(pk=producto.pk).stock_actual
+
+        documento, _, _ = self._crear_documento(9)
+        documento.anular('Error en la venta')
+
+        for lote, cantidad, costo_unitario in zip(
+            lotes, [Decimal('2.0000'), Decimal('10.0000')], [Decimal('4.0000'), Decimal('6.0000')]
+        ):
+            lote.refresh_from_db()
+            self.assertEqual((lote.cantidad_actual, lote.costo_unitario), (cantidad, costo_unitario))
+        stock = StockProducto.objects.get(producto=producto, almacen=almacen)
+        self.assertEqual(
+            (stock.cantidad_actual, stock.valor_costo, stock.costo_promedio),
+            (Decimal('12.0000'), Decimal('68.0000'), Decimal('5.6667'))
+        )
+        self.assertEqual(Producto.objects.get(pk=producto.pk).stock_actual, stock_producto)
+        self.assertFalse(ConsumoLote.objects.filter(documento_electronico=documento).exists())
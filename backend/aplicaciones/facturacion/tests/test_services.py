@@ -0,0 +1,160 @@
+"""
+Tests de services de Facturación - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests del asignador de numeración con hilos concurrentes
+"""
+
+import threading
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.test import TransactionTestCase
+from django.utils import timezone
+from decimal import Decimal
+from io import StringIO
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from aplicaciones.productos.models import Categoria, Producto, TipoProducto
+from ..models import DocumentoElectronico, NumeroReservado, SerieDocumento, TipoDocumentoElectronico
+from ..serializers import DocumentoElectronicoCreateSerializer
+from ..services import AsignadorNumeracion
+
+
+class TestAsignadorNumeracion(TransactionTestCase):
+    """Tests para AsignadorNumeracion"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        self.serie = SerieDocumento.objects.create(
+            sucursal=empresa.sucursales.first(),
+            tipo_documento=self.tipo_documento,
+            serie='B001'
+        )
+        self.cliente = Cliente.objects.create(
+            tipo_documento=TipoDocumento.objects.create(codigo='1', nombre='DNI'),
+            numero_documento='45678912',
+            razon_social='Juan Pérez',
+            direccion='Av. Cliente 456'
+        )
+    
+    def tearDown(self):
+        AsignadorNumeracion().liberar()
+    
+    def _trabajador(self, indice, cantidad, tamano_bloque, asignados, errores):
+        """Asigna y confirma números desde un hilo, liberando su bloque al final"""
+        asignador = AsignadorNumeracion(tamano_bloque=tamano_bloque, trabajador=f'hilo-{indice}')
+        try:
+            for _ in range(cantidad):
+                numero = asignador.asignar(self.serie)
+                asignador.confirmar(self.serie, numero, None)
+                asignados.append(numero)
+            asignador.liberar()
+        except Exception as e:
+            errores.append(e)
+        finally:
+            close_old_connections()
+    
+    def test_hilos_concurrentes_sin_duplicados_ni_saltos(self):
+        """Test varios hilos asignan números únicos y los no usados quedan anulados"""
+        asignados, errores = [], []
+        hilos = [
+            threading.Thread(target=self._trabajador, args=(indice, 20, 7, asignados, errores))
+            for indice in range(6)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        
+        self.assertEqual(errores, [])
+        self.assertEqual(len(asignados), 120)
+        self.assertEqual(len(set(asignados)), 120)
+        
+        # Cada hilo reservó 3 bloques de 7 y dejó 1 número sin usar
+        self.serie.refresh_from_db()
+        self.assertEqual(self.serie.numero_actual, 126)
+        
+        estados = dict(NumeroReservado.objects.values_list('numero', 'estado'))
+        self.assertEqual(sorted(estados), list(range(1, 127)))
+        self.assertEqual(sorted(n for n, e in estados.items() if e == 'utilizado'), sorted(asignados))
+        self.assertEqual(sum(1 for e in estados.values() if e == 'anulado'), 6)
+        self.assertNotIn('reservado', estados.values())
+    
+    def test_dentro_de_transaccion_no_guarda_bloque(self):
+        """Test dentro de una transacción abierta solo se reserva el número necesario"""
+        from django.db import transaction
+        
+        asignador = AsignadorNumeracion(tamano_bloque=10)
+        with transaction.atomic():
+            self.assertEqual(asignador.asignar(self.serie), 1)
+        self.assertEqual(asignador.asignar(self.serie), 2)
+        self.assertEqual(asignador.asignar(self.serie), 3)
+        
+        self.serie.refresh_from_db()
+        self.assertEqual(self.serie.numero_actual, 11)
+    
+    def test_creacion_documento_confirma_o_anula_numero(self):
+        """Test el serializer confirma el número usado y anula el de un documento fallido"""
+        producto = Producto.objects.create(
+            codigo='P001',
+            nombre='Producto 1',
+            tipo_producto=TipoProducto.objects.create(codigo='BIEN', nombre='Bien'),
+            categoria=Categoria.objects.create(codigo='GEN', nombre='General'),
+            precio_compra=Decimal('5.0000'),
+            precio_venta=Decimal('10.0000'),
+            stock_actual=Decimal('100.0000')
+        )
+        datos = {
+            'tipo_documento': self.tipo_documento,
+            'serie_documento': self.serie,
+            'cliente': self.cliente,
+            'detalles_data': [{
+                'numero_item': 1,
+                'producto': producto,
+                'cantidad': Decimal('1.0000'),
+                'precio_unitario': producto.precio_venta,
+            }],
+        }
+        
+        documento = DocumentoElectronicoCreateSerializer().create(dict(datos))
+        
+        with self.assertRaises(AttributeError):
+            DocumentoElectronicoCreateSerializer().create(dict(datos, detalles_data=[{'producto': None}]))
+        
+        self.assertEqual(documento.numero, 1)
+        self.assertEqual(DocumentoElectronico.objects.count(), 1)
+        
+        reservas = {reserva.numero: reserva for reserva in NumeroReservado.objects.all()}
+        self.assertEqual(reservas[1].estado, 'utilizado')
+        self.assertEqual(reservas[1].documento_id, documento.id)
+        self.assertEqual(reservas[2].estado, 'anulado')
+        self.assertIn('Error al crear documento', reservas[2].motivo_anulacion)
+    
+    def test_comando_anula_reservas_vencidas(self):
+        """Test el comando anula las reservas antiguas y lista los números"""
+        AsignadorNumeracion(tamano_bloque=3).reservar(self.serie, 3)
+        NumeroReservado.objects.filter(numero__lte=2).update(
+            fecha_creacion=timezone.now() - timezone.timedelta(days=2)
+        )
+        
+        salida = StringIO()
+        call_command('anular_numeracion_pendiente', '--horas', '24', stdout=salida)
+        
+        self.assertIn('B001-00000001', salida.getvalue())
+        self.assertIn('Números anulados: 2', salida.getvalue())
+        self.assertEqual(NumeroReservado.objects.get(numero=3).estado, 'reservado')
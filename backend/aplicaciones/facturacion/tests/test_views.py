@@ -0,0 +1,199 @@
+"""
+Tests de views de Facturación - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests del listado de documentos: estado de pago y paginación
+"""
+
+import io
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from aplicaciones.usuarios.models import Rol, Usuario
+from ..models import DocumentoElectronico, FormaPago, PagoDocumento, SerieDocumento, TipoDocumentoElectronico
+from ..views import DocumentoElectronicoViewSet
+
+
+class TestListadoDocumentos(TestCase):
+    """Tests para DocumentoElectronicoViewSet.list"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        cache.clear()
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.usuario = Usuario.objects.create_user(
+            email='admin@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Administrador',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Administrador', codigo='administrador')
+        )
+        self.cliente = Cliente.objects.create(
+            tipo_documento=TipoDocumento.objects.create(codigo='1', nombre='DNI'),
+            numero_documento='45678912',
+            razon_social='Juan Pérez',
+            direccion='Av. Cliente 456'
+        )
+        self.tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        self.serie = SerieDocumento.objects.create(
+            sucursal=empresa.sucursales.first(),
+            tipo_documento=self.tipo_documento,
+            serie='B001'
+        )
+        self.forma_pago = FormaPago.objects.create(codigo='EFE', nombre='Efectivo', tipo='efectivo')
+        self.vista = DocumentoElectronicoViewSet.as_view({'get': 'list'})
+    
+    def _crear_documentos(self, desde, cantidad, pagos=()):
+        """Crea boletas de 118.00 con los pagos indicados"""
+        for numero in range(desde, desde + cantidad):
+            documento = DocumentoElectronico.objects.create(
+                tipo_documento=self.tipo_documento,
+                serie_documento=self.serie,
+                numero=numero,
+                cliente=self.cliente,
+                cliente_tipo_documento='1',
+                cliente_numero_documento=self.cliente.numero_documento,
+                cliente_razon_social=self.cliente.razon_social,
+                cliente_direccion=self.cliente.direccion,
+                total=Decimal('118.00')
+            )
+            for monto, activo in pagos:
+                PagoDocumento.objects.create(
+                    documento=documento,
+                    forma_pago=self.forma_pago,
+                    monto=Decimal(monto),
+                    activo=activo
+                )
+    
+    def _listar(self, **parametros):
+        solicitud = APIRequestFactory().get('/api/facturacion/documentos/', parametros)
+        force_authenticate(solicitud, user=self.usuario)
+        return self.vista(solicitud)
+    
+    def test_estado_pago_desde_total_anotado(self):
+        """Test el estado de pago considera solo los pagos activos"""
+        self._crear_documentos(1, 1)
+        self._crear_documentos(2, 1, pagos=[('50.00', True), ('68.00', False)])
+        self._crear_documentos(3, 1, pagos=[('100.00', True), ('18.00', True)])
+        
+        respuesta = self._listar()
+        
+        self.assertEqual(respuesta.status_code, 200)
+        estados = {documento['numero_completo']: documento['estado_pago'] for documento in respuesta.data['results']}
+        self.assertEqual(estados, {
+            'B001-00000001': 'PENDIENTE',
+            'B001-00000002': 'PARCIAL',
+            'B001-00000003': 'PAGADO',
+        })
+    
+    def test_consultas_constantes_por_pagina(self):
+        """Test el listado usa las mismas consultas con 2 o 12 documentos con pagos"""
+        self._crear_documentos(1, 2, pagos=[('50.00', True)])
+        
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self._listar().data['results']), 2)
+        
+        self._crear_documentos(3, 10, pagos=[('50.00', True), ('68.00', True)])
+        
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self._listar().data['results']), 12)
+    
+    def test_paginacion_keyset_recorre_sin_repetir(self):
+        """Test con cursor se recorren todas las páginas en orden, con empates de fecha, sin COUNT"""
+        self._crear_documentos(1, 7)
+        # Empates en fecha_emision: el id desempata
+        fecha = timezone.now()
+        DocumentoElectronico.objects.filter(numero__in=[2, 3, 4]).update(fecha_emision=fecha)
+        DocumentoElectronico.objects.filter(numero__in=[5, 6, 7]).update(fecha_emision=fecha - timezone.timedelta(days=1))
+        DocumentoElectronico.objects.filter(numero=1).update(fecha_emision=fecha + timezone.timedelta(days=1))
+        esperados = list(
+            DocumentoElectronico.objects.order_by('-fecha_emision', '-id').values_list('numero_completo', flat=True)
+        )
+        
+        vistos = []
+        parametros = {'cursor': '', 'page_size': 3}
+        while True:
+            # Página y un aggregate() limitado a sus filas: sin COUNT(*) ni totales de todo el historial
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self._listar(**parametros)
+            self.assertEqual(len(consultas), 2)
+            self.assertIn(' IN (', consultas[1]['sql'])
+            self.assertNotIn('count', respuesta.data)
+            self.assertNotIn('totales_filtro', respuesta.data)
+            self.assertEqual(
+                respuesta.data['totales_pagina']['total_general'],
+                str(Decimal('118.00') * len(respuesta.data['results']))
+            )
+            vistos.extend(documento['numero_completo'] for documento in respuesta.data['results'])
+            if not respuesta.data['next']:
+                break
+            parametros = {clave: valor[0] for clave, valor in parse_qs(urlparse(respuesta.data['next']).query).items()}
+        
+        self.assertEqual(vistos, esperados)
+        
+        # Volver una página desde la última
+        parametros = {clave: valor[0] for clave, valor in parse_qs(urlparse(respuesta.data['previous']).query).items()}
+        anterior = self._listar(**parametros)
+        self.assertEqual([documento['numero_completo'] for documento in anterior.data['results']], esperados[3:6])
+        self.assertTrue(anterior.data['has_next'])
+    
+    def test_paginacion_keyset_totales_filtro_a_pedido(self):
+        """Test con cursor los totales del filtro se calculan solo con ?totales_filtro=true"""
+        self._crear_documentos(1, 7)
+        
+        # Página y un solo aggregate() para los totales de página y filtro
+        with self.assertNumQueries(2):
+            respuesta = self._listar(cursor='', page_size=3, totales_filtro='true')
+        
+        self.assertEqual(respuesta.data['totales_filtro']['total_general'], '826.00')
+        self.assertEqual(respuesta.data['totales_pagina']['total_general'], '354.00')
+    
+    def test_paginacion_keyset_cursor_invalido(self):
+        """Test un cursor manipulado responde 404"""
+        self.assertEqual(self._listar(cursor='no-es-un-cursor').status_code, 404)
+    
+    def test_sin_cursor_mantiene_paginacion_por_pagina(self):
+        """Test sin cursor se conserva la respuesta con count y número de página"""
+        self._crear_documentos(1, 2)
+        
+        respuesta = self._listar()
+        
+        self.assertEqual(respuesta.data['count'], 2)
+        self.assertEqual(respuesta.data['current_page'], 1)
+    
+    def test_exportar_documentos_xlsx(self):
+        """Test la exportación XLSX incluye los documentos filtrados con su saldo"""
+        self._crear_documentos(1, 3, pagos=[('18.00', True)])
+        vista = DocumentoElectronicoViewSet.as_view({'get': 'exportar'})
+        solicitud = APIRequestFactory().get('/api/facturacion/documentos/exportar/', {'formato': 'xlsx'})
+        force_authenticate(solicitud, user=self.usuario)
+        
+        with self.assertNumQueries(1):
+            contenido = b''.join(vista(solicitud).streaming_content)
+        
+        filas = list(load_workbook(io.BytesIO(contenido), read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[1][1], 'B001-00000003')
+        self.assertEqual(filas[1][-3:], (100, 'PARCIAL', 'borrador'))
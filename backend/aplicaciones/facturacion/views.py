@@ -24,8 +24,9 @@ from .serializers import (
     FormaPagoSerializer, EstadisticasFacturacionSerializer,
     AnulacionDocumentoSerializer
 )
-from aplicaciones.core.permissions import PuedeVerFacturacion, PuedeEditarFacturacion
-from aplicaciones.core.pagination import PaginacionEstandar
+from aplicaciones.core.permissions import PuedeVerFacturacion, PuedeEditarFacturacion, PuedeVerReportes
+from aplicaciones.core.pagination import PaginacionEstandar, obtener_paginacion_por_vista
+from aplicaciones.reportes.exporters import ExportacionMixin
 
 logger = logging.getLogger(__name__)
 
@@ -62,10 +63,11 @@ class FormaPagoViewSet(viewsets.ModelViewSet):
     pagination_class = None
 
 
-class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
-    queryset = DocumentoElectronico.objects.select_related(
-        'tipo_documento', 'serie_documento', 'cliente', 'vendedor'
-    ).prefetch_related('detalles', 'pagos').filter(activo=True)
+class DocumentoElectronicoViewSet(ExportacionMixin, viewsets.ModelViewSet):
+    queryset = DocumentoElectronico.objects.filter(activo=True)
+    
+    # Acciones que usan DocumentoElectronicoListSerializer
+    ACCIONES_LISTADO = ['list', 'busqueda_avanzada', 'documentos_pendientes']
     
     permission_classes = [IsAuthenticated, PuedeVerFacturacion]
     pagination_class = PaginacionEstandar
@@ -85,6 +87,42 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
     ordering_fields = ['fecha_emision', 'numero', 'total', 'cliente_razon_social']
     ordering = ['-fecha_emision', '-numero']
     
+    # Orden de la paginación keyset; con ?cursor= se evitan COUNT(*) y OFFSET en historiales largos
+    ordenamiento_keyset = ('-fecha_emision', '-id')
+    
+    # Totales de página y del filtro con aggregate() en la paginación que los soporte;
+    # con ?cursor= los del filtro solo se calculan si se piden con ?totales_filtro=true
+    totales_en_bd = True
+    
+    # Acción exportar de ExportacionMixin: nombre del archivo y columnas (campo, título[, formateador])
+    NOMBRE_EXPORTACION = 'documentos'
+    exportacion_descendente = True
+    COLUMNAS_EXPORTACION = [
+        ('tipo_documento__nombre', 'Tipo Documento'),
+        ('numero_completo', 'Número'),
+        ('fecha_emision', 'Fecha Emisión'),
+        ('fecha_vencimiento', 'Fecha Vencimiento'),
+        ('cliente_numero_documento', 'Documento Cliente'),
+        ('cliente_razon_social', 'Cliente'),
+        ('moneda', 'Moneda'),
+        ('subtotal', 'Subtotal'),
+        ('igv', 'IGV'),
+        ('total', 'Total'),
+        ('total_pagado', 'Pagado'),
+        ('saldo_pendiente', 'Saldo'),
+        ('estado_pago', 'Estado Pago', str.upper),
+        ('estado', 'Estado'),
+    ]
+    
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request is not None and 'cursor' in self.request.query_params:
+                self._paginator = obtener_paginacion_por_vista('documento', keyset=True)()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+    
     def get_serializer_class(self):
         if self.action == 'list':
             return DocumentoElectronicoListSerializer
@@ -95,6 +133,8 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update']:
             permission_classes = [IsAuthenticated, PuedeEditarFacturacion]
+        elif self.action == 'exportar':
+            permission_classes = [IsAuthenticated, PuedeVerReportes]
         else:
             permission_classes = [IsAuthenticated, PuedeVerFacturacion]
         return [permission() for permission in permission_classes]
@@ -107,36 +147,29 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
         if hasattr(user, 'rol') and user.rol.codigo == 'vendedor':
             queryset = queryset.filter(vendedor=user)
         
-        return queryset
+        if self.action in self.ACCIONES_LISTADO:
+            # Listados: el estado de pago está en el documento, sin precargar detalles ni pagos
+            return queryset.select_related('tipo_documento')
+        
+        return queryset.select_related(
+            'tipo_documento', 'serie_documento', 'cliente', 'vendedor'
+        ).prefetch_related('detalles', 'pagos')
     
     def perform_create(self, serializer):
         try:
-            # Asignar vendedor automáticamente
+            # Asignar vendedor automáticamente; el serializer encola el envío a SUNAT en la misma transacción
             documento = serializer.save(vendedor=self.request.user)
             
-            # Enviar a SUNAT automáticamente
-            self._enviar_sunat(documento)
-            
             logger.info(f"Documento creado: {documento.numero_completo} por {self.request.user.username}")
         except Exception as e:
             logger.error(f"Error creando documento: {str(e)}")
             raise
     
     def _enviar_sunat(self, documento):
-        """Envío automático a SUNAT via Nubefact"""
-        try:
-            from aplicaciones.integraciones.services.nubefact import NubefactService
-            
-            nubefact = NubefactService()
-            resultado = nubefact.enviar_documento(documento)
-            
-            if resultado['exitoso']:
-                documento.estado = 'enviado_sunat'
-                documento.fecha_envio_sunat = timezone.now()
-                documento.save(update_fields=['estado', 'fecha_envio_sunat'])
-            
-        except Exception as e:
-            logger.error(f"Error enviando a SUNAT: {str(e)}")
+        """Encola el envío a SUNAT via Nubefact sin esperar la respuesta"""
+        from aplicaciones.integraciones.models import ColaEnvioSunat
+        
+        ColaEnvioSunat.encolar(documento, 'emision')
     
     @action(detail=False, methods=['post'])
     def busqueda_avanzada(self, request):
@@ -178,15 +211,9 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
         if data.get('vendedor'):
             queryset = queryset.filter(vendedor_id=data['vendedor'])
         
-        # Estado de pago
-        estado_pago = data.get('estado_pago')
-        if estado_pago:
-            if estado_pago == 'pendiente':
-                queryset = queryset.filter(pagos__isnull=True)
-            elif estado_pago == 'pagado':
-                queryset = queryset.annotate(
-                    total_pagado=Sum('pagos__monto')
-                ).filter(total_pagado__gte=F('total'))
+        # Estado de pago (columna mantenida por los pagos)
+        if data.get('estado_pago'):
+            queryset = queryset.filter(estado_pago=data['estado_pago'])
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -225,15 +252,10 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Error interno'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     def _enviar_comunicacion_baja(self, documento):
-        """Enviar comunicación de baja a SUNAT"""
-        try:
-            from aplicaciones.integraciones.services.nubefact import NubefactService
-            
-            nubefact = NubefactService()
-            nubefact.enviar_comunicacion_baja(documento)
-            
-        except Exception as e:
-            logger.error(f"Error enviando comunicación de baja: {str(e)}")
+        """Encola la comunicación de baja a SUNAT dentro de la transacción de la anulación"""
+        from aplicaciones.integraciones.models import ColaEnvioSunat
+        
+        ColaEnvioSunat.encolar(documento, 'comunicacion_baja')
     
     @action(detail=True, methods=['get'])
     def pdf(self, request, pk=None):
@@ -265,7 +287,7 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
         
         try:
             self._enviar_sunat(documento)
-            return Response({'message': 'Documento reenviado a SUNAT'})
+            return Response({'message': 'Documento encolado para reenvío a SUNAT'})
         
         except Exception as e:
             logger.error(f"Error reenviando a SUNAT: {str(e)}")
@@ -329,7 +351,8 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
             # Documentos vencidos
             documentos_vencidos = queryset.filter(
                 fecha_vencimiento__lt=timezone.now().date(),
-                estado__in=['emitido', 'aceptado_sunat']
+                estado__in=['emitido', 'aceptado_sunat'],
+                estado_pago__in=['pendiente', 'parcial']
             ).count()
             
             # Documentos por vencer (próximos 7 días)
@@ -337,7 +360,8 @@ class DocumentoElectronicoViewSet(viewsets.ModelViewSet):
             documentos_por_vencer = queryset.filter(
                 fecha_vencimiento__lte=fecha_limite,
                 fecha_vencimiento__gte=timezone.now().date(),
-                estado__in=['emitido', 'aceptado_sunat']
+                estado__in=['emitido', 'aceptado_sunat'],
+                estado_pago__in=['pendiente', 'parcial']
             ).count()
             
             # Promedios
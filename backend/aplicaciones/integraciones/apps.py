@@ -8,4 +8,8 @@ from django.apps import AppConfig
 class IntegracionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'aplicaciones.integraciones'
-    verbose_name = 'Integraciones Externas'
\ No newline at end of file
+    verbose_name = 'Integraciones Externas'
+    
+    def ready(self):
+        """Configuración al inicializar la aplicación"""
+        import aplicaciones.integraciones.signals
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Comando conciliar_sunat - FELICITAFAC
+Consulta en lote el estado SUNAT de los documentos enviados vía Nubefact
+Uso: python manage.py conciliar_sunat [--hilos 8] [--lote 200]
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from aplicaciones.integraciones.services.conciliador import ConciliadorSunat
+
+
+class Command(BaseCommand):
+    help = 'Actualiza el estado SUNAT de los documentos enviados consultando Nubefact en lote'
+    
+    def add_arguments(self, parser):
+        configuracion = getattr(settings, 'CONFIGURACION_SUNAT', {})
+        
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=configuracion.get('CONCILIACION_HILOS', 8),
+            help='Cantidad máxima de consultas simultáneas'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=configuracion.get('CONCILIACION_LOTE', 200),
+            help='Cantidad de documentos por lote'
+        )
+    
+    def handle(self, *args, **options):
+        conciliador = ConciliadorSunat(hilos=options['hilos'], tamano_lote=options['lote'])
+        
+        self.stdout.write(
+            f"Conciliación SUNAT iniciada ({conciliador.hilos} hilos, lotes de {conciliador.tamano_lote})"
+        )
+        
+        resumen = conciliador.conciliar()
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Documentos consultados: {resumen['consultados']}, "
+            f"actualizados: {resumen['actualizados']}, errores: {resumen['errores']}"
+        ))
@@ -0,0 +1,63 @@
+"""
+Comando despachar_sunat - FELICITAFAC
+Drena la cola de envíos a SUNAT/Nubefact con un pool de hilos
+Uso: python manage.py despachar_sunat [--hilos 4] [--lote 50] [--una-vez]
+"""
+
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from aplicaciones.integraciones.services.despachador import DespachadorSunat
+
+
+class Command(BaseCommand):
+    help = 'Envía a SUNAT (vía Nubefact) los documentos encolados'
+    
+    def add_arguments(self, parser):
+        configuracion = getattr(settings, 'CONFIGURACION_SUNAT', {})
+        
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=configuracion.get('DESPACHO_HILOS', 4),
+            help='Cantidad de hilos para envíos en paralelo'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=configuracion.get('DESPACHO_LOTE', 50),
+            help='Cantidad máxima de envíos tomados por ciclo'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=configuracion.get('DESPACHO_INTERVALO_SEGUNDOS', 5),
+            help='Segundos de espera cuando la cola está vacía'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar la cola hasta vaciarla y terminar'
+        )
+    
+    def handle(self, *args, **options):
+        despachador = DespachadorSunat(hilos=options['hilos'], tamano_lote=options['lote'])
+        
+        self.stdout.write(
+            f"Despachador SUNAT iniciado ({despachador.hilos} hilos, lotes de {despachador.tamano_lote})"
+        )
+        
+        total = 0
+        try:
+            while True:
+                procesados = despachador.procesar_lote()
+                total += procesados
+                
+                if procesados == 0:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Despachador detenido')
+        
+        self.stdout.write(self.style.SUCCESS(f"Envíos procesados: {total}"))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0001_initial'),
+        ('integraciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColaEnvioSunat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Fecha y hora de creación del registro', verbose_name='Fecha de Creación')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, db_index=True, help_text='Fecha y hora de última actualización', verbose_name='Fecha de Actualización')),
+                ('activo', models.BooleanField(db_index=True, default=True, help_text='Indica si el registro está activo', verbose_name='Activo')),
+                ('tipo_operacion', models.CharField(choices=[('emision', 'Emisión'), ('comunicacion_baja', 'Comunicación de Baja')], default='emision', help_text='Operación a realizar con el proveedor', max_length=20, verbose_name='Tipo de Operación')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', help_text='Estado del envío en la cola', max_length=20, verbose_name='Estado')),
+                ('intentos', models.PositiveIntegerField(default=0, help_text='Número de intentos realizados', verbose_name='Intentos')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha a partir de la cual puede procesarse', verbose_name='Próximo Intento')),
+                ('fecha_bloqueo', models.DateTimeField(blank=True, help_text='Fecha en que un trabajador tomó el envío', null=True, verbose_name='Fecha Bloqueo')),
+                ('trabajador', models.CharField(blank=True, help_text='Identificador del proceso que tomó el envío', max_length=100, null=True, verbose_name='Trabajador')),
+                ('fecha_procesamiento', models.DateTimeField(blank=True, help_text='Fecha en que terminó el procesamiento', null=True, verbose_name='Fecha Procesamiento')),
+                ('ultimo_mensaje', models.TextField(blank=True, help_text='Mensaje del último intento', null=True, verbose_name='Último Mensaje')),
+                ('documento_electronico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios_encolados', to='facturacion.documentoelectronico', verbose_name='Documento Electrónico')),
+            ],
+            options={
+                'verbose_name': 'Envío en Cola SUNAT',
+                'verbose_name_plural': 'Cola de Envíos SUNAT',
+                'db_table': 'integraciones_cola_envio_sunat',
+                'ordering': ['proximo_intento', 'id'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='idx_cola_estado_proximo'), models.Index(fields=['documento_electronico'], name='idx_cola_documento'), models.Index(fields=['activo'], name='idx_cola_activo')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:03
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integraciones', '0002_cola_envio_sunat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logintegracion',
+            name='tiempo_conexion_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Tiempo para abrir la conexión, 0 si se reutilizó una existente', null=True, verbose_name='Tiempo Conexión (ms)'),
+        ),
+        migrations.AddField(
+            model_name='logintegracion',
+            name='tiempo_transferencia_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Tiempo de envío y recepción de datos en milisegundos', null=True, verbose_name='Tiempo Transferencia (ms)'),
+        ),
+        migrations.AddField(
+            model_name='proveedorintegracion',
+            name='factor_espera_reintento',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.50'), help_text='Factor de espera exponencial entre reintentos HTTP en segundos', max_digits=5, verbose_name='Factor Espera Reintento'),
+        ),
+        migrations.AddField(
+            model_name='proveedorintegracion',
+            name='tamano_pool_conexiones',
+            field=models.PositiveIntegerField(default=10, help_text='Conexiones persistentes que se mantienen abiertas con el proveedor', verbose_name='Tamaño Pool Conexiones'),
+        ),
+        migrations.AddField(
+            model_name='proveedorintegracion',
+            name='tiempo_conexion_segundos',
+            field=models.PositiveIntegerField(default=5, help_text='Tiempo máximo para establecer la conexión en segundos', verbose_name='Tiempo Conexión (seg)'),
+        ),
+    ]
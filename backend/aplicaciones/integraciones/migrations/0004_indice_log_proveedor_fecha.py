@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integraciones', '0003_pool_conexiones_nubefact'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logintegracion',
+            index=models.Index(fields=['proveedor', 'fecha_envio'], name='idx_log_proveedor_fecha'),
+        ),
+    ]
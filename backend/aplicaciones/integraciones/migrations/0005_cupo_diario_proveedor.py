@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integraciones', '0004_indice_log_proveedor_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CupoDiarioProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('cantidad', models.PositiveIntegerField(default=0, verbose_name='Cantidad de Operaciones')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cupos_diarios', to='integraciones.proveedorintegracion', verbose_name='Proveedor')),
+            ],
+            options={
+                'verbose_name': 'Cupo Diario de Proveedor',
+                'verbose_name_plural': 'Cupos Diarios de Proveedores',
+                'db_table': 'integraciones_cupo_diario_proveedor',
+                'unique_together': {('proveedor', 'fecha')},
+            },
+        ),
+    ]
@@ -116,6 +116,26 @@ class ProveedorIntegracion(ModeloBase):
         help_text='Número máximo de reintentos'
     )
     
+    tiempo_conexion_segundos = models.PositiveIntegerField(
+        'Tiempo Conexión (seg)',
+        default=5,
+        help_text='Tiempo máximo para establecer la conexión en segundos'
+    )
+    
+    factor_espera_reintento = models.DecimalField(
+        'Factor Espera Reintento',
+        max_digits=5,
+        decimal_places=2,
+        default=Decimal('0.50'),
+        help_text='Factor de espera exponencial entre reintentos HTTP en segundos'
+    )
+    
+    tamano_pool_conexiones = models.PositiveIntegerField(
+        'Tamaño Pool Conexiones',
+        default=10,
+        help_text='Conexiones persistentes que se mantienen abiertas con el proveedor'
+    )
+    
     # Configuración de autenticación
     requiere_token = models.BooleanField(
         'Requiere Token',
@@ -222,11 +242,19 @@ class ProveedorIntegracion(ModeloBase):
     
     def save(self, *args, **kwargs):
         """Override save para proveedor principal único"""
+        degradados = []
         if self.es_principal:
             # Solo un proveedor puede ser principal
-            ProveedorIntegracion.objects.filter(es_principal=True).update(es_principal=False)
+            anteriores = ProveedorIntegracion.objects.filter(es_principal=True).exclude(pk=self.pk)
+            degradados = list(anteriores.values_list('codigo', flat=True))
+            if degradados:
+                anteriores.update(es_principal=False)
         
         super().save(*args, **kwargs)
+        
+        # update() no envía post_save: se invalida aquí la configuración de los proveedores degradados
+        for codigo in degradados:
+            ConfiguracionIntegracion.invalidar_cache_principal(codigo)
     
     def esta_disponible(self):
         """Verifica si el proveedor está disponible"""
@@ -234,36 +262,88 @@ class ProveedorIntegracion(ModeloBase):
     
     def puede_enviar_documento(self):
         """Verifica si puede enviar más documentos hoy"""
-        from datetime import date
-        
         if not self.esta_disponible():
             return False, "Proveedor no disponible"
         
         # Verificar límite diario
-        hoy = date.today()
-        documentos_hoy = LogIntegracion.objects.filter(
-            proveedor=self,
-            fecha_envio__date=hoy
-        ).count()
+        documentos_hoy = self.contar_documentos_dia()
         
         if documentos_hoy >= self.limite_documentos_dia:
             return False, f"Límite diario alcanzado ({self.limite_documentos_dia})"
         
         return True, "Puede enviar documento"
     
-    def actualizar_estadisticas(self, exitoso=True):
-        """Actualiza las estadísticas del proveedor"""
-        self.total_documentos_enviados += 1
-        if exitoso:
-            self.total_documentos_exitosos += 1
-        else:
-            self.total_documentos_error += 1
+    def contar_documentos_dia(self, fecha=None):
+        """
+        Cantidad de operaciones registradas en el día
+        Se lee de la fila de CupoDiarioProveedor y solo se recalcula desde los logs si no existe
+        """
+        fecha = fecha or timezone.localdate()
+        cantidad = CupoDiarioProveedor.objects.filter(
+            proveedor=self, fecha=fecha
+        ).values_list('cantidad', flat=True).first()
+        
+        if cantidad is None:
+            cantidad = self._reconstruir_cupo_diario(fecha)
+        
+        return cantidad
+    
+    def registrar_documento_dia(self, fecha=None):
+        """
+        Suma una operación al contador diario del proveedor
+        El incremento se aplica al confirmar la transacción, con UPDATE ... cantidad + 1
+        """
+        from django.db import transaction
+        
+        fecha = fecha or timezone.localdate()
+        transaction.on_commit(lambda: self._incrementar_cupo_diario(fecha))
+    
+    def _incrementar_cupo_diario(self, fecha):
+        """Incrementa la fila del día; si aún no existe se crea desde los logs ya confirmados"""
+        from django.db.models import F
+        
+        actualizadas = CupoDiarioProveedor.objects.filter(
+            proveedor=self, fecha=fecha
+        ).update(cantidad=F('cantidad') + 1)
         
+        if not actualizadas:
+            # El log que originó el incremento ya está confirmado y se incluye al contar
+            self._reconstruir_cupo_diario(fecha)
+    
+    def _reconstruir_cupo_diario(self, fecha):
+        """Recalcula el contador diario desde LogIntegracion y crea su fila"""
+        from datetime import datetime, time, timedelta
+        
+        inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+        cantidad = LogIntegracion.objects.filter(
+            proveedor=self,
+            fecha_envio__gte=inicio,
+            fecha_envio__lt=inicio + timedelta(days=1)
+        ).count()
+        
+        # Si otro proceso creó la fila primero, su valor ya acumula incrementos
+        cupo, _ = CupoDiarioProveedor.objects.get_or_create(
+            proveedor=self, fecha=fecha, defaults={'cantidad': cantidad}
+        )
+        return cupo.cantidad
+    
+    def actualizar_estadisticas(self, exitoso=True):
+        """
+        Actualiza las estadísticas del proveedor
+        Incrementa en la base de datos para no perder envíos concurrentes
+        ni pisar cambios de configuración con una instancia en caché
+        """
+        campo_resultado = 'total_documentos_exitosos' if exitoso else 'total_documentos_error'
         self.fecha_ultimo_envio = timezone.now()
-        self.save(update_fields=[
-            'total_documentos_enviados', 'total_documentos_exitosos',
-            'total_documentos_error', 'fecha_ultimo_envio'
-        ])
+        
+        ProveedorIntegracion.objects.filter(pk=self.pk).update(
+            total_documentos_enviados=models.F('total_documentos_enviados') + 1,
+            fecha_ultimo_envio=self.fecha_ultimo_envio,
+            **{campo_resultado: models.F(campo_resultado) + 1}
+        )
+        
+        self.total_documentos_enviados += 1
+        setattr(self, campo_resultado, getattr(self, campo_resultado) + 1)
     
     def obtener_tasa_exito(self):
         """Calcula la tasa de éxito del proveedor"""
@@ -284,6 +364,9 @@ class ConfiguracionIntegracion(ModeloBase):
         ('produccion', 'Producción'),
     ]
     
+    # Segundos que se conserva en caché la configuración principal
+    TIEMPO_CACHE_PRINCIPAL = 300
+    
     proveedor = models.ForeignKey(
         ProveedorIntegracion,
         on_delete=models.CASCADE,
@@ -487,6 +570,41 @@ class ConfiguracionIntegracion(ModeloBase):
         
         return True, "Configuración válida"
     
+    @classmethod
+    def obtener_principal(cls, codigo_proveedor='nubefact'):
+        """
+        Obtiene la configuración activa del proveedor principal
+        Se guarda en caché y se invalida al guardar la configuración o el proveedor
+        """
+        from django.core.cache import cache
+        
+        clave = cls.clave_cache_principal(codigo_proveedor)
+        configuracion = cache.get(clave)
+        
+        if configuracion is None:
+            configuracion = cls.objects.select_related('proveedor').filter(
+                proveedor__codigo=codigo_proveedor,
+                proveedor__es_principal=True,
+                activo=True
+            ).first()
+            
+            if configuracion:
+                cache.set(clave, configuracion, cls.TIEMPO_CACHE_PRINCIPAL)
+        
+        return configuracion
+    
+    @classmethod
+    def invalidar_cache_principal(cls, codigo_proveedor='nubefact'):
+        """Elimina de la caché la configuración principal del proveedor"""
+        from django.core.cache import cache
+        
+        cache.delete(cls.clave_cache_principal(codigo_proveedor))
+    
+    @staticmethod
+    def clave_cache_principal(codigo_proveedor):
+        """Clave de caché de la configuración principal de un proveedor"""
+        return f'integraciones:configuracion_principal:{codigo_proveedor}'
+    
     def obtener_datos_empresa(self):
         """Retorna los datos de la empresa como diccionario"""
         if self.datos_empresa_json:
@@ -597,6 +715,20 @@ class LogIntegracion(ModeloBase):
         help_text='Tiempo de respuesta en milisegundos'
     )
     
+    tiempo_conexion_ms = models.PositiveIntegerField(
+        'Tiempo Conexión (ms)',
+        blank=True,
+        null=True,
+        help_text='Tiempo para abrir la conexión, 0 si se reutilizó una existente'
+    )
+    
+    tiempo_transferencia_ms = models.PositiveIntegerField(
+        'Tiempo Transferencia (ms)',
+        blank=True,
+        null=True,
+        help_text='Tiempo de envío y recepción de datos en milisegundos'
+    )
+    
     # Datos de la petición
     endpoint_utilizado = models.CharField(
         'Endpoint Utilizado',
@@ -762,6 +894,7 @@ class LogIntegracion(ModeloBase):
             models.Index(fields=['tipo_operacion'], name='idx_log_operacion'),
             models.Index(fields=['estado'], name='idx_log_estado'),
             models.Index(fields=['fecha_envio'], name='idx_log_fecha_envio'),
+            models.Index(fields=['proveedor', 'fecha_envio'], name='idx_log_proveedor_fecha'),
             models.Index(fields=['exitoso'], name='idx_log_exitoso'),
             models.Index(fields=['codigo_respuesta_http'], name='idx_log_codigo_http'),
             models.Index(fields=['numero_intento'], name='idx_log_intento'),
@@ -824,9 +957,15 @@ class LogIntegracion(ModeloBase):
         # Actualizar estadísticas del proveedor
         self.proveedor.actualizar_estadisticas(exitoso=False)
     
+    def registrar_tiempos(self, tiempo_total_ms, tiempo_conexion_ms):
+        """Registra la latencia medida de la llamada HTTP separando conexión y transferencia"""
+        self.tiempo_respuesta_ms = tiempo_total_ms
+        self.tiempo_conexion_ms = tiempo_conexion_ms
+        self.tiempo_transferencia_ms = max(tiempo_total_ms - tiempo_conexion_ms, 0)
+    
     def _calcular_tiempo_respuesta(self):
-        """Calcula el tiempo de respuesta en milisegundos"""
-        if self.fecha_respuesta and self.fecha_envio:
+        """Calcula el tiempo de respuesta en milisegundos si no se midió la llamada"""
+        if self.tiempo_respuesta_ms is None and self.fecha_respuesta and self.fecha_envio:
             delta = self.fecha_respuesta - self.fecha_envio
             self.tiempo_respuesta_ms = int(delta.total_seconds() * 1000)
     
@@ -862,6 +1001,38 @@ class LogIntegracion(ModeloBase):
         return nuevo_log
 
 
+class CupoDiarioProveedor(models.Model):
+    """
+    Contador de operaciones por proveedor y día
+    Permite verificar el límite diario sin contar LogIntegracion en cada envío
+    """
+    
+    proveedor = models.ForeignKey(
+        ProveedorIntegracion,
+        on_delete=models.CASCADE,
+        related_name='cupos_diarios',
+        verbose_name='Proveedor'
+    )
+    
+    fecha = models.DateField(
+        verbose_name='Fecha'
+    )
+    
+    cantidad = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Cantidad de Operaciones'
+    )
+    
+    class Meta:
+        db_table = 'integraciones_cupo_diario_proveedor'
+        verbose_name = 'Cupo Diario de Proveedor'
+        verbose_name_plural = 'Cupos Diarios de Proveedores'
+        unique_together = [['proveedor', 'fecha']]
+    
+    def __str__(self):
+        return f"{self.proveedor.codigo} {self.fecha}: {self.cantidad}"
+
+
 class WebhookIntegracion(ModeloBase):
     """
     Modelo para webhooks de integración
@@ -1101,4 +1272,147 @@ class WebhookIntegracion(ModeloBase):
     
     def _procesar_generico(self):
         """Procesamiento genérico de webhook"""
-        self.mensaje_procesamiento = "Webhook recibido y registrado"
\ No newline at end of file
+        self.mensaje_procesamiento = "Webhook recibido y registrado"
+
+
+class ColaEnvioSunat(ModeloBase):
+    """
+    Modelo para la cola de envíos a SUNAT (outbox)
+    Los documentos se encolan al emitirse y el comando despachar_sunat los envía
+    """
+    
+    TIPOS_OPERACION = [
+        ('emision', 'Emisión'),
+        ('comunicacion_baja', 'Comunicación de Baja'),
+    ]
+    
+    ESTADOS_COLA = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+    
+    documento_electronico = models.ForeignKey(
+        'facturacion.DocumentoElectronico',
+        on_delete=models.CASCADE,
+        related_name='envios_encolados',
+        verbose_name='Documento Electrónico'
+    )
+    
+    tipo_operacion = models.CharField(
+        'Tipo de Operación',
+        max_length=20,
+        choices=TIPOS_OPERACION,
+        default='emision',
+        help_text='Operación a realizar con el proveedor'
+    )
+    
+    estado = models.CharField(
+        'Estado',
+        max_length=20,
+        choices=ESTADOS_COLA,
+        default='pendiente',
+        help_text='Estado del envío en la cola'
+    )
+    
+    intentos = models.PositiveIntegerField(
+        'Intentos',
+        default=0,
+        help_text='Número de intentos realizados'
+    )
+    
+    proximo_intento = models.DateTimeField(
+        'Próximo Intento',
+        default=timezone.now,
+        help_text='Fecha a partir de la cual puede procesarse'
+    )
+    
+    fecha_bloqueo = models.DateTimeField(
+        'Fecha Bloqueo',
+        blank=True,
+        null=True,
+        help_text='Fecha en que un trabajador tomó el envío'
+    )
+    
+    trabajador = models.CharField(
+        'Trabajador',
+        max_length=100,
+        blank=True,
+        null=True,
+        help_text='Identificador del proceso que tomó el envío'
+    )
+    
+    fecha_procesamiento = models.DateTimeField(
+        'Fecha Procesamiento',
+        blank=True,
+        null=True,
+        help_text='Fecha en que terminó el procesamiento'
+    )
+    
+    ultimo_mensaje = models.TextField(
+        'Último Mensaje',
+        blank=True,
+        null=True,
+        help_text='Mensaje del último intento'
+    )
+    
+    class Meta:
+        db_table = 'integraciones_cola_envio_sunat'
+        verbose_name = 'Envío en Cola SUNAT'
+        verbose_name_plural = 'Cola de Envíos SUNAT'
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='idx_cola_estado_proximo'),
+            models.Index(fields=['documento_electronico'], name='idx_cola_documento'),
+            models.Index(fields=['activo'], name='idx_cola_activo'),
+        ]
+        ordering = ['proximo_intento', 'id']
+    
+    def __str__(self):
+        return f"{self.tipo_operacion} - {self.documento_electronico_id} - {self.estado}"
+    
+    @classmethod
+    def encolar(cls, documento, tipo_operacion='emision'):
+        """Encola un documento para envío, sin duplicar envíos pendientes"""
+        envio, _ = cls.objects.get_or_create(
+            documento_electronico=documento,
+            tipo_operacion=tipo_operacion,
+            estado__in=['pendiente', 'procesando'],
+            defaults={'estado': 'pendiente'}
+        )
+        return envio
+    
+    def marcar_completado(self, mensaje=None):
+        """Marca el envío como completado"""
+        self.estado = 'completado'
+        self.fecha_procesamiento = timezone.now()
+        self.ultimo_mensaje = mensaje
+        self.save(update_fields=['estado', 'fecha_procesamiento', 'ultimo_mensaje', 'fecha_actualizacion'])
+    
+    def marcar_fallido(self, mensaje, reintentos_maximos, espera_base_segundos=30):
+        """Programa un reintento con espera exponencial o marca error definitivo"""
+        from datetime import timedelta
+        
+        ahora = timezone.now()
+        self.ultimo_mensaje = mensaje
+        self.fecha_procesamiento = ahora
+        
+        if self.intentos >= reintentos_maximos:
+            self.estado = 'error'
+        else:
+            self.estado = 'pendiente'
+            self.proximo_intento = ahora + timedelta(seconds=espera_base_segundos * 2 ** (self.intentos - 1))
+        
+        self.save(update_fields=[
+            'estado', 'proximo_intento', 'fecha_procesamiento',
+            'ultimo_mensaje', 'fecha_actualizacion'
+        ])
+    
+    def posponer(self, mensaje, espera_segundos=300):
+        """Devuelve el envío a la cola sin contar un intento, p. ej. si falta la configuración del proveedor"""
+        from datetime import timedelta
+        
+        self.estado = 'pendiente'
+        self.ultimo_mensaje = mensaje
+        self.proximo_intento = timezone.now() + timedelta(seconds=espera_segundos)
+        self.save(update_fields=['estado', 'proximo_intento', 'ultimo_mensaje', 'fecha_actualizacion'])
@@ -0,0 +1,130 @@
+"""
+Conciliador SUNAT - FELICITAFAC
+Consulta en lote el estado SUNAT de los documentos enviados
+Usado por el comando manage.py conciliar_sunat
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, models
+
+logger = logging.getLogger(__name__)
+
+
+class ConciliadorSunat:
+    """
+    Recorre los documentos en estado enviado_sunat por lotes de id creciente,
+    consulta cada lote en paralelo y guarda los resultados con un solo UPDATE
+    condicionado a que el documento siga en enviado_sunat
+    """
+    
+    CAMPOS_ACTUALIZADOS = [
+        ('estado', models.CharField()),
+        ('fecha_respuesta_sunat', models.DateTimeField()),
+    ]
+    
+    def __init__(self, hilos=None, tamano_lote=None, servicio=None):
+        """Inicializar conciliador con la configuración de settings"""
+        configuracion = getattr(settings, 'CONFIGURACION_SUNAT', {})
+        
+        self.hilos = hilos or configuracion.get('CONCILIACION_HILOS', 8)
+        self.tamano_lote = tamano_lote or configuracion.get('CONCILIACION_LOTE', 200)
+        self.servicio = servicio
+    
+    def conciliar(self):
+        """Concilia todos los documentos pendientes y retorna el resumen"""
+        from .nubefact import NubefactService
+        
+        if self.servicio is None:
+            self.servicio = NubefactService()
+        
+        resumen = {'consultados': 0, 'actualizados': 0, 'errores': 0, 'lotes': 0}
+        ultimo_id = 0
+        inicio = time.perf_counter()
+        
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            while True:
+                documentos = self.obtener_lote(ultimo_id)
+                if not documentos:
+                    break
+                
+                ultimo_id = documentos[-1].id
+                actualizados, errores = self.procesar_lote(documentos, pool)
+                
+                resumen['lotes'] += 1
+                resumen['consultados'] += len(documentos)
+                resumen['actualizados'] += actualizados
+                resumen['errores'] += errores
+        
+        duracion = time.perf_counter() - inicio
+        logger.info(
+            f"Conciliación SUNAT: {resumen['consultados']} documentos en {resumen['lotes']} lotes, "
+            f"{resumen['actualizados']} actualizados, {resumen['errores']} errores, {duracion:.2f} s"
+        )
+        return resumen
+    
+    def obtener_lote(self, ultimo_id):
+        """Siguiente lote de documentos enviados con id mayor al último procesado"""
+        from aplicaciones.facturacion.models import DocumentoElectronico
+        
+        return list(
+            DocumentoElectronico.objects.select_related('tipo_documento').filter(
+                estado='enviado_sunat',
+                activo=True,
+                id__gt=ultimo_id
+            ).exclude(
+                hash_documento__isnull=True
+            ).exclude(
+                hash_documento=''
+            ).order_by('id')[:self.tamano_lote]
+        )
+    
+    def procesar_lote(self, documentos, pool):
+        """Consulta el lote en paralelo y guarda los estados con una sola sentencia"""
+        from aplicaciones.facturacion.models import DocumentoElectronico
+        
+        inicio = time.perf_counter()
+        resultados = list(pool.map(self._consultar_en_hilo, documentos))
+        duracion_consultas = time.perf_counter() - inicio
+        
+        exitosos = [documento for documento, resultado in zip(documentos, resultados) if resultado['exitoso']]
+        errores = len(documentos) - len(exitosos)
+        
+        # Un documento anulado o modificado mientras se consultaba a SUNAT no se sobrescribe
+        actualizados = 0
+        if exitosos:
+            actualizados = DocumentoElectronico.objects.filter(
+                id__in=[documento.id for documento in exitosos],
+                estado='enviado_sunat'
+            ).update(**{
+                campo: models.Case(
+                    *[
+                        models.When(id=documento.id, then=models.Value(getattr(documento, campo)))
+                        for documento in exitosos
+                    ],
+                    output_field=tipo
+                )
+                for campo, tipo in self.CAMPOS_ACTUALIZADOS
+            })
+        
+        duracion = time.perf_counter() - inicio
+        logger.info(
+            f"Conciliación SUNAT lote ids {documentos[0].id}-{documentos[-1].id}: "
+            f"{len(documentos)} consultados, {actualizados} actualizados, {errores} errores, "
+            f"consultas {duracion_consultas:.2f} s, total {duracion:.2f} s "
+            f"({len(documentos) / duracion if duracion else 0:.1f} documentos/s)"
+        )
+        return actualizados, errores
+    
+    def _consultar_en_hilo(self, documento):
+        """Consulta un documento sin guardarlo, cerrando la conexión del hilo al terminar"""
+        try:
+            return self.servicio.consultar_documento(documento, guardar=False)
+        except Exception as e:
+            logger.error(f"Error conciliando documento {documento.id}: {str(e)}")
+            return {'exitoso': False, 'mensaje': str(e)}
+        finally:
+            # close_old_connections respeta CONN_MAX_AGE y dejaría abierta la conexión del hilo
+            connection.close()
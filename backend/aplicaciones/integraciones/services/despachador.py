@@ -0,0 +1,135 @@
+"""
+Despachador SUNAT - FELICITAFAC
+Procesa la cola de envíos a Nubefact fuera del ciclo HTTP
+Usado por el comando manage.py despachar_sunat
+"""
+
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from ..models import ColaEnvioSunat
+
+logger = logging.getLogger(__name__)
+
+
+class DespachadorSunat:
+    """
+    Trabajador que drena la cola de envíos SUNAT con un pool de hilos
+    Es el único punto donde se envían documentos y se actualiza su estado SUNAT
+    """
+    
+    def __init__(self, hilos=None, tamano_lote=None, bloqueo_maximo_segundos=None):
+        """Inicializar despachador con la configuración de settings"""
+        configuracion = getattr(settings, 'CONFIGURACION_SUNAT', {})
+        
+        self.hilos = hilos or configuracion.get('DESPACHO_HILOS', 4)
+        self.tamano_lote = tamano_lote or configuracion.get('DESPACHO_LOTE', 50)
+        self.bloqueo_maximo_segundos = (
+            bloqueo_maximo_segundos or configuracion.get('DESPACHO_BLOQUEO_MAXIMO_SEGUNDOS', 600)
+        )
+        self.trabajador = f"{socket.gethostname()}:{os.getpid()}"
+    
+    def procesar_lote(self):
+        """Toma un lote de envíos pendientes y los procesa en paralelo"""
+        self.liberar_bloqueos_vencidos()
+        
+        ids = self.reclamar_envios()
+        if not ids:
+            return 0
+        
+        if self.hilos == 1:
+            for envio_id in ids:
+                self._procesar_envio(envio_id)
+        else:
+            with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+                list(pool.map(self._procesar_en_hilo, ids))
+        
+        logger.info(f"Despachador {self.trabajador}: {len(ids)} envíos procesados")
+        return len(ids)
+    
+    def reclamar_envios(self):
+        """Marca un lote de envíos pendientes como tomados por este trabajador"""
+        ahora = timezone.now()
+        
+        with transaction.atomic():
+            ids = list(
+                ColaEnvioSunat.objects.select_for_update(skip_locked=True).filter(
+                    estado='pendiente',
+                    proximo_intento__lte=ahora,
+                    activo=True
+                ).order_by('proximo_intento', 'id').values_list('id', flat=True)[:self.tamano_lote]
+            )
+            
+            if ids:
+                ColaEnvioSunat.objects.filter(id__in=ids).update(
+                    estado='procesando',
+                    fecha_bloqueo=ahora,
+                    trabajador=self.trabajador,
+                    fecha_actualizacion=ahora
+                )
+        
+        return ids
+    
+    def liberar_bloqueos_vencidos(self):
+        """Devuelve a pendiente los envíos de trabajadores que se detuvieron"""
+        limite = timezone.now() - timedelta(seconds=self.bloqueo_maximo_segundos)
+        
+        liberados = ColaEnvioSunat.objects.filter(
+            estado='procesando',
+            fecha_bloqueo__lt=limite
+        ).update(estado='pendiente', trabajador=None, fecha_bloqueo=None)
+        
+        if liberados:
+            logger.warning(f"Despachador: {liberados} envíos bloqueados devueltos a la cola")
+        
+        return liberados
+    
+    def _procesar_en_hilo(self, envio_id):
+        """Procesa un envío en un hilo del pool cerrando su conexión al terminar"""
+        try:
+            self._procesar_envio(envio_id)
+        finally:
+            # close_old_connections respeta CONN_MAX_AGE y dejaría abierta la conexión del hilo
+            connection.close()
+    
+    def _procesar_envio(self, envio_id):
+        """Envía un documento a Nubefact y registra el resultado en la cola"""
+        from .nubefact import NubefactService
+        
+        envio = ColaEnvioSunat.objects.select_related(
+            'documento_electronico__tipo_documento',
+            'documento_electronico__serie_documento'
+        ).get(id=envio_id)
+        
+        try:
+            nubefact = NubefactService()
+        except Exception as e:
+            # Sin configuración activa no se llamó al proveedor: el envío espera sin gastar reintentos
+            logger.warning(f"Envío {envio_id} pospuesto: {str(e)}")
+            envio.posponer(str(e))
+            return {'exitoso': False, 'mensaje': str(e)}
+        
+        envio.intentos += 1
+        envio.save(update_fields=['intentos', 'fecha_actualizacion'])
+        
+        try:
+            if envio.tipo_operacion == 'comunicacion_baja':
+                resultado = nubefact.enviar_comunicacion_baja(envio.documento_electronico)
+            else:
+                resultado = nubefact.enviar_documento(envio.documento_electronico)
+        
+        except Exception as e:
+            logger.error(f"Error despachando envío {envio_id}: {str(e)}")
+            resultado = {'exitoso': False, 'mensaje': str(e)}
+        
+        if resultado['exitoso']:
+            envio.marcar_completado(resultado.get('mensaje'))
+        else:
+            envio.marcar_fallido(resultado.get('mensaje'), nubefact.proveedor.reintentos_maximos)
+        
+        return resultado
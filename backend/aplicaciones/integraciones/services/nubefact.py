@@ -12,6 +12,7 @@ from datetime import datetime, date
 from django.conf import settings
 from django.utils import timezone
 from ..models import LogIntegracion, ConfiguracionIntegracion, ProveedorIntegracion
+from .sesion_http import obtener_sesion, peticion_medida
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +28,8 @@ class NubefactService:
         if configuracion:
             self.configuracion = configuracion
         else:
-            # Buscar configuración principal
-            self.configuracion = ConfiguracionIntegracion.objects.filter(
-                proveedor__codigo='nubefact',
-                proveedor__es_principal=True,
-                activo=True
-            ).first()
+            # Buscar configuración principal (en caché)
+            self.configuracion = ConfiguracionIntegracion.obtener_principal('nubefact')
         
         if not self.configuracion:
             raise ValueError("No se encontró configuración de Nubefact")
@@ -42,6 +39,10 @@ class NubefactService:
         self.token = self.configuracion.token
         self.ruc_empresa = self.configuracion.ruc_empresa
         
+        # Sesión keep-alive compartida por el proceso
+        self.sesion = obtener_sesion(self.proveedor)
+        self.timeout = (self.proveedor.tiempo_conexion_segundos, self.proveedor.tiempo_espera_segundos)
+        
         # Headers por defecto
         self.headers = {
             'Authorization': f'Token token={self.token}',
@@ -54,11 +55,7 @@ class NubefactService:
         try:
             url = f"{self.base_url}/api/v1/ping"
             
-            response = requests.get(
-                url, 
-                headers=self.headers,
-                timeout=self.proveedor.tiempo_espera_segundos
-            )
+            response = self._ejecutar('GET', url)
             
             if response.status_code == 200:
                 return {
@@ -115,12 +112,7 @@ class NubefactService:
             
             # Realizar petición
             url = f"{self.base_url}{endpoint}"
-            response = requests.post(
-                url,
-                headers=self.headers,
-                json=data,
-                timeout=self.proveedor.tiempo_espera_segundos
-            )
+            response = self._ejecutar('POST', url, log, json=data)
             
             log.codigo_respuesta_http = response.status_code
             log.payload_respuesta = response.text
@@ -170,8 +162,11 @@ class NubefactService:
             logger.error(f"Error inesperado enviando documento: {str(e)}")
             return {'exitoso': False, 'mensaje': 'Error interno del sistema'}
     
-    def consultar_documento(self, documento):
-        """Consultar estado de documento en SUNAT"""
+    def consultar_documento(self, documento, guardar=True):
+        """
+        Consultar estado de documento en SUNAT
+        Con guardar=False solo actualiza la instancia para que el llamador la guarde en lote
+        """
         log = self._crear_log(documento, 'consulta')
         
         try:
@@ -191,11 +186,7 @@ class NubefactService:
             log.endpoint_utilizado = endpoint
             log.save()
             
-            response = requests.get(
-                url,
-                headers=self.headers,
-                timeout=self.proveedor.tiempo_espera_segundos
-            )
+            response = self._ejecutar('GET', url, log)
             
             log.codigo_respuesta_http = response.status_code
             log.payload_respuesta = response.text
@@ -205,7 +196,10 @@ class NubefactService:
                 log.marcar_exitoso(resultado)
                 
                 # Actualizar estado del documento
-                self._actualizar_estado_documento(documento, resultado)
+                if guardar:
+                    self._actualizar_estado_documento(documento, resultado)
+                else:
+                    self._aplicar_estado_documento(documento, resultado)
                 
                 return {
                     'exitoso': True,
@@ -245,12 +239,7 @@ class NubefactService:
             log.save()
             
             url = f"{self.base_url}/api/v1/voids"
-            response = requests.post(
-                url,
-                headers=self.headers,
-                json=data,
-                timeout=self.proveedor.tiempo_espera_segundos
-            )
+            response = self._ejecutar('POST', url, log, json=data)
             
             log.codigo_respuesta_http = response.status_code
             log.payload_respuesta = response.text
@@ -278,6 +267,25 @@ class NubefactService:
             logger.error(f"Error en comunicación de baja: {str(e)}")
             return {'exitoso': False, 'mensaje': 'Error interno del sistema'}
     
+    def _ejecutar(self, metodo, url, log=None, **kwargs):
+        """Realiza la petición con la sesión compartida registrando su latencia"""
+        response, tiempo_total_ms, tiempo_conexion_ms = peticion_medida(
+            self.sesion, metodo, url,
+            headers=self.headers,
+            timeout=self.timeout,
+            **kwargs
+        )
+        
+        if log:
+            log.metodo_http = metodo
+            log.registrar_tiempos(tiempo_total_ms, tiempo_conexion_ms)
+        
+        logger.debug(
+            f"Nubefact {metodo} {url}: {tiempo_total_ms} ms "
+            f"(conexión {tiempo_conexion_ms} ms, transferencia {tiempo_total_ms - tiempo_conexion_ms} ms)"
+        )
+        return response
+    
     def _preparar_factura(self, documento):
         """Preparar datos de factura para Nubefact"""
         return {
@@ -416,19 +424,23 @@ class NubefactService:
         except Exception as e:
             logger.error(f"Error procesando respuesta exitosa: {str(e)}")
     
+    def _aplicar_estado_documento(self, documento, resultado):
+        """Asignar en memoria el estado del documento según respuesta de consulta"""
+        estado_sunat = resultado.get('sunat_status')
+        
+        if estado_sunat == 'ACEPTADO':
+            documento.estado = 'aceptado_sunat'
+        elif estado_sunat == 'RECHAZADO':
+            documento.estado = 'rechazado_sunat'
+        elif estado_sunat == 'OBSERVADO':
+            documento.estado = 'observado'
+        
+        documento.fecha_respuesta_sunat = timezone.now()
+    
     def _actualizar_estado_documento(self, documento, resultado):
         """Actualizar estado del documento según respuesta de consulta"""
         try:
-            estado_sunat = resultado.get('sunat_status')
-            
-            if estado_sunat == 'ACEPTADO':
-                documento.estado = 'aceptado_sunat'
-            elif estado_sunat == 'RECHAZADO':
-                documento.estado = 'rechazado_sunat'
-            elif estado_sunat == 'OBSERVADO':
-                documento.estado = 'observado'
-            
-            documento.fecha_respuesta_sunat = timezone.now()
+            self._aplicar_estado_documento(documento, resultado)
             documento.save(update_fields=['estado', 'fecha_respuesta_sunat'])
         
         except Exception as e:
@@ -0,0 +1,141 @@
+"""
+Sesiones HTTP - FELICITAFAC
+Sesiones persistentes con pool de conexiones para los proveedores de integración
+Reutiliza conexiones keep-alive y mide el tiempo de conexión de cada llamada
+"""
+
+import threading
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Códigos HTTP transitorios que se reintentan en peticiones idempotentes
+CODIGOS_REINTENTO = (429, 502, 503, 504)
+
+_medicion = threading.local()
+_sesiones = {}
+_bloqueo_sesiones = threading.Lock()
+
+
+class _ConexionMedida(HTTPConnection):
+    """Conexión HTTP que acumula el tiempo empleado en abrir el socket"""
+    
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _medicion.conexion_ms = getattr(_medicion, 'conexion_ms', 0) + (time.perf_counter() - inicio) * 1000
+
+
+class _ConexionMedidaHTTPS(HTTPSConnection):
+    """Conexión HTTPS que acumula el tiempo de socket y handshake TLS"""
+    
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _medicion.conexion_ms = getattr(_medicion, 'conexion_ms', 0) + (time.perf_counter() - inicio) * 1000
+
+
+class _PoolMedido(HTTPConnectionPool):
+    ConnectionCls = _ConexionMedida
+
+
+class _PoolMedidoHTTPS(HTTPSConnectionPool):
+    ConnectionCls = _ConexionMedidaHTTPS
+
+
+class AdaptadorMedido(HTTPAdapter):
+    """Adaptador de requests cuyos pools usan conexiones medidas"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PoolMedido,
+            'https': _PoolMedidoHTTPS,
+        }
+
+
+def obtener_sesion(proveedor):
+    """
+    Retorna la sesión compartida del proveedor para todo el proceso
+    Se reconstruye si cambian el tamaño del pool o la política de reintentos
+    """
+    parametros = (
+        proveedor.tamano_pool_conexiones,
+        proveedor.reintentos_maximos,
+        float(proveedor.factor_espera_reintento),
+    )
+    
+    with _bloqueo_sesiones:
+        actual = _sesiones.get(proveedor.pk)
+        if actual and actual[0] == parametros:
+            return actual[1]
+        
+        sesion = _crear_sesion(*parametros)
+        _sesiones[proveedor.pk] = (parametros, sesion)
+    
+    if actual:
+        actual[1].close()
+    
+    logger.info(f"Sesión HTTP creada para proveedor {proveedor.codigo} (pool={parametros[0]})")
+    return sesion
+
+
+def cerrar_sesiones():
+    """Cierra todas las sesiones abiertas del proceso"""
+    with _bloqueo_sesiones:
+        sesiones = [sesion for _, sesion in _sesiones.values()]
+        _sesiones.clear()
+    
+    for sesion in sesiones:
+        sesion.close()
+
+
+def peticion_medida(sesion, metodo, url, **kwargs):
+    """
+    Ejecuta una petición con la sesión y mide su latencia
+    Retorna (response, tiempo_total_ms, tiempo_conexion_ms); la conexión es 0 si se reutilizó
+    """
+    _medicion.conexion_ms = 0
+    inicio = time.perf_counter()
+    
+    response = sesion.request(metodo, url, **kwargs)
+    
+    tiempo_total_ms = int((time.perf_counter() - inicio) * 1000)
+    tiempo_conexion_ms = min(int(_medicion.conexion_ms), tiempo_total_ms)
+    return response, tiempo_total_ms, tiempo_conexion_ms
+
+
+def _crear_sesion(tamano_pool, reintentos, factor_espera):
+    """Crea una sesión con pool keep-alive y reintentos con espera exponencial"""
+    # Los errores de conexión se reintentan siempre porque la petición no llegó al proveedor;
+    # los de lectura y los códigos transitorios solo en métodos idempotentes para no duplicar emisiones
+    politica = Retry(
+        total=reintentos,
+        connect=reintentos,
+        read=reintentos,
+        status=reintentos,
+        backoff_factor=factor_espera,
+        status_forcelist=CODIGOS_REINTENTO,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+    adaptador = AdaptadorMedido(
+        pool_connections=tamano_pool,
+        pool_maxsize=tamano_pool,
+        max_retries=politica,
+    )
+    
+    sesion = requests.Session()
+    sesion.mount('http://', adaptador)
+    sesion.mount('https://', adaptador)
+    return sesion
@@ -0,0 +1,50 @@
+"""
+Signals de la aplicación Integraciones - FELICITAFAC
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import ConfiguracionIntegracion, LogIntegracion, ProveedorIntegracion
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Campos que se actualizan en cada envío y no afectan la configuración en caché
+CAMPOS_ESTADISTICAS = {
+    'total_documentos_enviados', 'total_documentos_exitosos',
+    'total_documentos_error', 'fecha_ultimo_envio', 'fecha_actualizacion'
+}
+
+
+@receiver(post_save, sender=ConfiguracionIntegracion)
+@receiver(post_delete, sender=ConfiguracionIntegracion)
+def configuracion_integracion_modificada(sender, instance, **kwargs):
+    """
+    Signal ejecutado al guardar o eliminar una configuración de integración
+    """
+    ConfiguracionIntegracion.invalidar_cache_principal(instance.proveedor.codigo)
+
+
+@receiver(post_save, sender=ProveedorIntegracion)
+@receiver(post_delete, sender=ProveedorIntegracion)
+def proveedor_integracion_modificado(sender, instance, **kwargs):
+    """
+    Signal ejecutado al guardar o eliminar un proveedor de integración
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= CAMPOS_ESTADISTICAS:
+        return
+    
+    # Los proveedores degradados a no principal se invalidan en ProveedorIntegracion.save
+    ConfiguracionIntegracion.invalidar_cache_principal(instance.codigo)
+    logger.info(f"Caché de configuración invalidada para proveedor {instance.codigo}")
+
+
+@receiver(post_save, sender=LogIntegracion)
+def log_integracion_creado(sender, instance, created, **kwargs):
+    """
+    Signal ejecutado al registrar una operación con un proveedor
+    """
+    if created:
+        instance.proveedor.registrar_documento_dia(timezone.localtime(instance.fecha_envio).date())
@@ -0,0 +1,170 @@
+"""
+Tests del conciliador SUNAT - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de la consulta de estados en lote contra un servidor HTTP local
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from aplicaciones.facturacion.models import DocumentoElectronico, SerieDocumento, TipoDocumentoElectronico
+from ..models import ConfiguracionIntegracion, LogIntegracion, ProveedorIntegracion
+from ..services.conciliador import ConciliadorSunat
+from ..services.nubefact import NubefactService
+from ..services.sesion_http import cerrar_sesiones
+
+
+class ManejadorConsultaSimulado(BaseHTTPRequestHandler):
+    """Responde el estado SUNAT según el hash consultado"""
+    
+    protocol_version = 'HTTP/1.1'
+    estados = {}
+    
+    def do_GET(self):
+        hash_documento = self.path.rsplit('/', 1)[-1]
+        estado = ManejadorConsultaSimulado.estados.get(hash_documento)
+        
+        codigo = 200 if estado else 404
+        datos = json.dumps({'sunat_status': estado} if estado else {'message': 'No encontrado'}).encode()
+        
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestConciliadorSunat(TransactionTestCase):
+    """Tests para ConciliadorSunat y el comando conciliar_sunat"""
+    
+    def setUp(self):
+        """Levanta el servidor simulado y documentos enviados a SUNAT"""
+        cache.clear()
+        cerrar_sesiones()
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorConsultaSimulado)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        url_base = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+        
+        proveedor = ProveedorIntegracion.objects.create(
+            codigo='nubefact',
+            nombre='Nubefact',
+            tipo='nubefact',
+            url_api=url_base,
+            es_principal=True,
+            reintentos_maximos=0,
+            endpoint_emision='/api/v1/invoices',
+            endpoint_consulta='/api/v1/documents'
+        )
+        ConfiguracionIntegracion.objects.create(
+            proveedor=proveedor,
+            token='token-prueba',
+            ruc_empresa='20123456789',
+            url_base=url_base
+        )
+        
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        cliente = Cliente.objects.create(
+            tipo_documento=TipoDocumento.objects.create(codigo='1', nombre='DNI'),
+            numero_documento='45678912',
+            razon_social='Juan Pérez',
+            direccion='Av. Cliente 456'
+        )
+        tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        serie = SerieDocumento.objects.create(
+            sucursal=empresa.sucursales.first(),
+            tipo_documento=tipo_documento,
+            serie='B001'
+        )
+        
+        estados_sunat = ['ACEPTADO', 'RECHAZADO', 'OBSERVADO', 'ACEPTADO', None]
+        ManejadorConsultaSimulado.estados = {}
+        self.documentos = []
+        for numero, estado_sunat in enumerate(estados_sunat, start=1):
+            hash_documento = f'HASH{numero}'
+            if estado_sunat:
+                ManejadorConsultaSimulado.estados[hash_documento] = estado_sunat
+            
+            self.documentos.append(DocumentoElectronico.objects.create(
+                tipo_documento=tipo_documento,
+                serie_documento=serie,
+                numero=numero,
+                cliente=cliente,
+                cliente_tipo_documento='1',
+                cliente_numero_documento=cliente.numero_documento,
+                cliente_razon_social=cliente.razon_social,
+                cliente_direccion=cliente.direccion,
+                estado='enviado_sunat',
+                hash_documento=hash_documento
+            ))
+    
+    def tearDown(self):
+        cerrar_sesiones()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+    
+    def test_concilia_por_lotes_con_un_update_por_lote(self):
+        """Test cada lote se guarda con una sola sentencia UPDATE"""
+        tabla = DocumentoElectronico._meta.db_table
+        
+        with CaptureQueriesContext(connection) as consultas:
+            resumen = ConciliadorSunat(hilos=3, tamano_lote=2).conciliar()
+        
+        actualizaciones = [q for q in consultas if q['sql'].startswith('UPDATE') and tabla in q['sql']]
+        self.assertEqual(resumen, {'consultados': 5, 'actualizados': 4, 'errores': 1, 'lotes': 3})
+        self.assertEqual(len(actualizaciones), 2)
+        self.assertEqual(LogIntegracion.objects.filter(tipo_operacion='consulta').count(), 5)
+        
+        estados = list(DocumentoElectronico.objects.order_by('numero').values_list('estado', flat=True))
+        self.assertEqual(
+            estados,
+            ['aceptado_sunat', 'rechazado_sunat', 'observado', 'aceptado_sunat', 'enviado_sunat']
+        )
+    
+    def test_no_sobrescribe_documentos_modificados_durante_la_consulta(self):
+        """Test un documento anulado después de leer el lote conserva su estado y no cuenta como actualizado"""
+        conciliador = ConciliadorSunat(hilos=2, servicio=NubefactService())
+        documentos = conciliador.obtener_lote(0)
+        DocumentoElectronico.objects.filter(pk=self.documentos[0].pk).update(estado='anulado')
+        
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            self.assertEqual(conciliador.procesar_lote(documentos, pool), (3, 1))
+        
+        estados = list(DocumentoElectronico.objects.order_by('numero').values_list('estado', flat=True))
+        self.assertEqual(
+            estados,
+            ['anulado', 'rechazado_sunat', 'observado', 'aceptado_sunat', 'enviado_sunat']
+        )
+    
+    def test_comando_conciliar_sunat(self):
+        """Test el comando reporta el resumen de la conciliación"""
+        salida = StringIO()
+        call_command('conciliar_sunat', '--hilos', '2', '--lote', '10', stdout=salida)
+        
+        self.assertIn('Documentos consultados: 5, actualizados: 4, errores: 1', salida.getvalue())
+        self.assertEqual(DocumentoElectronico.objects.filter(estado='enviado_sunat').count(), 1)
@@ -0,0 +1,213 @@
+"""
+Tests del despachador SUNAT - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de la cola de envíos contra un servidor HTTP local que simula Nubefact
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.utils import timezone
+from decimal import Decimal
+from io import StringIO
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from aplicaciones.facturacion.models import DetalleDocumento, DocumentoElectronico, SerieDocumento, TipoDocumentoElectronico
+from aplicaciones.productos.models import Categoria, Producto, TipoProducto
+from ..models import ColaEnvioSunat, ConfiguracionIntegracion, LogIntegracion, ProveedorIntegracion
+from ..services.despachador import DespachadorSunat
+
+
+class ManejadorNubefactSimulado(BaseHTTPRequestHandler):
+    """Responde como la API de Nubefact registrando las peticiones recibidas"""
+    
+    peticiones = []
+    codigo_respuesta = 200
+    
+    def do_POST(self):
+        longitud = int(self.headers.get('Content-Length', 0))
+        cuerpo = json.loads(self.rfile.read(longitud) or b'{}')
+        ManejadorNubefactSimulado.peticiones.append((self.path, cuerpo))
+        
+        respuesta = {
+            'hash': f"HASH-{cuerpo.get('serie')}-{cuerpo.get('numero')}",
+            'enlace_del_pdf': 'http://127.0.0.1/documento.pdf',
+        }
+        datos = json.dumps(respuesta).encode()
+        
+        self.send_response(self.codigo_respuesta)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDespachadorSunat(TransactionTestCase):
+    """Tests para la cola de envíos y el comando despachar_sunat"""
+    
+    def setUp(self):
+        """Levanta el servidor simulado y los datos mínimos de facturación"""
+        ManejadorNubefactSimulado.peticiones = []
+        ManejadorNubefactSimulado.codigo_respuesta = 200
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorNubefactSimulado)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        url_base = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+        
+        proveedor = ProveedorIntegracion.objects.create(
+            codigo='nubefact',
+            nombre='Nubefact',
+            tipo='nubefact',
+            url_api=url_base,
+            es_principal=True,
+            reintentos_maximos=2,
+            endpoint_emision='/api/v1/invoices',
+            endpoint_consulta='/api/v1/documents'
+        )
+        ConfiguracionIntegracion.objects.create(
+            proveedor=proveedor,
+            token='token-prueba',
+            ruc_empresa='20123456789',
+            url_base=url_base
+        )
+        
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        tipo_doc_cliente = TipoDocumento.objects.create(codigo='1', nombre='DNI')
+        self.cliente = Cliente.objects.create(
+            tipo_documento=tipo_doc_cliente,
+            numero_documento='45678912',
+            razon_social='Juan Pérez',
+            direccion='Av. Cliente 456'
+        )
+        self.tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        self.serie = SerieDocumento.objects.create(
+            sucursal=empresa.sucursales.first(),
+            tipo_documento=self.tipo_documento,
+            serie='B001'
+        )
+        self.producto = Producto.objects.create(
+            codigo='P001',
+            nombre='Producto 1',
+            tipo_producto=TipoProducto.objects.create(codigo='BIEN', nombre='Bien'),
+            categoria=Categoria.objects.create(codigo='GEN', nombre='General'),
+            precio_venta=Decimal('10.0000')
+        )
+    
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+    
+    def _crear_documento(self, numero):
+        """Crea una boleta emitida con un detalle"""
+        documento = DocumentoElectronico.objects.create(
+            tipo_documento=self.tipo_documento,
+            serie_documento=self.serie,
+            numero=numero,
+            cliente=self.cliente,
+            cliente_tipo_documento='1',
+            cliente_numero_documento=self.cliente.numero_documento,
+            cliente_razon_social=self.cliente.razon_social,
+            cliente_direccion=self.cliente.direccion,
+            estado='emitido'
+        )
+        DetalleDocumento.objects.create(
+            documento=documento,
+            numero_item=1,
+            producto=self.producto,
+            codigo_producto=self.producto.codigo,
+            descripcion=self.producto.nombre,
+            unidad_medida='NIU',
+            cantidad=Decimal('2.0000'),
+            precio_unitario=Decimal('10.0000')
+        )
+        return documento
+    
+    def test_encolar_no_duplica_envios_pendientes(self):
+        """Test encolar dos veces el mismo documento deja un solo envío pendiente"""
+        documento = self._crear_documento(1)
+        
+        primero = ColaEnvioSunat.encolar(documento)
+        segundo = ColaEnvioSunat.encolar(documento)
+        
+        self.assertEqual(primero.pk, segundo.pk)
+        self.assertEqual(ColaEnvioSunat.objects.count(), 1)
+        self.assertEqual(ManejadorNubefactSimulado.peticiones, [])
+    
+    def test_despachar_envia_documentos_con_pool_de_hilos(self):
+        """Test el comando envía todos los documentos encolados y actualiza su estado"""
+        documentos = [self._crear_documento(numero) for numero in range(1, 6)]
+        for documento in documentos:
+            ColaEnvioSunat.encolar(documento)
+        
+        salida = StringIO()
+        call_command('despachar_sunat', '--hilos', '3', '--una-vez', stdout=salida)
+        
+        self.assertIn('Envíos procesados: 5', salida.getvalue())
+        self.assertEqual(len(ManejadorNubefactSimulado.peticiones), 5)
+        self.assertEqual(ColaEnvioSunat.objects.filter(estado='completado').count(), 5)
+        self.assertEqual(LogIntegracion.objects.filter(exitoso=True).count(), 5)
+        
+        for documento in documentos:
+            documento.refresh_from_db()
+            self.assertEqual(documento.estado, 'enviado_sunat')
+            self.assertEqual(documento.hash_documento, f'HASH-B001-{documento.numero}')
+    
+    def test_error_http_programa_reintento_y_luego_error(self):
+        """Test un error del proveedor reprograma el envío hasta agotar reintentos"""
+        ManejadorNubefactSimulado.codigo_respuesta = 500
+        envio = ColaEnvioSunat.encolar(self._crear_documento(1))
+        despachador = DespachadorSunat(hilos=1)
+        
+        self.assertEqual(despachador.procesar_lote(), 1)
+        envio.refresh_from_db()
+        self.assertEqual(envio.estado, 'pendiente')
+        self.assertGreater(envio.proximo_intento, timezone.now())
+        
+        ColaEnvioSunat.objects.filter(pk=envio.pk).update(proximo_intento=timezone.now())
+        self.assertEqual(despachador.procesar_lote(), 1)
+        envio.refresh_from_db()
+        self.assertEqual(envio.estado, 'error')
+        self.assertEqual(envio.intentos, 2)
+    
+    def test_sin_configuracion_pospone_sin_gastar_intentos(self):
+        """Test sin configuración del proveedor el envío sigue pendiente, reprogramado y sin intentos"""
+        envio = ColaEnvioSunat.encolar(self._crear_documento(1))
+        ConfiguracionIntegracion.objects.all().delete()
+        ConfiguracionIntegracion.invalidar_cache_principal('nubefact')
+        
+        self.assertEqual(DespachadorSunat(hilos=1).procesar_lote(), 1)
+        envio.refresh_from_db()
+        self.assertEqual(envio.estado, 'pendiente')
+        self.assertEqual(envio.intentos, 0)
+        self.assertGreater(envio.proximo_intento, timezone.now())
+        self.assertEqual(ManejadorNubefactSimulado.peticiones, [])
+    
+    def test_libera_envios_de_trabajadores_detenidos(self):
+        """Test los envíos bloqueados por un trabajador caído vuelven a la cola"""
+        envio = ColaEnvioSunat.encolar(self._crear_documento(1))
+        ColaEnvioSunat.objects.filter(pk=envio.pk).update(
+            estado='procesando',
+            fecha_bloqueo=timezone.now() - timezone.timedelta(hours=1)
+        )
+        
+        self.assertEqual(DespachadorSunat(hilos=1).procesar_lote(), 1)
+        envio.refresh_from_db()
+        self.assertEqual(envio.estado, 'completado')
@@ -0,0 +1,99 @@
+"""
+Tests de modelos de Integraciones - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests del contador diario de operaciones por proveedor
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import ConfiguracionIntegracion, CupoDiarioProveedor, LogIntegracion, ProveedorIntegracion
+
+
+class TestCupoDiarioProveedor(TestCase):
+    """Tests para ProveedorIntegracion.puede_enviar_documento con contador por día"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        cache.clear()
+        self.proveedor = ProveedorIntegracion.objects.create(
+            codigo='nubefact',
+            nombre='Nubefact',
+            tipo='nubefact',
+            url_api='http://127.0.0.1',
+            limite_documentos_dia=3,
+            endpoint_emision='/api/v1/invoices',
+            endpoint_consulta='/api/v1/documents'
+        )
+        self.configuracion = ConfiguracionIntegracion.objects.create(
+            proveedor=self.proveedor,
+            token='token-prueba',
+            ruc_empresa='20123456789',
+            url_base='http://127.0.0.1'
+        )
+    
+    def _registrar_log(self, **kwargs):
+        """Crea un log de emisión para el proveedor y confirma su transacción"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return LogIntegracion.objects.create(
+                proveedor=self.proveedor,
+                configuracion=self.configuracion,
+                tipo_operacion='emision',
+                endpoint_utilizado='/api/v1/invoices',
+                **kwargs
+            )
+    
+    def test_verificacion_con_una_consulta(self):
+        """Test el cupo diario se verifica leyendo solo la fila del contador"""
+        self._registrar_log()
+        
+        with self.assertNumQueries(1):
+            puede_enviar, _ = self.proveedor.puede_enviar_documento()
+        
+        self.assertTrue(puede_enviar)
+        self.assertEqual(self.proveedor.contar_documentos_dia(), 1)
+    
+    def test_limite_diario_alcanzado(self):
+        """Test al llegar al límite diario no se permite enviar"""
+        for _ in range(3):
+            self._registrar_log()
+        
+        puede_enviar, motivo = self.proveedor.puede_enviar_documento()
+        self.assertFalse(puede_enviar)
+        self.assertIn('Límite diario alcanzado', motivo)
+    
+    def test_reconstruye_contador_desde_logs(self):
+        """Test sin fila del día se recalcula desde los logs y se crea el contador"""
+        self._registrar_log()
+        self._registrar_log()
+        self._registrar_log(fecha_envio=timezone.now() - timezone.timedelta(days=1))
+        CupoDiarioProveedor.objects.all().delete()
+        
+        self.assertEqual(self.proveedor.contar_documentos_dia(), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.proveedor.contar_documentos_dia(), 2)
+        
+        self._registrar_log()
+        self.assertEqual(self.proveedor.contar_documentos_dia(), 3)
+    
+    def test_incrementa_solo_al_confirmar(self):
+        """Test el incremento se aplica al confirmar la transacción, no al crear el log"""
+        self._registrar_log()
+        
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with transaction.atomic():
+                LogIntegracion.objects.create(
+                    proveedor=self.proveedor,
+                    configuracion=self.configuracion,
+                    tipo_operacion='emision',
+                    endpoint_utilizado='/api/v1/invoices'
+                )
+                self.assertEqual(self.proveedor.contar_documentos_dia(), 1)
+        
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.proveedor.contar_documentos_dia(), 1)
+        
+        callbacks[0]()
+        self.assertEqual(self.proveedor.contar_documentos_dia(), 2)
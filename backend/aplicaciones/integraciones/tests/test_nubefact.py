@@ -0,0 +1,208 @@
+"""
+Tests del servicio Nubefact - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de la sesión keep-alive, reintentos y caché de configuración
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.cache import cache
+from django.test import TestCase
+from decimal import Decimal
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from aplicaciones.facturacion.models import DetalleDocumento, DocumentoElectronico, SerieDocumento, TipoDocumentoElectronico
+from aplicaciones.productos.models import Categoria, Producto, TipoProducto
+from ..models import ConfiguracionIntegracion, LogIntegracion, ProveedorIntegracion
+from ..services.nubefact import NubefactService
+from ..services.sesion_http import cerrar_sesiones
+
+
+class ManejadorKeepAlive(BaseHTTPRequestHandler):
+    """Servidor HTTP/1.1 que registra conexiones y responde según una secuencia de códigos"""
+    
+    protocol_version = 'HTTP/1.1'
+    conexiones = set()
+    peticiones = []
+    codigos = []
+    
+    def _responder(self):
+        longitud = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(longitud)
+        ManejadorKeepAlive.conexiones.add(self.client_address)
+        ManejadorKeepAlive.peticiones.append((self.command, self.path))
+        
+        codigo = ManejadorKeepAlive.codigos.pop(0) if ManejadorKeepAlive.codigos else 200
+        datos = json.dumps({'hash': 'HASH-PRUEBA', 'sunat_status': 'ACEPTADO'}).encode()
+        
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+    
+    do_GET = _responder
+    do_POST = _responder
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestNubefactService(TestCase):
+    """Tests para NubefactService con la sesión HTTP compartida"""
+    
+    def setUp(self):
+        """Levanta el servidor simulado y los datos mínimos de facturación"""
+        cache.clear()
+        cerrar_sesiones()
+        ManejadorKeepAlive.conexiones = set()
+        ManejadorKeepAlive.peticiones = []
+        ManejadorKeepAlive.codigos = []
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorKeepAlive)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        url_base = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+        
+        self.proveedor = ProveedorIntegracion.objects.create(
+            codigo='nubefact',
+            nombre='Nubefact',
+            tipo='nubefact',
+            url_api=url_base,
+            es_principal=True,
+            reintentos_maximos=2,
+            factor_espera_reintento=Decimal('0.00'),
+            endpoint_emision='/api/v1/invoices',
+            endpoint_consulta='/api/v1/documents'
+        )
+        self.configuracion = ConfiguracionIntegracion.objects.create(
+            proveedor=self.proveedor,
+            token='token-prueba',
+            ruc_empresa='20123456789',
+            url_base=url_base
+        )
+        
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        cliente = Cliente.objects.create(
+            tipo_documento=TipoDocumento.objects.create(codigo='1', nombre='DNI'),
+            numero_documento='45678912',
+            razon_social='Juan Pérez',
+            direccion='Av. Cliente 456'
+        )
+        tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        serie = SerieDocumento.objects.create(
+            sucursal=empresa.sucursales.first(),
+            tipo_documento=tipo_documento,
+            serie='B001'
+        )
+        producto = Producto.objects.create(
+            codigo='P001',
+            nombre='Producto 1',
+            tipo_producto=TipoProducto.objects.create(codigo='BIEN', nombre='Bien'),
+            categoria=Categoria.objects.create(codigo='GEN', nombre='General'),
+            precio_venta=Decimal('10.0000')
+        )
+        
+        self.documentos = []
+        for numero in range(1, 4):
+            documento = DocumentoElectronico.objects.create(
+                tipo_documento=tipo_documento,
+                serie_documento=serie,
+                numero=numero,
+                cliente=cliente,
+                cliente_tipo_documento='1',
+                cliente_numero_documento=cliente.numero_documento,
+                cliente_razon_social=cliente.razon_social,
+                cliente_direccion=cliente.direccion,
+                estado='emitido'
+            )
+            DetalleDocumento.objects.create(
+                documento=documento,
+                numero_item=1,
+                producto=producto,
+                codigo_producto=producto.codigo,
+                descripcion=producto.nombre,
+                unidad_medida='NIU',
+                cantidad=Decimal('1.0000'),
+                precio_unitario=Decimal('10.0000')
+            )
+            self.documentos.append(documento)
+    
+    def tearDown(self):
+        cerrar_sesiones()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+    
+    def test_reutiliza_conexion_entre_envios(self):
+        """Test varios envíos comparten una sola conexión keep-alive"""
+        for documento in self.documentos:
+            resultado = NubefactService().enviar_documento(documento)
+            self.assertTrue(resultado['exitoso'])
+        
+        self.assertEqual(len(ManejadorKeepAlive.peticiones), 3)
+        self.assertEqual(len(ManejadorKeepAlive.conexiones), 1)
+        
+        logs = list(LogIntegracion.objects.order_by('id'))
+        for log in logs:
+            self.assertIsNotNone(log.tiempo_respuesta_ms)
+            self.assertEqual(log.tiempo_respuesta_ms, log.tiempo_conexion_ms + log.tiempo_transferencia_ms)
+        self.assertEqual(logs[-1].tiempo_conexion_ms, 0)
+    
+    def test_configuracion_en_cache_hasta_guardarla(self):
+        """Test la configuración se lee de caché y se invalida al guardarla"""
+        NubefactService()
+        with self.assertNumQueries(0):
+            NubefactService()
+        
+        # Las estadísticas de envío no invalidan la caché
+        self.proveedor.actualizar_estadisticas(exitoso=True)
+        with self.assertNumQueries(0):
+            NubefactService()
+        
+        self.configuracion.token = 'token-nuevo'
+        self.configuracion.save()
+        self.assertEqual(NubefactService().token, 'token-nuevo')
+    
+    def test_nuevo_principal_invalida_al_degradado(self):
+        """Test al marcar otro proveedor como principal se invalida la caché del anterior"""
+        self.assertEqual(ConfiguracionIntegracion.obtener_principal('nubefact'), self.configuracion)
+        
+        ProveedorIntegracion.objects.create(
+            codigo='respaldo',
+            nombre='Proveedor de respaldo',
+            tipo='otro',
+            url_api='http://127.0.0.1:1',
+            es_principal=True,
+            endpoint_emision='/emision',
+            endpoint_consulta='/consulta'
+        )
+        
+        self.assertIsNone(ConfiguracionIntegracion.obtener_principal('nubefact'))
+    
+    def test_reintenta_consulta_ante_error_transitorio(self):
+        """Test una consulta GET se reintenta ante 503 y el envío POST no"""
+        documento = self.documentos[0]
+        documento.hash_documento = 'HASH-PRUEBA'
+        
+        ManejadorKeepAlive.codigos = [503]
+        resultado = NubefactService().consultar_documento(documento)
+        self.assertTrue(resultado['exitoso'])
+        self.assertEqual(len(ManejadorKeepAlive.peticiones), 2)
+        
+        ManejadorKeepAlive.codigos = [503]
+        resultado = NubefactService().enviar_documento(self.documentos[1])
+        self.assertFalse(resultado['exitoso'])
+        self.assertEqual(len(ManejadorKeepAlive.peticiones), 3)
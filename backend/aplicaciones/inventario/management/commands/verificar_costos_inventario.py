@@ -0,0 +1,90 @@
+"""
+Comando verificar_costos_inventario - FELICITAFAC
+Compara el costo promedio acumulado de cada stock contra sus lotes abiertos
+Uso: python manage.py verificar_costos_inventario [--reparar] [--tolerancia 0.0001]
+"""
+
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from aplicaciones.inventario.models import LoteProducto, StockProducto
+
+
+class Command(BaseCommand):
+    help = 'Verifica (y opcionalmente repara) el costo promedio de los stocks recorriendo todos los lotes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar',
+            action='store_true',
+            help='Guardar el costo recalculado en los stocks con diferencias'
+        )
+        parser.add_argument(
+            '--tolerancia',
+            type=Decimal,
+            default=Decimal('0.0001'),
+            help='Diferencia máxima aceptada en el costo promedio'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Cantidad de stocks por sentencia al reparar'
+        )
+    
+    def handle(self, *args, **options):
+        tolerancia = options['tolerancia']
+        
+        # Una sola consulta agrupada con el valor de los lotes abiertos por producto y almacén
+        totales_lotes = {
+            (total['producto_id'], total['almacen_id']): total
+            for total in LoteProducto.objects.filter(
+                cantidad_actual__gt=0,
+                activo=True
+            ).values('producto_id', 'almacen_id').annotate(
+                cantidad=models.Sum('cantidad_actual'),
+                valor=models.Sum(
+                    models.F('cantidad_actual') * models.F('costo_unitario'),
+                    output_field=models.DecimalField(max_digits=16, decimal_places=4)
+                )
+            ).order_by()
+        }
+        
+        revisados = 0
+        corregidos = []
+        stocks = StockProducto.objects.filter(activo=True).select_related('producto', 'almacen')
+        
+        for stock in stocks.iterator(chunk_size=options['lote']):
+            revisados += 1
+            lotes = totales_lotes.get((stock.producto_id, stock.almacen_id))
+            
+            if lotes and lotes['cantidad'] > 0:
+                costo_esperado = (lotes['valor'] / lotes['cantidad']).quantize(Decimal('0.0001'))
+            else:
+                costo_esperado = stock.costo_promedio
+            valor_esperado = stock.cantidad_actual * costo_esperado if stock.cantidad_actual > 0 else Decimal('0.0000')
+            
+            costo_correcto = abs(stock.costo_promedio - costo_esperado) <= tolerancia
+            valor_correcto = abs(stock.valor_costo - valor_esperado) <= tolerancia
+            if costo_correcto and valor_correcto:
+                continue
+            
+            self.stdout.write(
+                f"{stock.producto.codigo} / {stock.almacen.codigo}: costo {stock.costo_promedio} -> {costo_esperado}, "
+                f"valor {stock.valor_costo} -> {valor_esperado}"
+            )
+            stock.costo_promedio = costo_esperado
+            stock.valor_costo = valor_esperado
+            stock.valor_inventario = (stock.cantidad_actual * costo_esperado).quantize(Decimal('0.01'))
+            corregidos.append(stock)
+        
+        if options['reparar'] and corregidos:
+            with transaction.atomic():
+                StockProducto.objects.bulk_update(
+                    corregidos,
+                    ['costo_promedio', 'valor_costo', 'valor_inventario'],
+                    batch_size=options['lote']
+                )
+        
+        accion = 'reparados' if options['reparar'] else 'con diferencias'
+        self.stdout.write(self.style.SUCCESS(f"Stocks revisados: {revisados}, {accion}: {len(corregidos)}"))
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:09
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def inicializar_valor_costo(apps, schema_editor):
+    """El valor acumulado parte del costo promedio vigente de cada stock"""
+    StockProducto = apps.get_model('inventario', 'StockProducto')
+    StockProducto.objects.update(valor_costo=models.F('cantidad_actual') * models.F('costo_promedio'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockproducto',
+            name='valor_costo',
+            field=models.DecimalField(decimal_places=4, default=Decimal('0.0000'), help_text='Valor acumulado al costo, base del costo promedio ponderado', max_digits=16, verbose_name='Valor al Costo'),
+        ),
+        migrations.RunPython(inicializar_valor_costo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0002_numeracion_reservada'),
+        ('productos', '0002_jerarquia_categorias'),
+        ('inventario', '0002_valor_costo_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumoLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=4, help_text='Cantidad consumida del lote', max_digits=12, verbose_name='Cantidad')),
+                ('costo_unitario', models.DecimalField(decimal_places=4, help_text='Costo unitario del lote al momento de la salida', max_digits=12, verbose_name='Costo Unitario')),
+                ('fecha_consumo', models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha de la salida', verbose_name='Fecha Consumo')),
+                ('detalle_documento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consumos_lote', to='facturacion.detalledocumento', verbose_name='Detalle Documento')),
+                ('documento_electronico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos_lote', to='facturacion.documentoelectronico', verbose_name='Documento Electrónico')),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='consumos', to='inventario.loteproducto', verbose_name='Lote')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='consumos_lote', to='productos.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Consumo de Lote',
+                'verbose_name_plural': 'Consumos de Lotes',
+                'db_table': 'inventario_consumo_lote',
+            },
+        ),
+    ]
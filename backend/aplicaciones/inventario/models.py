@@ -333,6 +333,14 @@ class StockProducto(ModeloBase):
         help_text='Valor total del inventario'
     )
     
+    valor_costo = models.DecimalField(
+        'Valor al Costo',
+        max_digits=16,
+        decimal_places=4,
+        default=Decimal('0.0000'),
+        help_text='Valor acumulado al costo, base del costo promedio ponderado'
+    )
+    
     fecha_ultimo_movimiento = models.DateTimeField(
         'Último Movimiento',
         blank=True,
@@ -416,6 +424,59 @@ class StockProducto(ModeloBase):
         """Verifica si hay cantidad disponible"""
         return self.cantidad_disponible >= cantidad_requerida
     
+    def registrar_entrada(self, cantidad, costo_unitario=None, valor_entrada=None):
+        """
+        Suma una entrada al valor acumulado y actualiza el costo promedio (no guarda)
+        valor_entrada reemplaza cantidad x costo_unitario, p. ej. al devolver lotes consumidos
+        """
+        if costo_unitario is None:
+            costo_unitario = self.costo_promedio
+        if valor_entrada is None:
+            valor_entrada = cantidad * costo_unitario
+        
+        self.cantidad_actual += cantidad
+        self.valor_costo += valor_entrada
+        self._actualizar_costo_promedio()
+    
+    def registrar_salida(self, cantidad, valor_salida=None):
+        """
+        Descuenta una salida del valor acumulado (no guarda)
+        valor_salida es el costo de los lotes consumidos; sin lotes se usa el costo promedio
+        """
+        if valor_salida is None:
+            valor_salida = cantidad * self.costo_promedio
+        
+        self.cantidad_actual -= cantidad
+        self.valor_costo -= valor_salida
+        self._actualizar_costo_promedio()
+    
+    def _actualizar_costo_promedio(self):
+        """Costo promedio = valor acumulado / cantidad; sin stock conserva el último costo"""
+        if self.cantidad_actual > 0:
+            self.costo_promedio = (self.valor_costo / self.cantidad_actual).quantize(Decimal('0.0001'))
+        else:
+            self.valor_costo = Decimal('0.0000')
+    
+    @staticmethod
+    def calcular_valor_lotes(producto, almacen):
+        """
+        Cantidad y valor de los lotes abiertos calculados en la base de datos
+        Retorna (cantidad, valor); se usa para verificar y reparar el valor acumulado
+        """
+        totales = LoteProducto.objects.filter(
+            producto=producto,
+            almacen=almacen,
+            cantidad_actual__gt=0,
+            activo=True
+        ).aggregate(
+            cantidad=models.Sum('cantidad_actual'),
+            valor=models.Sum(
+                models.F('cantidad_actual') * models.F('costo_unitario'),
+                output_field=models.DecimalField(max_digits=16, decimal_places=4)
+            )
+        )
+        return totales['cantidad'] or Decimal('0.0000'), totales['valor'] or Decimal('0.0000')
+    
     def reservar_cantidad(self, cantidad):
         """Reserva una cantidad específica"""
         if self.cantidad_disponible >= cantidad:
@@ -625,6 +686,109 @@ class LoteProducto(ModeloBase):
             return cantidad_consumida
 
 
+class ConsumoLote(models.Model):
+    """
+    Costo PEPS de cada lote consumido por la venta de un documento
+    Se registra al procesar la salida para costear el documento sin volver a recorrer lotes
+    Tabla compacta: una fila por lote y línea vendida, sin campos de auditoría
+    """
+    
+    documento_electronico = models.ForeignKey(
+        'facturacion.DocumentoElectronico',
+        on_delete=models.CASCADE,
+        related_name='consumos_lote',
+        verbose_name='Documento Electrónico'
+    )
+    
+    detalle_documento = models.ForeignKey(
+        'facturacion.DetalleDocumento',
+        on_delete=models.CASCADE,
+        related_name='consumos_lote',
+        verbose_name='Detalle Documento',
+        blank=True,
+        null=True
+    )
+    
+    producto = models.ForeignKey(
+        'productos.Producto',
+        on_delete=models.PROTECT,
+        related_name='consumos_lote',
+        verbose_name='Producto'
+    )
+    
+    lote = models.ForeignKey(
+        LoteProducto,
+        on_delete=models.PROTECT,
+        related_name='consumos',
+        verbose_name='Lote'
+    )
+    
+    cantidad = models.DecimalField(
+        'Cantidad',
+        max_digits=12,
+        decimal_places=4,
+        help_text='Cantidad consumida del lote'
+    )
+    
+    costo_unitario = models.DecimalField(
+        'Costo Unitario',
+        max_digits=12,
+        decimal_places=4,
+        help_text='Costo unitario del lote al momento de la salida'
+    )
+    
+    fecha_consumo = models.DateTimeField(
+        'Fecha Consumo',
+        default=timezone.now,
+        help_text='Fecha de la salida'
+    )
+    
+    class Meta:
+        db_table = 'inventario_consumo_lote'
+        verbose_name = 'Consumo de Lote'
+        verbose_name_plural = 'Consumos de Lotes'
+    
+    def __str__(self):
+        return f"{self.documento_electronico_id} - {self.lote_id}: {self.cantidad}"
+    
+    @classmethod
+    def registrar(cls, documento_electronico_id, producto_id, asignacion, detalle_documento_id=None):
+        """
+        Guarda con un bulk_create los lotes consumidos por una línea vendida
+        asignacion: [(lote, cantidad_consumida), ...] como la retorna asignar_lotes_peps
+        """
+        cls.objects.bulk_create([
+            cls(
+                documento_electronico_id=documento_electronico_id,
+                detalle_documento_id=detalle_documento_id,
+                producto_id=producto_id,
+                lote=lote,
+                cantidad=cantidad_consumida,
+                costo_unitario=lote.costo_unitario
+            )
+            for lote, cantidad_consumida in asignacion
+        ])
+    
+    @classmethod
+    def costos_por_documento(cls, documentos):
+        """
+        Costo PEPS total por documento en una consulta
+        documentos: ids o subconsulta de ids; retorna {documento_id: costo}
+        """
+        return dict(
+            cls.objects.filter(
+                documento_electronico_id__in=documentos
+            ).values(
+                'documento_electronico_id'
+            ).annotate(
+                costo=models.Sum(
+                    models.F('cantidad') * models.F('costo_unitario'),
+                    output_field=models.DecimalField(max_digits=20, decimal_places=8)
+                )
+            ).order_by().values_list('documento_electronico_id', 'costo')
+        )
+
+
 class MovimientoInventario(ModeloBase):
     """
     Modelo principal para movimientos de inventario
@@ -639,6 +803,8 @@ class MovimientoInventario(ModeloBase):
         ('anulado', 'Anulado'),
     ]
     
+    AMBITO_CORRELATIVO = 'inventario.movimiento'
+    
     # Identificación única
     uuid = models.UUIDField(
         'UUID',
@@ -804,18 +970,17 @@ class MovimientoInventario(ModeloBase):
     def _generar_numero(self):
         """Genera número automático para el movimiento"""
         from datetime import datetime
+        from aplicaciones.core.models import Correlativo
         
         prefix = f"MOV{datetime.now().strftime('%Y%m')}"
-        ultimo = MovimientoInventario.objects.filter(
-            numero__startswith=prefix
-        ).order_by('-numero').first()
         
-        if ultimo:
-            ultimo_numero = int(ultimo.numero[-6:])
-            nuevo_numero = ultimo_numero + 1
-        else:
-            nuevo_numero = 1
+        def ultimo_usado():
+            ultimo = MovimientoInventario.objects.filter(
+                numero__startswith=prefix
+            ).order_by('-numero').first()
+            return int(ultimo.numero[-6:]) if ultimo else 0
         
+        nuevo_numero = Correlativo.siguiente(self.AMBITO_CORRELATIVO, prefix, semilla=ultimo_usado)
         return f"{prefix}{nuevo_numero:06d}"
     
     def puede_autorizar(self, usuario):
@@ -842,19 +1007,13 @@ class MovimientoInventario(ModeloBase):
     
     def ejecutar(self):
         """Ejecuta el movimiento afectando el inventario"""
+        from .services import ServicioInventario
+        
         if self.estado not in ['autorizado', 'pendiente']:
             raise ValidationError(f"No se puede ejecutar movimiento en estado: {self.estado}")
         
-        # Ejecutar cada detalle del movimiento
-        for detalle in self.detalles.all():
-            detalle.ejecutar()
-        
-        # Actualizar estado
-        self.estado = 'ejecutado'
-        self.save(update_fields=['estado'])
-        
-        # Recalcular totales
-        self._calcular_totales()
+        # Ejecutar todos los detalles en lote y recalcular totales
+        ServicioInventario.ejecutar_movimiento(self)
     
     def anular(self, motivo):
         """Anula el movimiento"""
@@ -1057,6 +1216,8 @@ class DetalleMovimiento(ModeloBase):
             activo=True
         ).order_by('fecha_ingreso')
         
+        valor_salida = Decimal('0.0000')
+        asignacion = []
         for lote in lotes_disponibles:
             if cantidad_pendiente <= 0:
                 break
@@ -1064,12 +1225,18 @@ class DetalleMovimiento(ModeloBase):
             cantidad_a_consumir = min(cantidad_pendiente, lote.cantidad_actual)
             cantidad_consumida = lote.consumir_cantidad(cantidad_a_consumir)
             cantidad_pendiente -= cantidad_consumida
+            valor_salida += cantidad_consumida * lote.costo_unitario
+            asignacion.append((lote, cantidad_consumida))
         
         if cantidad_pendiente > 0:
             raise ValidationError(f"Stock insuficiente. Faltante: {cantidad_pendiente}")
         
-        # Actualizar stock del producto
-        self._actualizar_stock_producto('salida')
+        # Registrar el costo PEPS si la salida corresponde a una venta
+        if self.movimiento.documento_electronico_id:
+            ConsumoLote.registrar(self.movimiento.documento_electronico_id, self.producto_id, asignacion)
+        
+        # Actualizar stock del producto al costo de los lotes consumidos
+        self._actualizar_stock_producto('salida', valor_salida)
     
     def _ejecutar_ajuste(self):
         """Ejecuta un ajuste de inventario"""
@@ -1079,8 +1246,11 @@ class DetalleMovimiento(ModeloBase):
         else:
             self._actualizar_stock_producto('salida')
     
-    def _actualizar_stock_producto(self, tipo_operacion):
-        """Actualiza el stock del producto en el almacén"""
+    def _actualizar_stock_producto(self, tipo_operacion, valor_salida=None):
+        """
+        Actualiza el stock del producto en el almacén
+        El costo promedio se ajusta con el valor acumulado, sin recorrer los lotes
+        """
         stock, creado = StockProducto.objects.get_or_create(
             producto=self.producto,
             almacen=self.movimiento.almacen,
@@ -1088,46 +1258,24 @@ class DetalleMovimiento(ModeloBase):
         )
         
         if tipo_operacion == 'entrada':
-            stock.cantidad_actual += self.cantidad
+            stock.registrar_entrada(self.cantidad, self.costo_unitario or None)
             stock.fecha_ultimo_ingreso = self.movimiento.fecha_movimiento
         else:  # salida
-            stock.cantidad_actual -= self.cantidad
+            stock.registrar_salida(self.cantidad, valor_salida)
             stock.fecha_ultima_salida = self.movimiento.fecha_movimiento
         
         stock.fecha_ultimo_movimiento = self.movimiento.fecha_movimiento
-        
-        # Recalcular costo promedio
-        stock.costo_promedio = self._calcular_costo_promedio()
-        
         stock.save()
     
-    def _calcular_costo_promedio(self):
-        """Calcula el costo promedio del producto en el almacén"""
-        lotes = LoteProducto.objects.filter(
-            producto=self.producto,
-            almacen=self.movimiento.almacen,
-            cantidad_actual__gt=0,
-            activo=True
-        )
-        
-        if not lotes.exists():
-            return Decimal('0.0000')
-        
-        total_cantidad = sum(lote.cantidad_actual for lote in lotes)
-        total_valor = sum(lote.cantidad_actual * lote.costo_unitario for lote in lotes)
-        
-        if total_cantidad > 0:
-            return total_valor / total_cantidad
-        
-        return Decimal('0.0000')
-    
     def reversar(self):
         """Reversa el movimiento (para anulaciones)"""
         if not self.ejecutado:
             return
         
         if self.movimiento.tipo_movimiento.tipo == 'entrada':
-            self._actualizar_stock_producto('salida')
+            # La entrada se retira al mismo costo con el que ingresó
+            valor_entrada = self.cantidad * self.costo_unitario if self.costo_unitario else None
+            self._actualizar_stock_producto('salida', valor_entrada)
         elif self.movimiento.tipo_movimiento.tipo == 'salida':
             self._actualizar_stock_producto('entrada')
         
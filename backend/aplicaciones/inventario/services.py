@@ -8,10 +8,11 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
+from itertools import accumulate
 import logging
 from .models import (
     StockProducto, LoteProducto, MovimientoInventario, 
-    DetalleMovimiento, TipoMovimiento, Almacen
+    DetalleMovimiento, TipoMovimiento, Almacen, ConsumoLote
 )
 
 logger = logging.getLogger(__name__)
@@ -59,13 +60,7 @@ class ServicioInventario:
                     )
                 
                 # Actualizar stock con costo promedio ponderado
-                cantidad_total = stock.cantidad_actual + cantidad
-                if cantidad_total > 0:
-                    valor_anterior = stock.cantidad_actual * stock.costo_promedio
-                    valor_nuevo = cantidad * costo_unitario
-                    stock.costo_promedio = (valor_anterior + valor_nuevo) / cantidad_total
-                
-                stock.cantidad_actual = cantidad_total
+                stock.registrar_entrada(cantidad, costo_unitario)
                 stock.fecha_ultimo_ingreso = timezone.now()
                 stock.fecha_ultimo_movimiento = timezone.now()
                 stock.save()
@@ -93,13 +88,18 @@ class ServicioInventario:
     
     @staticmethod
     def procesar_salida(producto, almacen, cantidad, usuario=None, 
-                       documento_origen=None, forzar=False):
-        """Procesar salida de inventario usando método PEPS"""
+                       documento_origen=None, forzar=False, detalle_documento=None):
+        """
+        Procesar salida de inventario usando método PEPS
+        La asignación a lotes se calcula en una pasada sobre los lotes bloqueados
+        y se guarda con un solo bulk_update
+        Con detalle_documento se registra el costo de cada lote consumido para el costo de venta
+        """
         
         with transaction.atomic():
             try:
                 # Verificar stock disponible
-                stock = StockProducto.objects.filter(
+                stock = StockProducto.objects.select_for_update().filter(
                     producto=producto, almacen=almacen
                 ).first()
                 
@@ -112,46 +112,56 @@ class ServicioInventario:
                         f"Requerido: {cantidad}"
                     )
                 
-                # Procesar salida usando PEPS
-                cantidad_pendiente = cantidad
-                lotes_consumidos = []
+                # Obtener lotes ordenados por fecha (PEPS) bloqueados hasta el fin de la transacción
+                lotes = list(
+                    LoteProducto.objects.select_for_update().filter(
+                        producto=producto,
+                        almacen=almacen,
+                        cantidad_actual__gt=0,
+                        activo=True
+                    ).order_by('fecha_ingreso', 'numero_lote')
+                )
                 
-                # Obtener lotes ordenados por fecha (PEPS)
-                lotes = LoteProducto.objects.filter(
-                    producto=producto,
-                    almacen=almacen,
-                    cantidad_actual__gt=0,
-                    activo=True
-                ).order_by('fecha_ingreso', 'numero_lote')
+                # Verificar calidad de los lotes
+                if not forzar:
+                    lotes = [
+                        lote for lote in lotes
+                        if lote.estado_calidad in ['bueno', 'regular'] and not lote.esta_vencido()
+                    ]
                 
-                for lote in lotes:
-                    if cantidad_pendiente <= 0:
-                        break
-                    
-                    # Verificar calidad del lote
-                    disponible, mensaje = lote.esta_disponible(cantidad_pendiente)
-                    if not disponible and not forzar:
-                        continue
-                    
-                    # Consumir del lote
-                    cantidad_a_consumir = min(cantidad_pendiente, lote.cantidad_actual)
-                    cantidad_consumida = lote.consumir_cantidad(cantidad_a_consumir)
-                    
-                    cantidad_pendiente -= cantidad_consumida
+                asignacion, cantidad_pendiente = ServicioInventario.asignar_lotes_peps(lotes, cantidad)
+                
+                # Verificar que se pudo completar la salida
+                if cantidad_pendiente > 0 and not forzar:
+                    raise ValidationError(
+                        f"No se pudo completar la salida. Faltante: {cantidad_pendiente}"
+                    )
+                
+                # Consumir de los lotes
+                lotes_consumidos = []
+                valor_salida = Decimal('0.0000')
+                for lote, cantidad_consumida in asignacion:
+                    lote.cantidad_actual -= cantidad_consumida
+                    lote.valor_total = lote.cantidad_actual * lote.costo_unitario
+                    valor_salida += cantidad_consumida * lote.costo_unitario
                     lotes_consumidos.append({
                         'lote': lote.numero_lote,
                         'cantidad': cantidad_consumida,
                         'costo_unitario': lote.costo_unitario
                     })
                 
-                # Verificar que se pudo completar la salida
-                if cantidad_pendiente > 0 and not forzar:
-                    raise ValidationError(
-                        f"No se pudo completar la salida. Faltante: {cantidad_pendiente}"
+                if asignacion:
+                    LoteProducto.objects.bulk_update(
+                        [lote for lote, _ in asignacion], ['cantidad_actual', 'valor_total']
                     )
+                    
+                    if detalle_documento is not None:
+                        ConsumoLote.registrar(
+                            detalle_documento.documento_id, producto.id, asignacion, detalle_documento.id
+                        )
                 
-                # Actualizar stock general
-                stock.cantidad_actual -= (cantidad - cantidad_pendiente)
+                # Actualizar stock general al costo de los lotes consumidos
+                stock.registrar_salida(cantidad - cantidad_pendiente, valor_salida)
                 stock.fecha_ultima_salida = timezone.now()
                 stock.fecha_ultimo_movimiento = timezone.now()
                 stock.save()
@@ -179,6 +189,401 @@ class ServicioInventario:
                 logger.error(f"Error procesando salida: {str(e)}")
                 raise ValidationError(f"Error en salida de inventario: {str(e)}")
     
+    @staticmethod
+    def asignar_lotes_peps(lotes, cantidad):
+        """
+        Reparte una cantidad entre lotes ya ordenados por PEPS con suma acumulada
+        Retorna ([(lote, cantidad_consumida), ...], cantidad_pendiente)
+        """
+        asignacion = []
+        acumulado = Decimal('0.0000')
+        
+        for lote, acumulado_lote in zip(lotes, accumulate(lote.cantidad_actual for lote in lotes)):
+            if acumulado >= cantidad:
+                break
+            
+            # Cada lote aporta lo que falta para cubrir la cantidad, hasta su saldo
+            asignacion.append((lote, min(lote.cantidad_actual, cantidad - acumulado)))
+            acumulado = acumulado_lote
+        
+        return asignacion, max(cantidad - acumulado, Decimal('0.0000'))
+    
+    @staticmethod
+    def ejecutar_movimiento(movimiento):
+        """
+        Ejecuta todas las líneas pendientes de un movimiento en lote
+        Bloquea stocks y lotes en orden de producto, aplica los cambios en memoria
+        y los guarda con operaciones masivas; las consultas no dependen del número de líneas
+        """
+        with transaction.atomic():
+            detalles = list(movimiento.detalles.select_related('producto').order_by('numero_item'))
+            pendientes = [detalle for detalle in detalles if not detalle.ejecutado]
+            tipo = movimiento.tipo_movimiento.tipo
+            ahora = timezone.now()
+            
+            if pendientes:
+                stocks = ServicioInventario._bloquear_stocks(
+                    movimiento.almacen, {detalle.producto_id for detalle in pendientes}
+                )
+                
+                if tipo == 'entrada':
+                    ServicioInventario._aplicar_entradas_en_lote(movimiento, pendientes, stocks)
+                elif tipo == 'salida':
+                    ServicioInventario._aplicar_salidas_en_lote(movimiento, pendientes, stocks)
+                elif tipo == 'ajuste':
+                    for detalle in pendientes:
+                        stock = stocks[detalle.producto_id]
+                        if movimiento.tipo_movimiento.categoria == 'ajuste_positivo':
+                            stock.registrar_entrada(detalle.cantidad, detalle.costo_unitario or None)
+                            stock.fecha_ultimo_ingreso = movimiento.fecha_movimiento
+                        else:
+                            stock.registrar_salida(detalle.cantidad)
+                            stock.fecha_ultima_salida = movimiento.fecha_movimiento
+                
+                for stock in stocks.values():
+                    stock.fecha_ultimo_movimiento = movimiento.fecha_movimiento
+                    stock.cantidad_disponible = stock.cantidad_actual - stock.cantidad_reservada
+                    stock.valor_inventario = stock.cantidad_actual * stock.costo_promedio
+                
+                StockProducto.objects.bulk_update(list(stocks.values()), [
+                    'cantidad_actual', 'cantidad_disponible', 'costo_promedio', 'valor_costo',
+                    'valor_inventario', 'fecha_ultimo_movimiento', 'fecha_ultimo_ingreso', 'fecha_ultima_salida'
+                ])
+                
+                for detalle in pendientes:
+                    detalle.ejecutado = True
+                    detalle.fecha_ejecucion = ahora
+                DetalleMovimiento.objects.bulk_update(pendientes, ['lote', 'ejecutado', 'fecha_ejecucion'])
+            
+            # Totales con los valores en memoria
+            movimiento.estado = 'ejecutado'
+            movimiento.total_items = len(detalles)
+            movimiento.total_cantidad = sum((detalle.cantidad for detalle in detalles), Decimal('0.0000'))
+            movimiento.total_valor = sum((detalle.valor_total for detalle in detalles), Decimal('0.00'))
+            movimiento.save(update_fields=['estado', 'total_items', 'total_cantidad', 'total_valor'])
+            
+            logger.info(
+                f"Movimiento {movimiento.numero} ejecutado: {len(pendientes)} líneas - "
+                f"Almacén: {movimiento.almacen.codigo}"
+            )
+            return movimiento
+    
+    @staticmethod
+    def _bloquear_stocks(almacen, productos_ids):
+        """
+        Bloquea los stocks de los productos en orden de producto para evitar interbloqueos
+        Crea primero los que no existen; retorna {producto_id: stock}
+        """
+        productos_ids = sorted(productos_ids)
+        existentes = set(
+            StockProducto.objects.filter(
+                almacen=almacen, producto_id__in=productos_ids
+            ).values_list('producto_id', flat=True)
+        )
+        
+        faltantes = [producto_id for producto_id in productos_ids if producto_id not in existentes]
+        if faltantes:
+            StockProducto.objects.bulk_create([
+                StockProducto(almacen=almacen, producto_id=producto_id) for producto_id in faltantes
+            ], ignore_conflicts=True)
+        
+        return {
+            stock.producto_id: stock
+            for stock in StockProducto.objects.select_for_update().filter(
+                almacen=almacen, producto_id__in=productos_ids
+            ).order_by('producto_id')
+        }
+    
+    @staticmethod
+    def _aplicar_entradas_en_lote(movimiento, detalles, stocks):
+        """Crea o acumula los lotes de entrada y suma las entradas al stock en memoria"""
+        con_lote = [detalle for detalle in detalles if detalle.numero_lote_entrada]
+        
+        lotes = {}
+        if con_lote:
+            claves = {(detalle.producto_id, detalle.numero_lote_entrada) for detalle in con_lote}
+            lotes = ServicioInventario._bloquear_lotes(movimiento.almacen, claves)
+            
+            nuevos = {}
+            for detalle in con_lote:
+                clave = (detalle.producto_id, detalle.numero_lote_entrada)
+                if clave not in lotes and clave not in nuevos:
+                    nuevos[clave] = LoteProducto(
+                        producto_id=detalle.producto_id,
+                        almacen=movimiento.almacen,
+                        numero_lote=detalle.numero_lote_entrada,
+                        fecha_ingreso=movimiento.fecha_movimiento,
+                        fecha_vencimiento=detalle.fecha_vencimiento_entrada,
+                        cantidad_inicial=detalle.cantidad,
+                        cantidad_actual=Decimal('0.0000'),
+                        costo_unitario=detalle.costo_unitario,
+                        proveedor=movimiento.proveedor_cliente,
+                        documento_origen=movimiento.documento_origen
+                    )
+            
+            if nuevos:
+                # Se vuelven a leer porque MySQL no retorna los ids de bulk_create
+                LoteProducto.objects.bulk_create(list(nuevos.values()))
+                lotes = ServicioInventario._bloquear_lotes(movimiento.almacen, claves)
+            
+            # Acumular en cada lote (promedio ponderado si el lote ya tenía saldo)
+            for detalle in con_lote:
+                lote = lotes[(detalle.producto_id, detalle.numero_lote_entrada)]
+                cantidad_total = lote.cantidad_actual + detalle.cantidad
+                lote.costo_unitario = (
+                    (lote.cantidad_actual * lote.costo_unitario) + (detalle.cantidad * detalle.costo_unitario)
+                ) / cantidad_total
+                lote.cantidad_actual = cantidad_total
+                lote.valor_total = lote.cantidad_actual * lote.costo_unitario
+                detalle.lote = lote
+            
+            for clave in nuevos:
+                lotes[clave].cantidad_inicial = lotes[clave].cantidad_actual
+            
+            LoteProducto.objects.bulk_update(
+                list(lotes.values()), ['cantidad_inicial', 'cantidad_actual', 'costo_unitario', 'valor_total']
+            )
+        
+        for detalle in detalles:
+            stock = stocks[detalle.producto_id]
+            stock.registrar_entrada(detalle.cantidad, detalle.costo_unitario or None)
+            stock.fecha_ultimo_ingreso = movimiento.fecha_movimiento
+    
+    @staticmethod
+    def _aplicar_salidas_en_lote(movimiento, detalles, stocks):
+        """Consume lotes PEPS por línea y descuenta del stock el costo consumido, en memoria"""
+        lotes_por_producto = {}
+        for lote in LoteProducto.objects.select_for_update().filter(
+            producto_id__in=stocks.keys(),
+            almacen=movimiento.almacen,
+            cantidad_actual__gt=0,
+            estado_calidad__in=['bueno', 'regular'],
+            activo=True
+        ).order_by('producto_id', 'fecha_ingreso', 'numero_lote'):
+            lotes_por_producto.setdefault(lote.producto_id, []).append(lote)
+        
+        modificados = {}
+        consumos = []
+        for detalle in detalles:
+            disponibles = [
+                lote for lote in lotes_por_producto.get(detalle.producto_id, [])
+                if lote.cantidad_actual > 0
+            ]
+            asignacion, cantidad_pendiente = ServicioInventario.asignar_lotes_peps(disponibles, detalle.cantidad)
+            
+            if cantidad_pendiente > 0:
+                raise ValidationError(
+                    f"Stock insuficiente de {detalle.producto.codigo}. Faltante: {cantidad_pendiente}"
+                )
+            
+            valor_salida = Decimal('0.0000')
+            for lote, cantidad_consumida in asignacion:
+                lote.cantidad_actual -= cantidad_consumida
+                lote.valor_total = lote.cantidad_actual * lote.costo_unitario
+                valor_salida += cantidad_consumida * lote.costo_unitario
+                modificados[lote.pk] = lote
+            
+            if movimiento.documento_electronico_id:
+                consumos.extend(
+                    ConsumoLote(
+                        documento_electronico_id=movimiento.documento_electronico_id,
+                        producto_id=detalle.producto_id,
+                        lote=lote,
+                        cantidad=cantidad_consumida,
+                        costo_unitario=lote.costo_unitario
+                    )
+                    for lote, cantidad_consumida in asignacion
+                )
+            
+            stock = stocks[detalle.producto_id]
+            stock.registrar_salida(detalle.cantidad, valor_salida)
+            stock.fecha_ultima_salida = movimiento.fecha_movimiento
+        
+        if modificados:
+            LoteProducto.objects.bulk_update(list(modificados.values()), ['cantidad_actual', 'valor_total'])
+        
+        # Costo PEPS de la venta asociada al movimiento
+        if consumos:
+            ConsumoLote.objects.bulk_create(consumos)
+    
+    @staticmethod
+    def procesar_salida_documento(documento, detalles):
+        """
+        Salida PEPS de las líneas de un documento de venta en el primer almacén de su sucursal
+        Bloquea stocks y lotes una vez para todos los productos, registra en ConsumoLote
+        los lotes consumidos por cada línea y guarda lotes y stocks con operaciones masivas
+        Las líneas sin saldo suficiente en lotes descuentan el resto al costo promedio
+        El stock total del producto lo actualiza DetalleDocumento.afectar_inventario_en_lote
+        """
+        almacen = Almacen.objects.filter(sucursal_id=documento.serie_documento.sucursal_id).first()
+        if almacen is None or not detalles:
+            return []
+        
+        stocks = {
+            stock.producto_id: stock
+            for stock in StockProducto.objects.select_for_update().filter(
+                almacen=almacen, producto_id__in={detalle.producto_id for detalle in detalles}
+            ).order_by('producto_id')
+        }
+        detalles = [detalle for detalle in detalles if detalle.producto_id in stocks]
+        if not detalles:
+            return []
+        
+        lotes_por_producto = {}
+        for lote in LoteProducto.objects.select_for_update().filter(
+            producto_id__in=stocks.keys(),
+            almacen=almacen,
+            cantidad_actual__gt=0,
+            estado_calidad__in=['bueno', 'regular'],
+            activo=True
+        ).order_by('producto_id', 'fecha_ingreso', 'numero_lote'):
+            if not lote.esta_vencido():
+                lotes_por_producto.setdefault(lote.producto_id, []).append(lote)
+        
+        ahora = timezone.now()
+        modificados = {}
+        consumos = []
+        for detalle in detalles:
+            disponibles = [
+                lote for lote in lotes_por_producto.get(detalle.producto_id, [])
+                if lote.cantidad_actual > 0
+            ]
+            asignacion, cantidad_pendiente = ServicioInventario.asignar_lotes_peps(disponibles, detalle.cantidad)
+            
+            stock = stocks[detalle.producto_id]
+            valor_salida = cantidad_pendiente * stock.costo_promedio
+            for lote, cantidad_consumida in asignacion:
+                lote.cantidad_actual -= cantidad_consumida
+                lote.valor_total = lote.cantidad_actual * lote.costo_unitario
+                valor_salida += cantidad_consumida * lote.costo_unitario
+                modificados[lote.pk] = lote
+            
+            consumos.extend(
+                ConsumoLote(
+                    documento_electronico_id=documento.id,
+                    detalle_documento_id=detalle.id,
+                    producto_id=detalle.producto_id,
+                    lote=lote,
+                    cantidad=cantidad_consumida,
+                    costo_unitario=lote.costo_unitario,
+                    fecha_consumo=ahora
+                )
+                for lote, cantidad_consumida in asignacion
+            )
+            
+            stock.registrar_salida(detalle.cantidad, valor_salida)
+            stock.cantidad_disponible = stock.cantidad_actual - stock.cantidad_reservada
+            stock.valor_inventario = stock.cantidad_actual * stock.costo_promedio
+            stock.fecha_ultima_salida = ahora
+            stock.fecha_ultimo_movimiento = ahora
+        
+        if modificados:
+            LoteProducto.objects.bulk_update(list(modificados.values()), ['cantidad_actual', 'valor_total'])
+        
+        StockProducto.objects.bulk_update(list(stocks.values()), [
+            'cantidad_actual', 'cantidad_disponible', 'costo_promedio', 'valor_costo',
+            'valor_inventario', 'fecha_ultima_salida', 'fecha_ultimo_movimiento'
+        ])
+        
+        if consumos:
+            ConsumoLote.objects.bulk_create(consumos)
+        
+        logger.info(
+            f"Salida de documento {documento.numero_completo}: {len(detalles)} líneas - "
+            f"{len(consumos)} consumos de lote - Almacén: {almacen.codigo}"
+        )
+        return consumos
+    
+    @staticmethod
+    def reversar_salida_documento(documento):
+        """
+        Reversa la salida de un documento anulado a partir de sus ConsumoLote
+        Bloquea stocks y lotes en el mismo orden que la salida, devuelve a cada lote la cantidad
+        consumida a su costo registrado y suma al stock ese valor; lo que salió sin lote vuelve
+        al costo promedio. Luego elimina los consumos para que no se costee el documento
+        """
+        almacen = Almacen.objects.filter(sucursal_id=documento.serie_documento.sucursal_id).first()
+        if almacen is None:
+            return []
+        
+        detalles = list(
+            documento.detalles.filter(producto__controla_stock=True).values_list('id', 'producto_id', 'cantidad')
+        )
+        stocks = {
+            stock.producto_id: stock
+            for stock in StockProducto.objects.select_for_update().filter(
+                almacen=almacen, producto_id__in={producto_id for _, producto_id, _ in detalles}
+            ).order_by('producto_id')
+        }
+        detalles = [detalle for detalle in detalles if detalle[1] in stocks]
+        if not detalles:
+            return []
+        
+        consumos = list(ConsumoLote.objects.filter(documento_electronico=documento))
+        lotes = {
+            lote.pk: lote
+            for lote in LoteProducto.objects.select_for_update().filter(
+                pk__in={consumo.lote_id for consumo in consumos}
+            ).order_by('producto_id', 'fecha_ingreso', 'numero_lote')
+        }
+        
+        consumido = {}
+        for consumo in consumos:
+            lote = lotes[consumo.lote_id]
+            cantidad_total = lote.cantidad_actual + consumo.cantidad
+            lote.costo_unitario = (
+                (lote.cantidad_actual * lote.costo_unitario) + (consumo.cantidad * consumo.costo_unitario)
+            ) / cantidad_total
+            lote.cantidad_actual = cantidad_total
+            lote.valor_total = lote.cantidad_actual * lote.costo_unitario
+            cantidad, valor = consumido.get(consumo.detalle_documento_id, (Decimal('0'), Decimal('0')))
+            consumido[consumo.detalle_documento_id] = (
+                cantidad + consumo.cantidad, valor + consumo.cantidad * consumo.costo_unitario
+            )
+        
+        ahora = timezone.now()
+        for detalle_id, producto_id, cantidad in detalles:
+            stock = stocks[producto_id]
+            cantidad_lotes, valor_lotes = consumido.get(detalle_id, (Decimal('0'), Decimal('0')))
+            stock.registrar_entrada(
+                cantidad, valor_entrada=valor_lotes + (cantidad - cantidad_lotes) * stock.costo_promedio
+            )
+            stock.cantidad_disponible = stock.cantidad_actual - stock.cantidad_reservada
+            stock.valor_inventario = stock.cantidad_actual * stock.costo_promedio
+            stock.fecha_ultimo_movimiento = ahora
+        
+        if lotes:
+            LoteProducto.objects.bulk_update(list(lotes.values()), ['cantidad_actual', 'costo_unitario', 'valor_total'])
+        
+        StockProducto.objects.bulk_update(list(stocks.values()), [
+            'cantidad_actual', 'cantidad_disponible', 'costo_promedio', 'valor_costo',
+            'valor_inventario', 'fecha_ultimo_movimiento'
+        ])
+        
+        ConsumoLote.objects.filter(pk__in=[consumo.pk for consumo in consumos]).delete()
+        
+        logger.info(
+            f"Salida reversada de documento {documento.numero_completo}: {len(detalles)} líneas - "
+            f"{len(consumos)} consumos de lote - Almacén: {almacen.codigo}"
+        )
+        return consumos
+    
+    @staticmethod
+    def _bloquear_lotes(almacen, claves):
+        """Bloquea los lotes de las claves (producto_id, numero_lote); retorna {clave: lote}"""
+        productos_ids = {producto_id for producto_id, _ in claves}
+        numeros = {numero_lote for _, numero_lote in claves}
+        
+        return {
+            (lote.producto_id, lote.numero_lote): lote
+            for lote in LoteProducto.objects.select_for_update().filter(
+                almacen=almacen,
+                producto_id__in=productos_ids,
+                numero_lote__in=numeros
+            ).order_by('producto_id', 'numero_lote')
+            if (lote.producto_id, lote.numero_lote) in claves
+        }
+    
     @staticmethod
     def ajustar_stock(producto, almacen, cantidad_nueva, motivo, usuario=None):
         """Ajustar stock a una cantidad específica"""
@@ -197,8 +602,11 @@ class ServicioInventario:
                 cantidad_anterior = stock.cantidad_actual
                 diferencia = cantidad_nueva - cantidad_anterior
                 
-                # Actualizar stock
-                stock.cantidad_actual = cantidad_nueva
+                # Actualizar stock al costo promedio vigente
+                if diferencia >= 0:
+                    stock.registrar_entrada(diferencia)
+                else:
+                    stock.registrar_salida(-diferencia)
                 stock.fecha_ultimo_movimiento = timezone.now()
                 stock.save()
                 
@@ -407,20 +815,21 @@ class ServicioInventario:
     
     @staticmethod
     def calcular_costo_promedio_producto(producto, almacen):
-        """Calcular costo promedio actual de un producto"""
+        """
+        Calcular costo promedio actual de un producto
+        Lee el promedio mantenido en StockProducto; sin registro de stock lo agrega desde los lotes
+        """
         try:
-            lotes = LoteProducto.objects.filter(
+            costo_promedio = StockProducto.objects.filter(
                 producto=producto,
                 almacen=almacen,
-                cantidad_actual__gt=0,
-                activo=True
-            )
+                cantidad_actual__gt=0
+            ).values_list('costo_promedio', flat=True).first()
             
-            if not lotes.exists():
-                return producto.precio_compra
+            if costo_promedio:
+                return costo_promedio
             
-            total_cantidad = sum(lote.cantidad_actual for lote in lotes)
-            total_valor = sum(lote.cantidad_actual * lote.costo_unitario for lote in lotes)
+            total_cantidad, total_valor = StockProducto.calcular_valor_lotes(producto, almacen)
             
             if total_cantidad > 0:
                 return total_valor / total_cantidad
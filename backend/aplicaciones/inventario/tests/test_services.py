@@ -0,0 +1,424 @@
+"""
+Tests de servicios de Inventario - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de la salida PEPS sobre muchos lotes y del costo registrado por venta
+"""
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from decimal import Decimal
+from io import StringIO
+
+from aplicaciones.clientes.models import Cliente, TipoDocumento
+from aplicaciones.core.models import Empresa
+from aplicaciones.facturacion.models import DetalleDocumento, DocumentoElectronico, SerieDocumento, TipoDocumentoElectronico
+from aplicaciones.productos.models import Categoria, Producto, TipoProducto
+from aplicaciones.usuarios.models import Rol, Usuario
+from ..models import (
+    Almacen, ConsumoLote, DetalleMovimiento, LoteProducto, MovimientoInventario, StockProducto, TipoMovimiento
+)
+from ..services import ServicioInventario
+
+
+class TestSalidaPEPS(TestCase):
+    """Tests para ServicioInventario.procesar_salida"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.almacen = Almacen.objects.create(
+            codigo='ALM01',
+            nombre='Almacén Principal',
+            sucursal=empresa.sucursales.first()
+        )
+        self.tipo_producto = TipoProducto.objects.create(codigo='BIEN', nombre='Bien')
+        self.categoria = Categoria.objects.create(codigo='GEN', nombre='General')
+    
+    def _crear_producto_con_lotes(self, codigo, cantidad_lotes, cantidad_por_lote=Decimal('2.0000')):
+        """Crea un producto con N lotes de ingreso correlativo y su stock"""
+        producto = Producto.objects.create(
+            codigo=codigo,
+            nombre=f'Producto {codigo}',
+            tipo_producto=self.tipo_producto,
+            categoria=self.categoria,
+            precio_venta=Decimal('10.0000')
+        )
+        inicio = timezone.now() - timezone.timedelta(days=cantidad_lotes)
+        
+        LoteProducto.objects.bulk_create([
+            LoteProducto(
+                producto=producto,
+                almacen=self.almacen,
+                numero_lote=f'L{indice:05d}',
+                fecha_ingreso=inicio + timezone.timedelta(days=indice),
+                cantidad_inicial=cantidad_por_lote,
+                cantidad_actual=cantidad_por_lote,
+                costo_unitario=Decimal(indice + 1),
+                valor_total=cantidad_por_lote * (indice + 1)
+            )
+            for indice in range(cantidad_lotes)
+        ])
+        StockProducto.objects.create(
+            producto=producto,
+            almacen=self.almacen,
+            cantidad_actual=cantidad_por_lote * cantidad_lotes
+        )
+        return producto
+    
+    def _procesar_salida_medida(self, producto, cantidad):
+        """Procesa una salida contando consultas sin las actualizaciones de lotes"""
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = ServicioInventario.procesar_salida(producto, self.almacen, cantidad)
+        
+        tabla_lotes = LoteProducto._meta.db_table
+        actualizaciones = [q for q in consultas if q['sql'].startswith('UPDATE') and tabla_lotes in q['sql']]
+        return resultado, len(consultas) - len(actualizaciones), len(actualizaciones)
+    
+    def test_consultas_constantes_1_50_1000_lotes(self):
+        """Test benchmark: consumir 1, 50 o 1000 lotes usa las mismas consultas"""
+        conteos = []
+        for cantidad_lotes in [1, 50, 1000]:
+            producto = self._crear_producto_con_lotes(f'P{cantidad_lotes}', cantidad_lotes)
+            resultado, consultas, actualizaciones = self._procesar_salida_medida(
+                producto, Decimal('2.0000') * cantidad_lotes
+            )
+            
+            # bulk_update parte la sentencia en lotes según el motor (SQLite limita variables)
+            campos = ['pk', 'pk', 'cantidad_actual', 'valor_total']
+            lote = connection.ops.bulk_batch_size(campos, resultado['lotes_consumidos'])
+            self.assertEqual(len(resultado['lotes_consumidos']), cantidad_lotes)
+            self.assertEqual(actualizaciones, -(-cantidad_lotes // lote))
+            conteos.append(consultas)
+        
+        self.assertEqual(len(set(conteos)), 1)
+    
+    def test_consume_lotes_en_orden_peps(self):
+        """Test la salida parte entre lotes del más antiguo al más reciente"""
+        producto = self._crear_producto_con_lotes('P001', 3)
+        
+        resultado, _, _ = self._procesar_salida_medida(producto, Decimal('5.0000'))
+        
+        self.assertEqual(resultado['lotes_consumidos'], [
+            {'lote': 'L00000', 'cantidad': Decimal('2.0000'), 'costo_unitario': Decimal('1.0000')},
+            {'lote': 'L00001', 'cantidad': Decimal('2.0000'), 'costo_unitario': Decimal('2.0000')},
+            {'lote': 'L00002', 'cantidad': Decimal('1.0000'), 'costo_unitario': Decimal('3.0000')},
+        ])
+        self.assertEqual(resultado['stock_actual'], Decimal('1.0000'))
+        
+        ultimo = LoteProducto.objects.get(producto=producto, numero_lote='L00002')
+        self.assertEqual(ultimo.cantidad_actual, Decimal('1.0000'))
+        self.assertEqual(ultimo.valor_total, Decimal('3.00'))
+        self.assertFalse(LoteProducto.objects.filter(producto=producto, numero_lote='L00000', cantidad_actual__gt=0).exists())
+    
+    def test_omite_lotes_en_cuarentena(self):
+        """Test los lotes en mal estado no se consumen salvo que se fuerce"""
+        producto = self._crear_producto_con_lotes('P002', 2)
+        LoteProducto.objects.filter(producto=producto, numero_lote='L00000').update(estado_calidad='cuarentena')
+        
+        resultado, _, _ = self._procesar_salida_medida(producto, Decimal('1.0000'))
+        
+        self.assertEqual([consumo['lote'] for consumo in resultado['lotes_consumidos']], ['L00001'])
+    
+    def test_registra_costo_peps_de_la_linea_vendida(self):
+        """Test la salida de una línea de venta guarda el costo de cada lote consumido"""
+        producto = self._crear_producto_con_lotes('P003', 3)
+        cliente = Cliente.objects.create(
+            tipo_documento=TipoDocumento.objects.create(codigo='1', nombre='DNI'),
+            numero_documento='45678912',
+            razon_social='Juan Pérez',
+            direccion='Av. Cliente 456'
+        )
+        tipo_documento = TipoDocumentoElectronico.objects.create(
+            codigo_sunat='03',
+            nombre='Boleta de Venta',
+            nomenclatura='B',
+            serie_defecto='B001'
+        )
+        documento = DocumentoElectronico.objects.create(
+            tipo_documento=tipo_documento,
+            serie_documento=SerieDocumento.objects.create(
+                sucursal=self.almacen.sucursal,
+                tipo_documento=tipo_documento,
+                serie='B001'
+            ),
+            numero=1,
+            cliente=cliente,
+            cliente_tipo_documento='1',
+            cliente_numero_documento=cliente.numero_documento,
+            cliente_razon_social=cliente.razon_social,
+            cliente_direccion=cliente.direccion
+        )
+        detalle = DetalleDocumento.objects.create(
+            documento=documento,
+            numero_item=1,
+            producto=producto,
+            codigo_producto=producto.codigo,
+            descripcion=producto.nombre,
+            unidad_medida='NIU',
+            cantidad=Decimal('5.0000'),
+            precio_unitario=Decimal('10.0000')
+        )
+        
+        ServicioInventario.procesar_salida(producto, self.almacen, detalle.cantidad, detalle_documento=detalle)
+        
+        self.assertEqual(
+            list(
+                detalle.consumos_lote.order_by('lote__numero_lote').values_list(
+                    'lote__numero_lote', 'cantidad', 'costo_unitario'
+                )
+            ),
+            [
+                ('L00000', Decimal('2.0000'), Decimal('1.0000')),
+                ('L00001', Decimal('2.0000'), Decimal('2.0000')),
+                ('L00002', Decimal('1.0000'), Decimal('3.0000')),
+            ]
+        )
+        with self.assertNumQueries(1):
+            costos = ConsumoLote.costos_por_documento([documento.id])
+        self.assertEqual(costos, {documento.id: Decimal('9')})
+
+
+class TestCostoPromedioIncremental(TestCase):
+    """Tests para el costo promedio acumulado en StockProducto"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.almacen = Almacen.objects.create(
+            codigo='ALM01',
+            nombre='Almacén Principal',
+            sucursal=empresa.sucursales.first()
+        )
+        self.producto = Producto.objects.create(
+            codigo='P001',
+            nombre='Producto 1',
+            tipo_producto=TipoProducto.objects.create(codigo='BIEN', nombre='Bien'),
+            categoria=Categoria.objects.create(codigo='GEN', nombre='General'),
+            precio_compra=Decimal('1.0000'),
+            precio_venta=Decimal('10.0000')
+        )
+        
+        ServicioInventario.procesar_entrada(
+            self.producto, self.almacen, Decimal('10.0000'), Decimal('5.0000'), numero_lote='L1'
+        )
+        ServicioInventario.procesar_entrada(
+            self.producto, self.almacen, Decimal('10.0000'), Decimal('8.0000'), numero_lote='L2'
+        )
+    
+    def _stock(self):
+        """Stock del producto en el almacén de prueba"""
+        return StockProducto.objects.get(producto=self.producto, almacen=self.almacen)
+    
+    def test_entradas_y_salidas_mantienen_valor_de_lotes(self):
+        """Test el valor acumulado coincide con el de los lotes tras entradas y salidas PEPS"""
+        stock = self._stock()
+        self.assertEqual(stock.costo_promedio, Decimal('6.5000'))
+        self.assertEqual(stock.valor_costo, Decimal('130.0000'))
+        
+        ServicioInventario.procesar_salida(self.producto, self.almacen, Decimal('15.0000'))
+        
+        stock = self._stock()
+        cantidad_lotes, valor_lotes = StockProducto.calcular_valor_lotes(self.producto, self.almacen)
+        self.assertEqual(stock.cantidad_actual, cantidad_lotes)
+        self.assertEqual(stock.valor_costo, valor_lotes)
+        self.assertEqual(stock.costo_promedio, Decimal('8.0000'))
+    
+    def test_consulta_de_costo_en_una_consulta(self):
+        """Test el costo promedio se obtiene sin recorrer los lotes"""
+        with self.assertNumQueries(1):
+            costo = ServicioInventario.calcular_costo_promedio_producto(self.producto, self.almacen)
+        
+        self.assertEqual(costo, Decimal('6.5000'))
+    
+    def test_comando_verifica_y_repara_costos(self):
+        """Test el comando detecta y corrige un costo desalineado con los lotes"""
+        StockProducto.objects.filter(pk=self._stock().pk).update(costo_promedio=Decimal('1.0000'))
+        
+        salida = StringIO()
+        call_command('verificar_costos_inventario', stdout=salida)
+        self.assertIn('con diferencias: 1', salida.getvalue())
+        self.assertEqual(self._stock().costo_promedio, Decimal('1.0000'))
+        
+        salida = StringIO()
+        call_command('verificar_costos_inventario', '--reparar', stdout=salida)
+        self.assertIn('reparados: 1', salida.getvalue())
+        self.assertEqual(self._stock().costo_promedio, Decimal('6.5000'))
+        self.assertEqual(self._stock().valor_costo, Decimal('130.0000'))
+
+
+class TestEjecucionMovimientoEnLote(TestCase):
+    """Tests para MovimientoInventario.ejecutar con muchas líneas"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        empresa = Empresa.objects.create(
+            ruc='20123456789',
+            razon_social='Empresa Test SAC',
+            direccion='Av. Test 123',
+            ubigeo='150101',
+            departamento='LIMA',
+            provincia='LIMA',
+            distrito='LIMA'
+        )
+        self.almacen = Almacen.objects.create(
+            codigo='ALM01',
+            nombre='Almacén Principal',
+            sucursal=empresa.sucursales.first()
+        )
+        self.usuario = Usuario.objects.create_user(
+            email='almacen@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Almacén',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Administrador', codigo='administrador')
+        )
+        self.compra = TipoMovimiento.objects.create(codigo='COMPRA', nombre='Compra', tipo='entrada', categoria='compra')
+        self.venta = TipoMovimiento.objects.create(codigo='VENTA', nombre='Venta', tipo='salida', categoria='venta')
+        
+        tipo_producto = TipoProducto.objects.create(codigo='BIEN', nombre='Bien')
+        categoria = Categoria.objects.create(codigo='GEN', nombre='General')
+        self.productos = [
+            Producto.objects.create(
+                codigo=f'P{indice:03d}',
+                nombre=f'Producto {indice}',
+                tipo_producto=tipo_producto,
+                categoria=categoria,
+                precio_venta=Decimal('10.0000')
+            )
+            for indice in range(30)
+        ]
+    
+    def _crear_movimiento(self, tipo_movimiento, lineas):
+        """Crea un movimiento pendiente con líneas (producto, cantidad, costo, lote)"""
+        movimiento = MovimientoInventario.objects.create(
+            tipo_movimiento=tipo_movimiento,
+            almacen=self.almacen,
+            usuario_creacion=self.usuario,
+            estado='pendiente'
+        )
+        DetalleMovimiento.objects.bulk_create([
+            DetalleMovimiento(
+                movimiento=movimiento,
+                numero_item=numero,
+                producto=producto,
+                cantidad=cantidad,
+                costo_unitario=costo,
+                valor_total=cantidad * costo,
+                numero_lote_entrada=numero_lote
+            )
+            for numero, (producto, cantidad, costo, numero_lote) in enumerate(lineas, start=1)
+        ])
+        return movimiento
+    
+    def _lineas_compra(self, cantidad_lineas):
+        """Líneas de compra repartidas entre los productos, varias por lote"""
+        return [
+            (
+                self.productos[indice % len(self.productos)],
+                Decimal('2.0000'),
+                Decimal(indice // 60 + 1),
+                f'C{indice // 60}'
+            )
+            for indice in range(cantidad_lineas)
+        ]
+    
+    def _ejecutar_medido(self, movimiento):
+        """Ejecuta el movimiento separando las sentencias masivas del resto de consultas"""
+        tablas_masivas = [
+            LoteProducto._meta.db_table, StockProducto._meta.db_table, DetalleMovimiento._meta.db_table
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            movimiento.ejecutar()
+        
+        masivas = [
+            q for q in consultas
+            if q['sql'].startswith(('INSERT', 'UPDATE'))
+            and any(f'"{tabla}"' in q['sql'][:80] for tabla in tablas_masivas)
+        ]
+        return len(consultas) - len(masivas), len(masivas)
+    
+    def test_compra_300_lineas_con_consultas_fijas(self):
+        """Test benchmark: una compra de 300 líneas usa las mismas consultas que una de 5"""
+        consultas_pequena, _ = self._ejecutar_medido(self._crear_movimiento(self.compra, self._lineas_compra(5)))
+        movimiento = self._crear_movimiento(self.compra, self._lineas_compra(300))
+        consultas_grande, masivas = self._ejecutar_medido(movimiento)
+        
+        self.assertEqual(consultas_grande, consultas_pequena)
+        self.assertLess(masivas, 20)
+        
+        movimiento.refresh_from_db()
+        self.assertEqual(movimiento.estado, 'ejecutado')
+        self.assertEqual(movimiento.total_items, 300)
+        self.assertEqual(movimiento.total_cantidad, Decimal('600.0000'))
+        self.assertFalse(movimiento.detalles.filter(ejecutado=False).exists())
+        self.assertFalse(movimiento.detalles.filter(lote__isnull=True).exists())
+        
+        # P000 recibe 2 unidades de la compra pequeña y las líneas 0, 30, ..., 270 (dos por lote C0..C4)
+        stock = StockProducto.objects.get(producto=self.productos[0], almacen=self.almacen)
+        self.assertEqual(stock.cantidad_actual, Decimal('22.0000'))
+        lote = LoteProducto.objects.get(producto=self.productos[0], almacen=self.almacen, numero_lote='C4')
+        self.assertEqual(lote.cantidad_inicial, Decimal('4.0000'))
+        self.assertEqual(lote.cantidad_actual, Decimal('4.0000'))
+        self.assertEqual(lote.costo_unitario, Decimal('5.0000'))
+        
+        _, valor_lotes = StockProducto.calcular_valor_lotes(self.productos[0], self.almacen)
+        self.assertEqual(stock.valor_costo, valor_lotes)
+    
+    def test_salida_consume_lotes_peps_por_linea(self):
+        """Test las líneas de salida del mismo producto consumen lotes en orden"""
+        self._crear_movimiento(self.compra, self._lineas_compra(300)).ejecutar()
+        producto = self.productos[0]
+        
+        salida = self._crear_movimiento(self.venta, [
+            (producto, Decimal('3.0000'), Decimal('0.0000'), None),
+            (producto, Decimal('2.0000'), Decimal('0.0000'), None),
+        ])
+        salida.ejecutar()
+        
+        restantes = dict(
+            LoteProducto.objects.filter(producto=producto, almacen=self.almacen).values_list('numero_lote', 'cantidad_actual')
+        )
+        self.assertEqual(restantes['C0'], Decimal('0.0000'))
+        self.assertEqual(restantes['C1'], Decimal('3.0000'))
+        
+        stock = StockProducto.objects.get(producto=producto, almacen=self.almacen)
+        self.assertEqual(stock.cantidad_actual, Decimal('15.0000'))
+        _, valor_lotes = StockProducto.calcular_valor_lotes(producto, self.almacen)
+        self.assertEqual(stock.valor_costo, valor_lotes)
+    
+    def test_salida_sin_stock_no_aplica_cambios(self):
+        """Test una línea sin stock suficiente revierte todo el movimiento"""
+        self._crear_movimiento(self.compra, self._lineas_compra(30)).ejecutar()
+        
+        salida = self._crear_movimiento(self.venta, [
+            (self.productos[0], Decimal('1.0000'), Decimal('0.0000'), None),
+            (self.productos[1], Decimal('99.0000'), Decimal('0.0000'), None),
+        ])
+        
+        with self.assertRaises(ValidationError):
+            salida.ejecutar()
+        
+        stock = StockProducto.objects.get(producto=self.productos[0], almacen=self.almacen)
+        self.assertEqual(stock.cantidad_actual, Decimal('2.0000'))
+        self.assertFalse(salida.detalles.filter(ejecutado=True).exists())
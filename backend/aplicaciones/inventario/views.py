@@ -25,9 +25,10 @@ import logging
 #     LoteProductoSerializer, MovimientoInventarioSerializer
 # )
 from aplicaciones.core.permissions import (
-    EsContadorOAdministrador, PuedeGestionarInventario
+    EsContadorOAdministrador, PuedeGestionarInventario, PuedeVerReportes
 )
 from aplicaciones.core.pagination import PaginacionEstandar
+from aplicaciones.reportes.exporters import ExportacionMixin
 
 logger = logging.getLogger(__name__)
 
@@ -239,7 +240,7 @@ class AlmacenViewSet(viewsets.ReadOnlyModelViewSet):
         })
 
 
-class StockProductoViewSet(viewsets.ReadOnlyModelViewSet):
+class StockProductoViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para stock de productos
     Consulta de stock actual por producto y almacén
@@ -305,6 +306,32 @@ class StockProductoViewSet(viewsets.ReadOnlyModelViewSet):
             'count': len(stock_productos),
             'results': stock_productos
         })
+    
+    # Acción exportar de ExportacionMixin: nombre del archivo y columnas (campo, título[, formateador])
+    NOMBRE_EXPORTACION = 'stock_productos'
+    permisos_exportacion = [IsAuthenticated, PuedeVerReportes]
+    COLUMNAS_EXPORTACION = [
+        ('almacen__codigo', 'Almacén'),
+        ('producto__codigo', 'Código'),
+        ('producto__nombre', 'Producto'),
+        ('producto__unidad_medida', 'Unidad'),
+        ('cantidad_actual', 'Cantidad Actual'),
+        ('cantidad_reservada', 'Cantidad Reservada'),
+        ('cantidad_disponible', 'Cantidad Disponible'),
+        ('costo_promedio', 'Costo Promedio'),
+        ('valor_inventario', 'Valor Inventario'),
+        ('fecha_ultimo_movimiento', 'Último Movimiento'),
+    ]
+    
+    def get_queryset_exportacion(self):
+        """Stock activo por almacén y producto, opcionalmente de un ?almacen="""
+        from .models import StockProducto
+        
+        queryset = StockProducto.objects.filter(activo=True)
+        almacen = self.request.query_params.get('almacen')
+        if almacen:
+            queryset = queryset.filter(almacen_id=almacen)
+        return queryset
 
 
 class LoteProductoViewSet(viewsets.ReadOnlyModelViewSet):
@@ -348,7 +375,7 @@ class LoteProductoViewSet(viewsets.ReadOnlyModelViewSet):
         })
 
 
-class MovimientoInventarioViewSet(viewsets.ReadOnlyModelViewSet):
+class MovimientoInventarioViewSet(ExportacionMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para movimientos de inventario
     Historial de movimientos PEPS
@@ -393,3 +420,29 @@ class MovimientoInventarioViewSet(viewsets.ReadOnlyModelViewSet):
             'count': len(movimientos),
             'results': movimientos
         })
+    
+    # Acción exportar de ExportacionMixin: nombre del archivo y columnas (campo, título[, formateador])
+    NOMBRE_EXPORTACION = 'movimientos_inventario'
+    exportacion_descendente = True
+    permisos_exportacion = [IsAuthenticated, PuedeVerReportes]
+    COLUMNAS_EXPORTACION = [
+        ('numero', 'Número'),
+        ('tipo_movimiento__nombre', 'Tipo Movimiento'),
+        ('almacen__codigo', 'Almacén'),
+        ('fecha_movimiento', 'Fecha'),
+        ('documento_origen', 'Documento Origen'),
+        ('estado', 'Estado'),
+        ('total_items', 'Ítems'),
+        ('total_cantidad', 'Cantidad Total'),
+        ('total_valor', 'Valor Total'),
+    ]
+    
+    def get_queryset_exportacion(self):
+        """Movimientos activos, opcionalmente de un ?almacen="""
+        from .models import MovimientoInventario
+        
+        queryset = MovimientoInventario.objects.filter(activo=True)
+        almacen = self.request.query_params.get('almacen')
+        if almacen:
+            queryset = queryset.filter(almacen_id=almacen)
+        return queryset
@@ -0,0 +1,15 @@
+"""
+Configuración de la aplicación Productos - FELICITAFAC
+"""
+
+from django.apps import AppConfig
+
+
+class ProductosConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'aplicaciones.productos'
+    verbose_name = 'Productos'
+    
+    def ready(self):
+        """Configuración al inicializar la aplicación"""
+        import aplicaciones.productos.signals
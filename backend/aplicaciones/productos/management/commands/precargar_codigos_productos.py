@@ -0,0 +1,49 @@
+"""
+Comando precargar_codigos_productos - FELICITAFAC
+Carga en caché los datos de punto de venta de los productos activos por cada uno de sus códigos
+Uso: python manage.py precargar_codigos_productos [--lote 500]
+"""
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from aplicaciones.productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Precarga la caché de búsqueda por código y código de barras para el punto de venta'
+    
+    # De menor a mayor prioridad en Producto.buscar_por_codigo
+    CAMPOS_POR_PRIORIDAD = ['codigo_interno', 'codigo_barras', 'codigo']
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Cantidad de productos leídos por consulta'
+        )
+    
+    def handle(self, *args, **options):
+        productos = Producto.objects.filter(activo=True).only(*Producto.CAMPOS_CACHE_CODIGO).order_by('pk')
+        
+        # Un valor puede ser el código de un producto y el código de barras de otro: se carga
+        # de menor a mayor prioridad para que quede el mismo producto que elige buscar_por_codigo
+        cargados = 0
+        for campo in self.CAMPOS_POR_PRIORIDAD:
+            # Un set_many por lote de productos
+            valores = {}
+            pendientes = 0
+            for producto in productos.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''}).iterator(
+                chunk_size=options['lote']
+            ):
+                valores.update(producto.valores_cache_codigo(getattr(producto, campo)))
+                pendientes += 1
+                if pendientes % options['lote'] == 0:
+                    cache.set_many(valores, Producto.TIEMPO_CACHE_CODIGO)
+                    valores = {}
+            
+            if valores:
+                cache.set_many(valores, Producto.TIEMPO_CACHE_CODIGO)
+            cargados += pendientes
+        
+        self.stdout.write(self.style.SUCCESS(f'Códigos cargados en caché: {cargados}'))
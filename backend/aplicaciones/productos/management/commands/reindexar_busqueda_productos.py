@@ -0,0 +1,39 @@
+"""
+Comando reindexar_busqueda_productos - FELICITAFAC
+Reconstruye los términos de búsqueda de productos
+Uso: python manage.py reindexar_busqueda_productos [--lote 500]
+Necesario tras cargas masivas con bulk_create o update(), que no pasan por Producto.save
+"""
+
+from django.core.management.base import BaseCommand
+from aplicaciones.productos.models import Producto, TerminoBusquedaProducto
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de todos los productos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Cantidad de productos reindexados por transacción'
+        )
+    
+    def handle(self, *args, **options):
+        productos = Producto.objects.only(*TerminoBusquedaProducto.PESOS_CAMPOS).order_by('pk')
+        
+        lote = []
+        indexados = 0
+        for producto in productos.iterator(chunk_size=options['lote']):
+            lote.append(producto)
+            if len(lote) >= options['lote']:
+                TerminoBusquedaProducto.indexar(lote)
+                indexados += len(lote)
+                lote = []
+        
+        if lote:
+            TerminoBusquedaProducto.indexar(lote)
+            indexados += len(lote)
+        
+        self.stdout.write(self.style.SUCCESS(f'Productos reindexados: {indexados}'))
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def inicializar_jerarquia_categorias(apps, schema_editor):
+    """La tabla de clausura parte de las relaciones padre existentes"""
+    Nodo = apps.get_model('productos', 'Categoria')
+    Relacion = apps.get_model('productos', 'JerarquiaCategoria')
+    
+    padres = dict(Nodo.objects.values_list('id', 'categoria_padre_id'))
+    relaciones = []
+    for nodo_id in padres:
+        ancestro_id, profundidad, vistos = nodo_id, 0, set()
+        # Se corta al repetir un ancestro para tolerar ciclos en datos inconsistentes
+        while ancestro_id is not None and ancestro_id not in vistos:
+            vistos.add(ancestro_id)
+            relaciones.append(Relacion(ancestro_id=ancestro_id, descendiente_id=nodo_id, profundidad=profundidad))
+            ancestro_id, profundidad = padres.get(ancestro_id), profundidad + 1
+    
+    Relacion.objects.bulk_create(relaciones, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JerarquiaCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidad', models.PositiveSmallIntegerField(default=0, help_text='Niveles entre el ancestro y el descendiente', verbose_name='Profundidad')),
+                ('ancestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_descendientes', to='productos.categoria', verbose_name='Categoría Ancestro')),
+                ('descendiente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_ancestros', to='productos.categoria', verbose_name='Categoría Descendiente')),
+            ],
+            options={
+                'verbose_name': 'Jerarquía de Categorías',
+                'verbose_name_plural': 'Jerarquías de Categorías',
+                'db_table': 'productos_jerarquia_categoria',
+                'indexes': [models.Index(fields=['descendiente', 'profundidad'], name='idx_jerarq_categoria_desc')],
+                'unique_together': {('ancestro', 'descendiente')},
+            },
+        ),
+        migrations.RunPython(inicializar_jerarquia_categorias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+import unicodedata
+
+
+# Copia de TerminoBusquedaProducto al crear el índice: la migración no depende del modelo actual
+PESOS_CAMPOS = {
+    'codigo': 10,
+    'codigo_barras': 10,
+    'codigo_interno': 8,
+    'nombre': 5,
+    'marca': 3,
+    'modelo': 3,
+    'descripcion': 1,
+}
+CAMPOS_CODIGO = ['codigo', 'codigo_barras', 'codigo_interno']
+LONGITUD_TERMINO = 50
+
+
+def tokenizar(texto):
+    """Palabras sin tildes y en mayúsculas, en orden y sin repetir"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    return list(dict.fromkeys(re.findall(r'[A-Z0-9]+', texto.upper())))
+
+
+def terminos_producto(producto):
+    """Términos del producto con el mayor peso de los campos donde aparecen"""
+    terminos = {}
+    for campo, peso in PESOS_CAMPOS.items():
+        tokens = tokenizar(getattr(producto, campo))
+        if campo in CAMPOS_CODIGO and len(tokens) > 1:
+            tokens.append(''.join(tokens))
+        
+        for token in tokens:
+            token = token[:LONGITUD_TERMINO]
+            terminos[token] = max(peso, terminos.get(token, 0))
+    
+    return terminos
+
+
+def indexar_productos(apps, schema_editor):
+    """Términos de búsqueda de los productos existentes, en lotes"""
+    Producto = apps.get_model('productos', 'Producto')
+    Termino = apps.get_model('productos', 'TerminoBusquedaProducto')
+    
+    terminos = []
+    for producto in Producto.objects.only(*PESOS_CAMPOS).iterator(chunk_size=500):
+        terminos.extend(
+            Termino(producto_id=producto.pk, termino=termino, peso=peso)
+            for termino, peso in terminos_producto(producto).items()
+        )
+        if len(terminos) >= 5000:
+            Termino.objects.bulk_create(terminos)
+            terminos = []
+    
+    Termino.objects.bulk_create(terminos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_jerarquia_categorias'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusquedaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(help_text='Palabra normalizada sin tildes y en mayúsculas', max_length=50, verbose_name='Término')),
+                ('peso', models.PositiveSmallIntegerField(help_text='Peso del campo de mayor relevancia que contiene el término', verbose_name='Peso')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos_busqueda', to='productos.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda',
+                'verbose_name_plural': 'Términos de Búsqueda',
+                'db_table': 'productos_termino_busqueda',
+                'indexes': [models.Index(fields=['termino', 'producto', 'peso'], name='idx_termino_busqueda')],
+                'unique_together': {('producto', 'termino')},
+            },
+        ),
+        migrations.RunPython(indexar_productos, migrations.RunPython.noop),
+    ]
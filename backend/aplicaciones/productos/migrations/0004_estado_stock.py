@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:59
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def calcular_estados_stock(apps, schema_editor):
+    """Estado de stock de los productos existentes en un solo UPDATE"""
+    # Copia de Producto.expresion_estado_stock al agregar el campo
+    Producto = apps.get_model('productos', 'Producto')
+    Producto.objects.update(estado_stock=models.Case(
+        models.When(controla_stock=False, then=models.Value('no_controla')),
+        models.When(stock_actual__lte=Decimal('0'), then=models.Value('agotado')),
+        models.When(stock_actual__lte=models.F('stock_minimo'), then=models.Value('critico')),
+        models.When(stock_actual__lte=models.F('punto_reorden'), then=models.Value('bajo')),
+        models.When(
+            stock_maximo__gt=Decimal('0'),
+            stock_actual__gte=models.F('stock_maximo'),
+            then=models.Value('exceso')
+        ),
+        default=models.Value('normal')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_terminos_busqueda'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='estado_stock',
+            field=models.CharField(choices=[('no_controla', 'No Controla Stock'), ('agotado', 'Agotado'), ('critico', 'Crítico'), ('bajo', 'Bajo'), ('normal', 'Normal'), ('exceso', 'Exceso')], default='agotado', help_text='Estado del stock respecto a mínimo, punto de reorden y máximo', max_length=15, verbose_name='Estado de Stock'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'controla_stock', 'estado_stock'], name='idx_producto_estado_stock'),
+        ),
+        migrations.RunPython(calcular_estados_stock, migrations.RunPython.noop),
+    ]
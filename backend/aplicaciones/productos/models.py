@@ -4,12 +4,12 @@ Sistema de Facturación Electrónica para Perú
 Optimizado para MySQL y método PEPS
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
-from aplicaciones.core.models import ModeloBase
+from aplicaciones.core.models import ModeloBase, RelacionJerarquica, TerminoBusqueda
 
 
 class TipoProducto(ModeloBase):
@@ -186,11 +186,64 @@ class Categoria(ModeloBase):
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
     
+    def save(self, *args, **kwargs):
+        """Override save para mantener la jerarquía de categorías"""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            JerarquiaCategoria.sincronizar(self.pk, self.categoria_padre_id)
+    
     def obtener_ruta_completa(self):
         """Retorna la ruta completa de la categoría"""
-        if self.categoria_padre:
-            return f"{self.categoria_padre.obtener_ruta_completa()} > {self.nombre}"
-        return self.nombre
+        nombres = Categoria.objects.filter(
+            relaciones_descendientes__descendiente=self
+        ).order_by('-relaciones_descendientes__profundidad').values_list('nombre', flat=True)
+        return ' > '.join(nombres) or self.nombre
+    
+    def obtener_subcategorias(self):
+        """Retorna el subárbol de categorías activas con una sola consulta"""
+        # Una categoría inactiva oculta también a sus descendientes
+        inactivas = JerarquiaCategoria.objects.filter(
+            ancestro=self,
+            profundidad__gt=0,
+            descendiente__activo=False
+        ).values('descendiente_id')
+        
+        return Categoria.objects.filter(
+            relaciones_ancestros__ancestro=self,
+            relaciones_ancestros__profundidad__gt=0
+        ).exclude(
+            relaciones_ancestros__ancestro_id__in=inactivas
+        )
+
+
+class JerarquiaCategoria(RelacionJerarquica):
+    """
+    Tabla de clausura de categorías
+    Relaciona cada categoría con todos sus ancestros
+    """
+    
+    ancestro = models.ForeignKey(
+        Categoria,
+        on_delete=models.CASCADE,
+        related_name='relaciones_descendientes',
+        verbose_name='Categoría Ancestro'
+    )
+    
+    descendiente = models.ForeignKey(
+        Categoria,
+        on_delete=models.CASCADE,
+        related_name='relaciones_ancestros',
+        verbose_name='Categoría Descendiente'
+    )
+    
+    class Meta:
+        db_table = 'productos_jerarquia_categoria'
+        verbose_name = 'Jerarquía de Categorías'
+        verbose_name_plural = 'Jerarquías de Categorías'
+        unique_together = [['ancestro', 'descendiente']]
+        indexes = [
+            models.Index(fields=['descendiente', 'profundidad'], name='idx_jerarq_categoria_desc'),
+        ]
 
 
 class Producto(ModeloBase):
@@ -212,6 +265,26 @@ class Producto(ModeloBase):
         ('40', 'Exportación'),
     ]
     
+    # Campos de datos_punto_venta; guardar otros (stock, estadísticas) no invalida la caché de códigos
+    CAMPOS_CACHE_CODIGO = [
+        'codigo', 'codigo_barras', 'codigo_interno', 'nombre', 'unidad_medida_sunat',
+        'precio_venta', 'precio_venta_con_igv', 'tipo_afectacion_igv', 'codigo_producto_sunat',
+        'controla_stock', 'permite_descuento', 'descuento_maximo', 'activo'
+    ]
+    TIEMPO_CACHE_CODIGO = 60 * 60 * 12
+    
+    ESTADOS_STOCK = [
+        ('no_controla', 'No Controla Stock'),
+        ('agotado', 'Agotado'),
+        ('critico', 'Crítico'),
+        ('bajo', 'Bajo'),
+        ('normal', 'Normal'),
+        ('exceso', 'Exceso'),
+    ]
+    
+    # Campos de los que depende estado_stock; guardarlos también guarda el estado
+    CAMPOS_ESTADO_STOCK = ['controla_stock', 'stock_actual', 'stock_minimo', 'punto_reorden', 'stock_maximo']
+    
     # Validadores
     validador_codigo_barras = RegexValidator(
         regex=r'^[0-9]{8,13}$',
@@ -366,6 +439,14 @@ class Producto(ModeloBase):
         help_text='Punto de reorden automático'
     )
     
+    estado_stock = models.CharField(
+        'Estado de Stock',
+        max_length=15,
+        choices=ESTADOS_STOCK,
+        default='agotado',
+        help_text='Estado del stock respecto a mínimo, punto de reorden y máximo'
+    )
+    
     # Unidades de medida
     unidad_medida = models.CharField(
         'Unidad de Medida',
@@ -560,6 +641,7 @@ class Producto(ModeloBase):
             models.Index(fields=['controla_stock'], name='idx_producto_stock'),
             models.Index(fields=['stock_actual'], name='idx_producto_stock_actual'),
             models.Index(fields=['stock_minimo'], name='idx_producto_stock_min'),
+            models.Index(fields=['activo', 'controla_stock', 'estado_stock'], name='idx_producto_estado_stock'),
             models.Index(fields=['fecha_vencimiento'], name='idx_producto_venc'),
         ]
         ordering = ['codigo', 'nombre']
@@ -606,7 +688,59 @@ class Producto(ModeloBase):
         self.nombre = self.nombre.strip().upper()
         self.codigo = self.codigo.strip().upper()
         
-        super().save(*args, **kwargs)
+        # Estado de stock precalculado para las alertas
+        self.estado_stock = self.calcular_estado_stock(
+            self.controla_stock, self.stock_actual, self.stock_minimo, self.punto_reorden, self.stock_maximo
+        )
+        campos = kwargs.get('update_fields')
+        if campos is not None and set(campos) & set(self.CAMPOS_ESTADO_STOCK):
+            kwargs['update_fields'] = campos = {*campos, 'estado_stock'}
+        
+        # Solo se reindexa si cambian campos de búsqueda (no en actualizaciones de stock)
+        if campos is not None and not set(campos) & set(TerminoBusquedaProducto.PESOS_CAMPOS):
+            super().save(*args, **kwargs)
+            return
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            TerminoBusquedaProducto.indexar([self])
+    
+    @staticmethod
+    def calcular_estado_stock(controla_stock, stock_actual, stock_minimo, punto_reorden, stock_maximo):
+        """Estado del stock según mínimo, punto de reorden y máximo"""
+        if not controla_stock:
+            return 'no_controla'
+        elif stock_actual <= 0:
+            return 'agotado'
+        elif stock_actual <= stock_minimo:
+            return 'critico'
+        elif stock_actual <= punto_reorden:
+            return 'bajo'
+        elif stock_actual >= stock_maximo and stock_maximo > 0:
+            return 'exceso'
+        return 'normal'
+    
+    @staticmethod
+    def expresion_estado_stock(stock_actual=models.F('stock_actual')):
+        """
+        estado_stock como expresión SQL equivalente a calcular_estado_stock
+        En un UPDATE que también cambia stock_actual, se pasa la expresión del nuevo stock
+        y estado_stock va antes que stock_actual en el SET (MySQL evalúa las asignaciones en orden)
+        """
+        from django.db.models.lookups import GreaterThan, GreaterThanOrEqual, LessThanOrEqual
+        
+        return models.Case(
+            models.When(controla_stock=False, then=models.Value('no_controla')),
+            models.When(LessThanOrEqual(stock_actual, Decimal('0')), then=models.Value('agotado')),
+            models.When(LessThanOrEqual(stock_actual, models.F('stock_minimo')), then=models.Value('critico')),
+            models.When(LessThanOrEqual(stock_actual, models.F('punto_reorden')), then=models.Value('bajo')),
+            models.When(
+                GreaterThan(models.F('stock_maximo'), Decimal('0')) &
+                GreaterThanOrEqual(stock_actual, models.F('stock_maximo')),
+                then=models.Value('exceso')
+            ),
+            default=models.Value('normal')
+        )
     
     def esta_disponible(self, cantidad=1):
         """Verifica si hay stock disponible"""
@@ -662,6 +796,98 @@ class Producto(ModeloBase):
             'numero_ventas', 'fecha_ultima_venta'
         ])
     
+    def datos_punto_venta(self):
+        """Datos compactos para el escaneo en punto de venta (sin stock ni estadísticas)"""
+        return {
+            'id': self.pk,
+            'codigo': self.codigo,
+            'codigo_barras': self.codigo_barras,
+            'codigo_interno': self.codigo_interno,
+            'nombre': self.nombre,
+            'unidad_medida': self.unidad_medida_sunat,
+            'precio_venta': str(self.precio_venta),
+            'precio_venta_con_igv': str(self.precio_venta_con_igv),
+            'tipo_afectacion_igv': self.tipo_afectacion_igv,
+            'codigo_producto_sunat': self.codigo_producto_sunat,
+            'controla_stock': self.controla_stock,
+            'permite_descuento': self.permite_descuento,
+            'descuento_maximo': str(self.descuento_maximo),
+        }
+    
+    @classmethod
+    def buscar_por_codigo(cls, codigo, queryset=None):
+        """
+        Datos de punto de venta del producto activo con ese código, código de barras o código interno
+        Con caché es una sola lectura; sin ella, una consulta cuyo resultado se guarda bajo el código buscado.
+        Con queryset (filtros de la vista) se consulta sobre él sin usar la caché
+        """
+        from django.core.cache import cache
+        
+        if queryset is None:
+            datos = cache.get(cls.clave_cache_codigo(codigo))
+            if datos is not None:
+                return datos
+        
+        # Mismo orden de prioridad que la búsqueda por separado
+        producto = (cls.objects if queryset is None else queryset.select_related(None)).filter(
+            models.Q(codigo=codigo) | models.Q(codigo_barras=codigo) | models.Q(codigo_interno=codigo),
+            activo=True
+        ).annotate(
+            prioridad=models.Case(
+                models.When(codigo=codigo, then=models.Value(0)),
+                models.When(codigo_barras=codigo, then=models.Value(1)),
+                default=models.Value(2)
+            )
+        ).order_by('prioridad').only(*cls.CAMPOS_CACHE_CODIGO).first()
+        
+        if producto is None:
+            return None
+        
+        if queryset is None:
+            producto.guardar_cache_codigo(codigo)
+        return producto.datos_punto_venta()
+    
+    def codigos(self):
+        """Códigos no vacíos por los que se puede escanear el producto"""
+        return [codigo for codigo in (self.codigo, self.codigo_barras, self.codigo_interno) if codigo]
+    
+    def valores_cache_codigo(self, codigo):
+        """
+        Entradas de caché del producto encontrado con ese código: sus datos solo bajo ese código,
+        porque el mismo valor puede ser el código de barras de otro producto, y la lista de
+        las claves de todos sus códigos para invalidarlas al modificarlo
+        """
+        return {
+            self.clave_cache_codigo(codigo): self.datos_punto_venta(),
+            self.clave_cache_codigos_producto(self.pk): [self.clave_cache_codigo(valor) for valor in self.codigos()],
+        }
+    
+    def guardar_cache_codigo(self, codigo):
+        """Guarda los datos de punto de venta bajo el código con que se encontró el producto"""
+        from django.core.cache import cache
+        
+        cache.set_many(self.valores_cache_codigo(codigo), self.TIEMPO_CACHE_CODIGO)
+    
+    def invalidar_cache_codigos(self):
+        """Elimina de la caché los códigos actuales y los que tenía al guardarse en caché"""
+        from django.core.cache import cache
+        
+        clave_producto = self.clave_cache_codigos_producto(self.pk)
+        claves = set(cache.get(clave_producto) or [])
+        claves.update(self.clave_cache_codigo(codigo) for codigo in self.codigos())
+        claves.add(clave_producto)
+        cache.delete_many(list(claves))
+    
+    @staticmethod
+    def clave_cache_codigo(codigo):
+        """Clave de caché de un código escaneado"""
+        return f'productos:codigo:{codigo}'
+    
+    @staticmethod
+    def clave_cache_codigos_producto(producto_id):
+        """Clave de caché con las claves de código guardadas para un producto"""
+        return f'productos:codigos:{producto_id}'
+    
     def obtener_datos_facturacion(self):
         """Retorna datos formateados para facturación"""
         return {
@@ -676,6 +902,51 @@ class Producto(ModeloBase):
         }
 
 
+class TerminoBusquedaProducto(TerminoBusqueda):
+    """
+    Índice de búsqueda de productos
+    Se mantiene en Producto.save; reindexar_busqueda_productos lo reconstruye tras cargas masivas
+    """
+    
+    # Peso de cada campo en la relevancia
+    PESOS_CAMPOS = {
+        'codigo': 10,
+        'codigo_barras': 10,
+        'codigo_interno': 8,
+        'nombre': 5,
+        'marca': 3,
+        'modelo': 3,
+        'descripcion': 1,
+    }
+    
+    CAMPOS_CODIGO = ['codigo', 'codigo_barras', 'codigo_interno']
+    CAMPO_OBJETO = 'producto'
+    
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='terminos_busqueda',
+        verbose_name='Producto'
+    )
+    
+    class Meta:
+        db_table = 'productos_termino_busqueda'
+        verbose_name = 'Término de Búsqueda'
+        verbose_name_plural = 'Términos de Búsqueda'
+        unique_together = [['producto', 'termino']]
+        indexes = [
+            models.Index(fields=['termino', 'producto', 'peso'], name='idx_termino_busqueda'),
+        ]
+    
+    @classmethod
+    def buscar(cls, queryset, texto):
+        """Productos ordenados por relevancia y nombre"""
+        resultado = super().buscar(queryset, texto)
+        if resultado is queryset:
+            return queryset
+        return resultado.order_by('-relevancia', 'nombre')
+
+
 class ProductoProveedor(ModeloBase):
     """
     Modelo para relación Producto-Proveedor
@@ -291,19 +291,8 @@ class ProductoSerializer(serializers.ModelSerializer):
         }
     
     def get_estado_stock(self, obj):
-        """Estado del stock del producto"""
-        if not obj.controla_stock:
-            return 'NO_CONTROLA'
-        elif obj.stock_actual <= 0:
-            return 'AGOTADO'
-        elif obj.stock_actual <= obj.stock_minimo:
-            return 'CRITICO'
-        elif obj.stock_actual <= obj.punto_reorden:
-            return 'BAJO'
-        elif obj.stock_actual >= obj.stock_maximo and obj.stock_maximo > 0:
-            return 'EXCESO'
-        else:
-            return 'NORMAL'
+        """Estado del stock del producto, precalculado en el modelo"""
+        return obj.estado_stock.upper()
     
     def get_dias_sin_venta(self, obj):
         """Días desde la última venta"""
@@ -510,15 +499,10 @@ class ProductoListSerializer(serializers.ModelSerializer):
         ]
     
     def get_estado_stock(self, obj):
-        """Estado simplificado del stock"""
-        if not obj.controla_stock:
-            return 'NO_CONTROLA'
-        elif obj.stock_actual <= 0:
-            return 'AGOTADO'
-        elif obj.stock_actual <= obj.stock_minimo:
-            return 'CRITICO'
-        else:
-            return 'NORMAL'
+        """Estado simplificado del stock: bajo y exceso se muestran como normal"""
+        if obj.estado_stock in ['no_controla', 'agotado', 'critico']:
+            return obj.estado_stock.upper()
+        return 'NORMAL'
     
     def get_disponibilidad_simple(self, obj):
         """Disponibilidad simplificada"""
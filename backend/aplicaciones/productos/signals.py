@@ -0,0 +1,20 @@
+"""
+Signals de la aplicación Productos - FELICITAFAC
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Producto
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def producto_modificado(sender, instance, **kwargs):
+    """
+    Signal ejecutado al guardar, desactivar (soft_delete) o eliminar un producto
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & set(Producto.CAMPOS_CACHE_CODIGO):
+        return
+    
+    instance.invalidar_cache_codigos()
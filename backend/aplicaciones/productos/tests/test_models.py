@@ -0,0 +1,306 @@
+"""
+Tests de modelos de Productos - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests del índice de búsqueda, la caché de códigos y el estado de stock de productos
+"""
+
+from decimal import Decimal
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from aplicaciones.usuarios.models import Rol, Usuario
+from ..models import Categoria, Producto, TerminoBusquedaProducto, TipoProducto
+from ..views import ProductoViewSet
+
+
+class TestBusquedaProductos(TestCase):
+    """Tests para TerminoBusquedaProducto"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        self.tipo_producto = TipoProducto.objects.create(codigo='BIEN', nombre='Bien')
+        self.categoria = Categoria.objects.create(codigo='GEN', nombre='General')
+    
+    def _crear_producto(self, codigo, nombre, **kwargs):
+        return Producto.objects.create(
+            codigo=codigo,
+            nombre=nombre,
+            tipo_producto=self.tipo_producto,
+            categoria=self.categoria,
+            precio_compra=Decimal('5.00'),
+            precio_venta=Decimal('10.00'),
+            **kwargs
+        )
+    
+    def _buscar(self, texto):
+        return list(
+            TerminoBusquedaProducto.buscar(Producto.objects.all(), texto).values_list('codigo', flat=True)
+        )
+    
+    def test_busqueda_sin_tildes_y_por_prefijo(self):
+        """Test se encuentra por prefijo de cada palabra sin importar tildes ni mayúsculas"""
+        self._crear_producto('CAF-001', 'Café molido Ñuñoa', marca='Altomayo')
+        self._crear_producto('ARR-001', 'Arroz extra')
+        
+        self.assertEqual(self._buscar('cafe'), ['CAF-001'])
+        self.assertEqual(self._buscar('MOL nuñ'), ['CAF-001'])
+        self.assertEqual(self._buscar('altom'), ['CAF-001'])
+        self.assertEqual(self._buscar('caf001'), ['CAF-001'])
+        self.assertEqual(self._buscar('cafe arroz'), [])
+    
+    def test_relevancia_por_campo_y_coincidencia_exacta(self):
+        """Test el código pesa más que la descripción y la coincidencia exacta más que el prefijo"""
+        self._crear_producto('P-003', 'Gaseosa', descripcion='Similar a la cola negra')
+        self._crear_producto('COLA', 'Gaseosa cola')
+        self._crear_producto('P-002', 'Colageno hidrolizado')
+        
+        self.assertEqual(self._buscar('cola'), ['COLA', 'P-002', 'P-003'])
+    
+    def test_reindexa_al_cambiar_campos_de_busqueda(self):
+        """Test el índice sigue al nombre y no se toca en actualizaciones de stock"""
+        producto = self._crear_producto('P-001', 'Leche entera')
+        
+        producto.nombre = 'Leche descremada'
+        producto.save()
+        self.assertEqual(self._buscar('entera'), [])
+        self.assertEqual(self._buscar('descrem'), ['P-001'])
+        
+        producto.controla_stock = True
+        with self.assertNumQueries(1):
+            producto.actualizar_stock(Decimal('5.00'), 'entrada')
+    
+    def test_busqueda_combinada_con_filtros(self):
+        """Test la búsqueda se combina con los demás filtros del queryset"""
+        self._crear_producto('P-001', 'Yogurt fresa', permite_venta=True)
+        self._crear_producto('P-002', 'Yogurt durazno', permite_venta=False)
+        
+        resultado = TerminoBusquedaProducto.buscar(Producto.objects.filter(permite_venta=True), 'yog')
+        
+        self.assertEqual([producto.codigo for producto in resultado], ['P-001'])
+        self.assertEqual(resultado.count(), 1)
+
+
+class TestCacheCodigosProducto(TestCase):
+    """Tests para Producto.buscar_por_codigo"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        cache.clear()
+        self.producto = Producto.objects.create(
+            codigo='GAS-001',
+            nombre='Gaseosa 500 ml',
+            codigo_barras='7750182000123',
+            codigo_interno='int-9',
+            tipo_producto=TipoProducto.objects.create(codigo='BIEN', nombre='Bien'),
+            categoria=Categoria.objects.create(codigo='GEN', nombre='General'),
+            precio_compra=Decimal('1.50'),
+            precio_venta=Decimal('2.50'),
+            stock_actual=Decimal('10.00'),
+            controla_stock=True
+        )
+    
+    def test_escaneo_desde_cache(self):
+        """Test el primer escaneo de cada código consulta una vez y los siguientes no consultan"""
+        with self.assertNumQueries(1):
+            datos = Producto.buscar_por_codigo('7750182000123')
+        
+        self.assertEqual(datos['id'], self.producto.pk)
+        self.assertEqual(datos['precio_venta'], '2.5000')
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(Producto.buscar_por_codigo('7750182000123')['id'], self.producto.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(Producto.buscar_por_codigo('int-9')['id'], self.producto.pk)
+    
+    def test_prioridad_del_codigo_principal(self):
+        """Test si un código coincide con varios productos gana el código principal"""
+        otro = Producto.objects.create(
+            codigo='7750182000123',
+            nombre='Producto con código numérico',
+            tipo_producto=self.producto.tipo_producto,
+            categoria=self.producto.categoria
+        )
+        
+        self.assertEqual(Producto.buscar_por_codigo('7750182000123')['id'], otro.pk)
+    
+    def test_codigo_de_otro_producto_no_pisa_la_cache(self):
+        """Test escanear un producto no guarda sus datos bajo un código que resuelve a otro"""
+        otro = Producto.objects.create(
+            codigo='GAS-002',
+            nombre='Gaseosa 1 L',
+            codigo_interno='GAS-001',
+            tipo_producto=self.producto.tipo_producto,
+            categoria=self.producto.categoria
+        )
+        
+        self.assertEqual(Producto.buscar_por_codigo('GAS-001')['id'], self.producto.pk)
+        self.assertEqual(Producto.buscar_por_codigo('GAS-002')['id'], otro.pk)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(Producto.buscar_por_codigo('GAS-001')['id'], self.producto.pk)
+    
+    def test_vista_aplica_filtros_de_venta_y_stock(self):
+        """Test la acción buscar_por_codigo respeta ?solo_ventas y ?con_stock"""
+        usuario = Usuario.objects.create_user(
+            email='vendedor@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Vendedor',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Administrador', codigo='administrador')
+        )
+        vista = ProductoViewSet.as_view({'get': 'buscar_por_codigo'})
+        
+        def buscar(**parametros):
+            solicitud = APIRequestFactory().get('/api/productos/buscar_por_codigo/', {'codigo': 'GAS-001', **parametros})
+            force_authenticate(solicitud, user=usuario)
+            return vista(solicitud)
+        
+        self.assertEqual(buscar(con_stock='true').data['id'], self.producto.pk)
+        
+        Producto.objects.filter(pk=self.producto.pk).update(stock_actual=0, permite_venta=False)
+        
+        self.assertEqual(buscar().status_code, 200)
+        self.assertEqual(buscar(con_stock='true').status_code, 404)
+        self.assertEqual(buscar(solo_ventas='true').status_code, 404)
+    
+    def test_invalidacion_al_modificar(self):
+        """Test cambiar precio o código invalida la caché; actualizar stock no"""
+        Producto.buscar_por_codigo('GAS-001')
+        
+        self.producto.actualizar_stock(Decimal('1.00'), 'salida')
+        with self.assertNumQueries(0):
+            Producto.buscar_por_codigo('GAS-001')
+        
+        self.producto.precio_venta = Decimal('3.00')
+        self.producto.codigo_barras = '7750182000999'
+        self.producto.save()
+        
+        self.assertEqual(Producto.buscar_por_codigo('GAS-001')['precio_venta'], '3.0000')
+        self.assertIsNone(Producto.buscar_por_codigo('7750182000123'))
+    
+    def test_soft_delete_invalida(self):
+        """Test un producto desactivado deja de encontrarse"""
+        Producto.buscar_por_codigo('7750182000123')
+        
+        self.producto.soft_delete()
+        
+        self.assertIsNone(Producto.buscar_por_codigo('7750182000123'))
+    
+    def test_comando_precarga(self):
+        """Test el comando deja los códigos de los productos activos en caché"""
+        otro = Producto.objects.create(
+            codigo='GAS-002',
+            nombre='Producto con el código de barras de otro como código interno',
+            codigo_interno='7750182000123',
+            tipo_producto=self.producto.tipo_producto,
+            categoria=self.producto.categoria
+        )
+        
+        call_command('precargar_codigos_productos', stdout=StringIO())
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(Producto.buscar_por_codigo('int-9')['codigo'], 'GAS-001')
+            self.assertEqual(Producto.buscar_por_codigo('7750182000123')['codigo'], 'GAS-001')
+            self.assertEqual(Producto.buscar_por_codigo('GAS-002')['id'], otro.pk)
+
+
+class TestEstadoStockProducto(TestCase):
+    """Tests para Producto.estado_stock"""
+    
+    # (stock_actual, estado esperado) con mínimo 5, punto de reorden 10 y máximo 50
+    CASOS = [
+        ('-1.00', 'agotado'),
+        ('0.00', 'agotado'),
+        ('3.00', 'critico'),
+        ('5.00', 'critico'),
+        ('8.00', 'bajo'),
+        ('20.00', 'normal'),
+        ('50.00', 'exceso'),
+    ]
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        self.tipo_producto = TipoProducto.objects.create(codigo='BIEN', nombre='Bien')
+        self.categoria = Categoria.objects.create(codigo='GEN', nombre='General')
+    
+    def _crear_producto(self, codigo, stock, **kwargs):
+        return Producto.objects.create(
+            codigo=codigo,
+            nombre=f'Producto {codigo}',
+            tipo_producto=self.tipo_producto,
+            categoria=self.categoria,
+            precio_compra=Decimal('5.00'),
+            precio_venta=Decimal('10.00'),
+            stock_actual=Decimal(stock),
+            stock_minimo=Decimal('5.00'),
+            punto_reorden=Decimal('10.00'),
+            stock_maximo=Decimal('50.00'),
+            **kwargs
+        )
+    
+    def test_estado_al_guardar(self):
+        """Test save calcula el estado para cada tramo de stock"""
+        for indice, (stock, estado) in enumerate(self.CASOS):
+            self.assertEqual(self._crear_producto(f'P{indice}', stock).estado_stock, estado)
+        
+        self.assertEqual(self._crear_producto('SERV', '0.00', controla_stock=False).estado_stock, 'no_controla')
+    
+    def test_expresion_sql_equivale_al_calculo(self):
+        """Test la expresión SQL del UPDATE asigna el mismo estado que calcular_estado_stock"""
+        for indice, (stock, estado) in enumerate(self.CASOS):
+            self._crear_producto(f'P{indice}', stock)
+        Producto.objects.update(estado_stock='normal')
+        
+        Producto.objects.update(estado_stock=Producto.expresion_estado_stock())
+        
+        self.assertEqual(
+            list(Producto.objects.order_by('codigo').values_list('estado_stock', flat=True)),
+            [estado for _, estado in self.CASOS]
+        )
+    
+    def test_descuento_de_stock_actualiza_estado(self):
+        """Test actualizar_stock y el UPDATE con F() del inventario en lote mantienen el estado"""
+        producto = self._crear_producto('P1', '12.00')
+        
+        producto.actualizar_stock(Decimal('3.00'), 'salida')
+        producto.refresh_from_db()
+        self.assertEqual(producto.estado_stock, 'bajo')
+        
+        stock_actual = F('stock_actual') - Decimal('9.00')
+        Producto.objects.filter(pk=producto.pk).update(
+            estado_stock=Producto.expresion_estado_stock(stock_actual),
+            stock_actual=stock_actual
+        )
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, Decimal('0.00'))
+        self.assertEqual(producto.estado_stock, 'agotado')
+    
+    def test_alertas_stock_por_estado(self):
+        """Test alertas_stock agrupa los productos según la columna estado_stock"""
+        for indice, (stock, estado) in enumerate(self.CASOS):
+            self._crear_producto(f'P{indice}', stock)
+        usuario = Usuario.objects.create_user(
+            email='admin@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Administrador',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Administrador', codigo='administrador')
+        )
+        solicitud = APIRequestFactory().get('/api/productos/alertas_stock/')
+        force_authenticate(solicitud, user=usuario)
+        
+        respuesta = ProductoViewSet.as_view({'get': 'alertas_stock'})(solicitud)
+        
+        self.assertEqual(respuesta.data['resumen'], {
+            'total_agotados': 2,
+            'total_criticos': 2,
+            'total_reorden': 1,
+            'total_alertas': 5,
+        })
+        self.assertEqual([producto['codigo'] for producto in respuesta.data['productos_criticos']], ['P2', 'P3'])
@@ -16,7 +16,7 @@ from django.utils import timezone
 from decimal import Decimal
 import logging
 
-from .models import TipoProducto, Categoria, Producto, ProductoProveedor
+from .models import TipoProducto, Categoria, Producto, ProductoProveedor, TerminoBusquedaProducto
 from .serializers import (
     TipoProductoSerializer, CategoriaSerializer, CategoriaListSerializer,
     ProductoSerializer, ProductoListSerializer, ProductoCreateSerializer,
@@ -24,9 +24,11 @@ from .serializers import (
     EstadisticasProductoSerializer, MovimientoStockSerializer
 )
 from aplicaciones.core.permissions import (
-    EsContadorOAdministrador, EsVendedorOSuperior, PuedeVerProductos, PuedeEditarProductos
+    EsContadorOAdministrador, EsVendedorOSuperior, PuedeVerProductos, PuedeEditarProductos,
+    PuedeVerReportes
 )
 from aplicaciones.core.pagination import PaginacionEstandar
+from aplicaciones.reportes.exporters import ExportacionMixin
 
 logger = logging.getLogger(__name__)
 
@@ -146,21 +148,26 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     def jerarquia(self, request):
         """Obtener jerarquía completa de categorías"""
         try:
-            # Obtener categorías padre
-            categorias_padre = self.get_queryset().filter(categoria_padre__isnull=True)
+            # Todas las categorías activas con su cantidad de productos en una sola consulta
+            categorias = self.queryset.annotate(
+                cantidad_productos=Count('productos', filter=Q(productos__activo=True))
+            ).order_by('orden', 'nombre')
+            
+            hijas_por_padre = {}
+            for categoria in categorias:
+                hijas_por_padre.setdefault(categoria.categoria_padre_id, []).append(categoria)
             
             def construir_jerarquia(categoria):
-                """Construir jerarquía recursiva"""
-                subcategorias = categoria.subcategorias.filter(activo=True).order_by('orden', 'nombre')
+                """Construir jerarquía recursiva en memoria"""
                 return {
                     'id': categoria.id,
                     'codigo': categoria.codigo,
                     'nombre': categoria.nombre,
-                    'cantidad_productos': categoria.productos.filter(activo=True).count(),
-                    'subcategorias': [construir_jerarquia(sub) for sub in subcategorias]
+                    'cantidad_productos': categoria.cantidad_productos,
+                    'subcategorias': [construir_jerarquia(sub) for sub in hijas_por_padre.get(categoria.id, [])]
                 }
             
-            jerarquia = [construir_jerarquia(cat) for cat in categorias_padre]
+            jerarquia = [construir_jerarquia(cat) for cat in hijas_por_padre.get(None, [])]
             return Response(jerarquia)
         
         except Exception as e:
@@ -195,7 +202,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(ExportacionMixin, viewsets.ModelViewSet):
     """
     ViewSet principal para gestión de productos
     CRUD completo con funcionalidades de inventario
@@ -236,6 +243,27 @@ class ProductoViewSet(viewsets.ModelViewSet):
     ]
     ordering = ['codigo']
     
+    # Acción exportar de ExportacionMixin: nombre del archivo y columnas (campo, título[, formateador])
+    NOMBRE_EXPORTACION = 'productos'
+    COLUMNAS_EXPORTACION = [
+        ('codigo', 'Código'),
+        ('codigo_barras', 'Código de Barras'),
+        ('nombre', 'Nombre'),
+        ('tipo_producto__nombre', 'Tipo'),
+        ('categoria__nombre', 'Categoría'),
+        ('marca', 'Marca'),
+        ('unidad_medida', 'Unidad'),
+        ('precio_compra', 'Precio Compra'),
+        ('precio_venta', 'Precio Venta'),
+        ('precio_venta_con_igv', 'Precio con IGV'),
+        ('stock_actual', 'Stock Actual'),
+        ('stock_minimo', 'Stock Mínimo'),
+        ('permite_venta', 'Estado', lambda permite_venta: 'ACTIVO' if permite_venta else 'NO VENDIBLE'),
+    ]
+    
+    # Parámetros de get_queryset que buscar_por_codigo no puede resolver desde la caché
+    FILTROS_BUSQUEDA_CODIGO = ['solo_ventas', 'con_stock', 'estado_stock']
+    
     def get_serializer_class(self):
         """Seleccionar serializer según acción"""
         if self.action == 'list':
@@ -249,6 +277,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
         """Permisos específicos por acción"""
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [IsAuthenticated, PuedeEditarProductos]
+        elif self.action == 'exportar':
+            permission_classes = [IsAuthenticated, PuedeVerReportes]
         else:
             permission_classes = [IsAuthenticated, PuedeVerProductos]
         
@@ -270,23 +300,10 @@ class ProductoViewSet(viewsets.ModelViewSet):
                 Q(controla_stock=False) | Q(stock_actual__gt=0)
             )
         
-        # Filtrar por estado de stock
+        # Filtrar por estado de stock (columna precalculada, idx_producto_estado_stock)
         estado_stock = self.request.query_params.get('estado_stock', None)
-        if estado_stock:
-            if estado_stock == 'agotado':
-                queryset = queryset.filter(controla_stock=True, stock_actual=0)
-            elif estado_stock == 'critico':
-                queryset = queryset.filter(
-                    controla_stock=True,
-                    stock_actual__gt=0,
-                    stock_actual__lte=F('stock_minimo')
-                )
-            elif estado_stock == 'bajo':
-                queryset = queryset.filter(
-                    controla_stock=True,
-                    stock_actual__gt=F('stock_minimo'),
-                    stock_actual__lte=F('punto_reorden')
-                )
+        if estado_stock in ['agotado', 'critico', 'bajo']:
+            queryset = queryset.filter(controla_stock=True, estado_stock=estado_stock)
         
         return queryset
     
@@ -347,14 +364,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
         
         # Aplicar filtros
         if data.get('termino'):
-            termino = data['termino']
-            queryset = queryset.filter(
-                Q(codigo__icontains=termino) |
-                Q(nombre__icontains=termino) |
-                Q(descripcion__icontains=termino) |
-                Q(codigo_barras__icontains=termino) |
-                Q(marca__icontains=termino)
-            )
+            # Índice de términos por prefijo, ordenado por relevancia
+            queryset = TerminoBusquedaProducto.buscar(queryset, data['termino'])
         
         if data.get('tipo_producto'):
             queryset = queryset.filter(tipo_producto_id=data['tipo_producto'])
@@ -389,32 +400,11 @@ class ProductoViewSet(viewsets.ModelViewSet):
         
         # Aplicar estado de stock
         estado_stock = data.get('estado_stock')
-        if estado_stock:
-            if estado_stock == 'agotado':
-                queryset = queryset.filter(controla_stock=True, stock_actual=0)
-            elif estado_stock == 'critico':
-                queryset = queryset.filter(
-                    controla_stock=True,
-                    stock_actual__gt=0,
-                    stock_actual__lte=F('stock_minimo')
-                )
-            elif estado_stock == 'bajo':
-                queryset = queryset.filter(
-                    controla_stock=True,
-                    stock_actual__gt=F('stock_minimo'),
-                    stock_actual__lte=F('punto_reorden')
-                )
-            elif estado_stock == 'normal':
-                queryset = queryset.filter(
-                    Q(controla_stock=False) |
-                    Q(stock_actual__gt=F('punto_reorden'))
-                )
-            elif estado_stock == 'exceso':
-                queryset = queryset.filter(
-                    controla_stock=True,
-                    stock_maximo__gt=0,
-                    stock_actual__gte=F('stock_maximo')
-                )
+        if estado_stock == 'normal':
+            # Normal incluye los que no controlan stock y los que superan el máximo
+            queryset = queryset.filter(estado_stock__in=['no_controla', 'normal', 'exceso'])
+        elif estado_stock:
+            queryset = queryset.filter(controla_stock=True, estado_stock=estado_stock)
         
         # Paginar resultados
         page = self.paginate_queryset(queryset)
@@ -521,29 +511,21 @@ class ProductoViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def alertas_stock(self, request):
         """Obtener productos con alertas de stock"""
-        productos_criticos = self.get_queryset().filter(
-            controla_stock=True,
-            stock_actual__lte=F('stock_minimo')
-        ).order_by('stock_actual')
-        
-        productos_agotados = productos_criticos.filter(stock_actual=0)
-        productos_bajos = productos_criticos.filter(stock_actual__gt=0)
-        
-        productos_reorden = self.get_queryset().filter(
-            controla_stock=True,
-            stock_actual__gt=F('stock_minimo'),
-            stock_actual__lte=F('punto_reorden')
-        ).order_by('stock_actual')
+        # Búsquedas por igualdad sobre idx_producto_estado_stock
+        alertas = self.get_queryset().filter(controla_stock=True).order_by('stock_actual')
+        productos_agotados = list(alertas.filter(estado_stock='agotado'))
+        productos_criticos = list(alertas.filter(estado_stock='critico'))
+        productos_reorden = list(alertas.filter(estado_stock='bajo'))
         
         return Response({
             'productos_agotados': ProductoListSerializer(productos_agotados, many=True).data,
-            'productos_criticos': ProductoListSerializer(productos_bajos, many=True).data,
+            'productos_criticos': ProductoListSerializer(productos_criticos, many=True).data,
             'productos_reorden': ProductoListSerializer(productos_reorden, many=True).data,
             'resumen': {
-                'total_agotados': productos_agotados.count(),
-                'total_criticos': productos_bajos.count(),
-                'total_reorden': productos_reorden.count(),
-                'total_alertas': productos_criticos.count() + productos_reorden.count()
+                'total_agotados': len(productos_agotados),
+                'total_criticos': len(productos_criticos),
+                'total_reorden': len(productos_reorden),
+                'total_alertas': len(productos_agotados) + len(productos_criticos) + len(productos_reorden)
             }
         })
     
@@ -562,12 +544,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
             # Estadísticas básicas
             total_productos = queryset.count()
             productos_activos = queryset.filter(permite_venta=True).count()
-            productos_agotados = queryset.filter(controla_stock=True, stock_actual=0).count()
-            productos_criticos = queryset.filter(
-                controla_stock=True,
-                stock_actual__gt=0,
-                stock_actual__lte=F('stock_minimo')
-            ).count()
+            productos_agotados = queryset.filter(controla_stock=True, estado_stock='agotado').count()
+            productos_criticos = queryset.filter(controla_stock=True, estado_stock='critico').count()
             
             # Productos sin movimiento (más de 30 días)
             fecha_limite = timezone.now() - timezone.timedelta(days=30)
@@ -639,7 +617,11 @@ class ProductoViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def buscar_por_codigo(self, request):
-        """Buscar producto por código o código de barras"""
+        """
+        Buscar producto por código, código de barras o código interno
+        Responde los datos compactos de punto de venta desde la caché de códigos;
+        con ?solo_ventas, ?con_stock o ?estado_stock se busca sobre el queryset filtrado, sin caché
+        """
         codigo = request.query_params.get('codigo', '').strip()
         
         if not codigo:
@@ -649,20 +631,12 @@ class ProductoViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            # Buscar por código principal
-            producto = self.get_queryset().filter(codigo=codigo).first()
-            
-            # Si no encuentra, buscar por código de barras
-            if not producto:
-                producto = self.get_queryset().filter(codigo_barras=codigo).first()
-            
-            # Si no encuentra, buscar por código interno
-            if not producto:
-                producto = self.get_queryset().filter(codigo_interno=codigo).first()
+            # La caché no guarda stock ni permite_venta: los filtros de get_queryset van a la base de datos
+            filtrado = any(parametro in request.query_params for parametro in self.FILTROS_BUSQUEDA_CODIGO)
+            datos = Producto.buscar_por_codigo(codigo, self.get_queryset() if filtrado else None)
             
-            if producto:
-                serializer = self.get_serializer(producto)
-                return Response(serializer.data)
+            if datos:
+                return Response(datos)
             else:
                 return Response(
                     {'error': 'Producto no encontrado'},
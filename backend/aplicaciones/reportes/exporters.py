@@ -0,0 +1,305 @@
+"""
+Exportadores de Reportes - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Exportación CSV y XLSX por streaming: lectura por bloques keyset con values_list
+y escritura incremental, con memoria constante sin importar la cantidad de filas
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Filas leídas por consulta a la base de datos
+TAMANO_BLOQUE = 2000
+
+# Caracteres de control no permitidos en XML (XLSX)
+CARACTERES_INVALIDOS_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def valor_exportable(valor):
+    """Convierte fechas a texto local; None a cadena vacía; el resto se conserva"""
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return valor
+
+
+def filas_queryset(queryset, columnas, tamano_bloque=TAMANO_BLOQUE, descendente=False):
+    """
+    Filas de la exportación leídas por bloques keyset: pk > último ORDER BY pk LIMIT n
+    Cada bloque es una consulta independiente, así el controlador de MySQL no retiene
+    todo el resultado en memoria como con iterator(); las filas salen en orden de pk,
+    del más reciente al más antiguo con descendente=True
+    columnas: tuplas (campo, titulo) o (campo, titulo, formateador); campo puede ser
+    un nombre con '__' o una expresión (Coalesce, F...). Solo se leen esas columnas
+    """
+    campos = [columna[0] for columna in columnas]
+    formateadores = [columna[2] if len(columna) > 2 else None for columna in columnas]
+    
+    # Sin prefetch: values_list no lo usa
+    queryset = queryset.prefetch_related(None).order_by('-pk' if descendente else 'pk')
+    siguiente = 'pk__lt' if descendente else 'pk__gt'
+    ultimo = None
+    
+    while True:
+        bloque = queryset if ultimo is None else queryset.filter(**{siguiente: ultimo})
+        filas = list(bloque.values_list('pk', *campos)[:tamano_bloque])
+        
+        for fila in filas:
+            yield tuple(
+                formateador(valor) if formateador else valor
+                for formateador, valor in zip(formateadores, fila[1:])
+            )
+        
+        if len(filas) < tamano_bloque:
+            return
+        ultimo = filas[-1][0]
+
+
+class _SalidaStreaming:
+    """Archivo de solo escritura que acumula bytes hasta que se vacían hacia la respuesta"""
+    
+    def __init__(self):
+        self.partes = []
+    
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+    
+    def flush(self):
+        pass
+    
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+class ExportadorCSV:
+    """CSV UTF-8 generado por bloques de filas"""
+    
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    
+    def __init__(self, titulos, filas, filas_por_bloque=500):
+        self.titulos = titulos
+        self.filas = filas
+        self.filas_por_bloque = filas_por_bloque
+    
+    def generar(self):
+        """Bytes del archivo, un bloque de filas por iteración"""
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(self.titulos)
+        
+        pendientes = 0
+        for fila in self.filas:
+            escritor.writerow([valor_exportable(valor) for valor in fila])
+            pendientes += 1
+            if pendientes >= self.filas_por_bloque:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate(0)
+                pendientes = 0
+        
+        yield buffer.getvalue().encode('utf-8')
+
+
+class ExportadorXLSX:
+    """
+    XLSX de una hoja escrito directamente en un ZIP sin archivo temporal
+    Las celdas de texto van como inlineStr, sin tabla de cadenas compartidas,
+    para no retener el contenido en memoria hasta el final
+    """
+    
+    extension = 'xlsx'
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    
+    CONTENT_TYPES = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    )
+    
+    RELACIONES = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    )
+    
+    LIBRO = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+    
+    RELACIONES_LIBRO = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    )
+    
+    def __init__(self, titulos, filas, filas_por_bloque=500, hoja='Datos'):
+        self.titulos = titulos
+        self.filas = filas
+        self.filas_por_bloque = filas_por_bloque
+        self.hoja = hoja[:31]
+    
+    @staticmethod
+    def _celda(valor):
+        """XML de una celda: numérica o texto en línea"""
+        valor = valor_exportable(valor)
+        if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+            return f'<c t="n"><v>{valor}</v></c>'
+        
+        texto = escape(CARACTERES_INVALIDOS_XML.sub('', str(valor)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+    
+    def _fila(self, valores):
+        return ('<row>' + ''.join(self._celda(valor) for valor in valores) + '</row>').encode('utf-8')
+    
+    def generar(self):
+        """Bytes del archivo; la hoja se comprime y se envía por bloques de filas"""
+        salida = _SalidaStreaming()
+        
+        # Sin seek(): zipfile escribe cada entrada con descriptor de datos al final
+        with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo:
+            archivo.writestr('[Content_Types].xml', self.CONTENT_TYPES)
+            archivo.writestr('_rels/.rels', self.RELACIONES)
+            archivo.writestr('xl/workbook.xml', self.LIBRO.format(hoja=escape(self.hoja, {'"': '&quot;'})))
+            archivo.writestr('xl/_rels/workbook.xml.rels', self.RELACIONES_LIBRO)
+            
+            with archivo.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+                hoja.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    b'<sheetData>'
+                )
+                hoja.write(self._fila(self.titulos))
+                
+                pendientes = 0
+                for fila in self.filas:
+                    hoja.write(self._fila(fila))
+                    pendientes += 1
+                    if pendientes >= self.filas_por_bloque:
+                        pendientes = 0
+                        datos = salida.vaciar()
+                        if datos:
+                            yield datos
+                
+                hoja.write(b'</sheetData></worksheet>')
+        
+        yield salida.vaciar()
+
+
+FORMATOS_EXPORTACION = {
+    ExportadorCSV.extension: ExportadorCSV,
+    ExportadorXLSX.extension: ExportadorXLSX,
+}
+
+
+def exportar_queryset(queryset, columnas, nombre_archivo, formato='csv', tamano_bloque=TAMANO_BLOQUE,
+                      descendente=False):
+    """
+    StreamingHttpResponse con el queryset exportado en el formato indicado
+    nombre_archivo va sin extensión; formato debe estar en FORMATOS_EXPORTACION
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f'Formato de exportación no soportado: {formato}')
+    
+    exportador = FORMATOS_EXPORTACION[formato](
+        [columna[1] for columna in columnas],
+        filas_queryset(queryset, columnas, tamano_bloque, descendente)
+    )
+    
+    respuesta = StreamingHttpResponse(exportador.generar(), content_type=exportador.content_type)
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{exportador.extension}"'
+    return respuesta
+
+
+class ExportacionMixin:
+    """
+    Acción exportar para ViewSets: ?formato=csv|xlsx con las columnas de COLUMNAS_EXPORTACION
+    Por defecto exporta el queryset filtrado de la vista; las vistas sin get_queryset
+    reemplazan get_queryset_exportacion. permisos_exportacion reemplaza los permisos
+    de la vista para esta acción cuando la vista no define get_permissions
+    Las filas salen en orden de pk; exportacion_descendente las entrega de la más reciente a la más antigua
+    """
+    
+    # Columnas de exportar: (campo, título[, formateador])
+    COLUMNAS_EXPORTACION = []
+    NOMBRE_EXPORTACION = 'exportacion'
+    exportacion_descendente = False
+    permisos_exportacion = None
+    
+    def get_permissions(self):
+        if self.action == 'exportar' and self.permisos_exportacion is not None:
+            return [permiso() for permiso in self.permisos_exportacion]
+        return super().get_permissions()
+    
+    def get_queryset_exportacion(self):
+        """Queryset a exportar"""
+        return self.filter_queryset(self.get_queryset())
+    
+    def puede_exportar(self, request):
+        """Verificación adicional de permisos antes de exportar"""
+        return True
+    
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exportar el listado en CSV o XLSX (?formato=xlsx)"""
+        if not self.puede_exportar(request):
+            return Response(
+                {'error': f'No tiene permisos para exportar {self.NOMBRE_EXPORTACION}'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS_EXPORTACION:
+            return Response(
+                {'error': f'Formato no soportado. Opciones: {", ".join(FORMATOS_EXPORTACION)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Las consultas se ejecutan al enviar la respuesta, fuera de esta vista
+        respuesta = exportar_queryset(
+            self.get_queryset_exportacion(),
+            self.COLUMNAS_EXPORTACION,
+            self.NOMBRE_EXPORTACION,
+            formato,
+            descendente=self.exportacion_descendente
+        )
+        logger.info(f"Exportación de {self.NOMBRE_EXPORTACION} realizada por {request.user.email}")
+        return respuesta
@@ -0,0 +1,116 @@
+"""
+Tests de exportadores - FELICITAFAC
+Sistema de Facturación Electrónica para Perú
+Tests de la exportación CSV y XLSX por streaming
+"""
+
+import csv
+import io
+from decimal import Decimal
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from aplicaciones.productos.models import Categoria, Producto, TipoProducto
+from aplicaciones.productos.views import ProductoViewSet
+from aplicaciones.usuarios.models import Rol, Usuario
+from ..exporters import ExportadorXLSX, exportar_queryset
+
+
+class TestExportadores(TestCase):
+    """Tests para exportar_queryset y la acción exportar de productos"""
+    
+    def setUp(self):
+        """Configuración inicial para tests"""
+        tipo_producto = TipoProducto.objects.create(codigo='BIEN', nombre='Bien')
+        categorias = [
+            Categoria.objects.create(codigo=f'C{indice}', nombre=f'Categoría {indice}')
+            for indice in range(3)
+        ]
+        for indice in range(1, 8):
+            Producto.objects.create(
+                codigo=f'P{indice:03d}',
+                nombre=f'Producto & "{indice}"',
+                tipo_producto=tipo_producto,
+                categoria=categorias[indice % 3],
+                precio_compra=Decimal('5.00'),
+                precio_venta=Decimal('10.00'),
+                stock_actual=Decimal(indice),
+                permite_venta=indice != 7
+            )
+        self.columnas = [
+            ('codigo', 'Código'),
+            ('nombre', 'Nombre'),
+            ('categoria__nombre', 'Categoría'),
+            ('stock_actual', 'Stock'),
+            ('permite_venta', 'Estado', lambda permite_venta: 'ACTIVO' if permite_venta else 'NO VENDIBLE'),
+        ]
+        self.queryset = Producto.objects.select_related('categoria').prefetch_related('proveedores').order_by('codigo')
+    
+    def _contenido(self, respuesta):
+        return b''.join(respuesta.streaming_content)
+    
+    def test_csv_una_consulta_por_bloque(self):
+        """Test el CSV lee las columnas pedidas en bloques keyset por pk, sin N+1"""
+        respuesta = exportar_queryset(self.queryset, self.columnas, 'productos', tamano_bloque=3)
+        
+        self.assertIsInstance(respuesta, StreamingHttpResponse)
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="productos.csv"')
+        with CaptureQueriesContext(connection) as consultas:
+            contenido = self._contenido(respuesta)
+        
+        # 7 filas en bloques de 3: el último bloque incompleto termina la lectura
+        self.assertEqual(len(consultas), 3)
+        self.assertNotIn('OFFSET', consultas[2]['sql'])
+        self.assertIn('LIMIT 3', consultas[2]['sql'])
+        
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8'))))
+        self.assertEqual(filas[0], ['Código', 'Nombre', 'Categoría', 'Stock', 'Estado'])
+        self.assertEqual(len(filas), 8)
+        self.assertEqual(filas[1], ['P001', 'PRODUCTO & "1"', 'Categoría 1', '1.0000', 'ACTIVO'])
+        self.assertEqual(filas[7][4], 'NO VENDIBLE')
+    
+    def test_xlsx_legible_por_openpyxl(self):
+        """Test el XLSX generado sin archivo temporal se abre con sus celdas numéricas y de texto"""
+        respuesta = exportar_queryset(self.queryset, self.columnas, 'productos', 'xlsx')
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="productos.xlsx"')
+        
+        libro = load_workbook(io.BytesIO(self._contenido(respuesta)), read_only=True)
+        filas = list(libro.active.iter_rows(values_only=True))
+        
+        self.assertEqual(filas[0], ('Código', 'Nombre', 'Categoría', 'Stock', 'Estado'))
+        self.assertEqual(len(filas), 8)
+        self.assertEqual(filas[3], ('P003', 'PRODUCTO & "3"', 'Categoría 0', 3, 'ACTIVO'))
+    
+    def test_xlsx_envia_por_bloques(self):
+        """Test el XLSX se entrega en varios fragmentos a medida que se escriben las filas"""
+        filas = ((indice, f'Fila {indice}') for indice in range(5000))
+        fragmentos = list(ExportadorXLSX(['Número', 'Texto'], filas, filas_por_bloque=100).generar())
+        
+        self.assertGreater(len(fragmentos), 2)
+        libro = load_workbook(io.BytesIO(b''.join(fragmentos)), read_only=True)
+        self.assertEqual(len(list(libro.active.iter_rows(values_only=True))), 5001)
+    
+    def test_accion_exportar_productos(self):
+        """Test la acción exportar aplica los filtros de la vista y valida el formato"""
+        usuario = Usuario.objects.create_user(
+            email='contador@test.com',
+            password='clave-segura-123',
+            nombres='Usuario',
+            apellidos='Contador',
+            numero_documento='12345678',
+            rol=Rol.objects.create(nombre='Contador', codigo='contador')
+        )
+        vista = ProductoViewSet.as_view({'get': 'exportar'})
+        
+        solicitud = APIRequestFactory().get('/api/productos/exportar/', {'solo_ventas': 'true'})
+        force_authenticate(solicitud, user=usuario)
+        filas = list(csv.reader(io.StringIO(self._contenido(vista(solicitud)).decode('utf-8'))))
+        self.assertEqual([fila[0] for fila in filas[1:]], [f'P{indice:03d}' for indice in range(1, 7)])
+        
+        solicitud = APIRequestFactory().get('/api/productos/exportar/', {'formato': 'pdf'})
+        force_authenticate(solicitud, user=usuario)
+        self.assertEqual(vista(solicitud).status_code, 400)
@@ -636,6 +636,17 @@ CONFIGURACION_SUNAT = {
     'TIPO_DOCUMENTO_DNI': '1',
     'NUBEFACT_TOKEN': config('NUBEFACT_TOKEN', default=''),
     'NUBEFACT_URL_BASE': config('NUBEFACT_URL_BASE', default='https://api.nubefact.com'),
+    # Despacho asíncrono (manage.py despachar_sunat)
+    'DESPACHO_HILOS': config('SUNAT_DESPACHO_HILOS', default=4, cast=int),
+    'DESPACHO_LOTE': config('SUNAT_DESPACHO_LOTE', default=50, cast=int),
+    'DESPACHO_INTERVALO_SEGUNDOS': config('SUNAT_DESPACHO_INTERVALO', default=5, cast=int),
+    'DESPACHO_BLOQUEO_MAXIMO_SEGUNDOS': config('SUNAT_DESPACHO_BLOQUEO_MAXIMO', default=600, cast=int),
+    # Conciliación de estados (manage.py conciliar_sunat)
+    'CONCILIACION_HILOS': config('SUNAT_CONCILIACION_HILOS', default=8, cast=int),
+    'CONCILIACION_LOTE': config('SUNAT_CONCILIACION_LOTE', default=200, cast=int),
+    # Numeración de comprobantes (AsignadorNumeracion)
+    'NUMERACION_BLOQUE': config('SUNAT_NUMERACION_BLOQUE', default=1, cast=int),
+    'NUMERACION_VIGENCIA_HORAS': config('SUNAT_NUMERACION_VIGENCIA_HORAS', default=24, cast=int),
 }
 
 # Configuración de datos fiscales de la empresa